@@ -19,20 +19,38 @@ from pathlib import Path
 # print(f"This is printing from: {__file__}")
 # print(f"Source code for this package is available at: {__repo_url__}")
 
-base_package_path = Path(__file__).parent
+# the folder containing the package, not the package folder itself, where the skelly_synchronize module would shadow the package
+base_package_path = Path(__file__).parent.parent
 # print(f"adding base_package_path: {base_package_path} : to sys.path")
 sys.path.insert(0, str(base_package_path))  # add parent directory to sys.path
 
 from skelly_synchronize.system.default_paths import get_log_file_path
 from skelly_synchronize.system.logging_configuration import configure_logging
-from skelly_synchronize.skelly_synchronize import (
-    synchronize_videos_from_audio,
-    synchronize_videos_from_brightness,
-)
-from skelly_synchronize.core_processes.debugging.debug_plots import (
-    create_audio_debug_plots,
-    create_brightness_debug_plots,
-)
+
+# public functions are imported on first access, so importing the package doesn't load heavy dependencies like matplotlib or scipy
+_lazy_imports = {
+    "synchronize_videos_from_audio": "skelly_synchronize.skelly_synchronize",
+    "synchronize_videos_from_brightness": "skelly_synchronize.skelly_synchronize",
+    "create_audio_debug_plots": "skelly_synchronize.core_processes.debugging.debug_plots",
+    "create_brightness_debug_plots": "skelly_synchronize.core_processes.debugging.debug_plots",
+    "load_sync_manifest": "skelly_synchronize.core_processes.sync_result",
+    "AlignedFrameReader": "skelly_synchronize.core_processes.video_functions.aligned_frame_reader",
+    "read_aligned_frames": "skelly_synchronize.core_processes.video_functions.aligned_frame_reader",
+    "export_synchronized_frames": "skelly_synchronize.core_processes.video_functions.frame_export",
+    "add_camera_to_session": "skelly_synchronize.core_processes.incremental_sync",
+}
+
+
+def __getattr__(name: str):
+    if name in _lazy_imports:
+        import importlib
+
+        return getattr(importlib.import_module(_lazy_imports[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_lazy_imports))
 
 
 configure_logging(log_file_path=str(get_log_file_path()))
@@ -2,6 +2,7 @@
 import sys
 from pathlib import Path
 import argparse
+from typing import Optional
 
 base_package_path = Path(__file__).parent.parent
 print(f"adding base_package_path: {base_package_path} : to sys.path")
@@ -9,16 +10,501 @@ sys.path.insert(0, str(base_package_path))  # add parent directory to sys.path
 
 
 def parse_args():
-    parser = argparse.ArgumentParser(description="Skelly Synchronize")
+    parser = argparse.ArgumentParser(
+        description="Skelly Synchronize - run without a command to open the GUI"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    common_parser = argparse.ArgumentParser(add_help=False)
+    common_parser.add_argument(
+        "--video-handler", choices=["deffcode", "ffmpeg"], default="deffcode"
+    )
+    common_parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes, defaults to one less than the number of CPUs",
+    )
+    common_parser.add_argument(
+        "--max-cpu",
+        type=int,
+        default=None,
+        help="Most CPU cores to use, divided between the concurrent ffmpeg and decode jobs, defaults to every available core",
+    )
+    common_parser.add_argument(
+        "--no-debug-plots", action="store_true", help="Skip creating debug plots"
+    )
+    common_parser.add_argument(
+        "--chrome-trace",
+        action="store_true",
+        help="Also save the stage timing as a Chrome trace, viewable in chrome://tracing or Perfetto",
+    )
+
+    common_parser.add_argument(
+        "--verify-outputs",
+        action="store_true",
+        help="Probe the synchronized videos once finished to check they are as long as the trim stage reported",
+    )
+    common_parser.add_argument(
+        "--manifest-only",
+        action="store_true",
+        help="Only save the sync manifest, without writing trimmed videos, for reading aligned frames from the raw videos",
+    )
+
+    staging_parser = argparse.ArgumentParser(add_help=False)
+    staging_parser.add_argument(
+        "--staging",
+        choices=["auto", "always", "never"],
+        default="auto",
+        help="Copy the videos to local scratch space before processing and write outputs there before moving them into place, by default only for network storage",
+    )
+    staging_parser.add_argument(
+        "--scratch-dir",
+        type=Path,
+        default=None,
+        help="Folder for the local scratch space, defaults to the system temporary folder",
+    )
+    staging_parser.add_argument(
+        "--max-scratch-gb",
+        type=float,
+        default=None,
+        help="Most scratch space to use for staged videos, videos past the limit are read from their source",
+    )
+
+    audio_parser = subparsers.add_parser(
+        "audio",
+        parents=[common_parser, staging_parser],
+        help="Synchronize a folder of videos with audio cross correlation",
+    )
+    audio_parser.add_argument("raw_video_folder", type=Path)
+    audio_parser.add_argument(
+        "--progress", action="store_true", help="Log the progress of each stage"
+    )
+    audio_parser.add_argument(
+        "--output-folder",
+        type=Path,
+        default=None,
+        help="Folder for the synchronized videos, defaults to a synchronized_videos folder next to the raw videos",
+    )
+    audio_parser.add_argument(
+        "--analysis-sample-rate",
+        type=int,
+        default=None,
+        help="Resample audio to this rate before cross correlating",
+    )
+    audio_parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        help="Folder to cache extracted audio in between runs",
+    )
+    audio_parser.add_argument(
+        "--lag-estimator",
+        choices=[
+            "full_rate",
+            "decimated",
+            "coarse_to_fine",
+            "gcc_phat",
+            "onset_envelope",
+        ],
+        default="full_rate",
+        help="How the audio lags are estimated, gcc_phat and onset_envelope are more robust in reverberant rooms",
+    )
+    audio_parser.add_argument(
+        "--brightness-fallback",
+        type=float,
+        default=None,
+        metavar="CONFIDENCE",
+        help="Check audio lags with a confidence below this, like 0.2, against the brightness of their videos and fuse the two",
+    )
+    audio_parser.add_argument(
+        "--brightness-fallback-duration",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Only decode the first this many seconds of the videos checked against their brightness",
+    )
+
+    brightness_parser = subparsers.add_parser(
+        "brightness",
+        parents=[common_parser, staging_parser],
+        help="Synchronize a folder of videos with the first brightness change",
+    )
+    brightness_parser.add_argument("raw_video_folder", type=Path)
+    brightness_parser.add_argument(
+        "--progress", action="store_true", help="Log the progress of each stage"
+    )
+    brightness_parser.add_argument(
+        "--output-folder",
+        type=Path,
+        default=None,
+        help="Folder for the synchronized videos, defaults to a synchronized_videos folder next to the raw videos",
+    )
+    brightness_parser.add_argument(
+        "--brightness-ratio-threshold", type=float, default=1000
+    )
+    brightness_parser.add_argument(
+        "--lag-estimator",
+        choices=["brightness_threshold", "brightness_correlation"],
+        default="brightness_threshold",
+        help="How the brightness lags are estimated, brightness_correlation needs no threshold and reports a confidence for each lag",
+    )
+
+    batch_parser = subparsers.add_parser(
+        "batch",
+        parents=[common_parser],
+        help="Synchronize many sessions on one shared worker pool",
+    )
+    batch_parser.add_argument(
+        "session_folders",
+        nargs="+",
+        help="Session folders or glob patterns matching session folders",
+    )
+    batch_parser.add_argument(
+        "--method", choices=["audio", "brightness"], default="audio"
+    )
+    batch_parser.add_argument(
+        "--max-concurrent-sessions",
+        type=int,
+        default=2,
+        help="Number of sessions run at the same time",
+    )
+    batch_parser.add_argument("--brightness-ratio-threshold", type=float, default=1000)
+    batch_parser.add_argument(
+        "--recursive",
+        action="store_true",
+        help="Search the session folders for sessions at any depth",
+    )
+    batch_parser.add_argument(
+        "--include",
+        action="append",
+        default=None,
+        help="Glob pattern for folder names or relative paths to include when searching recursively, can be repeated",
+    )
+    batch_parser.add_argument(
+        "--exclude",
+        action="append",
+        default=None,
+        help="Glob pattern for folder names or relative paths to skip when searching recursively, can be repeated",
+    )
+    batch_parser.add_argument(
+        "--job-queue",
+        type=Path,
+        default=None,
+        help="Job queue to run the per camera work on, run `worker` with the same queue on each machine. "
+        "A folder on a shared filesystem works across machines, a .sqlite file only for workers on the machine it is on",
+    )
+
+    worker_parser = subparsers.add_parser(
+        "worker",
+        help="Run per camera work from a job queue, for batches started with --job-queue",
+    )
+    worker_parser.add_argument("job_queue", type=Path)
+    worker_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes to run on this machine",
+    )
+    worker_parser.add_argument(
+        "--max-cpu",
+        type=int,
+        default=None,
+        help="Most CPU cores to use, divided between the worker processes, defaults to every available core",
+    )
+    worker_parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=None,
+        help="Stop after the queue has been empty for this many seconds, by default run until interrupted",
+    )
+
+    export_parser = subparsers.add_parser(
+        "export",
+        help="Export synchronized frames to memory mapped npy arrays or image sequences",
+    )
+    export_parser.add_argument(
+        "synchronized_video_folder",
+        type=Path,
+        help="Synchronized video folder holding the sync manifest",
+    )
+    export_parser.add_argument("output_folder", type=Path)
+    export_parser.add_argument("--format", choices=["npy", "png", "jpg"], default="npy")
+    export_parser.add_argument(
+        "--size",
+        type=parse_frame_size,
+        default=None,
+        help="Resize frames to WIDTHxHEIGHT, like 640x360",
+    )
+    export_parser.add_argument(
+        "--grayscale", action="store_true", help="Export single channel frames"
+    )
+    export_parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of cameras exported at once, defaults to one less than the number of CPUs",
+    )
+    export_parser.add_argument(
+        "--max-cpu",
+        type=int,
+        default=None,
+        help="Most CPU cores to use, divided between the cameras being exported, defaults to every available core",
+    )
+
+    add_camera_parser = subparsers.add_parser(
+        "add-camera",
+        help="Add a camera to an audio synchronized session, or replace one, without synchronizing the session again",
+    )
+    add_camera_parser.add_argument(
+        "synchronized_video_folder",
+        type=Path,
+        help="Synchronized video folder holding the sync manifest",
+    )
+    add_camera_parser.add_argument(
+        "raw_video", type=Path, help="Video of the camera to add or replace"
+    )
+    add_camera_parser.add_argument(
+        "--reference-camera",
+        default=None,
+        help="Camera whose audio the new camera is aligned to, defaults to the first other camera in the session",
+    )
+    add_camera_parser.add_argument(
+        "--lag-estimator",
+        choices=[
+            "full_rate",
+            "decimated",
+            "coarse_to_fine",
+            "gcc_phat",
+            "onset_envelope",
+        ],
+        default="full_rate",
+    )
+    add_camera_parser.add_argument(
+        "--video-handler", choices=["deffcode", "ffmpeg"], default="deffcode"
+    )
+    add_camera_parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        help="Folder to cache extracted audio in between runs",
+    )
+    add_camera_parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes for videos trimmed again, defaults to one less than the number of CPUs",
+    )
+    add_camera_parser.add_argument(
+        "--max-cpu",
+        type=int,
+        default=None,
+        help="Most CPU cores to use, defaults to every available core",
+    )
+
     return parser.parse_args()
 
 
+def parse_frame_size(frame_size: str) -> tuple:
+    try:
+        width, height = frame_size.lower().split("x")
+        return int(width), int(height)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Frame size must be WIDTHxHEIGHT, like 640x360, got {frame_size}"
+        )
+
+
+def create_progress_reporter(args: argparse.Namespace):
+    import logging
+
+    from skelly_synchronize.core_processes.synchronization_progress import (
+        ProgressReporter,
+        format_progress,
+    )
+
+    if not args.progress:
+        return ProgressReporter()
+
+    logger = logging.getLogger("skelly_synchronize")
+    return ProgressReporter(
+        progress_callback=lambda progress: logger.info(
+            f"Progress - {format_progress(progress)}"
+        )
+    )
+
+
+def create_staging_kwargs(args: argparse.Namespace) -> dict:
+    return {
+        "staging_mode": args.staging,
+        "scratch_folder_path": args.scratch_dir,
+        "max_scratch_bytes": (
+            None if args.max_scratch_gb is None else int(args.max_scratch_gb * 1e9)
+        ),
+    }
+
+
+def run_audio(args: argparse.Namespace):
+    from skelly_synchronize.core_processes.io_staging import (
+        synchronize_with_local_staging,
+    )
+    from skelly_synchronize.skelly_synchronize import synchronize_videos_from_audio
+
+    synchronize_with_local_staging(
+        synchronize_videos_from_audio,
+        raw_video_folder_path=args.raw_video_folder,
+        synchronized_video_folder_path=args.output_folder,
+        video_handler=args.video_handler,
+        create_debug_plots_bool=not args.no_debug_plots,
+        max_processes=args.workers,
+        analysis_sample_rate=args.analysis_sample_rate,
+        cache_folder_path=args.cache_dir,
+        save_chrome_trace=args.chrome_trace,
+        verify_outputs=args.verify_outputs,
+        write_synchronized_videos=not args.manifest_only,
+        lag_estimator=args.lag_estimator,
+        brightness_fallback_confidence=args.brightness_fallback,
+        brightness_fallback_duration=args.brightness_fallback_duration,
+        progress_reporter=create_progress_reporter(args),
+        **create_staging_kwargs(args),
+    )
+
+
+def run_brightness(args: argparse.Namespace):
+    from skelly_synchronize.core_processes.io_staging import (
+        synchronize_with_local_staging,
+    )
+    from skelly_synchronize.skelly_synchronize import (
+        synchronize_videos_from_brightness,
+    )
+
+    synchronize_with_local_staging(
+        synchronize_videos_from_brightness,
+        raw_video_folder_path=args.raw_video_folder,
+        synchronized_video_folder_path=args.output_folder,
+        video_handler=args.video_handler,
+        brightness_ratio_threshold=args.brightness_ratio_threshold,
+        create_debug_plots_bool=not args.no_debug_plots,
+        max_processes=args.workers,
+        save_chrome_trace=args.chrome_trace,
+        lag_estimator=args.lag_estimator,
+        verify_outputs=args.verify_outputs,
+        write_synchronized_videos=not args.manifest_only,
+        progress_reporter=create_progress_reporter(args),
+        **create_staging_kwargs(args),
+    )
+
+
+def create_job_queue_pool(job_queue_path: Optional[Path]):
+    if job_queue_path is None:
+        return None
+
+    from skelly_synchronize.core_processes.job_queue import (
+        JobQueuePool,
+        create_job_queue,
+    )
+
+    return JobQueuePool(queue=create_job_queue(job_queue_path))
+
+
+def run_worker(args: argparse.Namespace):
+    from skelly_synchronize.core_processes.job_queue import (
+        create_job_queue,
+        run_job_workers,
+    )
+
+    run_job_workers(
+        queue=create_job_queue(args.job_queue),
+        worker_count=args.workers,
+        idle_timeout=args.idle_timeout,
+    )
+
+
+def run_export(args: argparse.Namespace):
+    from skelly_synchronize.core_processes.video_functions.frame_export import (
+        export_synchronized_frames,
+    )
+
+    export_synchronized_frames(
+        sync_manifest=args.synchronized_video_folder,
+        output_folder_path=args.output_folder,
+        export_format=args.format,
+        frame_size=args.size,
+        grayscale=args.grayscale,
+        max_processes=args.workers,
+    )
+
+
+def run_add_camera(args: argparse.Namespace):
+    from skelly_synchronize.core_processes.incremental_sync import (
+        add_camera_to_session,
+    )
+
+    add_camera_to_session(
+        raw_video_path=args.raw_video,
+        sync_manifest=args.synchronized_video_folder,
+        reference_camera_name=args.reference_camera,
+        lag_estimator=args.lag_estimator,
+        video_handler=args.video_handler,
+        cache_folder_path=args.cache_dir,
+        max_processes=args.workers,
+    )
+
+
+def run_batch(args: argparse.Namespace):
+    from skelly_synchronize.batch_synchronize import synchronize_sessions
+
+    session_summaries = synchronize_sessions(
+        session_folder_paths=args.session_folders,
+        recursive=args.recursive,
+        include_patterns=args.include,
+        exclude_patterns=args.exclude,
+        synchronization_method=args.method,
+        video_handler=args.video_handler,
+        max_processes=args.workers,
+        max_concurrent_sessions=args.max_concurrent_sessions,
+        brightness_ratio_threshold=args.brightness_ratio_threshold,
+        create_debug_plots_bool=not args.no_debug_plots,
+        save_chrome_trace=args.chrome_trace,
+        verify_outputs=args.verify_outputs,
+        write_synchronized_videos=not args.manifest_only,
+        pool=create_job_queue_pool(args.job_queue),
+    )
+    if any(summary["status"] != "synchronized" for summary in session_summaries):
+        sys.exit(1)
+
+
+COMMANDS = {
+    "audio": run_audio,
+    "brightness": run_brightness,
+    "batch": run_batch,
+    "worker": run_worker,
+    "export": run_export,
+    "add-camera": run_add_camera,
+}
+
+
 def run():
-    parse_args()
+    args = parse_args()
+
+    if args.command is not None and args.max_cpu is not None:
+        from skelly_synchronize.system.cpu_budget import set_max_cpu
+
+        set_max_cpu(args.max_cpu)
+
+    # only the modules needed for the chosen command are imported, so the GUI is never loaded on headless machines
+    try:
+        if args.command is not None:
+            COMMANDS[args.command](args)
+    except KeyboardInterrupt:
+        # running ffmpeg processes are stopped and partial outputs removed before the interrupt reaches here
+        print("Synchronization cancelled")
+        sys.exit(130)
 
-    from gui.skelly_synchronize_gui import main
+    if args.command is None:
+        from skelly_synchronize.gui.skelly_synchronize_gui import main
 
-    main()
+        main()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,248 @@
+import glob
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.pool import Pool
+from pathlib import Path
+from typing import List, Optional, Union
+
+from skelly_synchronize.skelly_synchronize import (
+    synchronize_videos_from_audio,
+    synchronize_videos_from_brightness,
+)
+from skelly_synchronize.system.cpu_budget import (
+    configure_cpu_budget,
+    get_default_worker_count,
+    get_max_cpu,
+)
+from skelly_synchronize.system.paths_and_file_names import RAW_VIDEOS_FOLDER_NAME
+from skelly_synchronize.utils.get_video_files import (
+    cache_directory_listings,
+    find_session_video_folders,
+    get_video_file_list,
+)
+
+logger = logging.getLogger(__name__)
+
+SYNCHRONIZATION_METHODS = ["audio", "brightness"]
+
+
+def find_raw_video_folders(
+    session_folder_paths: Union[str, Path, List[Union[str, Path]]],
+    recursive: bool = False,
+    include_patterns: Optional[List[str]] = None,
+    exclude_patterns: Optional[List[str]] = None,
+) -> List[Path]:
+    """Expand a list of session folder paths or glob patterns into a list of raw video folders.
+    A session folder containing a raw videos folder is replaced by that folder, otherwise the session folder is used directly.
+    If recursive is True, each matched folder is searched for sessions instead, filtered by the include and exclude patterns,
+    see `find_session_video_folders`.
+    """
+    if isinstance(session_folder_paths, (str, Path)):
+        session_folder_paths = [session_folder_paths]
+
+    raw_video_folder_paths = []
+    found_folder_paths = set()
+    for session_folder_path in session_folder_paths:
+        matched_paths = sorted(glob.glob(str(session_folder_path))) or [
+            str(session_folder_path)
+        ]
+        for matched_path in matched_paths:
+            folder_path = Path(matched_path)
+            if not folder_path.is_dir():
+                logger.warning(f"Skipping {folder_path}, it is not a folder")
+                continue
+            if recursive:
+                matched_folder_paths = find_session_video_folders(
+                    root_folder_path=folder_path,
+                    include_patterns=include_patterns,
+                    exclude_patterns=exclude_patterns,
+                )
+            elif (folder_path / RAW_VIDEOS_FOLDER_NAME).is_dir():
+                matched_folder_paths = [folder_path / RAW_VIDEOS_FOLDER_NAME]
+            else:
+                matched_folder_paths = [folder_path]
+            for matched_folder_path in matched_folder_paths:
+                if matched_folder_path not in found_folder_paths:
+                    found_folder_paths.add(matched_folder_path)
+                    raw_video_folder_paths.append(matched_folder_path)
+
+    return raw_video_folder_paths
+
+
+def synchronize_sessions(
+    session_folder_paths: Union[str, Path, List[Union[str, Path]]],
+    synchronization_method: str = "audio",
+    video_handler: str = "deffcode",
+    max_processes: Optional[int] = None,
+    max_concurrent_sessions: int = 2,
+    brightness_ratio_threshold: float = 1000,
+    create_debug_plots_bool: bool = True,
+    save_chrome_trace: bool = False,
+    verify_outputs: bool = False,
+    write_synchronized_videos: bool = True,
+    recursive: bool = False,
+    include_patterns: Optional[List[str]] = None,
+    exclude_patterns: Optional[List[str]] = None,
+    pool: Optional[Pool] = None,
+) -> List[dict]:
+    """Synchronize many recording sessions, sharing one worker pool between all of them.
+    Sessions are run concurrently up to the session limit, and all of their per camera work (probing, extraction, trimming and muxing)
+    is scheduled on the shared pool, so the number of worker processes is a global concurrency limit.
+    Session folders are found with `find_raw_video_folders`, searching them recursively if recursive is True.
+    If a pool is given, like a JobQueuePool whose workers run on other machines, the sessions share it instead of a new pool of max_processes workers.
+
+    Returns a summary dictionary for each session.
+    """
+    if synchronization_method not in SYNCHRONIZATION_METHODS:
+        raise ValueError(
+            f"synchronization_method must be one of {SYNCHRONIZATION_METHODS}"
+        )
+
+    session_kwargs = {
+        "synchronization_method": synchronization_method,
+        "video_handler": video_handler,
+        "brightness_ratio_threshold": brightness_ratio_threshold,
+        "create_debug_plots_bool": create_debug_plots_bool,
+        "save_chrome_trace": save_chrome_trace,
+        "verify_outputs": verify_outputs,
+        "write_synchronized_videos": write_synchronized_videos,
+    }
+
+    # session folders are listed during discovery and again when each session starts, so listings are reused for the batch
+    with cache_directory_listings():
+        raw_video_folder_paths = find_raw_video_folders(
+            session_folder_paths,
+            recursive=recursive,
+            include_patterns=include_patterns,
+            exclude_patterns=exclude_patterns,
+        )
+        logger.info(f"Found {len(raw_video_folder_paths)} sessions to synchronize")
+        if len(raw_video_folder_paths) == 0:
+            return []
+
+        if pool is not None:
+            session_summaries = synchronize_sessions_on_pool(
+                raw_video_folder_paths=raw_video_folder_paths,
+                pool=pool,
+                max_concurrent_sessions=max_concurrent_sessions,
+                **session_kwargs,
+            )
+        else:
+            if max_processes is None:
+                max_processes = get_default_worker_count()
+
+            # each worker runs one job at a time, so the CPU budget is divided between the workers
+            with multiprocessing.Pool(
+                processes=max_processes,
+                initializer=configure_cpu_budget,
+                initargs=(get_max_cpu(), max_processes),
+            ) as pool:
+                session_summaries = synchronize_sessions_on_pool(
+                    raw_video_folder_paths=raw_video_folder_paths,
+                    pool=pool,
+                    max_concurrent_sessions=max_concurrent_sessions,
+                    **session_kwargs,
+                )
+
+    log_session_summaries(session_summaries=session_summaries)
+
+    return session_summaries
+
+
+def synchronize_sessions_on_pool(
+    raw_video_folder_paths: List[Path],
+    pool: Pool,
+    max_concurrent_sessions: int,
+    **session_kwargs,
+) -> List[dict]:
+    """Run up to max_concurrent_sessions sessions at once, all scheduling their per camera work on the pool"""
+    with ThreadPoolExecutor(max_workers=max_concurrent_sessions) as executor:
+        return list(
+            executor.map(
+                lambda raw_video_folder_path: synchronize_single_session(
+                    raw_video_folder_path=raw_video_folder_path,
+                    pool=pool,
+                    **session_kwargs,
+                ),
+                raw_video_folder_paths,
+            )
+        )
+
+
+def synchronize_single_session(
+    raw_video_folder_path: Path,
+    synchronization_method: str,
+    video_handler: str,
+    brightness_ratio_threshold: float,
+    create_debug_plots_bool: bool,
+    pool: Pool,
+    save_chrome_trace: bool = False,
+    verify_outputs: bool = False,
+    write_synchronized_videos: bool = True,
+) -> dict:
+    """Synchronize one session on the shared pool, and return a summary of the run. Errors are recorded in the summary instead of raised."""
+    session_summary = {
+        "raw video folder": str(raw_video_folder_path),
+        "synchronized video folder": None,
+        "number of videos": len(get_video_file_list(folder_path=raw_video_folder_path)),
+        "status": "failed",
+        "elapsed time": 0.0,
+        "verified": None,
+        "error": None,
+    }
+
+    start_timer = time.time()
+    try:
+        if synchronization_method == "audio":
+            sync_result = synchronize_videos_from_audio(
+                raw_video_folder_path=raw_video_folder_path,
+                video_handler=video_handler,
+                create_debug_plots_bool=create_debug_plots_bool,
+                pool=pool,
+                save_chrome_trace=save_chrome_trace,
+                verify_outputs=verify_outputs,
+                write_synchronized_videos=write_synchronized_videos,
+            )
+        else:
+            sync_result = synchronize_videos_from_brightness(
+                raw_video_folder_path=raw_video_folder_path,
+                video_handler=video_handler,
+                brightness_ratio_threshold=brightness_ratio_threshold,
+                create_debug_plots_bool=create_debug_plots_bool,
+                pool=pool,
+                save_chrome_trace=save_chrome_trace,
+                verify_outputs=verify_outputs,
+                write_synchronized_videos=write_synchronized_videos,
+            )
+        session_summary["synchronized video folder"] = str(
+            sync_result.synchronized_video_folder_path
+        )
+        session_summary["verified"] = sync_result.verified
+        session_summary["status"] = "synchronized"
+    except Exception as e:
+        logger.error(
+            f"Error synchronizing session {raw_video_folder_path}: {e}", exc_info=True
+        )
+        session_summary["error"] = str(e)
+
+    session_summary["elapsed time"] = time.time() - start_timer
+
+    return session_summary
+
+
+def log_session_summaries(session_summaries: List[dict]):
+    number_synchronized = sum(
+        session_summary["status"] == "synchronized"
+        for session_summary in session_summaries
+    )
+    logger.info(
+        f"Synchronized {number_synchronized} of {len(session_summaries)} sessions"
+    )
+    for session_summary in session_summaries:
+        logger.info(
+            f"{session_summary['status']} - {session_summary['raw video folder']} - "
+            f"{session_summary['number of videos']} videos in {session_summary['elapsed time']:.1f} seconds"
+            + (f" - {session_summary['error']}" if session_summary["error"] else "")
+        )
@@ -0,0 +1,396 @@
+import argparse
+import json
+import logging
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from skelly_synchronize.benchmarks.synthetic_sessions import (
+    SYNTHETIC_SESSION_INFO_NAME,
+    create_synthetic_session,
+    load_synthetic_session_info,
+)
+from skelly_synchronize.core_processes.audio_file_io import load_audio_file
+from skelly_synchronize.core_processes.correlation_functions import (
+    AUDIO_LAG_ESTIMATORS,
+    BRIGHTNESS_LAG_ESTIMATORS,
+    find_brightness_across_frames,
+)
+from skelly_synchronize.core_processes.video_functions.ffmpeg_functions import (
+    extract_audio_from_video_ffmpeg,
+)
+from skelly_synchronize.system.paths_and_file_names import RAW_VIDEOS_FOLDER_NAME
+from skelly_synchronize.utils.get_video_files import get_video_file_list
+
+logger = logging.getLogger(__name__)
+
+GROUND_TRUTH_LAGS_NAME = "ground_truth_lags.json"
+
+
+def load_ground_truth_lags(session_folder_path: Path) -> Dict[str, float]:
+    """Load the known lag dictionary of a session, from a synthetic session's info file,
+    or for a recorded session from a json file mapping camera names to lags in seconds, normalized like `normalize_lag_dictionary`.
+    """
+    if (session_folder_path / SYNTHETIC_SESSION_INFO_NAME).exists():
+        return load_synthetic_session_info(session_folder_path)["expected lags"]
+
+    ground_truth_lags_path = session_folder_path / GROUND_TRUTH_LAGS_NAME
+    if not ground_truth_lags_path.exists():
+        raise FileNotFoundError(
+            f"No {SYNTHETIC_SESSION_INFO_NAME} or {GROUND_TRUTH_LAGS_NAME} found in {session_folder_path}"
+        )
+    with open(ground_truth_lags_path) as ground_truth_file:
+        return json.load(ground_truth_file)
+
+
+def resample_brightness_curve(
+    brightness_array: np.ndarray, frame_rate: float, new_frame_rate: float
+) -> np.ndarray:
+    """Linearly interpolate a brightness curve to a new frame rate, so curves from cameras with different frame rates can be compared"""
+    if frame_rate == new_frame_rate:
+        return brightness_array
+
+    frame_times = np.arange(brightness_array.size) / frame_rate
+    new_frame_times = np.arange(0, frame_times[-1], 1 / new_frame_rate)
+
+    return np.interp(new_frame_times, frame_times, brightness_array)
+
+
+def load_session_signals(
+    raw_video_folder_path: Path, audio_sample_rate: int = 48000
+) -> dict:
+    """Decode the audio of every video at the audio sample rate, and find the brightness curve of every video.
+    Brightness curves are resampled to the highest frame rate in the session.
+    """
+    import cv2
+
+    audio_signals = {}
+    brightness_curves = {}
+    frame_rates = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for video_path in get_video_file_list(folder_path=raw_video_folder_path):
+            audio_file_path = Path(temp_dir) / f"{video_path.stem}.wav"
+            extract_audio_from_video_ffmpeg(
+                file_pathstring=str(video_path), output_file_path=audio_file_path
+            )
+            audio_signals[video_path.stem], _ = load_audio_file(
+                audio_file_path, sample_rate=audio_sample_rate
+            )
+
+            video_capture_object = cv2.VideoCapture(str(video_path))
+            frame_rates[video_path.stem] = video_capture_object.get(cv2.CAP_PROP_FPS)
+            video_capture_object.release()
+            brightness_curves[video_path.stem] = find_brightness_across_frames(
+                video_pathstring=str(video_path)
+            )
+
+    frame_rate = max(frame_rates.values())
+    return {
+        "audio": audio_signals,
+        "audio sample rate": audio_sample_rate,
+        "brightness": {
+            camera_name: resample_brightness_curve(
+                brightness_array=brightness_curve,
+                frame_rate=frame_rates[camera_name],
+                new_frame_rate=frame_rate,
+            )
+            for camera_name, brightness_curve in brightness_curves.items()
+        },
+        "frame rate": frame_rate,
+    }
+
+
+def measure_estimator(estimator, reference_signal, signal_to_align, sample_rate):
+    """Run an estimator once for its runtime, and once under tracemalloc for its peak memory, since tracing slows it down"""
+    start_timer = time.perf_counter()
+    lag, confidence = estimator(reference_signal, signal_to_align, sample_rate)
+    runtime = time.perf_counter() - start_timer
+
+    tracemalloc.start()
+    estimator(reference_signal, signal_to_align, sample_rate)
+    _, peak_memory_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return lag, confidence, runtime, peak_memory_bytes
+
+
+def evaluate_session(
+    session_folder_path: Path,
+    estimator_names: Sequence[str],
+    audio_sample_rate: int = 48000,
+) -> List[dict]:
+    """Run each estimator between the first camera and every other camera of a session, and compare the lags to the ground truth"""
+    ground_truth_lags = load_ground_truth_lags(session_folder_path)
+    raw_video_folder_path = session_folder_path
+    if (session_folder_path / RAW_VIDEOS_FOLDER_NAME).is_dir():
+        raw_video_folder_path = session_folder_path / RAW_VIDEOS_FOLDER_NAME
+
+    logger.info(f"Loading signals from {raw_video_folder_path}")
+    session_signals = load_session_signals(
+        raw_video_folder_path=raw_video_folder_path,
+        audio_sample_rate=audio_sample_rate,
+    )
+
+    evaluation_records = []
+    for estimator_name in estimator_names:
+        if estimator_name in AUDIO_LAG_ESTIMATORS:
+            estimator = AUDIO_LAG_ESTIMATORS[estimator_name]
+            signals = session_signals["audio"]
+            sample_rate = session_signals["audio sample rate"]
+        else:
+            estimator = BRIGHTNESS_LAG_ESTIMATORS[estimator_name]
+            signals = session_signals["brightness"]
+            sample_rate = session_signals["frame rate"]
+
+        reference_camera_name = next(iter(signals))
+        for camera_name, signal_to_align in signals.items():
+            if camera_name == reference_camera_name:
+                continue
+            # estimators return how much later the camera started than the reference, which is the difference of their normalized lags
+            expected_lag = (
+                ground_truth_lags[reference_camera_name]
+                - ground_truth_lags[camera_name]
+            )
+            evaluation_record = {
+                "session": str(session_folder_path),
+                "estimator": estimator_name,
+                "camera name": camera_name,
+                "expected lag": expected_lag,
+                "frame rate": session_signals["frame rate"],
+                "error": None,
+            }
+            try:
+                lag, confidence, runtime, peak_memory_bytes = measure_estimator(
+                    estimator=estimator,
+                    reference_signal=signals[reference_camera_name],
+                    signal_to_align=signal_to_align,
+                    sample_rate=sample_rate,
+                )
+                evaluation_record.update(
+                    {
+                        "estimated lag": lag,
+                        "absolute error": abs(lag - expected_lag),
+                        "confidence": confidence,
+                        "runtime": runtime,
+                        "peak memory bytes": peak_memory_bytes,
+                    }
+                )
+            except Exception as e:
+                logger.error(
+                    f"Estimator {estimator_name} failed on {camera_name}: {e}",
+                    exc_info=True,
+                )
+                evaluation_record["error"] = str(e)
+            evaluation_records.append(evaluation_record)
+
+    return evaluation_records
+
+
+def summarize_evaluation_records(
+    evaluation_records: List[dict],
+    failure_threshold: float = 0.1,
+    accuracy_requirement_frames: float = 0.5,
+) -> Dict[str, dict]:
+    """Summarize the error distribution, failure rate, runtime and peak memory of each estimator.
+    A lag fails if the estimator raised an error or is off by more than failure_threshold seconds,
+    and meets the accuracy requirement if it is off by at most accuracy_requirement_frames frames.
+    """
+    grouped_records = {}
+    for record in evaluation_records:
+        grouped_records.setdefault(record["estimator"], []).append(record)
+
+    estimator_summaries = {}
+    for estimator_name, records in grouped_records.items():
+        completed_records = [record for record in records if record["error"] is None]
+        absolute_errors = np.array(
+            [record["absolute error"] for record in completed_records]
+        )
+        frame_errors = np.array(
+            [
+                record["absolute error"] * record["frame rate"]
+                for record in completed_records
+            ]
+        )
+        failures = (
+            len(records)
+            - len(completed_records)
+            + int(np.sum(absolute_errors > failure_threshold))
+        )
+
+        estimator_summary = {
+            "lags estimated": len(records),
+            "failure rate": failures / len(records),
+            "accuracy rate": float(np.sum(frame_errors <= accuracy_requirement_frames))
+            / len(records),
+        }
+        if len(completed_records) > 0:
+            estimator_summary.update(
+                {
+                    "median absolute error": float(np.median(absolute_errors)),
+                    "95th percentile absolute error": float(
+                        np.percentile(absolute_errors, 95)
+                    ),
+                    "max absolute error": float(np.max(absolute_errors)),
+                    "max error in frames": float(np.max(frame_errors)),
+                    "median runtime": float(
+                        np.median([record["runtime"] for record in completed_records])
+                    ),
+                    "peak memory bytes": max(
+                        record["peak memory bytes"] for record in completed_records
+                    ),
+                    "mean confidence": float(
+                        np.mean([record["confidence"] for record in completed_records])
+                    ),
+                }
+            )
+        estimator_summaries[estimator_name] = estimator_summary
+
+    return estimator_summaries
+
+
+def find_fastest_accurate_estimator(
+    estimator_summaries: Dict[str, dict], required_accuracy_rate: float = 1.0
+) -> Optional[str]:
+    """Find the estimator with the lowest median runtime that meets the accuracy requirement for at least the required fraction of lags"""
+    accurate_estimators = [
+        estimator_name
+        for estimator_name, estimator_summary in estimator_summaries.items()
+        if estimator_summary["accuracy rate"] >= required_accuracy_rate
+        and "median runtime" in estimator_summary
+    ]
+    if len(accurate_estimators) == 0:
+        return None
+
+    return min(
+        accurate_estimators,
+        key=lambda estimator_name: estimator_summaries[estimator_name][
+            "median runtime"
+        ],
+    )
+
+
+def evaluate_lag_estimators(
+    session_folder_paths: Sequence[Union[str, Path]],
+    output_file_path: Optional[Union[str, Path]] = None,
+    estimator_names: Optional[Sequence[str]] = None,
+    audio_sample_rate: int = 48000,
+    failure_threshold: float = 0.1,
+    accuracy_requirement_frames: float = 0.5,
+    required_accuracy_rate: float = 1.0,
+) -> dict:
+    """Run every lag estimator over sessions with known lags, and summarize how accurate and how expensive each one is.
+    Sessions can be synthetic sessions, or recorded sessions with a ground truth lags file.
+    Returns the evaluation, which is also saved to the output file if one is given.
+    """
+    if estimator_names is None:
+        estimator_names = list(AUDIO_LAG_ESTIMATORS) + list(BRIGHTNESS_LAG_ESTIMATORS)
+
+    evaluation_records = []
+    for session_folder_path in session_folder_paths:
+        evaluation_records.extend(
+            evaluate_session(
+                session_folder_path=Path(session_folder_path),
+                estimator_names=estimator_names,
+                audio_sample_rate=audio_sample_rate,
+            )
+        )
+
+    estimator_summaries = summarize_evaluation_records(
+        evaluation_records=evaluation_records,
+        failure_threshold=failure_threshold,
+        accuracy_requirement_frames=accuracy_requirement_frames,
+    )
+    fastest_accurate_estimator = find_fastest_accurate_estimator(
+        estimator_summaries=estimator_summaries,
+        required_accuracy_rate=required_accuracy_rate,
+    )
+    for estimator_name, estimator_summary in estimator_summaries.items():
+        logger.info(f"{estimator_name}: {estimator_summary}")
+    logger.info(
+        f"Fastest estimator within {accuracy_requirement_frames} frames for {required_accuracy_rate:.0%} of lags: {fastest_accurate_estimator}"
+    )
+
+    evaluation = {
+        "settings": {
+            "audio sample rate": audio_sample_rate,
+            "failure threshold": failure_threshold,
+            "accuracy requirement frames": accuracy_requirement_frames,
+            "required accuracy rate": required_accuracy_rate,
+        },
+        "fastest accurate estimator": fastest_accurate_estimator,
+        "estimators": estimator_summaries,
+        "records": evaluation_records,
+    }
+    if output_file_path is not None:
+        with open(output_file_path, "w") as output_file:
+            json.dump(evaluation, output_file, indent=2)
+        logger.info(f"Saved lag estimator evaluation to {output_file_path}")
+
+    return evaluation
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compare the accuracy and cost of the lag estimators on sessions with known lags"
+    )
+    parser.add_argument("output_file", type=Path, help="Json file to save results to")
+    parser.add_argument(
+        "session_folders",
+        nargs="*",
+        type=Path,
+        help=f"Synthetic sessions, or recorded sessions with a {GROUND_TRUTH_LAGS_NAME} file",
+    )
+    parser.add_argument(
+        "--synthetic-sessions",
+        type=int,
+        default=0,
+        help="Number of synthetic sessions to generate and evaluate, each with a different seed",
+    )
+    parser.add_argument(
+        "--reverberant",
+        action="store_true",
+        help="Give each synthetic camera different echoes and independent noise",
+    )
+    parser.add_argument(
+        "--estimators",
+        nargs="+",
+        choices=list(AUDIO_LAG_ESTIMATORS) + list(BRIGHTNESS_LAG_ESTIMATORS),
+        default=None,
+    )
+    parser.add_argument("--audio-sample-rate", type=int, default=48000)
+    parser.add_argument("--failure-threshold", type=float, default=0.1)
+    parser.add_argument("--accuracy-frames", type=float, default=0.5)
+    parser.add_argument("--required-accuracy-rate", type=float, default=1.0)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        session_folder_paths = list(args.session_folders)
+        for seed in range(args.synthetic_sessions):
+            session_folder_path = Path(temp_dir) / f"synthetic_session_{seed}"
+            create_synthetic_session(
+                session_folder_path=session_folder_path,
+                seed=seed,
+                reverberant=args.reverberant,
+                noise_level=0.05 if args.reverberant else 0.0,
+            )
+            session_folder_paths.append(session_folder_path)
+
+        evaluate_lag_estimators(
+            session_folder_paths=session_folder_paths,
+            output_file_path=args.output_file,
+            estimator_names=args.estimators,
+            audio_sample_rate=args.audio_sample_rate,
+            failure_threshold=args.failure_threshold,
+            accuracy_requirement_frames=args.accuracy_frames,
+            required_accuracy_rate=args.required_accuracy_rate,
+        )
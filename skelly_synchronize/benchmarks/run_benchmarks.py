@@ -0,0 +1,420 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+from skelly_synchronize.benchmarks.synthetic_sessions import create_synthetic_session
+from skelly_synchronize.system.paths_and_file_names import (
+    DEBUG_TOML_NAME,
+    LAG_DICTIONARY_NAME,
+    STAGE_TIMING_NAME,
+)
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_SCENARIOS = {
+    "small": {
+        "camera count": 3,
+        "duration": 10.0,
+        "resolution": [640, 360],
+        "fps": [30],
+        "sample rates": [48000],
+    },
+    "mixed_rates": {
+        "camera count": 3,
+        "duration": 10.0,
+        "resolution": [640, 360],
+        "fps": [30, 25, 60],
+        "sample rates": [48000, 44100],
+    },
+    "many_cameras": {
+        "camera count": 8,
+        "duration": 10.0,
+        "resolution": [640, 360],
+        "fps": [30],
+        "sample rates": [48000],
+    },
+    "high_resolution": {
+        "camera count": 3,
+        "duration": 10.0,
+        "resolution": [1920, 1080],
+        "fps": [30],
+        "sample rates": [48000],
+    },
+}
+BENCHMARK_METHODS = ["audio", "brightness"]
+BENCHMARK_VIDEO_HANDLERS = ["deffcode", "ffmpeg"]
+
+
+def get_benchmark_metadata() -> dict:
+    """Describe the machine and code the benchmarks ran on, so results from different runs can be put in context"""
+    git_commit = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        cwd=Path(__file__).parent,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    ).stdout.decode()
+    ffmpeg_version = subprocess.run(
+        ["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    ).stdout.decode()
+
+    return {
+        "git commit": git_commit.strip() or None,
+        "ffmpeg version": (ffmpeg_version.splitlines() or [None])[0],
+        "python version": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu count": os.cpu_count(),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def run_single_benchmark(
+    raw_video_folder_path: Path,
+    synchronized_video_folder_path: Path,
+    method: str,
+    video_handler: str,
+    expected_lags: Dict[str, float],
+    max_processes: Optional[int] = None,
+) -> dict:
+    """Synchronize a session in a fresh process through the command line, so peak memory is not carried over between runs.
+    Returns the wall time, stage timing, peak memory and lag errors of the run.
+    """
+    command = [
+        sys.executable,
+        "-m",
+        "skelly_synchronize",
+        method,
+        str(raw_video_folder_path),
+        "--output-folder",
+        str(synchronized_video_folder_path),
+        "--video-handler",
+        video_handler,
+        "--no-debug-plots",
+    ]
+    if max_processes is not None:
+        command.extend(["--workers", str(max_processes)])
+
+    start_timer = time.perf_counter()
+    synchronize_subprocess = subprocess.run(
+        command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    wall_time = time.perf_counter() - start_timer
+
+    benchmark_result = {
+        "status": "failed",
+        "wall time": wall_time,
+        "stage totals": {},
+        "peak rss bytes": None,
+        "lag errors": {},
+        "max lag error": None,
+        "error": None,
+    }
+    if synchronize_subprocess.returncode != 0:
+        benchmark_result["error"] = synchronize_subprocess.stderr.decode()[-2000:]
+        return benchmark_result
+
+    with open(synchronized_video_folder_path / STAGE_TIMING_NAME) as timing_file:
+        stage_timing = json.load(timing_file)
+    benchmark_result["stage totals"] = stage_timing["stage totals"]
+    # the RSS high-water mark of the synchronization process and the subprocesses it waited for
+    benchmark_result["peak rss bytes"] = stage_timing["process totals"][
+        "rss high water mark bytes"
+    ]
+
+    import toml
+
+    lag_dict = toml.load(synchronized_video_folder_path / DEBUG_TOML_NAME)[
+        LAG_DICTIONARY_NAME
+    ]
+    benchmark_result["lag errors"] = {
+        camera_name: abs(lag_dict[camera_name] - expected_lag)
+        for camera_name, expected_lag in expected_lags.items()
+    }
+    benchmark_result["max lag error"] = max(benchmark_result["lag errors"].values())
+    benchmark_result["status"] = "completed"
+
+    return benchmark_result
+
+
+def run_benchmarks(
+    output_file_path: Union[str, Path],
+    scenario_names: Optional[Sequence[str]] = None,
+    methods: Sequence[str] = BENCHMARK_METHODS,
+    video_handlers: Sequence[str] = BENCHMARK_VIDEO_HANDLERS,
+    repeats: int = 1,
+    max_processes: Optional[int] = None,
+    sessions_folder_path: Optional[Union[str, Path]] = None,
+) -> dict:
+    """Run every combination of scenario, synchronization method and video handler on generated synthetic sessions,
+    and save the results to a json file that can be compared against a baseline with `compare_benchmark_results`.
+    Sessions are generated in a temporary folder unless a sessions folder is given, in which case they are kept for inspection.
+    """
+    if scenario_names is None:
+        scenario_names = list(BENCHMARK_SCENARIOS.keys())
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if sessions_folder_path is None:
+            sessions_folder_path = temp_dir
+        sessions_folder_path = Path(sessions_folder_path)
+
+        benchmark_results = []
+        for scenario_name in scenario_names:
+            scenario = BENCHMARK_SCENARIOS[scenario_name]
+            logger.info(f"Generating synthetic session for scenario {scenario_name}")
+            start_timer = time.perf_counter()
+            session_info = create_synthetic_session(
+                session_folder_path=sessions_folder_path / scenario_name,
+                camera_count=scenario["camera count"],
+                duration=scenario["duration"],
+                resolution=tuple(scenario["resolution"]),
+                fps_list=scenario["fps"],
+                sample_rate_list=scenario["sample rates"],
+            )
+            logger.info(
+                f"Generated session in {time.perf_counter() - start_timer:.2f} seconds"
+            )
+
+            for method in methods:
+                for video_handler in video_handlers:
+                    for repeat in range(repeats):
+                        logger.info(
+                            f"Running benchmark {scenario_name} - {method} - {video_handler} - repeat {repeat}"
+                        )
+                        benchmark_result = run_single_benchmark(
+                            raw_video_folder_path=Path(
+                                session_info["raw video folder"]
+                            ),
+                            synchronized_video_folder_path=sessions_folder_path
+                            / scenario_name
+                            / f"synchronized_{method}_{video_handler}_{repeat}",
+                            method=method,
+                            video_handler=video_handler,
+                            expected_lags=session_info["expected lags"],
+                            max_processes=max_processes,
+                        )
+                        benchmark_results.append(
+                            {
+                                "scenario": scenario_name,
+                                "method": method,
+                                "video handler": video_handler,
+                                "repeat": repeat,
+                                "camera count": scenario["camera count"],
+                                "video seconds processed": scenario["camera count"]
+                                * scenario["duration"],
+                                **benchmark_result,
+                            }
+                        )
+                        logger.info(
+                            f"Benchmark {benchmark_result['status']} in {benchmark_result['wall time']:.2f} seconds"
+                        )
+
+    benchmark_output = {
+        "metadata": get_benchmark_metadata(),
+        "scenarios": {
+            scenario_name: BENCHMARK_SCENARIOS[scenario_name]
+            for scenario_name in scenario_names
+        },
+        "results": benchmark_results,
+    }
+    with open(output_file_path, "w") as output_file:
+        json.dump(benchmark_output, output_file, indent=2)
+    logger.info(f"Saved benchmark results to {output_file_path}")
+
+    return benchmark_output
+
+
+def summarize_benchmark_results(benchmark_results: List[dict]) -> Dict[str, dict]:
+    """Take the median wall time, stage wall times and peak memory of the repeats of each benchmark.
+    Benchmarks are keyed by scenario, method and video handler, and failed runs are left out.
+    """
+    grouped_results = {}
+    for result in benchmark_results:
+        if result["status"] != "completed":
+            continue
+        benchmark_name = (
+            f"{result['scenario']}/{result['method']}/{result['video handler']}"
+        )
+        grouped_results.setdefault(benchmark_name, []).append(result)
+
+    benchmark_summaries = {}
+    for benchmark_name, results in grouped_results.items():
+        stage_names = {stage for result in results for stage in result["stage totals"]}
+        benchmark_summaries[benchmark_name] = {
+            "wall time": statistics.median(result["wall time"] for result in results),
+            "peak rss bytes": statistics.median(
+                result["peak rss bytes"] or 0 for result in results
+            ),
+            "max lag error": max(result["max lag error"] for result in results),
+            "stage wall times": {
+                stage_name: statistics.median(
+                    result["stage totals"].get(stage_name, {}).get("wall time", 0.0)
+                    for result in results
+                )
+                for stage_name in stage_names
+            },
+        }
+
+    return benchmark_summaries
+
+
+def compare_benchmark_results(
+    baseline_results: List[dict],
+    current_results: List[dict],
+    time_tolerance: float = 0.2,
+    memory_tolerance: float = 0.2,
+    minimum_stage_time: float = 0.1,
+) -> List[dict]:
+    """Compare benchmark results against a baseline and return the regressions.
+    Wall time, per stage wall time and peak memory regress when they grow by more than the tolerance fraction.
+    Stages that took less than minimum_stage_time seconds in the baseline are skipped, since their timing is mostly noise.
+    Benchmarks that completed in the baseline but not in the current results are also reported.
+    """
+    baseline_summaries = summarize_benchmark_results(baseline_results)
+    current_summaries = summarize_benchmark_results(current_results)
+
+    regressions = []
+    for benchmark_name, baseline_summary in baseline_summaries.items():
+        if benchmark_name not in current_summaries:
+            regressions.append(
+                {
+                    "benchmark": benchmark_name,
+                    "metric": "status",
+                    "baseline": "completed",
+                    "current": "missing or failed",
+                }
+            )
+            continue
+        current_summary = current_summaries[benchmark_name]
+
+        metrics_to_compare = [
+            (
+                "wall time",
+                baseline_summary["wall time"],
+                current_summary["wall time"],
+                time_tolerance,
+            ),
+            (
+                "peak rss bytes",
+                baseline_summary["peak rss bytes"],
+                current_summary["peak rss bytes"],
+                memory_tolerance,
+            ),
+        ]
+        for stage_name, baseline_stage_time in baseline_summary[
+            "stage wall times"
+        ].items():
+            if baseline_stage_time < minimum_stage_time:
+                continue
+            metrics_to_compare.append(
+                (
+                    f"{stage_name} wall time",
+                    baseline_stage_time,
+                    current_summary["stage wall times"].get(stage_name, 0.0),
+                    time_tolerance,
+                )
+            )
+
+        for metric, baseline_value, current_value, tolerance in metrics_to_compare:
+            if baseline_value and current_value > baseline_value * (1 + tolerance):
+                regressions.append(
+                    {
+                        "benchmark": benchmark_name,
+                        "metric": metric,
+                        "baseline": baseline_value,
+                        "current": current_value,
+                        "change": current_value / baseline_value - 1,
+                    }
+                )
+
+    return regressions
+
+
+def log_regressions(regressions: List[dict]):
+    if len(regressions) == 0:
+        logger.info("No benchmark regressions found")
+        return
+
+    for regression in regressions:
+        change = regression.get("change")
+        change_string = f" ({change:+.1%})" if change is not None else ""
+        logger.warning(
+            f"Regression in {regression['benchmark']} - {regression['metric']}: "
+            f"{regression['baseline']} -> {regression['current']}{change_string}"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark skelly_synchronize on generated synthetic sessions"
+    )
+    parser.add_argument("output_file", type=Path, help="Json file to save results to")
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=list(BENCHMARK_SCENARIOS.keys()),
+        default=None,
+    )
+    parser.add_argument(
+        "--methods", nargs="+", choices=BENCHMARK_METHODS, default=BENCHMARK_METHODS
+    )
+    parser.add_argument(
+        "--video-handlers",
+        nargs="+",
+        choices=BENCHMARK_VIDEO_HANDLERS,
+        default=BENCHMARK_VIDEO_HANDLERS,
+    )
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--sessions-folder",
+        type=Path,
+        default=None,
+        help="Folder to keep the generated sessions in, defaults to a temporary folder",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=None,
+        help="Results json to compare against, exits with an error if there are regressions",
+    )
+    parser.add_argument("--time-tolerance", type=float, default=0.2)
+    parser.add_argument("--memory-tolerance", type=float, default=0.2)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+
+    benchmark_output = run_benchmarks(
+        output_file_path=args.output_file,
+        scenario_names=args.scenarios,
+        methods=args.methods,
+        video_handlers=args.video_handlers,
+        repeats=args.repeats,
+        max_processes=args.workers,
+        sessions_folder_path=args.sessions_folder,
+    )
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline_output = json.load(baseline_file)
+        regressions = compare_benchmark_results(
+            baseline_results=baseline_output["results"],
+            current_results=benchmark_output["results"],
+            time_tolerance=args.time_tolerance,
+            memory_tolerance=args.memory_tolerance,
+        )
+        log_regressions(regressions)
+        if len(regressions) > 0:
+            sys.exit(1)
@@ -0,0 +1,230 @@
+import json
+import logging
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from skelly_synchronize.core_processes.video_functions.ffmpeg_functions import (
+    check_for_ffmpeg,
+    ffmpeg_string,
+)
+from skelly_synchronize.system.paths_and_file_names import RAW_VIDEOS_FOLDER_NAME
+from skelly_synchronize.utils.path_handling_utilities import create_directory
+
+logger = logging.getLogger(__name__)
+
+SYNTHETIC_SESSION_INFO_NAME = "synthetic_session.json"
+NOISE_SAMPLE_RATE = 48000
+# short decaying bursts of noise, like claps, repeating with three periods that don't share a common factor so the pattern doesn't repeat within a session
+CLAPS_EXPRESSION = "(2*random(0)-1)*(exp(-80*mod(t+0.37,1.7))+exp(-80*mod(t+1.1,2.9))+exp(-80*mod(t,4.3)))"
+
+
+def create_camera_offsets(
+    camera_count: int, max_offset: float = 3.0, seed: int = 0
+) -> List[float]:
+    """Create a random recording start time for each camera, in seconds after the first camera started recording"""
+    rng = np.random.default_rng(seed)
+    offsets = rng.uniform(0, max_offset, size=camera_count)
+    offsets[0] = 0.0
+
+    return [round(float(offset), 4) for offset in offsets]
+
+
+def find_expected_lags(camera_offsets: Dict[str, float]) -> Dict[str, float]:
+    """Find the lag dictionary the synchronization should produce for the given camera start times.
+    The camera that started last has a lag of 0, matching `normalize_lag_dictionary`.
+    """
+    latest_offset = max(camera_offsets.values())
+
+    return {
+        camera_name: latest_offset - offset
+        for camera_name, offset in camera_offsets.items()
+    }
+
+
+def create_synthetic_video(
+    output_video_path: Path,
+    start_offset: float,
+    duration: float,
+    resolution: Tuple[int, int] = (640, 360),
+    fps: float = 30,
+    sample_rate: int = 48000,
+    flash_time: Optional[float] = None,
+    flash_duration: float = 0.5,
+    audio_seed: int = 0,
+    echo_delays: Optional[Sequence[float]] = None,
+    noise_level: float = 0.0,
+    noise_seed: int = 1,
+):
+    """Generate a video with ffmpeg's lavfi sources, as if the camera started recording start_offset seconds into the session.
+    Every camera records the same noise and claps, seeded with audio_seed, so the audio lines up across cameras once they are synchronized.
+    If a flash time is given, the whole frame turns white for flash_duration seconds at that time in the session.
+    Echo delays in milliseconds add decaying echoes like a reverberant room, and a noise level adds white noise that is independent between cameras.
+    """
+    check_for_ffmpeg()
+    width, height = resolution
+
+    video_filter = "[0:v]null[video]"
+    if flash_time is not None:
+        flash_start = flash_time - start_offset
+        video_filter = (
+            "[0:v]drawbox=x=0:y=0:w=iw:h=ih:color=white:t=fill:"
+            f"enable='between(t,{flash_start},{flash_start + flash_duration})'[video]"
+        )
+    # the session audio is generated at the same rate for every camera, so each camera gets the same samples before resampling
+    audio_filter = (
+        f"aevalsrc=exprs='{CLAPS_EXPRESSION}':sample_rate={NOISE_SAMPLE_RATE}:duration={start_offset + duration}[claps];"
+        f"[1:a][claps]amix=inputs=2:duration=first:normalize=0,atrim=start={start_offset},asetpts=PTS-STARTPTS"
+    )
+    if echo_delays is not None:
+        echo_decays = [
+            0.6 * 0.75**echo_number for echo_number in range(len(echo_delays))
+        ]
+        audio_filter += f",aecho=0.8:0.8:{'|'.join(str(delay) for delay in echo_delays)}:{'|'.join(str(decay) for decay in echo_decays)}"
+    if noise_level > 0:
+        audio_filter += (
+            f"[session_audio];anoisesrc=color=white:seed={noise_seed}:sample_rate={NOISE_SAMPLE_RATE}:amplitude={noise_level}:duration={duration}[camera_noise];"
+            "[session_audio][camera_noise]amix=inputs=2:duration=first:normalize=0"
+        )
+    audio_filter += f",aresample={sample_rate}[audio]"
+
+    generate_video_subprocess = subprocess.run(
+        [
+            ffmpeg_string,
+            "-y",
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc2=size={width}x{height}:rate={fps}:duration={duration}",
+            "-f",
+            "lavfi",
+            "-i",
+            f"anoisesrc=color=pink:seed={audio_seed}:sample_rate={NOISE_SAMPLE_RATE}:amplitude=0.3:duration={start_offset + duration}",
+            "-filter_complex",
+            f"{video_filter};{audio_filter}",
+            "-map",
+            "[video]",
+            "-map",
+            "[audio]",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "veryfast",
+            "-pix_fmt",
+            "yuv420p",
+            "-c:a",
+            "aac",
+            "-t",
+            f"{duration}",
+            str(output_video_path),
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+    if generate_video_subprocess.returncode != 0:
+        raise RuntimeError(
+            f"Error generating synthetic video {output_video_path}: {generate_video_subprocess.stderr.decode()}"
+        )
+
+
+def create_synthetic_session(
+    session_folder_path: Union[str, Path],
+    camera_count: int = 3,
+    duration: float = 10.0,
+    resolution: Tuple[int, int] = (640, 360),
+    fps_list: Sequence[float] = (30,),
+    sample_rate_list: Sequence[int] = (48000,),
+    max_offset: float = 3.0,
+    flash_time: Optional[float] = None,
+    seed: int = 0,
+    reverberant: bool = False,
+    noise_level: float = 0.0,
+) -> dict:
+    """Generate a session of camera_count videos with known start offsets in a raw videos folder inside the session folder.
+    Frame rates and sample rates are cycled through the cameras, so a mix of rates can be given.
+    The flash defaults to a second after the last camera starts recording, so every camera sees it.
+    If reverberant is True, each camera hears different echoes, as if placed at different spots in a reverberant room,
+    and the noise level adds white noise that is independent between cameras.
+
+    Returns the session info, which is also saved to a json file in the session folder,
+    including the camera offsets and the lag dictionary synchronization is expected to produce.
+    """
+    session_folder_path = Path(session_folder_path)
+    raw_video_folder_path = create_directory(
+        parent_directory=session_folder_path, directory_name=RAW_VIDEOS_FOLDER_NAME
+    )
+
+    offsets = create_camera_offsets(
+        camera_count=camera_count, max_offset=max_offset, seed=seed
+    )
+    if flash_time is None:
+        flash_time = max(offsets) + 1.0
+
+    camera_info = {}
+    for camera_number, offset in enumerate(offsets):
+        camera_name = f"cam_{camera_number}"
+        camera_info[camera_name] = {
+            "offset": offset,
+            "fps": fps_list[camera_number % len(fps_list)],
+            "sample rate": sample_rate_list[camera_number % len(sample_rate_list)],
+        }
+        logger.info(f"Generating synthetic video {camera_name} - offset: {offset}")
+        create_synthetic_video(
+            output_video_path=raw_video_folder_path / f"{camera_name}.mp4",
+            start_offset=offset,
+            duration=duration,
+            resolution=resolution,
+            fps=camera_info[camera_name]["fps"],
+            sample_rate=camera_info[camera_name]["sample rate"],
+            flash_time=flash_time,
+            audio_seed=seed,
+            echo_delays=(
+                [
+                    23 + 7 * camera_number,
+                    51 + 11 * camera_number,
+                    89 + 13 * camera_number,
+                ]
+                if reverberant
+                else None
+            ),
+            noise_level=noise_level,
+            noise_seed=seed + camera_number + 1,
+        )
+
+    session_info = {
+        "raw video folder": str(raw_video_folder_path),
+        "camera count": camera_count,
+        "duration": duration,
+        "resolution": list(resolution),
+        "flash time": flash_time,
+        "seed": seed,
+        "reverberant": reverberant,
+        "noise level": noise_level,
+        "cameras": camera_info,
+        "expected lags": find_expected_lags(
+            {camera_name: info["offset"] for camera_name, info in camera_info.items()}
+        ),
+    }
+    with open(session_folder_path / SYNTHETIC_SESSION_INFO_NAME, "w") as info_file:
+        json.dump(session_info, info_file, indent=2)
+
+    return session_info
+
+
+def load_synthetic_session_info(session_folder_path: Union[str, Path]) -> dict:
+    with open(Path(session_folder_path) / SYNTHETIC_SESSION_INFO_NAME) as info_file:
+        return json.load(info_file)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    session_info = create_synthetic_session(
+        session_folder_path=Path.home() / "skelly_synchronize_synthetic_session",
+        camera_count=3,
+    )
+    print(json.dumps(session_info["expected lags"], indent=2))
@@ -0,0 +1,173 @@
+import logging
+import math
+import subprocess
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from skelly_synchronize.core_processes.video_functions.ffmpeg_functions import (
+    check_for_ffmpeg,
+    extract_audio_channel_count_ffmpeg,
+    extract_audio_sample_rate_ffmpeg,
+    ffmpeg_string,
+    run_subprocess,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_audio_file_info(audio_file_path: Union[str, Path]) -> dict:
+    """Read the sample rate, channel count, frame count and duration of an audio file from its header, without decoding the audio"""
+    import soundfile as sf
+
+    audio_file_info = sf.info(str(audio_file_path))
+
+    return {
+        "sample rate": audio_file_info.samplerate,
+        "channels": audio_file_info.channels,
+        "frames": audio_file_info.frames,
+        "audio duration": audio_file_info.duration,
+    }
+
+
+def get_audio_file_duration(audio_file_path: Union[str, Path]) -> float:
+    """Get the duration of an audio file in seconds from its header"""
+    return get_audio_file_info(audio_file_path)["audio duration"]
+
+
+def load_audio_file(
+    audio_file_path: Union[str, Path],
+    sample_rate: Optional[int] = None,
+    start_time: float = 0.0,
+    duration: Optional[float] = None,
+    mono: bool = True,
+    dtype: type = np.float32,
+) -> Tuple[np.ndarray, int]:
+    """Load an audio file, or the part of it starting at start_time and lasting duration seconds, and return the audio signal and its sample rate.
+    Only the requested part of the file is read. The audio is resampled if a sample rate is given, otherwise the native sample rate is kept.
+    Mono audio has shape (samples,), other audio has shape (channels, samples).
+    Formats soundfile can't read are decoded through an ffmpeg pipe.
+    """
+    try:
+        audio_signal, native_sample_rate = read_audio_with_soundfile(
+            audio_file_path=audio_file_path, start_time=start_time, duration=duration
+        )
+    except RuntimeError as e:
+        logger.debug(
+            f"soundfile unable to read {audio_file_path}, decoding with ffmpeg: {e}"
+        )
+        audio_signal, native_sample_rate = read_audio_with_ffmpeg(
+            audio_file_path=audio_file_path,
+            start_time=start_time,
+            duration=duration,
+            mono=mono,
+        )
+
+    if mono and audio_signal.shape[0] > 1:
+        audio_signal = np.mean(audio_signal, axis=0, keepdims=True)
+
+    if sample_rate is not None and sample_rate != native_sample_rate:
+        audio_signal = resample_audio(
+            audio_signal=audio_signal,
+            sample_rate=native_sample_rate,
+            new_sample_rate=sample_rate,
+        )
+    else:
+        sample_rate = native_sample_rate
+
+    audio_signal = audio_signal.astype(dtype, copy=False)
+    if mono:
+        audio_signal = audio_signal[0]
+
+    return audio_signal, int(sample_rate)
+
+
+def read_audio_with_soundfile(
+    audio_file_path: Union[str, Path],
+    start_time: float = 0.0,
+    duration: Optional[float] = None,
+) -> Tuple[np.ndarray, int]:
+    """Read part of an audio file with soundfile, seeking in the file instead of decoding everything before the start time.
+    Returns the audio with shape (channels, samples) and its sample rate.
+    """
+    import soundfile as sf
+
+    try:
+        with sf.SoundFile(str(audio_file_path)) as audio_file:
+            sample_rate = audio_file.samplerate
+            start_frame = int(start_time * sample_rate)
+            frames = -1 if duration is None else int(duration * sample_rate)
+            if start_frame > 0:
+                audio_file.seek(min(start_frame, audio_file.frames))
+            audio_signal = audio_file.read(
+                frames=frames, dtype="float32", always_2d=True
+            )
+    except sf.LibsndfileError as e:
+        raise RuntimeError(str(e)) from e
+
+    return audio_signal.T, sample_rate
+
+
+def read_audio_with_ffmpeg(
+    audio_file_path: Union[str, Path],
+    start_time: float = 0.0,
+    duration: Optional[float] = None,
+    mono: bool = True,
+) -> Tuple[np.ndarray, int]:
+    """Decode part of an audio file to 32 bit float PCM through an ffmpeg pipe.
+    Returns the audio with shape (channels, samples) and its sample rate.
+    """
+    check_for_ffmpeg()
+    audio_file_pathstring = str(audio_file_path)
+    sample_rate = int(extract_audio_sample_rate_ffmpeg(audio_file_pathstring))
+    channels = (
+        1 if mono else int(extract_audio_channel_count_ffmpeg(audio_file_pathstring))
+    )
+
+    command = [ffmpeg_string, "-v", "error"]
+    if start_time > 0:
+        command.extend(["-ss", f"{start_time}"])
+    command.extend(["-i", audio_file_pathstring, "-map", "0:a:0"])
+    if duration is not None:
+        command.extend(["-t", f"{duration}"])
+    command.extend(["-ac", f"{channels}", "-f", "f32le", "pipe:1"])
+
+    read_audio_subprocess = run_subprocess(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if read_audio_subprocess.returncode != 0:
+        raise RuntimeError(
+            f"Unable to decode audio from {audio_file_pathstring}, ffmpeg returned code {read_audio_subprocess.returncode}"
+        )
+
+    audio_signal = np.frombuffer(read_audio_subprocess.stdout, dtype=np.float32)
+
+    return audio_signal.reshape(-1, channels).T, sample_rate
+
+
+def resample_audio(
+    audio_signal: np.ndarray, sample_rate: int, new_sample_rate: int
+) -> np.ndarray:
+    """Resample audio along its last axis with a polyphase filter, which low pass filters the signal before downsampling"""
+    from scipy import signal
+
+    sample_rate_divisor = math.gcd(int(sample_rate), int(new_sample_rate))
+    return signal.resample_poly(
+        audio_signal,
+        up=int(new_sample_rate) // sample_rate_divisor,
+        down=int(sample_rate) // sample_rate_divisor,
+        axis=-1,
+    )
+
+
+def write_audio_file(
+    audio_file_path: Union[str, Path],
+    audio_signal: np.ndarray,
+    sample_rate: int,
+    subtype: str = "PCM_24",
+):
+    """Write an audio signal with shape (samples,) or (channels, samples) to an audio file"""
+    import soundfile as sf
+
+    sf.write(str(audio_file_path), np.asarray(audio_signal).T, sample_rate, subtype)
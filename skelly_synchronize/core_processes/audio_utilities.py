@@ -1,24 +1,50 @@
+import json
 import logging
-import librosa
-import soundfile as sf
+import os
+import shutil
+import uuid
+from functools import partial
+from multiprocessing.pool import Pool
 from pathlib import Path
 import numpy as np
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
+from skelly_synchronize.core_processes.audio_file_io import (
+    load_audio_file,
+    write_audio_file,
+)
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    StageInstrumentation,
+    measure_stage,
+)
+from skelly_synchronize.core_processes.video_functions.analysis_pass import (
+    run_analysis_pass,
+)
 from skelly_synchronize.core_processes.video_functions.ffmpeg_functions import (
-    extract_audio_from_video_ffmpeg,
     extract_audio_sample_rate_ffmpeg,
 )
 from skelly_synchronize.system.file_extensions import AudioExtension
 from skelly_synchronize.system.paths_and_file_names import TRIMMED_AUDIO_FOLDER_NAME
+from skelly_synchronize.utils.path_handling_utilities import get_cached_file_path
 
 logger = logging.getLogger(__name__)
 
+# audio being extracted into the cache is written with this before its extension, and renamed once the extraction succeeds
+PARTIAL_CACHE_SUFFIX = ".partial"
+# keyframe timestamps read in the same analysis pass are cached next to the audio with this extension
+KEYFRAMES_CACHE_EXTENSION = "keyframes.json"
+
 
 def get_audio_sample_rates(video_info_dict: Dict[str, dict]) -> list:
-    """Get the sample rates of each audio file and return them in a list"""
+    """Get the sample rates of each audio file and return them in a list, probing only the videos whose info doesn't already have it"""
     audio_sample_rate_list = [
-        extract_audio_sample_rate_ffmpeg(file_pathstring=video_dict["video pathstring"])
+        (
+            video_dict["audio sample rate"]
+            if "audio sample rate" in video_dict
+            else extract_audio_sample_rate_ffmpeg(
+                file_pathstring=video_dict["video pathstring"]
+            )
+        )
         for video_dict in video_info_dict.values()
     ]
 
@@ -34,36 +60,178 @@ def extract_audio_files(
     video_info_dict: Dict[str, dict],
     audio_extension: AudioExtension,
     audio_folder_path: Path,
+    pool: Optional[Pool] = None,
+    cache_folder_path: Optional[Path] = None,
+    instrumentation: Optional[StageInstrumentation] = None,
 ) -> dict:
-    """Get a dictionary with audio files and information from the given video file paths."""
-    audio_signal_dict = dict()
-    for video_dict in video_info_dict.values():
-        audio_name = f"{video_dict['camera name']}.{audio_extension.value}"
-        audio_file_path = audio_folder_path / audio_name
-
-        extract_audio_from_video_ffmpeg(
-            file_pathstring=video_dict["video pathstring"],
-            output_file_path=audio_file_path,
+    """Get a dictionary with audio files and information from the given video file paths.
+    If a pool is given, the audio is extracted on its workers.
+    If a cache folder is given, extracted audio is reused from it for videos that have not changed since they were last extracted.
+    """
+    extract_audio = partial(
+        extract_single_audio_file,
+        audio_extension=audio_extension,
+        audio_folder_path=audio_folder_path,
+        cache_folder_path=cache_folder_path,
+        instrumentation=instrumentation,
+    )
+    if pool is None:
+        audio_items = [
+            extract_audio(video_dict) for video_dict in video_info_dict.values()
+        ]
+    else:
+        audio_items = pool.map(extract_audio, list(video_info_dict.values()))
+
+    return dict(audio_items)
+
+
+def extract_single_audio_file(
+    video_dict: dict,
+    audio_extension: AudioExtension,
+    audio_folder_path: Path,
+    cache_folder_path: Optional[Path] = None,
+    instrumentation: Optional[StageInstrumentation] = None,
+) -> Tuple[str, dict]:
+    """Extract the audio of a single video, and return the audio name with its audio information dictionary"""
+    with measure_stage(instrumentation, "extraction", video_dict["camera name"]):
+        return extract_audio_from_single_video(
+            video_dict=video_dict,
+            audio_extension=audio_extension,
+            audio_folder_path=audio_folder_path,
+            cache_folder_path=cache_folder_path,
         )
 
-        if not audio_file_path.is_file():
-            logging.error("Error loading audio file, verify video has audio track")
-            raise FileNotFoundError(
-                f"Audio file not found: {audio_file_path}, ensure input video has audio"
+
+def extract_audio_from_single_video(
+    video_dict: dict,
+    audio_extension: AudioExtension,
+    audio_folder_path: Path,
+    cache_folder_path: Optional[Path] = None,
+) -> Tuple[str, dict]:
+    audio_name = f"{video_dict['camera name']}.{audio_extension.value}"
+    audio_file_path = audio_folder_path / audio_name
+    # the audio is extracted in the analysis pass, which reads the keyframe index for trimming from the same read of the video
+    analysis_results = {}
+
+    if cache_folder_path is None:
+        analysis_results = run_analysis_pass(
+            video_pathstring=video_dict["video pathstring"],
+            audio_file_path=audio_file_path,
+            outputs=("keyframe timestamps",),
+        )
+    else:
+        cached_audio_file_path = get_cached_file_path(
+            cache_folder_path=cache_folder_path,
+            source_file_path=video_dict["video filepath"],
+            file_extension=audio_extension.value,
+        )
+        cached_keyframes_file_path = get_cached_file_path(
+            cache_folder_path=cache_folder_path,
+            source_file_path=video_dict["video filepath"],
+            file_extension=KEYFRAMES_CACHE_EXTENSION,
+        )
+        if cached_audio_file_path.is_file():
+            logger.info(f"Using cached audio {cached_audio_file_path} for {audio_name}")
+            analysis_results = load_cached_keyframe_timestamps(
+                cached_keyframes_file_path
+            )
+        else:
+            analysis_results = extract_audio_to_cache(
+                video_pathstring=video_dict["video pathstring"],
+                cached_audio_file_path=cached_audio_file_path,
+                cached_keyframes_file_path=cached_keyframes_file_path,
             )
+        if cached_audio_file_path.is_file():
+            shutil.copyfile(cached_audio_file_path, audio_file_path)
 
-        audio_signal, sample_rate = librosa.load(path=audio_file_path, sr=None)
+    if not audio_file_path.is_file():
+        logging.error("Error loading audio file, verify video has audio track")
+        raise FileNotFoundError(
+            f"Audio file not found: {audio_file_path}, ensure input video has audio"
+        )
+
+    audio_signal, sample_rate = load_audio_file(audio_file_path=audio_file_path)
+
+    audio_duration = audio_signal.shape[-1] / sample_rate
+    logger.info(f"audio file {audio_name} is {audio_duration} seconds long")
+
+    audio_info_dictionary = {
+        "audio file": audio_signal,
+        "sample rate": sample_rate,
+        "camera name": video_dict["camera name"],
+        "audio duration": audio_duration,
+    }
+    if "keyframe timestamps" in analysis_results:
+        audio_info_dictionary["keyframe timestamps"] = analysis_results[
+            "keyframe timestamps"
+        ]
+
+    return audio_name, audio_info_dictionary
+
+
+def create_partial_cache_file_path(cached_file_path: Path) -> Path:
+    return cached_file_path.with_name(
+        f"{cached_file_path.stem}.{uuid.uuid4().hex}{PARTIAL_CACHE_SUFFIX}{cached_file_path.suffix}"
+    )
+
+
+def extract_audio_to_cache(
+    video_pathstring: str,
+    cached_audio_file_path: Path,
+    cached_keyframes_file_path: Optional[Path] = None,
+) -> dict:
+    """Run the analysis pass with the audio written under a temporary name in the cache folder, and rename it into place once ffmpeg succeeds,
+    so an interrupted or cancelled extraction never leaves a truncated file that later runs would take for a cache hit.
+    The keyframe timestamps are cached first, so a cache hit on the audio also has the keyframe index for trimming.
+    """
+    cached_audio_file_path.parent.mkdir(parents=True, exist_ok=True)
+    partial_audio_file_path = create_partial_cache_file_path(cached_audio_file_path)
+    try:
+        analysis_results = run_analysis_pass(
+            video_pathstring=video_pathstring,
+            audio_file_path=partial_audio_file_path,
+            outputs=("keyframe timestamps",),
+        )
+        if partial_audio_file_path.is_file():
+            if (
+                cached_keyframes_file_path is not None
+                and "keyframe timestamps" in analysis_results
+            ):
+                save_cached_keyframe_timestamps(
+                    cached_keyframes_file_path=cached_keyframes_file_path,
+                    keyframe_timestamps=analysis_results["keyframe timestamps"],
+                )
+            os.replace(partial_audio_file_path, cached_audio_file_path)
+    finally:
+        partial_audio_file_path.unlink(missing_ok=True)
+
+    return analysis_results
+
+
+def save_cached_keyframe_timestamps(
+    cached_keyframes_file_path: Path, keyframe_timestamps: List[float]
+):
+    partial_keyframes_file_path = create_partial_cache_file_path(
+        cached_keyframes_file_path
+    )
+    try:
+        partial_keyframes_file_path.write_text(json.dumps(list(keyframe_timestamps)))
+        os.replace(partial_keyframes_file_path, cached_keyframes_file_path)
+    finally:
+        partial_keyframes_file_path.unlink(missing_ok=True)
 
-        audio_duration = librosa.get_duration(y=audio_signal, sr=sample_rate)
-        logger.info(f"audio file {audio_name} is {audio_duration} seconds long")
-        audio_signal_dict[audio_name] = {
-            "audio file": audio_signal,
-            "sample rate": sample_rate,
-            "camera name": video_dict["camera name"],
-            "audio duration": audio_duration,
-        }
 
-    return audio_signal_dict
+def load_cached_keyframe_timestamps(cached_keyframes_file_path: Path) -> dict:
+    """Return the cached keyframe timestamps like the analysis pass results, or no results if they weren't cached or can't be read,
+    in which case trimming reads the keyframe index from the video instead
+    """
+    try:
+        keyframe_timestamps = json.loads(cached_keyframes_file_path.read_text())
+    except (OSError, ValueError):
+        return {}
+    return {
+        "keyframe timestamps": [float(timestamp) for timestamp in keyframe_timestamps]
+    }
 
 
 def trim_audio_files(
@@ -71,28 +239,35 @@ def trim_audio_files(
     lag_dictionary: dict,
     synced_video_length: float,
     audio_extension: AudioExtension = AudioExtension.WAV,
+    camera_names: Optional[List[str]] = None,
 ):
+    """Trim each camera's audio to the synchronized part, or only the audio of the cameras in camera_names if they are given"""
     logger.info("Trimming audio files to match synchronized video length")
 
     trimmed_audio_folder_path = Path(audio_folder_path) / TRIMMED_AUDIO_FOLDER_NAME
     trimmed_audio_folder_path.mkdir(parents=True, exist_ok=True)
 
     for audio_filepath in audio_folder_path.glob(f"*.{audio_extension.value}"):
-        audio_signal, sr = librosa.load(path=audio_filepath, sr=None)
+        if camera_names is not None and audio_filepath.stem not in camera_names:
+            continue
         lag = lag_dictionary[audio_filepath.stem]
 
-        lag_in_samples = int(float(lag) * sr)
-        synched_video_length_in_samples = int(synced_video_length * sr)
-
-        shortened_audio_signal = audio_signal[lag_in_samples:]
-        shortened_audio_signal = shortened_audio_signal[
-            :synched_video_length_in_samples
-        ]
+        # only the synchronized part of the audio is read from the file
+        shortened_audio_signal, sr = load_audio_file(
+            audio_file_path=audio_filepath,
+            start_time=float(lag),
+            duration=synced_video_length,
+        )
 
         audio_filename = f"{audio_filepath.stem}.{AudioExtension.WAV.value}"
 
         logger.info(f"Saving audio {audio_filename}")
         output_path = trimmed_audio_folder_path / audio_filename
-        sf.write(output_path, shortened_audio_signal, sr, subtype="PCM_24")
+        write_audio_file(
+            audio_file_path=output_path,
+            audio_signal=shortened_audio_signal,
+            sample_rate=sr,
+            subtype="PCM_24",
+        )
 
     return trimmed_audio_folder_path
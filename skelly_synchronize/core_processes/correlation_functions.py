@@ -1,20 +1,37 @@
 import logging
+from functools import partial
+from multiprocessing.pool import Pool
 from pathlib import Path
-import cv2
 import numpy as np
-from typing import Dict
-from scipy import signal
-
+from typing import Dict, List, Optional, Tuple, Union
+
+from skelly_synchronize.core_processes.audio_file_io import resample_audio
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    StageInstrumentation,
+    measure_stage,
+)
+from skelly_synchronize.core_processes.synchronization_progress import (
+    ProgressReporter,
+)
+from skelly_synchronize.core_processes.video_functions.analysis_pass import (
+    run_analysis_pass,
+)
 from skelly_synchronize.system.file_extensions import NUMPY_EXTENSION
 from skelly_synchronize.system.paths_and_file_names import BRIGHTNESS_SUFFIX
 
 logger = logging.getLogger(__name__)
 
+# correlation within this many seconds of the peak is part of the peak when finding the confidence
+PEAK_EXCLUSION_SECONDS = 0.01
+# samples per second of the onset envelopes correlated by the onset envelope estimator
+ONSET_ENVELOPE_RATE = 200
+
 
 def cross_correlate(audio1: np.ndarray, audio2: np.ndarray):
     """Take two audio files, synchronize them using cross correlation, and trim them to the same length.
     Inputs are two audio arrays to be synchronized. Return the lag expressed in terms of the audio sample rate of the clips.
     """
+    from scipy import signal
 
     # compute cross correlation with scipy correlate function, which gives the correlation of every different lag value
     # mode='full' makes sure every lag value possible between the two signals is used, and method='fft' uses the fast fourier transform to speed the process up
@@ -27,11 +44,477 @@ def cross_correlate(audio1: np.ndarray, audio2: np.ndarray):
     return lag
 
 
+def find_correlation_peak(
+    correlation: np.ndarray,
+    lags: np.ndarray,
+    exclusion_width: int = 1,
+    interpolate: bool = False,
+) -> Tuple[float, float]:
+    """Find the lag at the maximum of a cross correlation, and a confidence score between 0 and 1 for it.
+    The confidence is one minus the ratio of the highest correlation outside of exclusion_width of the peak to the peak,
+    so a single sharp peak scores close to 1, and an ambiguous correlation with several similar peaks scores close to 0.
+    If interpolate is True, a parabola is fit through the peak and its neighbours to find the lag between samples.
+    """
+    peak_index = int(np.argmax(correlation))
+    peak_value = correlation[peak_index]
+    lag = float(lags[peak_index])
+    if interpolate:
+        lag += find_parabolic_peak_offset(correlation, peak_index)
+    if peak_value <= 0:
+        return lag, 0.0
+
+    exclusion_start = max(peak_index - exclusion_width, 0)
+    exclusion_end = peak_index + exclusion_width + 1
+    sidelobes = np.concatenate(
+        [correlation[:exclusion_start], correlation[exclusion_end:]]
+    )
+    if sidelobes.size == 0:
+        return lag, 1.0
+
+    confidence = 1 - max(float(np.max(sidelobes)), 0.0) / peak_value
+
+    return lag, float(confidence)
+
+
+def find_parabolic_peak_offset(values: np.ndarray, peak_index: int) -> float:
+    """Find how far between samples the true peak is, from the parabola through the peak and its two neighbours"""
+    if peak_index == 0 or peak_index == values.size - 1:
+        return 0.0
+
+    left, center, right = (
+        values[peak_index - 1],
+        values[peak_index],
+        values[peak_index + 1],
+    )
+    curvature = left - 2 * center + right
+    if curvature >= 0:
+        return 0.0
+
+    return float(0.5 * (left - right) / curvature)
+
+
+def estimate_lag_full_rate(
+    reference_signal: np.ndarray, signal_to_align: np.ndarray, sample_rate: float
+) -> Tuple[float, float]:
+    """Cross correlate the full rate signals, as `cross_correlate` does. Returns the lag in seconds and its confidence."""
+    from scipy import signal
+
+    correlation = signal.correlate(
+        reference_signal, signal_to_align, mode="full", method="fft"
+    )
+    lags = signal.correlation_lags(
+        reference_signal.size, signal_to_align.size, mode="full"
+    )
+    lag, confidence = find_correlation_peak(
+        correlation=correlation,
+        lags=lags,
+        exclusion_width=int(sample_rate * PEAK_EXCLUSION_SECONDS),
+    )
+
+    return lag / sample_rate, confidence
+
+
+def estimate_lag_decimated(
+    reference_signal: np.ndarray,
+    signal_to_align: np.ndarray,
+    sample_rate: float,
+    analysis_sample_rate: int = 4000,
+) -> Tuple[float, float]:
+    """Resample both signals to the analysis sample rate before cross correlating, trading lag resolution for speed"""
+    if analysis_sample_rate >= sample_rate:
+        return estimate_lag_full_rate(reference_signal, signal_to_align, sample_rate)
+
+    return estimate_lag_full_rate(
+        reference_signal=resample_audio(
+            reference_signal,
+            sample_rate=sample_rate,
+            new_sample_rate=analysis_sample_rate,
+        ),
+        signal_to_align=resample_audio(
+            signal_to_align,
+            sample_rate=sample_rate,
+            new_sample_rate=analysis_sample_rate,
+        ),
+        sample_rate=analysis_sample_rate,
+    )
+
+
+def estimate_lag_coarse_to_fine(
+    reference_signal: np.ndarray,
+    signal_to_align: np.ndarray,
+    sample_rate: float,
+    coarse_sample_rate: int = 1000,
+    refine_duration: float = 2.0,
+) -> Tuple[float, float]:
+    """Find a coarse lag on heavily resampled signals, then refine it at full rate.
+    The refinement only correlates refine_duration seconds from the middle of the overlap, over the lags within a few coarse samples of the coarse lag.
+    """
+    from scipy import signal
+
+    coarse_lag, confidence = estimate_lag_decimated(
+        reference_signal=reference_signal,
+        signal_to_align=signal_to_align,
+        sample_rate=sample_rate,
+        analysis_sample_rate=coarse_sample_rate,
+    )
+    coarse_lag_samples = int(round(coarse_lag * sample_rate))
+    search_width = int(np.ceil(2 * sample_rate / min(coarse_sample_rate, sample_rate)))
+
+    # the part of signal_to_align that overlaps the reference at the coarse lag, with room to search around it
+    overlap_start = max(0, -coarse_lag_samples + search_width)
+    overlap_end = min(
+        signal_to_align.size,
+        reference_signal.size - coarse_lag_samples - search_width,
+    )
+    segment_length = min(
+        int(refine_duration * sample_rate), overlap_end - overlap_start
+    )
+    if segment_length <= 0:
+        return coarse_lag, confidence
+
+    segment_start = overlap_start + (overlap_end - overlap_start - segment_length) // 2
+    segment_end = segment_start + segment_length
+    segment = signal_to_align[segment_start:segment_end]
+    reference_start = segment_start + coarse_lag_samples - search_width
+    reference_end = segment_end + coarse_lag_samples + search_width
+    reference_segment = reference_signal[reference_start:reference_end]
+
+    # valid mode gives one correlation value per lag from coarse lag - search width to coarse lag + search width
+    refine_correlation = signal.correlate(
+        reference_segment, segment, mode="valid", method="fft"
+    )
+    refined_lag_samples = (
+        coarse_lag_samples - search_width + int(np.argmax(refine_correlation))
+    )
+
+    return refined_lag_samples / sample_rate, confidence
+
+
+def estimate_lag_brightness_threshold(
+    reference_signal: np.ndarray,
+    signal_to_align: np.ndarray,
+    sample_rate: float,
+    brightness_ratio_threshold: float = 1000,
+) -> Tuple[float, float]:
+    """Align the first brightness change of two brightness curves, as `find_brightest_point_lags` does.
+    The sample rate is the frame rate, and the confidence is 1 if both curves pass the threshold and 0 otherwise.
+    """
+    reference_frame = find_brightness_change_frame(
+        reference_signal, brightness_ratio_threshold
+    )
+    frame = find_brightness_change_frame(signal_to_align, brightness_ratio_threshold)
+    confidence = float(
+        passes_brightness_threshold(
+            reference_signal, reference_frame, brightness_ratio_threshold
+        )
+        and passes_brightness_threshold(
+            signal_to_align, frame, brightness_ratio_threshold
+        )
+    )
+
+    return (reference_frame - frame) / sample_rate, confidence
+
+
+def passes_brightness_threshold(
+    brightness_array: np.ndarray, frame: int, brightness_ratio_threshold: float
+) -> bool:
+    brightness_difference = np.diff(brightness_array, prepend=brightness_array[0])
+    brightness_double_difference = np.diff(
+        brightness_difference, prepend=brightness_difference[0]
+    )
+    return bool(
+        frame > 0
+        and brightness_difference[frame] * brightness_double_difference[frame]
+        >= brightness_ratio_threshold
+    )
+
+
+def batched_cross_correlation(
+    reference_signal: np.ndarray,
+    signals_to_align: List[np.ndarray],
+    phase_transform: bool = False,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Cross correlate a reference signal with several signals at once, transforming the reference only once.
+    Each row of the returned correlation matches `signal.correlate(reference_signal, signal_to_align, mode="full")`,
+    zero padded to the longest signal, and the lags match `signal.correlation_lags` for the longest signal.
+    With phase_transform, the cross spectrum is whitened so only its phase is correlated (GCC-PHAT),
+    which gives a sharp peak at the direct path even when reverberation smears the plain cross correlation.
+    """
+    from scipy import fft
+
+    longest_length = max(signal_to_align.size for signal_to_align in signals_to_align)
+    fft_length = fft.next_fast_len(
+        reference_signal.size + longest_length - 1, real=True
+    )
+
+    signals_array = np.zeros((len(signals_to_align), longest_length), dtype=np.float32)
+    for signal_number, signal_to_align in enumerate(signals_to_align):
+        signal_length = signal_to_align.size
+        signals_array[signal_number, :signal_length] = signal_to_align
+
+    reference_spectrum = fft.rfft(reference_signal.astype(np.float32), n=fft_length)
+    cross_spectrum = fft.rfft(signals_array, n=fft_length, axis=-1, workers=-1)
+    del signals_array
+    np.conjugate(cross_spectrum, out=cross_spectrum)
+    cross_spectrum *= reference_spectrum
+    if phase_transform:
+        cross_spectrum /= np.maximum(np.abs(cross_spectrum), 1e-12)
+
+    circular_correlation = fft.irfft(cross_spectrum, n=fft_length, axis=-1, workers=-1)
+    del cross_spectrum
+
+    # negative lags wrap around to the end of the circular correlation
+    negative_lags_start = fft_length - (longest_length - 1)
+    positive_lags_end = reference_signal.size
+    correlation = np.concatenate(
+        [
+            circular_correlation[:, negative_lags_start:],
+            circular_correlation[:, :positive_lags_end],
+        ],
+        axis=-1,
+    )
+    lags = np.arange(-(longest_length - 1), reference_signal.size)
+
+    return correlation, lags
+
+
+def estimate_lags_batched(
+    reference_signal: np.ndarray,
+    signals_to_align: List[np.ndarray],
+    sample_rate: float,
+    phase_transform: bool = False,
+    interpolate: bool = False,
+    max_batch_size: int = 4,
+) -> List[Tuple[float, float]]:
+    """Estimate the lag and confidence of each signal against the reference with `batched_cross_correlation`.
+    Signals are correlated max_batch_size at a time to bound the memory used by their spectra.
+    """
+    lags_and_confidences = []
+    for batch_start in range(0, len(signals_to_align), max_batch_size):
+        batch_end = batch_start + max_batch_size
+        correlation, lags = batched_cross_correlation(
+            reference_signal=reference_signal,
+            signals_to_align=signals_to_align[batch_start:batch_end],
+            phase_transform=phase_transform,
+        )
+        for signal_correlation in correlation:
+            lag, confidence = find_correlation_peak(
+                correlation=signal_correlation,
+                lags=lags,
+                exclusion_width=max(int(sample_rate * PEAK_EXCLUSION_SECONDS), 1),
+                interpolate=interpolate,
+            )
+            lags_and_confidences.append((lag / sample_rate, confidence))
+
+    return lags_and_confidences
+
+
+def estimate_lags_gcc_phat(
+    reference_signal: np.ndarray,
+    signals_to_align: List[np.ndarray],
+    sample_rate: float,
+    analysis_sample_rate: int = 16000,
+) -> List[Tuple[float, float]]:
+    """Estimate lags with generalized cross correlation with phase transform.
+    Since the phase transform whitens the spectrum, the signals are resampled to the analysis sample rate first without losing the sharp peak.
+    """
+    if analysis_sample_rate < sample_rate:
+        reference_signal = resample_audio(
+            reference_signal,
+            sample_rate=sample_rate,
+            new_sample_rate=analysis_sample_rate,
+        )
+        signals_to_align = [
+            resample_audio(
+                signal_to_align,
+                sample_rate=sample_rate,
+                new_sample_rate=analysis_sample_rate,
+            )
+            for signal_to_align in signals_to_align
+        ]
+        sample_rate = analysis_sample_rate
+
+    return estimate_lags_batched(
+        reference_signal=reference_signal,
+        signals_to_align=signals_to_align,
+        sample_rate=sample_rate,
+        phase_transform=True,
+        interpolate=True,
+    )
+
+
+def compute_onset_envelope(
+    audio_signal: np.ndarray,
+    sample_rate: float,
+    analysis_sample_rate: int = 8000,
+    envelope_rate: int = ONSET_ENVELOPE_RATE,
+    window_duration: float = 0.02,
+) -> Tuple[np.ndarray, float]:
+    """Compute the spectral flux onset envelope of an audio signal, and its sample rate, which is close to the envelope rate.
+    The spectral flux sums the increases in log magnitude across frequencies from one frame to the next,
+    so it peaks at the start of sounds like claps and footsteps, and ignores the steady reverberant tail that follows them.
+    """
+    from scipy import signal
+
+    if analysis_sample_rate < sample_rate:
+        audio_signal = resample_audio(
+            audio_signal, sample_rate=sample_rate, new_sample_rate=analysis_sample_rate
+        )
+        sample_rate = analysis_sample_rate
+
+    hop_length = int(round(sample_rate / envelope_rate))
+    window_length = max(int(window_duration * sample_rate), hop_length)
+    _, _, spectrogram = signal.stft(
+        audio_signal.astype(np.float32),
+        fs=sample_rate,
+        nperseg=window_length,
+        noverlap=window_length - hop_length,
+        boundary=None,
+        padded=False,
+    )
+    log_magnitude = np.log1p(100 * np.abs(spectrogram))
+    del spectrogram
+
+    spectral_flux = np.maximum(np.diff(log_magnitude, axis=1), 0).sum(axis=0)
+    spectral_flux = np.concatenate([[0.0], spectral_flux])
+
+    onset_envelope = (spectral_flux - spectral_flux.mean()) / (
+        spectral_flux.std() + 1e-12
+    )
+
+    return onset_envelope, sample_rate / hop_length
+
+
+def estimate_lags_onset_envelope(
+    reference_signal: np.ndarray,
+    signals_to_align: List[np.ndarray],
+    sample_rate: float,
+) -> List[Tuple[float, float]]:
+    """Estimate lags by cross correlating onset envelopes instead of waveforms.
+    The envelopes are sampled at ONSET_ENVELOPE_RATE, so the correlation is orders of magnitude smaller than the full rate one,
+    and the peak is interpolated between envelope samples.
+    """
+    reference_envelope, envelope_rate = compute_onset_envelope(
+        reference_signal, sample_rate
+    )
+    envelopes_to_align = [
+        compute_onset_envelope(signal_to_align, sample_rate)[0]
+        for signal_to_align in signals_to_align
+    ]
+
+    return estimate_lags_batched(
+        reference_signal=reference_envelope,
+        signals_to_align=envelopes_to_align,
+        sample_rate=envelope_rate,
+        interpolate=True,
+    )
+
+
+def estimate_lag_gcc_phat(
+    reference_signal: np.ndarray, signal_to_align: np.ndarray, sample_rate: float
+) -> Tuple[float, float]:
+    return estimate_lags_gcc_phat(reference_signal, [signal_to_align], sample_rate)[0]
+
+
+def estimate_lag_onset_envelope(
+    reference_signal: np.ndarray, signal_to_align: np.ndarray, sample_rate: float
+) -> Tuple[float, float]:
+    return estimate_lags_onset_envelope(
+        reference_signal, [signal_to_align], sample_rate
+    )[0]
+
+
+def compute_brightness_change_curve(brightness_array: np.ndarray) -> np.ndarray:
+    """Find the frame to frame brightness change of a brightness curve, scaled to zero mean and unit variance.
+    Correlating changes instead of levels ignores each camera's exposure and slow lighting drift,
+    and leaves sharp peaks at flashes and lights switching that line up between cameras.
+    """
+    brightness_change = np.diff(
+        brightness_array.astype(np.float32), prepend=brightness_array[0]
+    )
+
+    return (brightness_change - brightness_change.mean()) / (
+        brightness_change.std() + 1e-12
+    )
+
+
+def estimate_lags_brightness_correlation(
+    reference_signal: np.ndarray,
+    signals_to_align: List[np.ndarray],
+    sample_rate: float,
+) -> List[Tuple[float, float]]:
+    """Estimate lags by cross correlating the brightness change curves of every camera against the reference in one batched FFT.
+    The sample rate is the frame rate, and the peak is interpolated between frames.
+    Unlike the threshold estimator, every brightness change in the recording contributes to the lag, so no threshold needs tuning,
+    and the confidence tells how clearly one alignment stands out.
+    """
+    return estimate_lags_batched(
+        reference_signal=compute_brightness_change_curve(reference_signal),
+        signals_to_align=[
+            compute_brightness_change_curve(signal_to_align)
+            for signal_to_align in signals_to_align
+        ],
+        sample_rate=sample_rate,
+        interpolate=True,
+    )
+
+
+def estimate_lag_brightness_correlation(
+    reference_signal: np.ndarray, signal_to_align: np.ndarray, sample_rate: float
+) -> Tuple[float, float]:
+    return estimate_lags_brightness_correlation(
+        reference_signal, [signal_to_align], sample_rate
+    )[0]
+
+
+# lag estimators take a reference signal, a signal to align to it and their sample rate,
+# and return the lag of the signal to align in seconds, as `cross_correlate` does, and a confidence between 0 and 1
+AUDIO_LAG_ESTIMATORS = {
+    "full_rate": estimate_lag_full_rate,
+    "decimated": estimate_lag_decimated,
+    "coarse_to_fine": estimate_lag_coarse_to_fine,
+    "gcc_phat": estimate_lag_gcc_phat,
+    "onset_envelope": estimate_lag_onset_envelope,
+}
+# estimators that correlate every camera against the reference in one batched FFT, used when synchronizing a whole session
+BATCHED_AUDIO_LAG_ESTIMATORS = {
+    "gcc_phat": estimate_lags_gcc_phat,
+    "onset_envelope": estimate_lags_onset_envelope,
+}
+BRIGHTNESS_LAG_ESTIMATORS = {
+    "brightness_threshold": estimate_lag_brightness_threshold,
+    "brightness_correlation": estimate_lag_brightness_correlation,
+}
+BATCHED_BRIGHTNESS_LAG_ESTIMATORS = {
+    "brightness_correlation": estimate_lags_brightness_correlation,
+}
+
+
 def find_first_brightness_change(
-    video_pathstring: str, brightness_ratio_threshold: float = 1000
+    video_pathstring: str,
+    brightness_ratio_threshold: float = 1000,
+    instrumentation: Optional[StageInstrumentation] = None,
+    progress_reporter: Optional[ProgressReporter] = None,
 ) -> int:
     logger.info(f"Detecting first brightness change in {video_pathstring}")
-    brightness_array = find_brightness_across_frames(video_pathstring)
+    brightness_array = extract_brightness_array(
+        video_pathstring,
+        instrumentation=instrumentation,
+        progress_reporter=progress_reporter,
+    )
+
+    return find_brightness_change_frame(
+        brightness_array=brightness_array,
+        brightness_ratio_threshold=brightness_ratio_threshold,
+    )
+
+
+def find_brightness_change_frame(
+    brightness_array: np.ndarray, brightness_ratio_threshold: float = 1000
+) -> int:
+    """Find the first frame where the brightness change times its rate of change passes the threshold,
+    or the frame with the fastest brightness change if no frame passes it.
+    """
     brightness_difference = np.diff(brightness_array, prepend=brightness_array[0])
     brightness_double_difference = np.diff(
         brightness_difference, prepend=brightness_difference[0]
@@ -56,25 +539,28 @@ def find_first_brightness_change(
     return int(first_brightness_change)
 
 
-def find_brightness_across_frames(video_pathstring: str) -> np.ndarray:
-    video_capture_object = cv2.VideoCapture(video_pathstring)
+def find_brightness_across_frames(
+    video_pathstring: str, progress_reporter: Optional[ProgressReporter] = None
+) -> np.ndarray:
+    """Find the mean brightness of every frame of a video, and save it next to the video.
+    Frames are decoded and shrunk by ffmpeg in the analysis pass, whose progress is reported through the FFmpegRunner if one is active.
+    """
+    if progress_reporter is not None:
+        progress_reporter.check_cancelled()
 
-    video_framecount = int(video_capture_object.get(cv2.CAP_PROP_FRAME_COUNT))
-    brightness_array = np.zeros(video_framecount)
+    brightness_array = run_analysis_pass(
+        video_pathstring=video_pathstring, outputs=("brightness",)
+    )["brightness"]
 
-    frame_number = 0
+    np.save(file=find_brightness_array_path(video_pathstring), arr=brightness_array)
 
-    while frame_number < video_framecount:
-        ret, frame = video_capture_object.read()
-        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        brightness_array[frame_number] = np.mean(gray_frame)
-        frame_number += 1
+    return brightness_array
 
-    video_path = Path(video_pathstring)
-    brightness_array_pathstring = f"{str(video_path.parent / video_path.stem)}{BRIGHTNESS_SUFFIX}.{NUMPY_EXTENSION}"
-    np.save(file=brightness_array_pathstring, arr=brightness_array)
 
-    return brightness_array
+def find_brightness_array_path(video_pathstring: str) -> Path:
+    """Find where the brightness array of a video is saved, next to the video"""
+    video_path = Path(video_pathstring)
+    return video_path.parent / f"{video_path.stem}{BRIGHTNESS_SUFFIX}.{NUMPY_EXTENSION}"
 
 
 def normalize_lag_dictionary(lag_dictionary: Dict[str, float]) -> Dict[str, float]:
@@ -91,24 +577,64 @@ def normalize_lag_dictionary(lag_dictionary: Dict[str, float]) -> Dict[str, floa
 
 
 def find_cross_correlation_lags(
-    audio_signal_dict: dict, sample_rate: int
-) -> Dict[str, float]:
+    audio_signal_dict: dict,
+    sample_rate: int,
+    analysis_sample_rate: Optional[int] = None,
+    lag_estimator: str = "full_rate",
+    return_confidences: bool = False,
+) -> Union[Dict[str, float], Tuple[Dict[str, float], Dict[str, float]]]:
     """Take a dictionary of audio signals, as well as the sample rate of the audio, cross correlate the audio files, and output a lag dictionary.
     The lag dict is normalized so that the lag of the latest video to start in time is 0, and all other lags are positive.
+    If an analysis sample rate lower than the audio sample rate is given, the audio is resampled to it before correlating,
+    which speeds up the correlation at the cost of lag resolution.
+    The lag estimator can be any of AUDIO_LAG_ESTIMATORS, "gcc_phat" and "onset_envelope" are more robust in reverberant rooms.
+    If return_confidences is True, a dictionary of the estimator's confidence in each lag is returned too,
+    and the "full_rate" lags are found with `estimate_lag_full_rate`, which gives the same lags as `cross_correlate` and a confidence.
     """
+    if lag_estimator not in AUDIO_LAG_ESTIMATORS:
+        raise ValueError(
+            f"lag_estimator must be one of {list(AUDIO_LAG_ESTIMATORS.keys())}"
+        )
+
     comparison_file_key = next(iter(audio_signal_dict))
     logger.info(
         f"comparison file is: {comparison_file_key}, sample rate is: {sample_rate}"
     )
 
-    lag_dict = {
-        single_audio_dict["camera name"]: cross_correlate(
-            audio1=audio_signal_dict[comparison_file_key]["audio file"],
-            audio2=single_audio_dict["audio file"],
+    if analysis_sample_rate is not None and analysis_sample_rate < sample_rate:
+        logger.info(f"Resampling audio to {analysis_sample_rate} for correlation")
+        analysis_signal_dict = {
+            audio_name: resample_audio(
+                audio_signal=single_audio_dict["audio file"],
+                sample_rate=sample_rate,
+                new_sample_rate=analysis_sample_rate,
+            )
+            for audio_name, single_audio_dict in audio_signal_dict.items()
+        }
+        sample_rate = analysis_sample_rate
+    else:
+        analysis_signal_dict = {
+            audio_name: single_audio_dict["audio file"]
+            for audio_name, single_audio_dict in audio_signal_dict.items()
+        }
+
+    if lag_estimator == "full_rate" and not return_confidences:
+        lag_dict = {
+            single_audio_dict["camera name"]: cross_correlate(
+                audio1=analysis_signal_dict[comparison_file_key],
+                audio2=analysis_signal_dict[audio_name],
+            )
+            / sample_rate
+            for audio_name, single_audio_dict in audio_signal_dict.items()
+        }  # cross correlates all audio to the first audio file in the dict, and divides by the audio sample rate in order to get the lag in seconds
+    else:
+        lag_dict, confidence_dict = estimate_lag_dictionary(
+            audio_signal_dict=audio_signal_dict,
+            analysis_signal_dict=analysis_signal_dict,
+            comparison_file_key=comparison_file_key,
+            sample_rate=sample_rate,
+            lag_estimator=lag_estimator,
         )
-        / sample_rate
-        for single_audio_dict in audio_signal_dict.values()
-    }  # cross correlates all audio to the first audio file in the dict, and divides by the audio sample rate in order to get the lag in seconds
 
     normalized_lag_dict = normalize_lag_dictionary(lag_dictionary=lag_dict)
 
@@ -116,22 +642,199 @@ def find_cross_correlation_lags(
         f"original lag dict: {lag_dict} normalized lag dict: {normalized_lag_dict}"
     )
 
+    if return_confidences:
+        return normalized_lag_dict, confidence_dict
     return normalized_lag_dict
 
 
+def estimate_lag_dictionary(
+    audio_signal_dict: dict,
+    analysis_signal_dict: Dict[str, np.ndarray],
+    comparison_file_key: str,
+    sample_rate: float,
+    lag_estimator: str,
+) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Estimate the lag of every audio signal against the comparison signal with a lag estimator, and log their confidences.
+    Batched estimators correlate all of the signals against the comparison signal at once.
+
+    Returns the lag dictionary and a dictionary of the confidence in each lag.
+    """
+    audio_names = [
+        audio_name
+        for audio_name in audio_signal_dict
+        if audio_name != comparison_file_key
+    ]
+    signals_to_align = [analysis_signal_dict[audio_name] for audio_name in audio_names]
+
+    if lag_estimator in BATCHED_AUDIO_LAG_ESTIMATORS:
+        lags_and_confidences = BATCHED_AUDIO_LAG_ESTIMATORS[lag_estimator](
+            analysis_signal_dict[comparison_file_key], signals_to_align, sample_rate
+        )
+    else:
+        lags_and_confidences = [
+            AUDIO_LAG_ESTIMATORS[lag_estimator](
+                analysis_signal_dict[comparison_file_key], signal_to_align, sample_rate
+            )
+            for signal_to_align in signals_to_align
+        ]
+
+    comparison_camera_name = audio_signal_dict[comparison_file_key]["camera name"]
+    lag_dict = {comparison_camera_name: 0.0}
+    # the comparison signal's lag is zero by definition
+    confidence_dict = {comparison_camera_name: 1.0}
+    for audio_name, (lag, confidence) in zip(audio_names, lags_and_confidences):
+        camera_name = audio_signal_dict[audio_name]["camera name"]
+        lag_dict[camera_name] = lag
+        confidence_dict[camera_name] = confidence
+        logger.info(
+            f"{lag_estimator} lag of {camera_name}: {lag} seconds, confidence: {confidence:.3f}"
+        )
+
+    return lag_dict, confidence_dict
+
+
 def find_brightest_point_lags(
-    video_info_dict: dict, frame_rate: float, brightness_ratio_threshold: float = 1000
+    video_info_dict: dict,
+    frame_rate: float,
+    brightness_ratio_threshold: float = 1000,
+    pool: Optional[Pool] = None,
+    instrumentation: Optional[StageInstrumentation] = None,
+    progress_reporter: Optional[ProgressReporter] = None,
 ) -> Dict[str, float]:
     """Take a video info dictionary, find the first significant contrast change in the video, and return its time in second as the lag.
     The lag dict is normalized so that the lag of the latest video to start in time is 0, and all other lags are positive.
+    If a pool is given, the videos are read on its workers.
     """
+    find_brightness_change = partial(
+        find_first_brightness_change,
+        brightness_ratio_threshold=brightness_ratio_threshold,
+        instrumentation=instrumentation,
+        progress_reporter=progress_reporter,
+    )
+    video_pathstrings = [
+        str(video_dict["video pathstring"]) for video_dict in video_info_dict.values()
+    ]
+    if pool is None:
+        brightness_change_frames = [
+            find_brightness_change(video_pathstring)
+            for video_pathstring in video_pathstrings
+        ]
+    else:
+        brightness_change_frames = pool.map(find_brightness_change, video_pathstrings)
+
     lag_dict = {
-        video_dict["camera name"]: find_first_brightness_change(
-            video_pathstring=str(video_dict["video pathstring"]),
-            brightness_ratio_threshold=brightness_ratio_threshold,
+        video_dict["camera name"]: brightness_change_frame / frame_rate
+        for video_dict, brightness_change_frame in zip(
+            video_info_dict.values(), brightness_change_frames
         )
-        / frame_rate
-        for video_dict in video_info_dict.values()
     }
 
     return lag_dict
+
+
+def find_brightness_correlation_lags(
+    video_info_dict: dict,
+    frame_rate: float,
+    pool: Optional[Pool] = None,
+    instrumentation: Optional[StageInstrumentation] = None,
+    progress_reporter: Optional[ProgressReporter] = None,
+) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Take a video info dictionary, find the brightness of every frame of each video,
+    and cross correlate the brightness changes of every video against the first one with `estimate_lags_brightness_correlation`.
+    The lag dict is normalized so that the lag of the latest video to start in time is 0, and all other lags are positive.
+    If a pool is given, the videos are read on its workers.
+
+    Returns the lag dictionary and a dictionary of the confidence in each lag.
+    """
+    extract_brightness = partial(
+        extract_brightness_array,
+        instrumentation=instrumentation,
+        progress_reporter=progress_reporter,
+    )
+    video_pathstrings = [
+        str(video_dict["video pathstring"]) for video_dict in video_info_dict.values()
+    ]
+    if pool is None:
+        brightness_arrays = [
+            extract_brightness(video_pathstring)
+            for video_pathstring in video_pathstrings
+        ]
+    else:
+        brightness_arrays = pool.map(extract_brightness, video_pathstrings)
+
+    camera_names = [
+        video_dict["camera name"] for video_dict in video_info_dict.values()
+    ]
+    with measure_stage(instrumentation, "correlation"):
+        lags_and_confidences = estimate_lags_brightness_correlation(
+            reference_signal=brightness_arrays[0],
+            signals_to_align=brightness_arrays[1:],
+            sample_rate=frame_rate,
+        )
+
+    lag_dict = {camera_names[0]: 0.0}
+    # the reference camera's lag is zero by definition
+    confidence_dict = {camera_names[0]: 1.0}
+    for camera_name, (lag, confidence) in zip(camera_names[1:], lags_and_confidences):
+        lag_dict[camera_name] = lag
+        confidence_dict[camera_name] = confidence
+        logger.info(
+            f"brightness correlation lag of {camera_name}: {lag} seconds, confidence: {confidence:.3f}"
+        )
+
+    return normalize_lag_dictionary(lag_dictionary=lag_dict), confidence_dict
+
+
+def extract_brightness_array(
+    video_pathstring: str,
+    instrumentation: Optional[StageInstrumentation] = None,
+    progress_reporter: Optional[ProgressReporter] = None,
+) -> np.ndarray:
+    with measure_stage(instrumentation, "extraction", Path(video_pathstring).stem):
+        return find_brightness_across_frames(
+            video_pathstring, progress_reporter=progress_reporter
+        )
+
+
+def find_brightness_lags(
+    video_info_dict: dict,
+    frame_rate: float,
+    lag_estimator: str = "brightness_threshold",
+    brightness_ratio_threshold: float = 1000,
+    pool: Optional[Pool] = None,
+    instrumentation: Optional[StageInstrumentation] = None,
+    progress_reporter: Optional[ProgressReporter] = None,
+) -> Tuple[Dict[str, float], Optional[Dict[str, float]]]:
+    """Find the lag of every video from its brightness with one of the BRIGHTNESS_LAG_ESTIMATORS,
+    see `find_brightest_point_lags` and `find_brightness_correlation_lags`.
+
+    Returns the lag dictionary and a dictionary of the confidence in each lag, which is None for the threshold estimator.
+    """
+    if lag_estimator not in BRIGHTNESS_LAG_ESTIMATORS:
+        raise ValueError(
+            f"lag_estimator must be one of {list(BRIGHTNESS_LAG_ESTIMATORS.keys())}"
+        )
+
+    if lag_estimator == "brightness_correlation":
+        logger.info("Synchronizing videos by correlating their brightness changes")
+        return find_brightness_correlation_lags(
+            video_info_dict=video_info_dict,
+            frame_rate=frame_rate,
+            pool=pool,
+            instrumentation=instrumentation,
+            progress_reporter=progress_reporter,
+        )
+
+    logger.info(
+        f"Synchronizing videos with a brightness ratio threshold of {brightness_ratio_threshold}"
+    )
+    lag_dict = find_brightest_point_lags(
+        video_info_dict=video_info_dict,
+        frame_rate=frame_rate,
+        brightness_ratio_threshold=brightness_ratio_threshold,
+        pool=pool,
+        instrumentation=instrumentation,
+        progress_reporter=progress_reporter,
+    )
+    # the brightest point lags are frame times, which have no confidence score
+    return lag_dict, None
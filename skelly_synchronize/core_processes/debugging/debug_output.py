@@ -1,13 +1,23 @@
-import toml
 from pathlib import Path
 
 
 def save_dictionaries_to_toml(input_dictionaries: dict, output_file_path: Path):
     """Saves informative dictionaries to a TOML file for debugging"""
+    import toml
+
     with open(output_file_path, "w") as toml_file:
         toml_file.write(toml.dumps(input_dictionaries))
 
 
+def load_dictionaries_from_toml(input_file_path: Path) -> dict:
+    """Load the dictionaries saved by `save_dictionaries_to_toml`, or an empty dictionary if there is no debug TOML"""
+    import toml
+
+    if not Path(input_file_path).is_file():
+        return {}
+    return toml.load(input_file_path)
+
+
 def remove_audio_files_from_audio_signal_dict(audio_signal_dictionary: dict) -> dict:
     """Remove audio files from audio signal dict to reduce unnessary storage"""
     for audio_info_dictionary in audio_signal_dictionary.values():
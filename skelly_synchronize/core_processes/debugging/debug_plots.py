@@ -1,10 +1,11 @@
 import logging
-import librosa
-from matplotlib import pyplot as plt
+import multiprocessing
+import threading
 import numpy as np
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, List, Optional
 
+from skelly_synchronize.core_processes.audio_file_io import load_audio_file
 from skelly_synchronize.system.file_extensions import NUMPY_EXTENSION, AudioExtension
 from skelly_synchronize.system.paths_and_file_names import (
     BRIGHTNESS_SUFFIX,
@@ -15,40 +16,150 @@ from skelly_synchronize.system.paths_and_file_names import (
 
 logger = logging.getLogger(__name__)
 
+# each trace is drawn from this many min/max pairs, which is more than a saved plot has pixels across
+DEFAULT_ENVELOPE_POINTS = 2000
+
+# debug plots rendering in background processes, keyed by the folder they save to
+_background_plot_processes: Dict[Path, List[multiprocessing.Process]] = {}
+_background_plot_processes_lock = threading.Lock()
+
+
+def compute_min_max_envelope(
+    signal: np.ndarray,
+    sample_rate: float,
+    start_sample: int = 0,
+    sample_count: Optional[int] = None,
+    max_points: int = DEFAULT_ENVELOPE_POINTS,
+) -> dict:
+    """Reduce the part of a signal starting at the start sample and lasting sample count samples to the minimum and maximum of each of up to max_points bins.
+    Plotting the envelope looks the same as plotting every sample, but draws thousands of points instead of millions.
+
+    Returns a dictionary with the "times" in seconds from the start of the part, and the "minimums" and "maximums" of each bin.
+    """
+    start_sample = max(int(start_sample), 0)
+    end_sample = (
+        len(signal) if sample_count is None else start_sample + int(sample_count)
+    )
+    signal_part = np.asarray(signal[start_sample:end_sample])
+    if len(signal_part) == 0:
+        empty_array = np.zeros(0)
+        return {"times": empty_array, "minimums": empty_array, "maximums": empty_array}
+
+    bin_size = max(int(np.ceil(len(signal_part) / max_points)), 1)
+    bin_starts = np.arange(0, len(signal_part), bin_size)
+
+    return {
+        "times": bin_starts / sample_rate,
+        "minimums": np.minimum.reduceat(signal_part, bin_starts),
+        "maximums": np.maximum.reduceat(signal_part, bin_starts),
+    }
+
+
+def create_audio_envelopes(
+    audio_signal_dict: dict, lag_dict: Dict[str, float], synchronized_duration: float
+) -> dict:
+    """Find the envelopes of the raw audio signals, and of the part of each signal the synchronized video keeps, from the audio already in memory.
+    Must be called before the audio signals are removed from the audio signal dictionary.
+
+    Returns a dictionary with the "raw" and "synchronized" envelopes, keyed by camera name.
+    """
+    audio_envelopes = {"raw": {}, "synchronized": {}}
+    for audio_info in audio_signal_dict.values():
+        camera_name = audio_info["camera name"]
+        sample_rate = audio_info["sample rate"]
+        audio_envelopes["raw"][camera_name] = compute_min_max_envelope(
+            signal=audio_info["audio file"], sample_rate=sample_rate
+        )
+        audio_envelopes["synchronized"][camera_name] = compute_min_max_envelope(
+            signal=audio_info["audio file"],
+            sample_rate=sample_rate,
+            start_sample=round(lag_dict[camera_name] * sample_rate),
+            sample_count=round(synchronized_duration * sample_rate),
+        )
+
+    return audio_envelopes
+
+
+def create_brightness_envelopes(
+    raw_brightness_arrays: Dict[str, np.ndarray],
+    synchronized_brightness_arrays: Dict[str, np.ndarray],
+) -> dict:
+    """Find the envelopes of raw and synchronized brightness arrays, with frame numbers as times.
+
+    Returns a dictionary with the "raw" and "synchronized" envelopes, keyed by the names of the arrays.
+    """
+    return {
+        "raw": {
+            name: compute_min_max_envelope(signal=brightness_array, sample_rate=1)
+            for name, brightness_array in raw_brightness_arrays.items()
+        },
+        "synchronized": {
+            name: compute_min_max_envelope(signal=brightness_array, sample_rate=1)
+            for name, brightness_array in synchronized_brightness_arrays.items()
+        },
+    }
+
 
 def create_brightness_debug_plots(
-    raw_video_folder_path: Path, synchronized_video_folder_path: Path
+    raw_video_folder_path: Path,
+    synchronized_video_folder_path: Path,
+    brightness_envelopes: Optional[dict] = None,
 ):
+    """Plot the brightness of the videos before and after synchronization.
+    The brightness envelopes are from `create_brightness_envelopes`, and are read from the brightness arrays saved in the folders if not given.
+    """
     output_filepath = synchronized_video_folder_path / DEBUG_PLOT_NAME
 
-    list_of_raw_brightness_paths = get_brightness_npys_from_folder(
-        folder_path=raw_video_folder_path
-    )
-    list_of_trimmed_brightness_paths = get_brightness_npys_from_folder(
-        folder_path=synchronized_video_folder_path
-    )
+    if brightness_envelopes is None:
+        brightness_envelopes = create_brightness_envelopes(
+            raw_brightness_arrays=load_brightness_npys(
+                get_brightness_npys_from_folder(folder_path=raw_video_folder_path)
+            ),
+            synchronized_brightness_arrays=load_brightness_npys(
+                get_brightness_npys_from_folder(
+                    folder_path=synchronized_video_folder_path
+                )
+            ),
+        )
 
     logger.info("Creating debug plots")
-    plot_brightness_across_frames(
-        raw_brightness_npys=list_of_raw_brightness_paths,
-        trimmed_brightness_npys=list_of_trimmed_brightness_paths,
+    plot_envelopes(
+        envelopes=brightness_envelopes,
+        title="Brightness Across Frames",
+        y_label="Brightness",
+        x_label="Frame",
         output_filepath=output_filepath,
     )
 
 
-def create_audio_debug_plots(synchronized_video_folder_path: Path):
+def create_audio_debug_plots(
+    synchronized_video_folder_path: Path, audio_envelopes: Optional[dict] = None
+):
+    """Plot the audio of the videos before and after synchronization.
+    The audio envelopes are from `create_audio_envelopes`, and are read from the audio files in the synchronized video folder if not given.
+    """
     output_filepath = synchronized_video_folder_path / DEBUG_PLOT_NAME
-    raw_audio_folder_path = synchronized_video_folder_path / AUDIO_FILES_FOLDER_NAME
-    trimmed_audio_folder_path = raw_audio_folder_path / TRIMMED_AUDIO_FOLDER_NAME
 
-    list_of_raw_audio_paths = get_audio_paths_from_folder(raw_audio_folder_path)
-    list_of_trimmed_audio_paths = get_audio_paths_from_folder(trimmed_audio_folder_path)
+    if audio_envelopes is None:
+        raw_audio_folder_path = synchronized_video_folder_path / AUDIO_FILES_FOLDER_NAME
+        trimmed_audio_folder_path = raw_audio_folder_path / TRIMMED_AUDIO_FOLDER_NAME
+        audio_envelopes = {
+            "raw": load_audio_envelopes(
+                get_audio_paths_from_folder(raw_audio_folder_path)
+            ),
+            "synchronized": load_audio_envelopes(
+                get_audio_paths_from_folder(trimmed_audio_folder_path)
+            ),
+        }
 
     logger.info("Creating debug plots")
-    plot_audio_waveforms(
-        raw_audio_filepath_list=list_of_raw_audio_paths,
-        trimmed_audio_filepath_list=list_of_trimmed_audio_paths,
+    plot_envelopes(
+        envelopes=audio_envelopes,
+        title="Audio Cross Correlation Debug",
+        y_label="Amplitude",
+        x_label="Time (s)",
         output_filepath=output_filepath,
+        alpha=0.4,
     )
 
 
@@ -64,67 +175,123 @@ def get_audio_paths_from_folder(
     return list(Path(folder_path).glob(search_extension))
 
 
-def plot_brightness_across_frames(
-    raw_brightness_npys: List[Path],
-    trimmed_brightness_npys: List[Path],
-    output_filepath: Path,
-):
-    fig, axs = plt.subplots(2, 1, sharex=True, sharey=True)
-    fig.suptitle("Brightness Across Frames")
-
-    axs[0].set_ylabel("Brightness")
-    axs[1].set_ylabel("Brightness")
-    axs[1].set_xlabel("Time (s)")
-
-    axs[0].set_title("Before Cross Correlation")
-    axs[1].set_title("After Cross Correlation")
-
-    for brightness_npys in raw_brightness_npys:
-        brightness_array = np.load(brightness_npys)
-
-        time = np.linspace(0, len(brightness_array), num=len(brightness_array))
-
-        axs[0].plot(time, brightness_array, alpha=0.5)
-
-    for brightness_npys in trimmed_brightness_npys:
-        brightness_array = np.load(brightness_npys)
+def load_brightness_npys(brightness_npys: List[Path]) -> Dict[str, np.ndarray]:
+    return {
+        brightness_npy.stem: np.load(brightness_npy)
+        for brightness_npy in brightness_npys
+    }
 
-        time = np.linspace(0, len(brightness_array), num=len(brightness_array))
 
-        axs[1].plot(time, brightness_array, alpha=0.5)
-
-    logger.info(f"Saving debug plots to: {output_filepath}")
-    plt.savefig(output_filepath)
+def load_audio_envelopes(audio_filepath_list: List[Path]) -> Dict[str, dict]:
+    audio_envelopes = {}
+    for audio_filepath in audio_filepath_list:
+        audio_signal, sample_rate = load_audio_file(audio_file_path=audio_filepath)
+        audio_envelopes[audio_filepath.stem] = compute_min_max_envelope(
+            signal=audio_signal, sample_rate=sample_rate
+        )
+    return audio_envelopes
 
 
-def plot_audio_waveforms(
-    raw_audio_filepath_list: List[Path],
-    trimmed_audio_filepath_list: List[Path],
+def plot_envelopes(
+    envelopes: dict,
+    title: str,
+    y_label: str,
+    x_label: str,
     output_filepath: Path,
+    alpha: float = 0.5,
 ):
-    fig, axs = plt.subplots(2, 1, sharex=True, sharey=True)
-    fig.suptitle("Audio Cross Correlation Debug")
-
-    axs[0].set_ylabel("Amplitude")
-    axs[1].set_ylabel("Amplitude")
-    axs[1].set_xlabel("Time (s)")
+    """Plot the raw envelopes above the synchronized envelopes, and save the plot.
+    The figure is drawn on its own Agg canvas instead of through pyplot, so no window or global figure state is involved,
+    plots can be drawn from several threads at once, and the figure is freed as soon as it is saved.
+    """
+    # matplotlib is slow to import, so it is only imported when plots are created
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    axs = figure.subplots(2, 1, sharex=True, sharey=True)
+    figure.suptitle(title)
+
+    axs[0].set_ylabel(y_label)
+    axs[1].set_ylabel(y_label)
+    axs[1].set_xlabel(x_label)
 
     axs[0].set_title("Before Cross Correlation")
     axs[1].set_title("After Cross Correlation")
 
-    for audio_filepath in raw_audio_filepath_list:
-        audio_signal, sr = librosa.load(path=audio_filepath, sr=None)
-
-        time = np.linspace(0, len(audio_signal) / sr, num=len(audio_signal))
-
-        axs[0].plot(time, audio_signal, alpha=0.4)
-
-    for audio_filepath in trimmed_audio_filepath_list:
-        audio_signal, sr = librosa.load(path=audio_filepath, sr=None)
-
-        time = np.linspace(0, len(audio_signal) / sr, num=len(audio_signal))
-
-        axs[1].plot(time, audio_signal, alpha=0.4)
+    for axis, envelope_group in zip(axs, [envelopes["raw"], envelopes["synchronized"]]):
+        for envelope in envelope_group.values():
+            axis.fill_between(
+                envelope["times"],
+                envelope["minimums"],
+                envelope["maximums"],
+                alpha=alpha,
+                linewidth=0.5,
+            )
 
     logger.info(f"Saving debug plots to: {output_filepath}")
-    plt.savefig(output_filepath)
+    figure.savefig(output_filepath)
+    figure.clear()
+
+
+def start_background_debug_plots(
+    create_debug_plots: Callable, output_folder_path: Path, **kwargs
+) -> multiprocessing.Process:
+    """Create debug plots in a background process, so the synchronization can return without waiting for them.
+    The process isn't a daemon, so Python waits for the plot to be saved before exiting.
+    Use `wait_for_background_debug_plots` before moving or removing the output folder.
+    """
+    plot_process = multiprocessing.get_context("spawn").Process(
+        target=create_debug_plots,
+        kwargs=kwargs,
+        name=f"debug-plots-{Path(output_folder_path).name}",
+    )
+    plot_process.start()
+    logger.info(f"Creating debug plots for {output_folder_path} in the background")
+
+    with _background_plot_processes_lock:
+        _background_plot_processes.setdefault(Path(output_folder_path), []).append(
+            plot_process
+        )
+    return plot_process
+
+
+def wait_for_background_debug_plots(
+    output_folder_path: Optional[Path] = None, timeout: Optional[float] = None
+) -> bool:
+    """Wait for the background debug plots saving to the output folder, or for all of them if no folder is given.
+    Returns True if they all finished within the timeout.
+    """
+    with _background_plot_processes_lock:
+        if output_folder_path is None:
+            folder_paths = list(_background_plot_processes)
+        else:
+            folder_paths = [Path(output_folder_path)]
+        plot_processes = [
+            plot_process
+            for folder_path in folder_paths
+            for plot_process in _background_plot_processes.get(folder_path, [])
+        ]
+
+    for plot_process in plot_processes:
+        plot_process.join(timeout=timeout)
+        if plot_process.exitcode not in (None, 0):
+            logger.warning(
+                f"Background debug plots {plot_process.name} failed with exit code {plot_process.exitcode}"
+            )
+
+    finished = all(not plot_process.is_alive() for plot_process in plot_processes)
+    with _background_plot_processes_lock:
+        for folder_path in folder_paths:
+            remaining_processes = [
+                plot_process
+                for plot_process in _background_plot_processes.get(folder_path, [])
+                if plot_process.is_alive()
+            ]
+            if remaining_processes:
+                _background_plot_processes[folder_path] = remaining_processes
+            else:
+                _background_plot_processes.pop(folder_path, None)
+
+    return finished
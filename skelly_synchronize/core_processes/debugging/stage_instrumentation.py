@@ -0,0 +1,286 @@
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+try:
+    import resource
+except ImportError:  # resource is unavailable on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# the stage and camera each thread is working on, so progress from subprocesses can be attributed to them
+current_stage_state = threading.local()
+# the subprocess counter of each thread, so stages running at once on different threads only count their own subprocesses
+thread_subprocess_counter_state = threading.local()
+
+
+class SubprocessCounter:
+    """Counts the subprocesses started for one thread.
+    Subprocesses run on an FFmpegRunner's event loop are counted there for the thread that asked for them, so the count is locked.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add(self, count: int = 1):
+        with self.lock:
+            self.count += count
+
+    def get(self) -> int:
+        with self.lock:
+            return self.count
+
+
+def get_thread_subprocess_counter() -> SubprocessCounter:
+    """Return the subprocess counter of this thread, creating it on first use"""
+    counter = getattr(thread_subprocess_counter_state, "counter", None)
+    if counter is None:
+        counter = SubprocessCounter()
+        thread_subprocess_counter_state.counter = counter
+    return counter
+
+
+def record_subprocess_spawned(
+    count: int = 1, counter: Optional[SubprocessCounter] = None
+):
+    """Count subprocesses started by this thread, or for the thread whose counter is given"""
+    if counter is None:
+        counter = get_thread_subprocess_counter()
+    counter.add(count)
+
+
+def get_subprocess_count() -> int:
+    """Return the number of subprocesses started by or for this thread"""
+    return get_thread_subprocess_counter().get()
+
+
+def read_process_resource_usage() -> dict:
+    """Read the CPU time, RSS high-water mark and I/O of this process and the subprocesses it has waited for.
+    These are process-wide, so they can't be split between stages that run at the same time on different threads.
+    The RSS high-water mark is the largest RSS this process or any of its waited for subprocesses reached in their lifetime.
+    Linux counts the I/O of reaped subprocesses in /proc/self/io, other platforms only report CPU time and RSS.
+    """
+    cpu_time = time.process_time()
+    rss_high_water_mark_bytes = 0
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        rss_unit = 1 if sys.platform == "darwin" else 1024
+        self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_time += children_usage.ru_utime + children_usage.ru_stime
+        rss_high_water_mark_bytes = (
+            max(self_usage.ru_maxrss, children_usage.ru_maxrss) * rss_unit
+        )
+
+    bytes_read, bytes_written = None, None
+    try:
+        with open("/proc/self/io") as io_file:
+            io_counters = dict(line.split(": ") for line in io_file.read().splitlines())
+        bytes_read, bytes_written = int(io_counters["rchar"]), int(io_counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        pass
+
+    return {
+        "cpu time": cpu_time,
+        "rss high water mark bytes": rss_high_water_mark_bytes,
+        "bytes read": bytes_read,
+        "bytes written": bytes_written,
+    }
+
+
+def subtract_optional(end_value: Optional[int], start_value: Optional[int]):
+    if end_value is None or start_value is None:
+        return None
+    return end_value - start_value
+
+
+def find_process_totals(start_usage: dict, end_usage: dict) -> dict:
+    return {
+        "cpu time": end_usage["cpu time"] - start_usage["cpu time"],
+        "rss high water mark bytes": end_usage["rss high water mark bytes"],
+        "bytes read": subtract_optional(
+            end_usage["bytes read"], start_usage["bytes read"]
+        ),
+        "bytes written": subtract_optional(
+            end_usage["bytes written"], start_usage["bytes written"]
+        ),
+    }
+
+
+class StageInstrumentation:
+    """Records the wall time, thread CPU time and subprocesses spawned of each pipeline stage and camera.
+    These are measured for the thread running the stage, so cameras processed at once on different threads don't count each other's work.
+    The CPU time and I/O of subprocesses, and the RSS high-water mark, are process-wide, so they are only recorded as totals of the run.
+    Records are appended to a JSON lines file, so stages measured in pool workers are collected along with the stages of the main process.
+    """
+
+    def __init__(self, records_file_path: Union[str, Path]):
+        self.records_file_path = Path(records_file_path)
+        self.records_file_path.parent.mkdir(parents=True, exist_ok=True)
+        self.records_file_path.write_text("")
+        self.start_usage = read_process_resource_usage()
+
+    @contextlib.contextmanager
+    def measure(self, stage_name: str, camera_name: Optional[str] = None):
+        subprocess_counter = get_thread_subprocess_counter()
+        start_subprocess_count = subprocess_counter.get()
+        start_time = time.time()
+        start_timer = time.perf_counter()
+        start_thread_cpu_time = time.thread_time()
+        try:
+            yield
+        finally:
+            self.add_record(
+                {
+                    "stage": stage_name,
+                    "camera name": camera_name,
+                    "pid": os.getpid(),
+                    "start time": start_time,
+                    "wall time": time.perf_counter() - start_timer,
+                    "thread cpu time": time.thread_time() - start_thread_cpu_time,
+                    "subprocesses spawned": subprocess_counter.get()
+                    - start_subprocess_count,
+                }
+            )
+
+    def add_record(self, record: dict):
+        with open(self.records_file_path, "a") as records_file:
+            records_file.write(json.dumps(record) + "\n")
+
+    def load_records(self) -> List[dict]:
+        with open(self.records_file_path) as records_file:
+            records = [json.loads(line) for line in records_file if line.strip()]
+        return sorted(records, key=lambda record: record["start time"])
+
+    def save(
+        self,
+        output_file_path: Path,
+        chrome_trace_file_path: Optional[Path] = None,
+    ):
+        """Save the stage records, per stage totals and process totals as JSON, and optionally as a Chrome trace, then remove the records file"""
+        records = self.load_records()
+        with open(output_file_path, "w") as output_file:
+            json.dump(
+                {
+                    "process totals": find_process_totals(
+                        start_usage=self.start_usage,
+                        end_usage=read_process_resource_usage(),
+                    ),
+                    "stage totals": summarize_stage_records(records),
+                    "stages": records,
+                },
+                output_file,
+                indent=2,
+            )
+        logger.info(f"Saved stage timing to {output_file_path}")
+
+        if chrome_trace_file_path is not None:
+            with open(chrome_trace_file_path, "w") as chrome_trace_file:
+                json.dump(create_chrome_trace(records), chrome_trace_file)
+            logger.info(f"Saved Chrome trace to {chrome_trace_file_path}")
+
+        self.records_file_path.unlink(missing_ok=True)
+
+
+def get_current_stage() -> dict:
+    """Return the stage and camera this thread is inside of `measure_stage` for"""
+    return {
+        "stage": getattr(current_stage_state, "stage", None),
+        "camera name": getattr(current_stage_state, "camera_name", None),
+    }
+
+
+@contextlib.contextmanager
+def measure_stage(
+    instrumentation: Optional[StageInstrumentation],
+    stage_name: str,
+    camera_name: Optional[str] = None,
+):
+    """Measure a stage if instrumentation is given, and mark this thread as working on the stage either way"""
+    previous_stage = get_current_stage()
+    current_stage_state.stage = stage_name
+    current_stage_state.camera_name = camera_name
+    try:
+        if instrumentation is None:
+            yield
+        else:
+            with instrumentation.measure(
+                stage_name=stage_name, camera_name=camera_name
+            ):
+                yield
+    finally:
+        current_stage_state.stage = previous_stage["stage"]
+        current_stage_state.camera_name = previous_stage["camera name"]
+
+
+def summarize_stage_records(records: List[dict]) -> Dict[str, dict]:
+    """Sum the wall time, thread CPU time and subprocesses of each stage across cameras"""
+    stage_totals = {}
+    for record in records:
+        stage_total = stage_totals.setdefault(
+            record["stage"],
+            {
+                "wall time": 0.0,
+                "thread cpu time": 0.0,
+                "subprocesses spawned": 0,
+                "records": 0,
+            },
+        )
+        stage_total["wall time"] += record["wall time"]
+        stage_total["thread cpu time"] += record["thread cpu time"]
+        stage_total["subprocesses spawned"] += record["subprocesses spawned"]
+        stage_total["records"] += 1
+
+    return stage_totals
+
+
+def create_chrome_trace(records: List[dict]) -> dict:
+    """Convert stage records to the Chrome trace event format, with one track per camera in each process"""
+    if len(records) == 0:
+        return {"traceEvents": []}
+
+    trace_start_time = min(record["start time"] for record in records)
+    camera_thread_ids = {}
+    trace_events = []
+    for record in records:
+        camera_name = record["camera name"] or "session"
+        if camera_name not in camera_thread_ids:
+            camera_thread_ids[camera_name] = len(camera_thread_ids)
+        trace_events.append(
+            {
+                "name": record["stage"],
+                "cat": camera_name,
+                "ph": "X",
+                "ts": (record["start time"] - trace_start_time) * 1e6,
+                "dur": record["wall time"] * 1e6,
+                "pid": record["pid"],
+                "tid": camera_thread_ids[camera_name],
+                "args": {
+                    key: value
+                    for key, value in record.items()
+                    if key not in {"stage", "start time", "pid"}
+                },
+            }
+        )
+
+    thread_name_events = [
+        {
+            "name": "thread_name",
+            "ph": "M",
+            "pid": pid,
+            "tid": thread_id,
+            "args": {"name": camera_name},
+        }
+        for pid in {record["pid"] for record in records}
+        for camera_name, thread_id in camera_thread_ids.items()
+    ]
+
+    return {"traceEvents": thread_name_events + trace_events}
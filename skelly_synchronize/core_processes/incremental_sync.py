@@ -0,0 +1,398 @@
+import logging
+from multiprocessing.pool import Pool
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from skelly_synchronize.core_processes.audio_file_io import (
+    load_audio_file,
+    resample_audio,
+)
+from skelly_synchronize.core_processes.audio_utilities import (
+    extract_single_audio_file,
+)
+from skelly_synchronize.core_processes.correlation_functions import (
+    AUDIO_LAG_ESTIMATORS,
+)
+from skelly_synchronize.core_processes.debugging.debug_output import (
+    load_dictionaries_from_toml,
+    save_dictionaries_to_toml,
+)
+from skelly_synchronize.core_processes.debugging.debug_plots import (
+    wait_for_background_debug_plots,
+)
+from skelly_synchronize.core_processes.sync_result import (
+    CameraSyncResult,
+    SyncResult,
+    create_sync_result,
+    load_sync_manifest,
+    log_sync_result,
+    save_sync_manifest,
+)
+from skelly_synchronize.core_processes.video_functions.video_utilities import (
+    attach_audio_to_videos,
+    create_single_video_info_dict,
+    find_trimmed_frame_ranges,
+    trim_videos,
+)
+from skelly_synchronize.system.file_extensions import AudioExtension
+from skelly_synchronize.system.paths_and_file_names import (
+    AUDIO_FILES_FOLDER_NAME,
+    AUDIO_NAME,
+    DEBUG_PLOT_NAME,
+    DEBUG_TOML_NAME,
+    LAG_DICTIONARY_NAME,
+    RAW_VIDEO_NAME,
+    SYNCHRONIZED_VIDEO_NAME,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def add_camera_to_session(
+    raw_video_path: Union[str, Path],
+    sync_manifest: Union[str, Path, SyncResult],
+    reference_camera_name: Optional[str] = None,
+    lag_estimator: str = "full_rate",
+    video_handler: str = "deffcode",
+    cache_folder_path: Optional[Path] = None,
+    pool: Optional[Pool] = None,
+    max_processes: Optional[int] = None,
+) -> SyncResult:
+    """Add a camera to an audio synchronized session, or replace the video of one of its cameras, without synchronizing the session again.
+    The camera is named after the raw video, like in a full synchronization, and replaces the session's camera of the same name.
+
+    Only the new video's audio is extracted, and it is correlated once with the lag estimator against the reference camera's audio,
+    which the session kept in its audio files folder. The reference camera defaults to the first other camera in the sync manifest.
+    The other cameras' lags come from the sync manifest. Their synchronized videos are reused unless the new camera moves the start
+    or end of the window the cameras share, in which case only the cameras whose frames changed are trimmed again.
+    Sessions saved with write_synchronized_videos=False only have their sync manifest updated.
+    The new video must have the session's frame rate, since the raw videos aren't normalized again.
+
+    Returns the updated SyncResult, whose sync manifest is saved over the session's. The debug TOML is updated to match,
+    and the debug plot is removed, since it shows the old lags.
+    """
+    if lag_estimator not in AUDIO_LAG_ESTIMATORS:
+        raise ValueError(
+            f"lag_estimator must be one of {list(AUDIO_LAG_ESTIMATORS.keys())}"
+        )
+    if not isinstance(sync_manifest, SyncResult):
+        sync_manifest = load_sync_manifest(sync_manifest)
+    sync_result = sync_manifest
+    if sync_result.method != "audio":
+        raise ValueError(
+            f"Cameras can only be added to audio synchronized sessions, this session was synchronized with {sync_result.method}"
+        )
+
+    new_video_dict = create_single_video_info_dict(
+        video_filepath=Path(raw_video_path), video_handler="ffmpeg"
+    )
+    camera_name = new_video_dict["camera name"]
+    if new_video_dict["video fps"] != sync_result.fps:
+        raise ValueError(
+            f"{raw_video_path} is {new_video_dict['video fps']} fps, but the session is {sync_result.fps} fps"
+        )
+    reference_camera_name = find_reference_camera(
+        sync_result=sync_result,
+        camera_name=camera_name,
+        reference_camera_name=reference_camera_name,
+    )
+
+    synchronized_video_folder_path = sync_result.synchronized_video_folder_path
+    audio_folder_path = synchronized_video_folder_path / AUDIO_FILES_FOLDER_NAME
+    lag, confidence, audio_info = estimate_camera_lag(
+        new_video_dict=new_video_dict,
+        reference_camera_name=reference_camera_name,
+        audio_folder_path=audio_folder_path,
+        lag_estimator=lag_estimator,
+        cache_folder_path=cache_folder_path,
+    )
+
+    lag_dict = find_incremental_lag_dict(
+        lag_dict=sync_result.lag_dict,
+        reference_camera_name=reference_camera_name,
+        camera_name=camera_name,
+        lag=lag,
+    )
+    video_info_dict = create_session_video_info_dict(
+        sync_result=sync_result, new_video_dict=new_video_dict
+    )
+    trim_info_dict = find_trimmed_frame_ranges(
+        video_info_dict=video_info_dict, lag_dict=lag_dict, fps=sync_result.fps
+    )
+    changed_camera_names = find_changed_cameras(
+        sync_result=sync_result, trim_info_dict=trim_info_dict, camera_name=camera_name
+    )
+    logger.info(
+        f"Reusing the synchronized frames of {[name for name in trim_info_dict if name not in changed_camera_names]}, updating {changed_camera_names}"
+    )
+
+    trim_info_dict.update(
+        {
+            unchanged_camera_name: create_trim_info(
+                sync_result.cameras[unchanged_camera_name]
+            )
+            for unchanged_camera_name in trim_info_dict
+            if unchanged_camera_name not in changed_camera_names
+        }
+    )
+    if sync_result.videos_written:
+        trim_info_dict.update(
+            trim_videos(
+                video_info_dict=video_info_dict,
+                synchronized_folder_path=synchronized_video_folder_path,
+                lag_dict=lag_dict,
+                fps=sync_result.fps,
+                video_handler=video_handler,
+                pool=pool,
+                max_processes=max_processes,
+                keyframe_timestamps_dict={
+                    camera_name: audio_info.pop("keyframe timestamps", None)
+                },
+                camera_names=changed_camera_names,
+            )
+        )
+
+    updated_sync_result = create_sync_result(
+        synchronized_video_folder_path=synchronized_video_folder_path,
+        method=sync_result.method,
+        fps=sync_result.fps,
+        video_info_dict=video_info_dict,
+        lag_dict=lag_dict,
+        trim_info_dict=trim_info_dict,
+        confidence_dict={
+            **{
+                name: camera_result.confidence
+                for name, camera_result in sync_result.cameras.items()
+            },
+            camera_name: confidence,
+        },
+    )
+    # drift is a property of each camera's clock, so it carries over however the window moved
+    for name, camera_result in sync_result.cameras.items():
+        updated_sync_result.cameras[name].drift = camera_result.drift
+    updated_sync_result.cameras[camera_name].drift = 0.0
+
+    if updated_sync_result.videos_written:
+        attach_audio_to_videos(
+            synchronized_video_folder_path=synchronized_video_folder_path,
+            audio_folder_path=audio_folder_path,
+            lag_dictionary=lag_dict,
+            synchronized_video_length=updated_sync_result.synchronized_duration,
+            pool=pool,
+            camera_names=changed_camera_names,
+        )
+
+    log_sync_result(updated_sync_result)
+    save_sync_manifest(updated_sync_result)
+    update_debug_outputs(
+        sync_result=updated_sync_result,
+        new_video_dict=new_video_dict,
+        audio_info=audio_info,
+    )
+    return updated_sync_result
+
+
+def update_debug_outputs(
+    sync_result: SyncResult, new_video_dict: dict, audio_info: dict
+):
+    """Update the session's debug TOML with the new camera's video and audio information, and the new lags and synchronized videos.
+    The debug plot is removed rather than redrawn, since redrawing it would read every camera's audio again.
+    """
+    synchronized_video_folder_path = sync_result.synchronized_video_folder_path
+    debug_toml_path = synchronized_video_folder_path / DEBUG_TOML_NAME
+    camera_name = new_video_dict["camera name"]
+    debug_dictionaries = load_dictionaries_from_toml(debug_toml_path)
+
+    raw_video_info_dict = debug_dictionaries.get(RAW_VIDEO_NAME, {})
+    raw_video_info_dict[camera_name] = new_video_dict
+    audio_info_dict = debug_dictionaries.get(AUDIO_NAME, {})
+    audio_info_dict[f"{camera_name}.{AudioExtension.WAV.value}"] = {
+        key: value
+        for key, value in audio_info.items()
+        if key not in {"audio file", "keyframe timestamps"}
+    }
+    save_dictionaries_to_toml(
+        input_dictionaries={
+            **debug_dictionaries,
+            RAW_VIDEO_NAME: {
+                session_camera_name: raw_video_info_dict[session_camera_name]
+                for session_camera_name in sync_result.cameras
+                if session_camera_name in raw_video_info_dict
+            },
+            SYNCHRONIZED_VIDEO_NAME: sync_result.create_video_info_dict(),
+            AUDIO_NAME: audio_info_dict,
+            LAG_DICTIONARY_NAME: sync_result.lag_dict,
+        },
+        output_file_path=debug_toml_path,
+    )
+
+    wait_for_background_debug_plots(synchronized_video_folder_path)
+    debug_plot_path = synchronized_video_folder_path / DEBUG_PLOT_NAME
+    if debug_plot_path.is_file():
+        debug_plot_path.unlink()
+        logger.info(
+            f"Removed {debug_plot_path}, which doesn't show {camera_name}'s new lag"
+        )
+
+
+def estimate_camera_lag(
+    new_video_dict: dict,
+    reference_camera_name: str,
+    audio_folder_path: Path,
+    lag_estimator: str,
+    cache_folder_path: Optional[Path] = None,
+) -> Tuple[float, float, dict]:
+    """Extract the new video's audio into the session's audio files folder and correlate it with the reference camera's audio there.
+
+    Returns the lag of the new camera against the reference camera, its confidence, and the new video's audio information.
+    """
+    reference_audio_path = (
+        audio_folder_path / f"{reference_camera_name}.{AudioExtension.WAV.value}"
+    )
+    if not reference_audio_path.is_file():
+        raise FileNotFoundError(
+            f"The audio of reference camera {reference_camera_name} was not found at {reference_audio_path}"
+        )
+    reference_signal, sample_rate = load_audio_file(
+        audio_file_path=reference_audio_path
+    )
+
+    _, audio_info = extract_single_audio_file(
+        video_dict=new_video_dict,
+        audio_extension=AudioExtension.WAV,
+        audio_folder_path=audio_folder_path,
+        cache_folder_path=cache_folder_path,
+    )
+    signal_to_align = audio_info["audio file"]
+    if audio_info["sample rate"] != sample_rate:
+        signal_to_align = resample_audio(
+            signal_to_align,
+            sample_rate=audio_info["sample rate"],
+            new_sample_rate=sample_rate,
+        )
+    lag, confidence = AUDIO_LAG_ESTIMATORS[lag_estimator](
+        reference_signal, signal_to_align, sample_rate
+    )
+    logger.info(
+        f"{lag_estimator} lag of {new_video_dict['camera name']} against {reference_camera_name}: {lag} seconds, confidence: {confidence:.3f}"
+    )
+
+    return lag, confidence, audio_info
+
+
+def find_reference_camera(
+    sync_result: SyncResult, camera_name: str, reference_camera_name: Optional[str]
+) -> str:
+    """Check the reference camera is another camera of the session, or pick the first one"""
+    if reference_camera_name is None:
+        for session_camera_name in sync_result.cameras:
+            if session_camera_name != camera_name:
+                return session_camera_name
+        raise ValueError(
+            f"The session has no camera besides {camera_name} to align it to"
+        )
+    if reference_camera_name not in sync_result.cameras:
+        raise ValueError(
+            f"Reference camera {reference_camera_name} is not in the sync manifest"
+        )
+    if reference_camera_name == camera_name:
+        raise ValueError(
+            f"Camera {camera_name} is being replaced, so it can't be the reference camera"
+        )
+    return reference_camera_name
+
+
+def find_incremental_lag_dict(
+    lag_dict: Dict[str, float],
+    reference_camera_name: str,
+    camera_name: str,
+    lag: float,
+) -> Dict[str, float]:
+    """Add a camera to a normalized lag dict, replacing the camera of the same name if there is one.
+    The lag is the camera's lag against the reference camera, as the lag estimators give it, so it is positive if the camera started later.
+    The lags are shifted so the latest camera to start has a lag of 0 again, and are left exactly as they were if the latest start doesn't change.
+    """
+    incremental_lag_dict = {
+        session_camera_name: session_lag
+        for session_camera_name, session_lag in lag_dict.items()
+        if session_camera_name != camera_name
+    }
+    incremental_lag_dict[camera_name] = (
+        incremental_lag_dict[reference_camera_name] - lag
+    )
+
+    latest_start_lag = min(incremental_lag_dict.values())
+    return {
+        session_camera_name: session_lag - latest_start_lag
+        for session_camera_name, session_lag in incremental_lag_dict.items()
+    }
+
+
+def create_session_video_info_dict(
+    sync_result: SyncResult, new_video_dict: dict
+) -> Dict[str, dict]:
+    """Describe the session's raw videos like `create_video_info_dict` does, with the new camera's video in place of its camera's.
+    Durations come from the sync manifest, and only the raw videos of manifests that didn't record them are probed.
+    """
+    camera_name = new_video_dict["camera name"]
+    video_info_dict = {}
+    for session_camera_name, camera_result in sync_result.cameras.items():
+        if session_camera_name == camera_name:
+            continue
+        if camera_result.raw_duration is None:
+            video_info_dict[session_camera_name] = create_single_video_info_dict(
+                video_filepath=camera_result.raw_video_path, video_handler="ffmpeg"
+            )
+            continue
+        video_info_dict[session_camera_name] = {
+            "video filepath": camera_result.raw_video_path,
+            "video pathstring": str(camera_result.raw_video_path),
+            "camera name": session_camera_name,
+            "video duration": camera_result.raw_duration,
+            "video fps": sync_result.fps,
+        }
+    video_info_dict[camera_name] = new_video_dict
+    return video_info_dict
+
+
+def find_changed_cameras(
+    sync_result: SyncResult, trim_info_dict: Dict[str, dict], camera_name: str
+) -> List[str]:
+    """Find the cameras whose synchronized frames have to be found again, the new camera and any whose frame range moved"""
+    return [
+        session_camera_name
+        for session_camera_name, trim_info in trim_info_dict.items()
+        if session_camera_name == camera_name
+        or not can_reuse_camera_result(
+            camera_result=sync_result.cameras.get(session_camera_name),
+            trim_info=trim_info,
+            videos_written=sync_result.videos_written,
+        )
+    ]
+
+
+def can_reuse_camera_result(
+    camera_result: Optional[CameraSyncResult], trim_info: dict, videos_written: bool
+) -> bool:
+    if camera_result is None:
+        return False
+    if (
+        camera_result.start_frame != trim_info["start frame"]
+        or camera_result.frame_count != trim_info["frame count"]
+    ):
+        return False
+    return not videos_written or camera_result.output_video_path.is_file()
+
+
+def create_trim_info(camera_result: CameraSyncResult) -> dict:
+    """Describe an existing camera result like `trim_single_video` describes what it wrote"""
+    return {
+        "camera name": camera_result.camera_name,
+        "output video pathstring": (
+            None
+            if camera_result.output_video_path is None
+            else str(camera_result.output_video_path)
+        ),
+        "start frame": camera_result.start_frame,
+        "frame count": camera_result.frame_count,
+    }
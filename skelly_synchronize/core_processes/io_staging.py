@@ -0,0 +1,302 @@
+import contextlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Union
+
+from skelly_synchronize.core_processes.debugging.debug_plots import (
+    wait_for_background_debug_plots,
+)
+from skelly_synchronize.core_processes.sync_result import (
+    SyncResult,
+    save_sync_manifest,
+)
+from skelly_synchronize.core_processes.synchronization_progress import (
+    report_progress,
+)
+from skelly_synchronize.system.paths_and_file_names import (
+    SYNCHRONIZED_VIDEOS_FOLDER_NAME,
+)
+from skelly_synchronize.utils.get_video_files import get_video_file_list
+
+logger = logging.getLogger(__name__)
+
+# filesystem types in /proc/mounts that are served over the network
+NETWORK_FILESYSTEM_TYPES = {
+    "nfs",
+    "nfs4",
+    "cifs",
+    "smb3",
+    "smbfs",
+    "fuse.sshfs",
+    "fuse.rclone",
+    "afs",
+    "ceph",
+    "glusterfs",
+    "davfs",
+    "9p",
+}
+# fraction of the scratch disk's free space staging may use when no size limit is given
+DEFAULT_SCRATCH_FREE_SPACE_FRACTION = 0.9
+STAGING_MODES = ["auto", "always", "never"]
+PARTIAL_MOVE_SUFFIX = ".partial"
+
+
+def read_mount_points() -> Dict[Path, str]:
+    """Return the filesystem type of each mount point, on platforms with /proc/mounts"""
+    try:
+        with open("/proc/mounts") as mounts_file:
+            mount_lines = mounts_file.read().splitlines()
+    except OSError:
+        return {}
+
+    mount_points = {}
+    for mount_line in mount_lines:
+        fields = mount_line.split()
+        if len(fields) >= 3:
+            # spaces in mount points are escaped as octal in /proc/mounts
+            mount_point = fields[1].replace("\\040", " ")
+            mount_points[Path(mount_point)] = fields[2]
+    return mount_points
+
+
+def is_network_path(path: Union[str, Path]) -> bool:
+    """Return True if the path is on network storage, from its mount's filesystem type on Linux, or a UNC path on Windows"""
+    path = Path(path).absolute()
+    if sys.platform == "win32":
+        return str(path).startswith("\\\\")
+
+    mount_points = read_mount_points()
+    containing_mount_points = [
+        mount_point
+        for mount_point in mount_points
+        if path == mount_point or mount_point in path.parents
+    ]
+    if len(containing_mount_points) == 0:
+        return False
+
+    deepest_mount_point = max(containing_mount_points, key=lambda p: len(p.parts))
+    return mount_points[deepest_mount_point] in NETWORK_FILESYSTEM_TYPES
+
+
+def move_atomically(source_path: Path, destination_path: Path):
+    """Move a file or folder so the destination never holds a partial file.
+    Across filesystems, each file is copied next to its destination under a temporary name, then renamed into place.
+    """
+    if source_path.is_dir():
+        destination_path.mkdir(parents=True, exist_ok=True)
+        for child_path in source_path.iterdir():
+            move_atomically(child_path, destination_path / child_path.name)
+        source_path.rmdir()
+        return
+
+    try:
+        os.replace(source_path, destination_path)
+        return
+    except OSError:
+        # renames fail across filesystems
+        pass
+
+    partial_path = destination_path.with_name(
+        destination_path.name + PARTIAL_MOVE_SUFFIX
+    )
+    try:
+        shutil.copyfile(source_path, partial_path)
+        os.replace(partial_path, destination_path)
+    except BaseException:
+        partial_path.unlink(missing_ok=True)
+        raise
+    source_path.unlink()
+
+
+class LocalStagingArea:
+    """A local scratch folder that network-stored videos are copied into before processing, and outputs are written to before being moved to their destination.
+    Each source is copied with one sequential read, so the stages that read it (probing, extraction, trimming and the frame count checks)
+    read the local copy instead of each going over the network. Sources are only staged while they fit in the size limit.
+    """
+
+    def __init__(
+        self,
+        scratch_folder_path: Optional[Union[str, Path]] = None,
+        max_scratch_bytes: Optional[int] = None,
+    ):
+        if scratch_folder_path is not None:
+            Path(scratch_folder_path).mkdir(parents=True, exist_ok=True)
+        self.temporary_directory = tempfile.TemporaryDirectory(
+            prefix="skelly_synchronize_staging_",
+            dir=None if scratch_folder_path is None else str(scratch_folder_path),
+        )
+        self.scratch_folder_path = Path(self.temporary_directory.name)
+
+        if max_scratch_bytes is None:
+            max_scratch_bytes = int(
+                shutil.disk_usage(self.scratch_folder_path).free
+                * DEFAULT_SCRATCH_FREE_SPACE_FRACTION
+            )
+        self.max_scratch_bytes = max_scratch_bytes
+        self.staged_bytes = 0
+
+    def __enter__(self) -> "LocalStagingArea":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.temporary_directory.cleanup()
+
+    def stage_file(self, source_path: Path, staged_path: Path) -> bool:
+        """Copy the source to the staged path if it fits in the size limit, returning whether it was staged"""
+        file_size = source_path.stat().st_size
+        if self.staged_bytes + file_size > self.max_scratch_bytes:
+            logger.warning(
+                f"Not staging {source_path}, it would exceed the scratch size limit of {self.max_scratch_bytes} bytes"
+            )
+            return False
+
+        logger.info(f"Staging {source_path} to {staged_path}")
+        shutil.copyfile(source_path, staged_path)
+        self.staged_bytes += file_size
+        return True
+
+    def stage_video_folder(self, video_folder_path: Path) -> Path:
+        """Return a local folder holding the folder's videos, with videos that don't fit the size limit linked to their source instead"""
+        staged_folder_path = (
+            self.scratch_folder_path / "inputs" / video_folder_path.name
+        )
+        staged_folder_path.mkdir(parents=True)
+
+        for video_path in get_video_file_list(folder_path=video_folder_path):
+            staged_path = staged_folder_path / video_path.name
+            if not self.stage_file(source_path=video_path, staged_path=staged_path):
+                os.symlink(video_path.absolute(), staged_path)
+
+        return staged_folder_path
+
+    def create_output_folder(self, name: str) -> Path:
+        output_folder_path = self.scratch_folder_path / "outputs" / name
+        output_folder_path.mkdir(parents=True)
+        return output_folder_path
+
+
+def find_staging_need(staging_mode: str, folder_path: Path) -> bool:
+    if staging_mode not in STAGING_MODES:
+        raise ValueError(f"staging_mode must be one of {STAGING_MODES}")
+    if staging_mode == "auto":
+        return is_network_path(folder_path)
+    return staging_mode == "always"
+
+
+@contextlib.contextmanager
+def stage_synchronization_folders(
+    raw_video_folder_path: Path,
+    synchronized_video_folder_path: Optional[Path] = None,
+    staging_mode: str = "auto",
+    scratch_folder_path: Optional[Union[str, Path]] = None,
+    max_scratch_bytes: Optional[int] = None,
+) -> Iterator[tuple]:
+    """Yield the raw video folder and synchronized video folder a synchronization should use, staged locally if they are on network storage.
+    A staged raw video folder holds local copies of the raw videos, and the outputs written next to them are moved back once the synchronization finishes.
+    A staged synchronized video folder is written locally, then moved to its destination once the synchronization finishes.
+    Moves are atomic per file, and nothing is moved if the synchronization fails, so the destinations are never left with partial outputs.
+    """
+    raw_video_folder_path = Path(raw_video_folder_path)
+    if synchronized_video_folder_path is None:
+        synchronized_video_folder_path = (
+            raw_video_folder_path.parent / SYNCHRONIZED_VIDEOS_FOLDER_NAME
+        )
+    synchronized_video_folder_path = Path(synchronized_video_folder_path)
+
+    stage_inputs = find_staging_need(staging_mode, raw_video_folder_path)
+    stage_outputs = find_staging_need(staging_mode, synchronized_video_folder_path)
+    if not stage_inputs and not stage_outputs:
+        yield raw_video_folder_path, synchronized_video_folder_path
+        return
+
+    with LocalStagingArea(
+        scratch_folder_path=scratch_folder_path, max_scratch_bytes=max_scratch_bytes
+    ) as staging_area:
+        staged_raw_video_folder_path = raw_video_folder_path
+        staged_input_names = set()
+        if stage_inputs:
+            staged_raw_video_folder_path = staging_area.stage_video_folder(
+                raw_video_folder_path
+            )
+            staged_input_names = {
+                path.name for path in staged_raw_video_folder_path.iterdir()
+            }
+
+        staged_synchronized_video_folder_path = synchronized_video_folder_path
+        if stage_outputs:
+            staged_synchronized_video_folder_path = staging_area.create_output_folder(
+                synchronized_video_folder_path.name
+            )
+
+        yield staged_raw_video_folder_path, staged_synchronized_video_folder_path
+
+        if stage_outputs:
+            # debug plots rendering in the background save to the staged folder, so they must finish before it is moved
+            wait_for_background_debug_plots(staged_synchronized_video_folder_path)
+            logger.info(
+                f"Moving synchronized outputs to {synchronized_video_folder_path}"
+            )
+            move_atomically(
+                staged_synchronized_video_folder_path, synchronized_video_folder_path
+            )
+        if stage_inputs:
+            for output_path in staged_raw_video_folder_path.iterdir():
+                if output_path.name not in staged_input_names:
+                    move_atomically(
+                        output_path, raw_video_folder_path / output_path.name
+                    )
+
+
+def synchronize_with_local_staging(
+    synchronize_function: Callable,
+    raw_video_folder_path: Path,
+    synchronized_video_folder_path: Optional[Path] = None,
+    staging_mode: str = "auto",
+    scratch_folder_path: Optional[Union[str, Path]] = None,
+    max_scratch_bytes: Optional[int] = None,
+    **synchronize_kwargs,
+) -> Union[SyncResult, Path]:
+    """Run a synchronization function on locally staged folders, see `stage_synchronization_folders`.
+    The staging mode is "auto" to stage the folders that are on network storage, "always", or "never".
+
+    Returns the synchronization function's SyncResult with its raw videos and outputs at their destination,
+    or the folder path of the synchronized video folder if the function doesn't return a SyncResult.
+    """
+    report_progress(synchronize_kwargs.get("progress_reporter"), "staging")
+    with stage_synchronization_folders(
+        raw_video_folder_path=raw_video_folder_path,
+        synchronized_video_folder_path=synchronized_video_folder_path,
+        staging_mode=staging_mode,
+        scratch_folder_path=scratch_folder_path,
+        max_scratch_bytes=max_scratch_bytes,
+    ) as (staged_raw_video_folder_path, staged_synchronized_video_folder_path):
+        sync_result = synchronize_function(
+            raw_video_folder_path=staged_raw_video_folder_path,
+            synchronized_video_folder_path=staged_synchronized_video_folder_path,
+            **synchronize_kwargs,
+        )
+
+    if synchronized_video_folder_path is None:
+        synchronized_video_folder_path = (
+            Path(raw_video_folder_path).parent / SYNCHRONIZED_VIDEOS_FOLDER_NAME
+        )
+    if not isinstance(sync_result, SyncResult):
+        return Path(synchronized_video_folder_path)
+
+    moved_sync_result = sync_result.move_to(
+        synchronized_video_folder_path,
+        raw_video_folder_paths={
+            staged_raw_video_folder_path: Path(raw_video_folder_path)
+        },
+    )
+    if moved_sync_result != sync_result:
+        # the manifest was written with the staged paths
+        save_sync_manifest(moved_sync_result)
+    return moved_sync_result
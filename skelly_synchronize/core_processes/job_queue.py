@@ -0,0 +1,768 @@
+import abc
+import contextlib
+import logging
+import multiprocessing
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from skelly_synchronize.system.cpu_budget import configure_cpu_budget, get_max_cpu
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ["pending", "running", "succeeded", "failed", "cancelled"]
+FINISHED_JOB_STATUSES = ["succeeded", "failed", "cancelled"]
+
+DEFAULT_LEASE_SECONDS = 60.0
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+# a DirectoryJobQueue keeps each job's payload in this folder, next to a folder of job markers for each status
+PAYLOADS_FOLDER_NAME = "payloads"
+PARTIAL_PAYLOAD_SUFFIX = ".partial"
+MARKER_NAME_SEPARATOR = "_"
+# passes over the markers of jobs being cancelled, each catching the markers that heartbeats renamed during the last
+MAX_CANCEL_PASSES = 10
+# queue paths with these extensions are SQLite databases, any other path is a DirectoryJobQueue folder
+SQLITE_QUEUE_EXTENSIONS = [".sqlite", ".sqlite3", ".db"]
+
+
+class JobFailedError(RuntimeError):
+    """Raised by a JobQueuePool when a job failed on every attempt, with the worker's traceback in the message"""
+
+
+class JobQueueBackend(abc.ABC):
+    """Where jobs wait for workers, and where their results wait for the coordinator.
+    Jobs are pickled (function, args, kwargs) payloads. A worker claims a job for a lease, renews the lease with heartbeats while it runs,
+    and completes or fails it. A job whose lease runs out is claimed again by another worker, so jobs from crashed workers are retried,
+    and a job is failed for good once it has been attempted max attempts times.
+    """
+
+    @abc.abstractmethod
+    def submit(self, payloads: List[bytes]) -> List[str]:
+        """Add jobs to the queue, returning their ids"""
+
+    @abc.abstractmethod
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[tuple]:
+        """Atomically claim the oldest waiting job, returning its id and payload, or None if there's nothing to run"""
+
+    @abc.abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Extend a running job's lease, returning False if the worker no longer holds it"""
+
+    @abc.abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: bytes) -> bool:
+        """Save a job's pickled result, returning False if the worker no longer holds it"""
+
+    @abc.abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        """Record a failed attempt, putting the job back in the queue if it has attempts left"""
+
+    @abc.abstractmethod
+    def cancel(self, job_ids: List[str]):
+        """Stop unfinished jobs from being claimed, and their results from being saved"""
+
+    @abc.abstractmethod
+    def get_jobs(self, job_ids: List[str]) -> Dict[str, dict]:
+        """Return the "status", "result" and "error" of each job, keyed by job id"""
+
+    @abc.abstractmethod
+    def remove(self, job_ids: List[str]):
+        """Remove jobs from the queue once their results are gathered"""
+
+    @abc.abstractmethod
+    def count_jobs(self) -> Dict[str, int]:
+        """Return the number of jobs with each status"""
+
+
+class SQLiteJobQueue(JobQueueBackend):
+    """A job queue in a SQLite database, for worker processes on the machine the database is on.
+    Claims run in an immediate transaction, so two workers never claim the same job, but only while SQLite's file locks work,
+    which they don't reliably on network filesystems. Keep the database on a local disk, and use a DirectoryJobQueue for workers on several machines.
+
+    Payloads are pickled, so only share the database with workers you trust.
+    """
+
+    def __init__(
+        self,
+        database_path: Union[str, Path],
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        busy_timeout: float = 60.0,
+    ):
+        if max_attempts < 1:
+            raise ValueError(f"max_attempts must be at least 1, got {max_attempts}")
+        self.database_path = Path(database_path)
+        self.max_attempts = max_attempts
+        self.busy_timeout = busy_timeout
+
+        self.database_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    result BLOB,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    worker_id TEXT,
+                    lease_expires REAL,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+                """)
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created)"
+            )
+
+    def __repr__(self) -> str:
+        return f"SQLiteJobQueue({str(self.database_path)!r})"
+
+    @contextlib.contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection for one operation, so the queue can be used from any thread or process.
+        The connection is in autocommit mode, and writes that need several statements start their own transaction.
+        """
+        connection = sqlite3.connect(
+            self.database_path, timeout=self.busy_timeout, isolation_level=None
+        )
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def submit(self, payloads: List[bytes]) -> List[str]:
+        now = time.time()
+        job_ids = [uuid.uuid4().hex for _ in payloads]
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT INTO jobs (job_id, status, payload, max_attempts, created, updated) "
+                "VALUES (?, 'pending', ?, ?, ?, ?)",
+                [
+                    (job_id, payload, self.max_attempts, now + index * 1e-6, now)
+                    for index, (job_id, payload) in enumerate(zip(job_ids, payloads))
+                ],
+            )
+            connection.execute("COMMIT")
+        return job_ids
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[tuple]:
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                job = self.claim_in_transaction(connection, worker_id, lease_seconds)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return job
+
+    def claim_in_transaction(
+        self, connection: sqlite3.Connection, worker_id: str, lease_seconds: float
+    ) -> Optional[tuple]:
+        now = time.time()
+        while True:
+            row = connection.execute(
+                "SELECT job_id, payload, status, attempts, max_attempts FROM jobs "
+                "WHERE status = 'pending' OR (status = 'running' AND lease_expires < ?) "
+                "ORDER BY created LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            job_id, payload, status, attempts, max_attempts = row
+            if status == "running" and attempts >= max_attempts:
+                # the worker running the last attempt stopped heartbeating, likely because it crashed
+                connection.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE job_id = ?",
+                    (
+                        f"Worker stopped heartbeating on the last of {max_attempts} attempts",
+                        now,
+                        job_id,
+                    ),
+                )
+                continue
+
+            connection.execute(
+                "UPDATE jobs SET status = 'running', worker_id = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated = ? WHERE job_id = ?",
+                (worker_id, now + lease_seconds, now, job_id),
+            )
+            return job_id, payload
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        now = time.time()
+        with self.connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? "
+                "WHERE job_id = ? AND worker_id = ? AND status = 'running'",
+                (now + lease_seconds, now, job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: bytes) -> bool:
+        with self.connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = 'succeeded', result = ?, lease_expires = NULL, updated = ? "
+                "WHERE job_id = ? AND worker_id = ? AND status = 'running'",
+                (result, time.time(), job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        with self.connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET "
+                "status = CASE WHEN attempts < max_attempts THEN 'pending' ELSE 'failed' END, "
+                "error = ?, worker_id = NULL, lease_expires = NULL, updated = ? "
+                "WHERE job_id = ? AND worker_id = ? AND status = 'running'",
+                (error, time.time(), job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def cancel(self, job_ids: List[str]):
+        with self.connect() as connection:
+            connection.executemany(
+                "UPDATE jobs SET status = 'cancelled', lease_expires = NULL, updated = ? "
+                "WHERE job_id = ? AND status IN ('pending', 'running')",
+                [(time.time(), job_id) for job_id in job_ids],
+            )
+
+    def get_jobs(self, job_ids: List[str]) -> Dict[str, dict]:
+        jobs = {}
+        with self.connect() as connection:
+            for job_id in job_ids:
+                row = connection.execute(
+                    "SELECT status, result, error FROM jobs WHERE job_id = ?",
+                    (job_id,),
+                ).fetchone()
+                if row is not None:
+                    jobs[job_id] = {"status": row[0], "result": row[1], "error": row[2]}
+        return jobs
+
+    def remove(self, job_ids: List[str]):
+        with self.connect() as connection:
+            connection.executemany(
+                "DELETE FROM jobs WHERE job_id = ?", [(job_id,) for job_id in job_ids]
+            )
+
+    def count_jobs(self) -> Dict[str, int]:
+        with self.connect() as connection:
+            rows = connection.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        job_counts = {status: 0 for status in JOB_STATUSES}
+        job_counts.update(dict(rows))
+        return job_counts
+
+
+class DirectoryJobQueue(JobQueueBackend):
+    """A job queue in a folder, for workers on several machines sharing it over a network filesystem like NFS or SMB.
+    Each job has one marker file, and every change of its state renames the marker between the pending, running and finished folders.
+    A rename succeeds for only one of the workers racing on the same marker, so claims are atomic without relying on file locks.
+    The lease is part of a running marker's name, so heartbeats are renames too, and a worker whose marker was taken knows it lost the job.
+    Results and errors are written into the marker before it is renamed into the succeeded or failed folder.
+    Leases are compared with each machine's clock, so the machines' clocks should be synchronized.
+
+    Payloads are pickled, so only share the folder with workers you trust.
+    """
+
+    def __init__(
+        self,
+        queue_folder_path: Union[str, Path],
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ):
+        if max_attempts < 1:
+            raise ValueError(f"max_attempts must be at least 1, got {max_attempts}")
+        self.queue_folder_path = Path(queue_folder_path)
+        self.max_attempts = max_attempts
+        for folder_name in [PAYLOADS_FOLDER_NAME, *JOB_STATUSES]:
+            (self.queue_folder_path / folder_name).mkdir(parents=True, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return f"DirectoryJobQueue({str(self.queue_folder_path)!r})"
+
+    def get_folder_path(self, folder_name: str) -> Path:
+        return self.queue_folder_path / folder_name
+
+    def list_markers(self, status: str) -> List[Tuple[str, dict]]:
+        """Return the names of the markers in a pending or running folder with their parsed fields, oldest job first"""
+        markers = []
+        for marker_name in os.listdir(self.get_folder_path(status)):
+            try:
+                markers.append((marker_name, parse_marker_name(marker_name)))
+            except ValueError:
+                logger.warning(f"Ignoring unexpected file {marker_name} in {self}")
+        return sorted(markers, key=lambda marker: marker[1]["created"])
+
+    def find_running_marker(self, job_id: str, worker_id: str) -> Optional[str]:
+        for marker_name, marker in self.list_markers("running"):
+            if marker["job id"] == job_id and marker["worker id"] == worker_id:
+                return marker_name
+        return None
+
+    def submit(self, payloads: List[bytes]) -> List[str]:
+        job_ids = []
+        created = time.time_ns()
+        for index, payload in enumerate(payloads):
+            job_id = uuid.uuid4().hex
+            payload_path = self.get_folder_path(PAYLOADS_FOLDER_NAME) / job_id
+            partial_payload_path = payload_path.with_name(
+                job_id + PARTIAL_PAYLOAD_SUFFIX
+            )
+            partial_payload_path.write_bytes(payload)
+            os.replace(partial_payload_path, payload_path)
+            # the marker is created once the payload is complete, so workers never claim a job they can't read
+            marker_name = create_marker_name(
+                created=created + index,
+                job_id=job_id,
+                attempts=0,
+                max_attempts=self.max_attempts,
+            )
+            (self.get_folder_path("pending") / marker_name).touch(exist_ok=False)
+            job_ids.append(job_id)
+        return job_ids
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[tuple]:
+        now = time.time()
+        candidates = [
+            ("pending", marker_name, marker)
+            for marker_name, marker in self.list_markers("pending")
+        ] + [
+            ("running", marker_name, marker)
+            for marker_name, marker in self.list_markers("running")
+            if marker["lease expires"] < now
+        ]
+        for status, marker_name, marker in sorted(
+            candidates, key=lambda candidate: candidate[2]["created"]
+        ):
+            marker_path = self.get_folder_path(status) / marker_name
+            if status == "running" and marker["attempts"] >= marker["max attempts"]:
+                # the worker running the last attempt stopped heartbeating, likely because it crashed
+                move_marker(
+                    marker_path,
+                    self.get_folder_path("failed") / marker["job id"],
+                    content=f"Worker stopped heartbeating on the last of {marker['max attempts']} attempts".encode(),
+                )
+                continue
+
+            claimed_marker_path = self.get_folder_path("running") / create_marker_name(
+                created=marker["created"],
+                job_id=marker["job id"],
+                attempts=marker["attempts"] + 1,
+                max_attempts=marker["max attempts"],
+                lease_expires=now + lease_seconds,
+                worker_id=worker_id,
+            )
+            if not move_marker(marker_path, claimed_marker_path):
+                # another worker claimed it first
+                continue
+            try:
+                payload = (
+                    self.get_folder_path(PAYLOADS_FOLDER_NAME) / marker["job id"]
+                ).read_bytes()
+            except FileNotFoundError:
+                # the job was removed while it was being claimed
+                claimed_marker_path.unlink(missing_ok=True)
+                continue
+            return marker["job id"], payload
+        return None
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        marker_name = self.find_running_marker(job_id, worker_id)
+        if marker_name is None:
+            return False
+        marker = parse_marker_name(marker_name)
+        return move_marker(
+            self.get_folder_path("running") / marker_name,
+            self.get_folder_path("running")
+            / create_marker_name(
+                created=marker["created"],
+                job_id=job_id,
+                attempts=marker["attempts"],
+                max_attempts=marker["max attempts"],
+                lease_expires=time.time() + lease_seconds,
+                worker_id=worker_id,
+            ),
+        )
+
+    def complete(self, job_id: str, worker_id: str, result: bytes) -> bool:
+        marker_name = self.find_running_marker(job_id, worker_id)
+        if marker_name is None:
+            return False
+        return move_marker(
+            self.get_folder_path("running") / marker_name,
+            self.get_folder_path("succeeded") / job_id,
+            content=result,
+        )
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        marker_name = self.find_running_marker(job_id, worker_id)
+        if marker_name is None:
+            return False
+        marker = parse_marker_name(marker_name)
+        marker_path = self.get_folder_path("running") / marker_name
+        if marker["attempts"] < marker["max attempts"]:
+            return move_marker(
+                marker_path,
+                self.get_folder_path("pending")
+                / create_marker_name(
+                    created=marker["created"],
+                    job_id=job_id,
+                    attempts=marker["attempts"],
+                    max_attempts=marker["max attempts"],
+                ),
+            )
+        return move_marker(
+            marker_path, self.get_folder_path("failed") / job_id, content=error.encode()
+        )
+
+    def cancel(self, job_ids: List[str]):
+        cancelled_job_ids = set(job_ids)
+        # markers renamed by a heartbeat while they are being moved are found again on the next pass
+        for _ in range(MAX_CANCEL_PASSES):
+            unfinished_markers = [
+                (status, marker_name, marker["job id"])
+                for status in ["pending", "running"]
+                for marker_name, marker in self.list_markers(status)
+                if marker["job id"] in cancelled_job_ids
+            ]
+            if not unfinished_markers:
+                return
+            for status, marker_name, job_id in unfinished_markers:
+                move_marker(
+                    self.get_folder_path(status) / marker_name,
+                    self.get_folder_path("cancelled") / job_id,
+                )
+        logger.warning(f"Some jobs in {self} could not be cancelled")
+
+    def get_jobs(self, job_ids: List[str]) -> Dict[str, dict]:
+        running_job_ids = {
+            marker["job id"] for _, marker in self.list_markers("running")
+        }
+        jobs = {}
+        for job_id in job_ids:
+            if not (self.get_folder_path(PAYLOADS_FOLDER_NAME) / job_id).is_file():
+                continue
+            job = {
+                "status": "running" if job_id in running_job_ids else "pending",
+                "result": None,
+                "error": None,
+            }
+            for status in FINISHED_JOB_STATUSES:
+                try:
+                    content = (self.get_folder_path(status) / job_id).read_bytes()
+                except FileNotFoundError:
+                    continue
+                job["status"] = status
+                if status == "succeeded":
+                    job["result"] = content
+                else:
+                    job["error"] = content.decode(errors="replace") or None
+            jobs[job_id] = job
+        return jobs
+
+    def remove(self, job_ids: List[str]):
+        removed_job_ids = set(job_ids)
+        for job_id in job_ids:
+            for folder_name in [PAYLOADS_FOLDER_NAME, *FINISHED_JOB_STATUSES]:
+                (self.get_folder_path(folder_name) / job_id).unlink(missing_ok=True)
+        for status in ["pending", "running"]:
+            for marker_name, marker in self.list_markers(status):
+                if marker["job id"] in removed_job_ids:
+                    (self.get_folder_path(status) / marker_name).unlink(missing_ok=True)
+
+    def count_jobs(self) -> Dict[str, int]:
+        return {
+            status: len(os.listdir(self.get_folder_path(status)))
+            for status in JOB_STATUSES
+        }
+
+
+def create_marker_name(
+    created: int,
+    job_id: str,
+    attempts: int,
+    max_attempts: int,
+    lease_expires: Optional[float] = None,
+    worker_id: Optional[str] = None,
+) -> str:
+    """Name a job's marker with its creation time in nanoseconds, its id and attempts, and for running jobs,
+    the time its lease expires in milliseconds and the worker holding it. The worker id is last, so it may contain the separator.
+    """
+    fields = [f"{created:020d}", job_id, str(attempts), str(max_attempts)]
+    if worker_id is not None:
+        fields += [str(int(lease_expires * 1000)), worker_id]
+    return MARKER_NAME_SEPARATOR.join(fields)
+
+
+def parse_marker_name(marker_name: str) -> dict:
+    """Return the fields `create_marker_name` put in a marker's name, raising ValueError for other names"""
+    fields = marker_name.split(MARKER_NAME_SEPARATOR, 5)
+    if len(fields) not in (4, 6):
+        raise ValueError(f"{marker_name} is not a job marker")
+    marker = {
+        "created": int(fields[0]),
+        "job id": fields[1],
+        "attempts": int(fields[2]),
+        "max attempts": int(fields[3]),
+        "lease expires": None,
+        "worker id": None,
+    }
+    if len(fields) == 6:
+        marker["lease expires"] = int(fields[4]) / 1000
+        marker["worker id"] = fields[5]
+    return marker
+
+
+def move_marker(
+    marker_path: Path, destination_path: Path, content: Optional[bytes] = None
+) -> bool:
+    """Rename a job's marker, after writing the content into it if given.
+    Returns False if the marker is gone, because another worker renamed it first.
+    """
+    if content is not None:
+        try:
+            # the marker isn't created if it is gone, so a stray marker is never left behind
+            file_descriptor = os.open(
+                marker_path, os.O_WRONLY | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+            )
+        except FileNotFoundError:
+            return False
+        with os.fdopen(file_descriptor, "wb") as marker_file:
+            marker_file.write(content)
+
+    try:
+        os.rename(marker_path, destination_path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def create_job_queue(
+    queue_path: Union[str, Path], max_attempts: int = DEFAULT_MAX_ATTEMPTS
+) -> JobQueueBackend:
+    """Open the job queue at a path: a SQLiteJobQueue for a path ending in one of SQLITE_QUEUE_EXTENSIONS, which must be on a local disk,
+    or a DirectoryJobQueue folder, which can be on a filesystem shared between machines.
+    """
+    if Path(queue_path).suffix.lower() in SQLITE_QUEUE_EXTENSIONS:
+        return SQLiteJobQueue(database_path=queue_path, max_attempts=max_attempts)
+    return DirectoryJobQueue(queue_folder_path=queue_path, max_attempts=max_attempts)
+
+
+def run_pickled_job(payload: bytes):
+    function, args, kwargs = pickle.loads(payload)
+    return function(*args, **kwargs)
+
+
+class JobQueuePool:
+    """Runs work on the workers of a job queue, with the same `map`, `starmap` and `apply` methods as a multiprocessing Pool,
+    so it can be passed as the pool of the pipeline functions or of `synchronize_sessions`.
+    Each call submits one job per item and waits for the workers started with `run_job_worker`, which can be on other machines.
+    Functions and arguments are pickled, so they must be importable by the workers, and any paths in them must be the same for the workers,
+    like paths on a shared filesystem.
+
+    If a job fails on every attempt, JobFailedError is raised with the worker's traceback, and the call's unfinished jobs are cancelled.
+    If timeout is given, the call's unfinished jobs are cancelled and TimeoutError raised after waiting that many seconds.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueueBackend,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        timeout: Optional[float] = None,
+    ):
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def map(self, function: Callable, iterable: Iterable) -> list:
+        return self.starmap(function, ((item,) for item in iterable))
+
+    def starmap(self, function: Callable, iterable: Iterable) -> list:
+        return self.run_jobs(
+            [(function, tuple(arguments), {}) for arguments in iterable]
+        )
+
+    def apply(self, function: Callable, args: tuple = (), kwds: Optional[dict] = None):
+        return self.run_jobs([(function, tuple(args), dict(kwds or {}))])[0]
+
+    def run_jobs(self, jobs: List[tuple]) -> list:
+        if len(jobs) == 0:
+            return []
+
+        job_ids = self.queue.submit([pickle.dumps(job) for job in jobs])
+        logger.debug(f"Submitted {len(job_ids)} jobs to {self.queue}")
+        try:
+            results = self.wait_for_results(job_ids)
+        except BaseException:
+            self.queue.cancel(job_ids)
+            raise
+        finally:
+            self.queue.remove(job_ids)
+        return [results[job_id] for job_id in job_ids]
+
+    def wait_for_results(self, job_ids: List[str]) -> dict:
+        results = {}
+        start_time = time.monotonic()
+        while True:
+            unfinished_job_ids = [job_id for job_id in job_ids if job_id not in results]
+            jobs = self.queue.get_jobs(unfinished_job_ids)
+            if len(jobs) < len(unfinished_job_ids):
+                raise JobFailedError(
+                    f"{len(unfinished_job_ids) - len(jobs)} jobs were removed from {self.queue} before finishing"
+                )
+            for job_id, job in jobs.items():
+                if job["status"] == "succeeded":
+                    results[job_id] = pickle.loads(job["result"])
+                elif job["status"] in FINISHED_JOB_STATUSES:
+                    raise JobFailedError(
+                        f"Job {job_id} {job['status']}: {job['error'] or 'no error recorded'}"
+                    )
+            if len(results) == len(job_ids):
+                return results
+
+            if (
+                self.timeout is not None
+                and time.monotonic() - start_time > self.timeout
+            ):
+                raise TimeoutError(
+                    f"{len(job_ids) - len(results)} of {len(job_ids)} jobs didn't finish within {self.timeout} seconds, check that workers are running"
+                )
+            time.sleep(self.poll_interval)
+
+
+def create_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def keep_job_leased(
+    queue: JobQueueBackend,
+    job_id: str,
+    worker_id: str,
+    lease_seconds: float,
+    stop_event: threading.Event,
+):
+    """Heartbeat a running job a few times per lease, until the stop event is set"""
+    while not stop_event.wait(lease_seconds / 3):
+        if not queue.heartbeat(job_id, worker_id, lease_seconds):
+            logger.warning(
+                f"Lost the lease on job {job_id}, it was cancelled or claimed by another worker"
+            )
+            return
+
+
+def run_claimed_job(
+    queue: JobQueueBackend,
+    job_id: str,
+    payload: bytes,
+    worker_id: str,
+    lease_seconds: float,
+) -> bool:
+    """Run a claimed job while heartbeating its lease, and save its result or error. Returns True if the job succeeded."""
+    stop_event = threading.Event()
+    heartbeat_thread = threading.Thread(
+        target=keep_job_leased,
+        args=(queue, job_id, worker_id, lease_seconds, stop_event),
+        name=f"job-heartbeat-{job_id[:8]}",
+        daemon=True,
+    )
+    heartbeat_thread.start()
+    try:
+        result = pickle.dumps(run_pickled_job(payload))
+    except Exception:
+        logger.error(f"Job {job_id} failed", exc_info=True)
+        queue.fail(job_id, worker_id, traceback.format_exc())
+        return False
+    finally:
+        stop_event.set()
+        heartbeat_thread.join()
+
+    if not queue.complete(job_id, worker_id, result):
+        logger.warning(
+            f"Discarding the result of job {job_id}, it was cancelled or claimed by another worker"
+        )
+    return True
+
+
+def run_job_worker(
+    queue: JobQueueBackend,
+    worker_id: Optional[str] = None,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    max_jobs: Optional[int] = None,
+    idle_timeout: Optional[float] = None,
+    stop_event: Optional[threading.Event] = None,
+) -> int:
+    """Claim and run jobs from the queue one at a time, until max_jobs have run, the queue has been empty for idle_timeout seconds,
+    or the stop event is set. Runs until interrupted if none of them are given.
+    The job's lease is renewed while it runs, so lease_seconds only needs to cover a few missed heartbeats, not the length of a job.
+
+    Returns the number of jobs run.
+    """
+    worker_id = worker_id or create_worker_id()
+    logger.info(f"Worker {worker_id} waiting for jobs from {queue}")
+
+    jobs_run = 0
+    idle_since = time.monotonic()
+    while max_jobs is None or jobs_run < max_jobs:
+        if stop_event is not None and stop_event.is_set():
+            break
+
+        job = queue.claim(worker_id, lease_seconds)
+        if job is None:
+            if (
+                idle_timeout is not None
+                and time.monotonic() - idle_since > idle_timeout
+            ):
+                break
+            time.sleep(poll_interval)
+            continue
+
+        job_id, payload = job
+        logger.info(f"Worker {worker_id} running job {job_id}")
+        run_claimed_job(queue, job_id, payload, worker_id, lease_seconds)
+        jobs_run += 1
+        idle_since = time.monotonic()
+
+    logger.info(f"Worker {worker_id} stopping after {jobs_run} jobs")
+    return jobs_run
+
+
+def run_job_worker_process(
+    max_cpu: Optional[int], worker_count: int, queue: JobQueueBackend, **kwargs
+) -> int:
+    configure_cpu_budget(max_cpu, worker_count)
+    return run_job_worker(queue, **kwargs)
+
+
+def run_job_workers(queue: JobQueueBackend, worker_count: int = 1, **kwargs) -> int:
+    """Run worker_count workers on this machine with `run_job_worker`, dividing the CPU budget between them,
+    and wait for them to stop. Keyword arguments are passed to each worker.
+
+    Returns the number of jobs run.
+    """
+    if worker_count <= 1:
+        configure_cpu_budget(get_max_cpu(), 1)
+        return run_job_worker(queue, **kwargs)
+
+    with multiprocessing.Pool(processes=worker_count) as pool:
+        job_counts = [
+            pool.apply_async(
+                run_job_worker_process,
+                args=(get_max_cpu(), worker_count, queue),
+                kwds=kwargs,
+            )
+            for _ in range(worker_count)
+        ]
+        return sum(job_count.get() for job_count in job_counts)
@@ -0,0 +1,195 @@
+import logging
+from functools import partial
+from multiprocessing.pool import Pool
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from skelly_synchronize.core_processes.correlation_functions import (
+    estimate_lags_brightness_correlation,
+    normalize_lag_dictionary,
+)
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    StageInstrumentation,
+    measure_stage,
+)
+from skelly_synchronize.core_processes.synchronization_progress import (
+    ProgressReporter,
+)
+from skelly_synchronize.core_processes.video_functions.analysis_pass import (
+    run_analysis_pass,
+)
+
+logger = logging.getLogger(__name__)
+
+# confidence below which an audio lag is checked against the brightness of the videos
+DEFAULT_BRIGHTNESS_FALLBACK_CONFIDENCE = 0.2
+# confidences are floored at this when turned into uncertainties, so a zero confidence gives a large but finite uncertainty
+MINIMUM_FUSION_CONFIDENCE = 1e-3
+
+
+def find_lag_uncertainty(confidence: float, resolution: float) -> float:
+    """Turn a lag estimate's confidence into an uncertainty in seconds, its resolution divided by its confidence,
+    so a sharp peak is trusted to within a sample and an ambiguous one much less.
+    """
+    return resolution / max(confidence, MINIMUM_FUSION_CONFIDENCE)
+
+
+def fuse_lag_estimates(
+    audio_lag: float,
+    audio_confidence: float,
+    audio_resolution: float,
+    brightness_lag: float,
+    brightness_confidence: float,
+    brightness_resolution: float,
+) -> Tuple[float, float]:
+    """Combine an audio and a brightness estimate of the same lag, given in seconds with their confidences and resolutions.
+    If the estimates agree within their combined uncertainty, or a brightness frame, they are averaged weighted by inverse variance,
+    and since both found the same alignment the confidence is raised to the chance that at least one of them is right.
+    If they disagree, one of them locked onto the wrong peak, so the one with the higher confidence is kept as it is.
+
+    Returns the fused lag and its confidence.
+    """
+    audio_uncertainty = find_lag_uncertainty(audio_confidence, audio_resolution)
+    brightness_uncertainty = find_lag_uncertainty(
+        brightness_confidence, brightness_resolution
+    )
+    combined_uncertainty = np.hypot(audio_uncertainty, brightness_uncertainty)
+
+    if abs(audio_lag - brightness_lag) > max(
+        combined_uncertainty, brightness_resolution
+    ):
+        if brightness_confidence > audio_confidence:
+            return brightness_lag, brightness_confidence
+        return audio_lag, audio_confidence
+
+    audio_weight = audio_uncertainty**-2
+    brightness_weight = brightness_uncertainty**-2
+    fused_lag = (audio_weight * audio_lag + brightness_weight * brightness_lag) / (
+        audio_weight + brightness_weight
+    )
+    fused_confidence = 1 - (1 - audio_confidence) * (1 - brightness_confidence)
+
+    return float(fused_lag), float(fused_confidence)
+
+
+def find_low_confidence_cameras(
+    confidence_dict: Dict[str, float], minimum_confidence: float
+) -> List[str]:
+    return [
+        camera_name
+        for camera_name, confidence in confidence_dict.items()
+        if confidence < minimum_confidence
+    ]
+
+
+def measure_brightness(
+    video_pathstring: str,
+    duration: Optional[float] = None,
+    instrumentation: Optional[StageInstrumentation] = None,
+    progress_reporter: Optional[ProgressReporter] = None,
+) -> np.ndarray:
+    """Find the mean brightness of every frame in the first duration seconds of a video, or all of it if duration is None.
+    Unlike `find_brightness_across_frames`, the brightness isn't saved, since it may only cover the start of the video.
+    """
+    if progress_reporter is not None:
+        progress_reporter.check_cancelled()
+
+    with measure_stage(instrumentation, "extraction", Path(video_pathstring).stem):
+        return run_analysis_pass(
+            video_pathstring=video_pathstring,
+            outputs=("brightness",),
+            duration=duration,
+        )["brightness"]
+
+
+def fuse_brightness_lags(
+    lag_dict: Dict[str, float],
+    confidence_dict: Dict[str, float],
+    video_info_dict: dict,
+    reference_camera_name: str,
+    frame_rate: float,
+    audio_resolution: float,
+    minimum_confidence: float = DEFAULT_BRIGHTNESS_FALLBACK_CONFIDENCE,
+    brightness_duration: Optional[float] = None,
+    pool: Optional[Pool] = None,
+    instrumentation: Optional[StageInstrumentation] = None,
+    progress_reporter: Optional[ProgressReporter] = None,
+) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Check the audio lags of cameras whose confidence is below the minimum confidence against the brightness of their videos.
+    Only the low confidence cameras and the reference camera are decoded, reading the first brightness duration seconds of each
+    if a duration is given, and their brightness changes are correlated with `estimate_lags_brightness_correlation`.
+    Each camera's audio and brightness lags are then combined with `fuse_lag_estimates`.
+    The lag dict is the normalized audio lag dict, and the fused lag dict is normalized the same way.
+    If a pool is given, the videos are read on its workers.
+
+    Returns the lag dictionary and the confidence dictionary with the fused lags and confidences.
+    """
+    low_confidence_cameras = [
+        camera_name
+        for camera_name in find_low_confidence_cameras(
+            confidence_dict, minimum_confidence
+        )
+        if camera_name != reference_camera_name
+    ]
+    if not low_confidence_cameras:
+        logger.info(
+            f"Every audio lag has a confidence of at least {minimum_confidence}, skipping the brightness fallback"
+        )
+        return lag_dict, confidence_dict
+
+    logger.info(
+        f"Audio lags of {low_confidence_cameras} have a confidence below {minimum_confidence}, checking them against the video brightness"
+    )
+    find_brightness = partial(
+        measure_brightness,
+        duration=brightness_duration,
+        instrumentation=instrumentation,
+        progress_reporter=progress_reporter,
+    )
+    video_pathstrings = [
+        str(video_info_dict[camera_name]["video pathstring"])
+        for camera_name in [reference_camera_name, *low_confidence_cameras]
+    ]
+    if pool is None:
+        brightness_arrays = [
+            find_brightness(video_pathstring) for video_pathstring in video_pathstrings
+        ]
+    else:
+        brightness_arrays = pool.map(find_brightness, video_pathstrings)
+
+    with measure_stage(instrumentation, "correlation"):
+        brightness_lags_and_confidences = estimate_lags_brightness_correlation(
+            reference_signal=brightness_arrays[0],
+            signals_to_align=brightness_arrays[1:],
+            sample_rate=frame_rate,
+        )
+
+    # the normalized lags are undone to get each camera's lag relative to the reference camera, which is what was correlated
+    relative_lag_dict = {
+        camera_name: lag_dict[reference_camera_name] - lag
+        for camera_name, lag in lag_dict.items()
+    }
+    fused_confidence_dict = dict(confidence_dict)
+    for camera_name, (brightness_lag, brightness_confidence) in zip(
+        low_confidence_cameras, brightness_lags_and_confidences
+    ):
+        audio_lag = relative_lag_dict[camera_name]
+        relative_lag_dict[camera_name], fused_confidence_dict[camera_name] = (
+            fuse_lag_estimates(
+                audio_lag=audio_lag,
+                audio_confidence=confidence_dict[camera_name],
+                audio_resolution=audio_resolution,
+                brightness_lag=brightness_lag,
+                brightness_confidence=brightness_confidence,
+                brightness_resolution=1 / frame_rate,
+            )
+        )
+        logger.info(
+            f"Lag of {camera_name}: audio {audio_lag} seconds, confidence {confidence_dict[camera_name]:.3f}, "
+            f"brightness {brightness_lag} seconds, confidence {brightness_confidence:.3f}, "
+            f"fused {relative_lag_dict[camera_name]} seconds, confidence {fused_confidence_dict[camera_name]:.3f}"
+        )
+
+    return normalize_lag_dictionary(relative_lag_dict), fused_confidence_dict
@@ -1,5 +1,11 @@
+from functools import partial
+from multiprocessing.pool import Pool
 from pathlib import Path
 from typing import Dict, List, Optional
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    StageInstrumentation,
+    measure_stage,
+)
 from skelly_synchronize.core_processes.video_functions.ffmpeg_functions import (
     normalize_framerates_in_video_ffmpeg,
 )
@@ -16,8 +22,12 @@ def normalize_framerates(
     video_info_dict: Dict[str, dict],
     fps_list: List[float],
     audio_samplerate_list: Optional[List[float]] = None,
+    pool: Optional[Pool] = None,
+    instrumentation: Optional[StageInstrumentation] = None,
 ) -> Path:
-    """Normalize the frame rates of a list of videos. Also normalize audio sample rates, if given"""
+    """Normalize the frame rates of a list of videos. Also normalize audio sample rates, if given.
+    If a pool is given, the videos are normalized on its workers.
+    """
     normalized_videos_folder_path = create_directory(
         parent_directory=raw_video_folder_path,
         directory_name=NORMALIZED_VIDEOS_FOLDER_NAME,
@@ -32,15 +42,45 @@ def normalize_framerates(
     else:
         desired_audio_sample_rate = standard_audio_sample_rate
 
-    for video_dict in video_info_dict.values():
-        normalize_framerates_in_video_ffmpeg(
-            input_video_pathstring=str(video_dict["video pathstring"]),
-            output_video_pathstring=str(
+    normalize_video = partial(
+        normalize_single_video,
+        desired_fps=desired_fps,
+        desired_sample_rate=int(desired_audio_sample_rate),
+        instrumentation=instrumentation,
+    )
+    normalize_arguments = [
+        (
+            str(video_dict["video pathstring"]),
+            str(
                 normalized_videos_folder_path
                 / f"{video_dict['camera name']}.{VideoExtension.MP4.value}"
             ),
-            desired_fps=desired_fps,
-            desired_sample_rate=int(desired_audio_sample_rate),
+            video_dict["camera name"],
         )
+        for video_dict in video_info_dict.values()
+    ]
+
+    if pool is None:
+        for arguments in normalize_arguments:
+            normalize_video(*arguments)
+    else:
+        pool.starmap(normalize_video, normalize_arguments)
 
     return normalized_videos_folder_path
+
+
+def normalize_single_video(
+    input_video_pathstring: str,
+    output_video_pathstring: str,
+    camera_name: str,
+    desired_fps: float,
+    desired_sample_rate: int,
+    instrumentation: Optional[StageInstrumentation] = None,
+):
+    with measure_stage(instrumentation, "normalization", camera_name):
+        normalize_framerates_in_video_ffmpeg(
+            input_video_pathstring=input_video_pathstring,
+            output_video_pathstring=output_video_pathstring,
+            desired_fps=desired_fps,
+            desired_sample_rate=desired_sample_rate,
+        )
@@ -0,0 +1,242 @@
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from skelly_synchronize.core_processes.correlation_functions import (
+    estimate_lags_batched,
+    normalize_lag_dictionary,
+)
+
+logger = logging.getLogger(__name__)
+
+STREAM_SIGNAL_TYPES = ["audio", "brightness"]
+
+
+class RingBuffer:
+    """Fixed size buffer that keeps the most recent samples of a stream"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.float32)
+        self.samples_written = 0
+
+    def write(self, chunk: np.ndarray):
+        chunk = np.asarray(chunk, dtype=np.float32).ravel()
+        if chunk.size >= self.capacity:
+            # only the end of a chunk larger than the buffer is kept
+            skipped_samples = chunk.size - self.capacity
+            self.samples_written += skipped_samples
+            chunk = chunk[skipped_samples:]
+
+        write_start = self.samples_written % self.capacity
+        first_part_size = min(chunk.size, self.capacity - write_start)
+        write_end = write_start + first_part_size
+        self.buffer[write_start:write_end] = chunk[:first_part_size]
+        self.buffer[: chunk.size - first_part_size] = chunk[first_part_size:]
+        self.samples_written += chunk.size
+
+    @property
+    def samples_available(self) -> int:
+        return min(self.samples_written, self.capacity)
+
+    def read_latest(self, number_of_samples: int) -> np.ndarray:
+        """Return a copy of the most recent samples, oldest first"""
+        number_of_samples = min(number_of_samples, self.samples_available)
+        read_end = self.samples_written % self.capacity
+        read_start = read_end - number_of_samples
+        if read_start >= 0:
+            return self.buffer[read_start:read_end].copy()
+
+        return np.concatenate([self.buffer[read_start:], self.buffer[:read_end]])
+
+
+class StreamingSynchronizer:
+    """Keep a rolling estimate of the lags between live camera streams from incremental chunks of audio or brightness samples.
+    Each camera's stream is held in a ring buffer, so memory stays constant however long the recording runs.
+    Every update_interval seconds of new reference data, the latest window of the reference camera is correlated
+    against the buffer of every other camera in one batched FFT, so each update costs the same and latency stays bounded.
+    Lags follow `find_cross_correlation_lags`: the camera that started recording last has a lag of 0.
+    """
+
+    def __init__(
+        self,
+        camera_names: List[str],
+        sample_rate: float,
+        signal_type: str = "audio",
+        window_duration: float = 10.0,
+        max_delivery_skew: float = 2.0,
+        update_interval: float = 1.0,
+        min_confidence: float = 0.1,
+    ):
+        """camera_names - the first camera is the reference the others are correlated against
+        sample_rate - samples per second of the chunks, the audio sample rate or the frame rate for brightness samples
+        window_duration - seconds of the reference stream correlated at each update
+        max_delivery_skew - how far apart in time the newest chunks of different cameras can be and still be aligned
+        min_confidence - estimates with a lower confidence don't replace the current estimate
+        """
+        if signal_type not in STREAM_SIGNAL_TYPES:
+            raise ValueError(f"signal_type must be one of {STREAM_SIGNAL_TYPES}")
+        if len(camera_names) < 2:
+            raise ValueError("At least two cameras are needed to synchronize")
+
+        self.camera_names = list(camera_names)
+        self.reference_camera_name = self.camera_names[0]
+        self.sample_rate = sample_rate
+        self.signal_type = signal_type
+        self.window_length = int(window_duration * sample_rate)
+        self.update_length = max(int(update_interval * sample_rate), 1)
+        self.min_confidence = min_confidence
+
+        buffer_capacity = self.window_length + 2 * int(max_delivery_skew * sample_rate)
+        self.ring_buffers = {
+            camera_name: RingBuffer(capacity=buffer_capacity)
+            for camera_name in self.camera_names
+        }
+        self.last_update_position = 0
+        self.lag_estimates = {
+            self.reference_camera_name: {"lag": 0.0, "confidence": 1.0, "updates": 0}
+        }
+
+    def add_chunk(self, camera_name: str, chunk: np.ndarray) -> bool:
+        """Add the next chunk of samples from a camera, and update the lag estimates if enough new reference data has arrived.
+        Returns whether the estimates were updated.
+        """
+        self.ring_buffers[camera_name].write(chunk)
+
+        reference_position = self.ring_buffers[
+            self.reference_camera_name
+        ].samples_written
+        if reference_position - self.last_update_position < self.update_length:
+            return False
+
+        return self.update()
+
+    def update(self) -> bool:
+        """Correlate the latest reference window against every other camera, and keep the estimates that are confident enough.
+        Returns whether there was enough data to correlate.
+        """
+        reference_buffer = self.ring_buffers[self.reference_camera_name]
+        ready_camera_names = [
+            camera_name
+            for camera_name in self.camera_names[1:]
+            if self.ring_buffers[camera_name].samples_available >= self.window_length
+        ]
+        if (
+            reference_buffer.samples_available < self.window_length
+            or len(ready_camera_names) == 0
+        ):
+            return False
+        self.last_update_position = reference_buffer.samples_written
+
+        reference_window = self.prepare_signal(
+            reference_buffer.read_latest(self.window_length)
+        )
+        reference_window_start = reference_buffer.samples_written - self.window_length
+        camera_signals = [
+            self.prepare_signal(
+                self.ring_buffers[camera_name].read_latest(
+                    self.ring_buffers[camera_name].capacity
+                )
+            )
+            for camera_name in ready_camera_names
+        ]
+
+        lags_and_confidences = estimate_lags_batched(
+            reference_signal=reference_window,
+            signals_to_align=camera_signals,
+            sample_rate=self.sample_rate,
+            phase_transform=self.signal_type == "audio",
+            interpolate=True,
+        )
+
+        for camera_name, camera_signal, (window_lag, confidence) in zip(
+            ready_camera_names, camera_signals, lags_and_confidences
+        ):
+            camera_buffer = self.ring_buffers[camera_name]
+            camera_signal_start = camera_buffer.samples_written - camera_signal.size
+            # the window lag is relative to the start of each segment, so shift it by where each segment starts in its stream
+            lag = (
+                window_lag
+                + (reference_window_start - camera_signal_start) / self.sample_rate
+            )
+            self.update_lag_estimate(camera_name, lag, confidence)
+
+        return True
+
+    def prepare_signal(self, samples: np.ndarray) -> np.ndarray:
+        """Brightness is correlated by its change between frames, so a steady difference in exposure between cameras doesn't matter"""
+        if self.signal_type == "brightness":
+            return np.diff(samples, prepend=samples[0])
+        return samples
+
+    def update_lag_estimate(self, camera_name: str, lag: float, confidence: float):
+        if confidence < self.min_confidence:
+            logger.debug(
+                f"Skipping lag estimate for {camera_name} with low confidence {confidence:.3f}"
+            )
+            return
+
+        previous_estimate = self.lag_estimates.get(camera_name)
+        updates = 0 if previous_estimate is None else previous_estimate["updates"]
+        self.lag_estimates[camera_name] = {
+            "lag": lag,
+            "confidence": confidence,
+            "updates": updates + 1,
+        }
+
+    def get_lag_dictionary(self) -> Dict[str, float]:
+        """Return the current lags of the cameras that have an estimate, normalized so the latest camera to start has a lag of 0"""
+        lag_dict = {
+            camera_name: estimate["lag"]
+            for camera_name, estimate in self.lag_estimates.items()
+        }
+
+        return normalize_lag_dictionary(lag_dictionary=lag_dict)
+
+
+def synchronize_audio_files_streaming(
+    audio_file_paths: Dict[str, Union[str, Path]],
+    chunk_duration: float = 0.1,
+    window_duration: float = 10.0,
+    max_chunks: Optional[int] = None,
+) -> Dict[str, float]:
+    """Feed audio files into a streaming synchronizer chunk by chunk, as if they were live streams, and return the final lag dictionary.
+    The files must share a sample rate. Useful for testing the streaming synchronizer against the file based synchronization.
+    """
+    import soundfile as sf
+
+    sample_rates = {sf.info(str(path)).samplerate for path in audio_file_paths.values()}
+    if len(sample_rates) > 1:
+        raise ValueError(
+            f"Audio files must share a sample rate to be streamed, found {sample_rates}"
+        )
+    sample_rate = sample_rates.pop()
+    chunk_length = int(chunk_duration * sample_rate)
+
+    streaming_synchronizer = StreamingSynchronizer(
+        camera_names=list(audio_file_paths.keys()),
+        sample_rate=sample_rate,
+        window_duration=window_duration,
+    )
+    audio_streams = {
+        camera_name: sf.blocks(
+            str(path), blocksize=chunk_length, dtype="float32", always_2d=True
+        )
+        for camera_name, path in audio_file_paths.items()
+    }
+
+    chunks_read = 0
+    while len(audio_streams) > 0 and (max_chunks is None or chunks_read < max_chunks):
+        for camera_name in list(audio_streams.keys()):
+            chunk = next(audio_streams[camera_name], None)
+            if chunk is None:
+                audio_streams.pop(camera_name)
+                continue
+            streaming_synchronizer.add_chunk(camera_name, chunk.mean(axis=1))
+        chunks_read += 1
+
+    logger.info(f"Streaming lag estimates: {streaming_synchronizer.lag_estimates}")
+
+    return streaming_synchronizer.get_lag_dictionary()
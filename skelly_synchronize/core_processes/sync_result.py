@@ -0,0 +1,314 @@
+import dataclasses
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from skelly_synchronize.system.paths_and_file_names import SYNC_MANIFEST_NAME
+
+logger = logging.getLogger(__name__)
+
+# bumped when the manifest layout changes in a way older readers can't load
+SYNC_MANIFEST_VERSION = 1
+
+
+@dataclasses.dataclass
+class CameraSyncResult:
+    """What the synchronization did to one camera's video.
+    The lag is in seconds from the start of the raw video, and the confidence is the lag estimator's, or None if it doesn't give one.
+    The trimmed video starts at the start frame of the raw video, and its frame count and duration are what the trim stage wrote,
+    or what it would write if the trimmed videos weren't written, in which case the output video path is None.
+    The drift is how many seconds per second the camera's clock runs ahead of the synchronized timeline. The lag estimators find constant offsets,
+    so it is 0 unless set from another estimate, and frame readers step through the raw video 1 + drift frames per synchronized frame.
+    The raw duration is the raw video's duration in seconds, which bounds the synchronized window when a camera is added later,
+    or None if it wasn't recorded.
+    """
+
+    camera_name: str
+    raw_video_path: Path
+    output_video_path: Optional[Path]
+    lag: float
+    confidence: Optional[float]
+    start_frame: int
+    frame_count: int
+    duration: float
+    drift: float = 0.0
+    raw_duration: Optional[float] = None
+
+    @property
+    def end_frame(self) -> int:
+        """The raw video frame after the last frame of the trimmed video"""
+        return self.start_frame + self.frame_count
+
+
+@dataclasses.dataclass
+class SyncResult:
+    """The result of synchronizing a folder of videos, with the per camera results keyed by camera name.
+    It can be used as the synchronized video folder path, which the synchronization functions used to return.
+    verified is None if the outputs weren't verified, otherwise whether they all matched their expected duration.
+    """
+
+    synchronized_video_folder_path: Path
+    method: str
+    fps: float
+    cameras: Dict[str, CameraSyncResult]
+    elapsed_time: float = 0.0
+    verified: Optional[bool] = None
+
+    def __fspath__(self) -> str:
+        return str(self.synchronized_video_folder_path)
+
+    def __str__(self) -> str:
+        return str(self.synchronized_video_folder_path)
+
+    def __truediv__(self, other: Union[str, os.PathLike]) -> Path:
+        return self.synchronized_video_folder_path / other
+
+    def __getattr__(self, name: str):
+        """Delegate the Path attributes the result doesn't have, like `exists`, `glob` and `parent`, to the synchronized video folder path"""
+        # dunder lookups, and lookups before the fields are set while unpickling, must not recurse into the folder path
+        if name.startswith("__") or "synchronized_video_folder_path" not in vars(self):
+            raise AttributeError(name)
+        return getattr(self.synchronized_video_folder_path, name)
+
+    @property
+    def lag_dict(self) -> Dict[str, float]:
+        return {
+            camera_name: camera_result.lag
+            for camera_name, camera_result in self.cameras.items()
+        }
+
+    @property
+    def confidence_dict(self) -> Dict[str, Optional[float]]:
+        return {
+            camera_name: camera_result.confidence
+            for camera_name, camera_result in self.cameras.items()
+        }
+
+    @property
+    def synchronized_duration(self) -> float:
+        """The duration of the shortest trimmed video, which the audio is trimmed to"""
+        return min(camera_result.duration for camera_result in self.cameras.values())
+
+    @property
+    def videos_written(self) -> bool:
+        """Whether the trimmed videos were written, otherwise only the frame ranges were found"""
+        return all(
+            camera_result.output_video_path is not None
+            for camera_result in self.cameras.values()
+        )
+
+    def create_video_info_dict(self) -> Dict[str, dict]:
+        """Describe the synchronized videos like `create_video_info_dict` does, without probing them"""
+        return {
+            camera_result.output_video_path.stem: {
+                "video filepath": camera_result.output_video_path,
+                "video pathstring": str(camera_result.output_video_path),
+                "camera name": camera_result.output_video_path.stem,
+                "video duration": camera_result.duration,
+                "video fps": self.fps,
+                "video frame count": camera_result.frame_count,
+            }
+            for camera_result in self.cameras.values()
+            if camera_result.output_video_path is not None
+        }
+
+    def move_to(
+        self,
+        synchronized_video_folder_path: Path,
+        raw_video_folder_paths: Optional[Dict[Path, Path]] = None,
+    ) -> "SyncResult":
+        """Return a copy of the result with its outputs in another folder, like after staged outputs are moved to their destination.
+        Raw videos inside the folders keyed in raw_video_folder_paths are moved to the same place inside the folders they map to,
+        like from staged raw videos back to their source.
+        """
+        synchronized_video_folder_path = Path(synchronized_video_folder_path)
+        return dataclasses.replace(
+            self,
+            synchronized_video_folder_path=synchronized_video_folder_path,
+            cameras={
+                camera_name: dataclasses.replace(
+                    camera_result,
+                    raw_video_path=move_path(
+                        camera_result.raw_video_path, raw_video_folder_paths or {}
+                    ),
+                    output_video_path=(
+                        None
+                        if camera_result.output_video_path is None
+                        else synchronized_video_folder_path
+                        / camera_result.output_video_path.name
+                    ),
+                )
+                for camera_name, camera_result in self.cameras.items()
+            },
+        )
+
+
+def move_path(path: Path, folder_paths: Dict[Path, Path]) -> Path:
+    for source_folder_path, destination_folder_path in folder_paths.items():
+        try:
+            return Path(destination_folder_path) / path.relative_to(source_folder_path)
+        except ValueError:
+            continue
+    return path
+
+
+def create_sync_result(
+    synchronized_video_folder_path: Path,
+    method: str,
+    fps: float,
+    video_info_dict: Dict[str, dict],
+    lag_dict: Dict[str, float],
+    trim_info_dict: Dict[str, dict],
+    confidence_dict: Optional[Dict[str, float]] = None,
+) -> SyncResult:
+    """Combine the raw video information, lags and what the trim stage wrote into a SyncResult"""
+    confidence_dict = confidence_dict or {}
+    cameras = {}
+    for camera_name, video_dict in video_info_dict.items():
+        trim_info = trim_info_dict[camera_name]
+        cameras[camera_name] = CameraSyncResult(
+            camera_name=camera_name,
+            raw_video_path=Path(video_dict["video pathstring"]),
+            output_video_path=(
+                None
+                if trim_info["output video pathstring"] is None
+                else Path(trim_info["output video pathstring"])
+            ),
+            lag=lag_dict[camera_name],
+            confidence=confidence_dict.get(camera_name),
+            start_frame=trim_info["start frame"],
+            frame_count=trim_info["frame count"],
+            duration=trim_info["frame count"] / fps,
+            raw_duration=video_dict.get("video duration"),
+        )
+
+    return SyncResult(
+        synchronized_video_folder_path=Path(synchronized_video_folder_path),
+        method=method,
+        fps=fps,
+        cameras=cameras,
+    )
+
+
+def log_sync_result(sync_result: SyncResult):
+    for camera_result in sync_result.cameras.values():
+        confidence = (
+            "none"
+            if camera_result.confidence is None
+            else f"{camera_result.confidence:.3f}"
+        )
+        output = (
+            "not written"
+            if camera_result.output_video_path is None
+            else f"saved to {camera_result.output_video_path}"
+        )
+        logger.info(
+            f"{camera_result.camera_name}: lag {camera_result.lag:.4f} seconds (confidence {confidence}), "
+            f"frames {camera_result.start_frame} to {camera_result.end_frame}, "
+            f"{camera_result.frame_count} frames {output}"
+        )
+
+
+def create_manifest_pathstring(path: Optional[Path], manifest_folder_path: Path):
+    """Write a path relative to the manifest's folder, so the session can be moved or mounted elsewhere as a whole"""
+    if path is None:
+        return None
+    try:
+        return Path(os.path.relpath(path, manifest_folder_path)).as_posix()
+    except ValueError:
+        # on Windows, paths on another drive have no relative path
+        return str(path)
+
+
+def resolve_manifest_path(
+    pathstring: Optional[str], manifest_folder_path: Path
+) -> Optional[Path]:
+    if pathstring is None:
+        return None
+    return Path(os.path.normpath(manifest_folder_path / pathstring))
+
+
+def create_sync_manifest(sync_result: SyncResult) -> dict:
+    """Describe a synchronization with what a reader needs to align the cameras' frames, see `save_sync_manifest`"""
+    manifest_folder_path = sync_result.synchronized_video_folder_path
+    return {
+        "manifest version": SYNC_MANIFEST_VERSION,
+        "method": sync_result.method,
+        "fps": sync_result.fps,
+        "verified": sync_result.verified,
+        "cameras": {
+            camera_name: {
+                "raw video path": create_manifest_pathstring(
+                    camera_result.raw_video_path, manifest_folder_path
+                ),
+                "output video path": create_manifest_pathstring(
+                    camera_result.output_video_path, manifest_folder_path
+                ),
+                "lag": camera_result.lag,
+                "confidence": camera_result.confidence,
+                "start frame": camera_result.start_frame,
+                "frame count": camera_result.frame_count,
+                "drift": camera_result.drift,
+                "raw duration": camera_result.raw_duration,
+            }
+            for camera_name, camera_result in sync_result.cameras.items()
+        },
+    }
+
+
+def save_sync_manifest(sync_result: SyncResult) -> Path:
+    """Save the sync manifest to the synchronized video folder, with each camera's raw and output video, lag, confidence,
+    the start frame and frame count of its synchronized frames, its drift, and the duration of its raw video.
+    Paths are relative to the manifest, so it stays valid when the session folder is moved.
+
+    Returns the path of the manifest.
+    """
+    manifest_path = sync_result.synchronized_video_folder_path / SYNC_MANIFEST_NAME
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(create_sync_manifest(sync_result), manifest_file, indent=2)
+    logger.info(f"Saved sync manifest to {manifest_path}")
+    return manifest_path
+
+
+def load_sync_manifest(manifest_path: Union[str, Path]) -> SyncResult:
+    """Load a sync manifest saved by `save_sync_manifest`, or the manifest in a synchronized video folder, as a SyncResult"""
+    manifest_path = Path(manifest_path)
+    if manifest_path.is_dir():
+        manifest_path = manifest_path / SYNC_MANIFEST_NAME
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    if manifest["manifest version"] > SYNC_MANIFEST_VERSION:
+        raise ValueError(
+            f"Sync manifest {manifest_path} is version {manifest['manifest version']}, this version of skelly_synchronize reads up to version {SYNC_MANIFEST_VERSION}"
+        )
+
+    manifest_folder_path = manifest_path.parent
+    fps = manifest["fps"]
+    return SyncResult(
+        synchronized_video_folder_path=manifest_folder_path,
+        method=manifest["method"],
+        fps=fps,
+        cameras={
+            camera_name: CameraSyncResult(
+                camera_name=camera_name,
+                raw_video_path=resolve_manifest_path(
+                    camera_manifest["raw video path"], manifest_folder_path
+                ),
+                output_video_path=resolve_manifest_path(
+                    camera_manifest["output video path"], manifest_folder_path
+                ),
+                lag=camera_manifest["lag"],
+                confidence=camera_manifest["confidence"],
+                start_frame=camera_manifest["start frame"],
+                frame_count=camera_manifest["frame count"],
+                duration=camera_manifest["frame count"] / fps,
+                drift=camera_manifest.get("drift", 0.0),
+                raw_duration=camera_manifest.get("raw duration"),
+            )
+            for camera_name, camera_manifest in manifest["cameras"].items()
+        },
+        verified=manifest.get("verified"),
+    )
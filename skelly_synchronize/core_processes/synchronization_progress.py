@@ -0,0 +1,242 @@
+import concurrent.futures
+import contextlib
+import logging
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    get_current_stage,
+)
+
+logger = logging.getLogger(__name__)
+
+# decode loops report their progress and check for cancellation every this many frames
+FRAME_PROGRESS_INTERVAL = 30
+
+
+class SynchronizationCancelled(Exception):
+    """Raised when a synchronization is cancelled through its progress reporter"""
+
+
+class ProgressReporter:
+    """Reports the progress of a synchronization, and lets it be cancelled from another thread.
+    Progress is reported to the callback as a dictionary with the stage, camera name, frames processed, total frames,
+    fraction of the stage or camera completed, and ETA in seconds, with None for anything that isn't known.
+    Reports come from ffmpeg's progress output and from the pipeline's own decode loops, on whichever thread is doing the work.
+
+    Cancelling stops the running ffmpeg processes of the attached FFmpegRunner,
+    and decode loops and stage boundaries raise SynchronizationCancelled the next time they check.
+    """
+
+    def __init__(self, progress_callback: Optional[Callable[[dict], None]] = None):
+        self.progress_callback = progress_callback
+        self.cancel_event = threading.Event()
+        self.runner = None
+        self.expected_durations = {}
+        self.job_start_times = {}
+
+    def __getstate__(self):
+        # callbacks and events can't cross to pool workers in other processes, so workers get a reporter that does nothing
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        logger.info("Cancelling synchronization")
+        self.cancel_event.set()
+        if self.runner is not None:
+            self.runner.cancel()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise SynchronizationCancelled("Synchronization was cancelled")
+
+    @contextlib.contextmanager
+    def attach_runner(self, runner):
+        """Cancel the runner's processes along with the synchronization, and cancel the synchronization if anything fails while attached"""
+        self.runner = runner
+        try:
+            yield
+        except BaseException:
+            self.cancel()
+            raise
+        finally:
+            self.runner = None
+
+    def report(
+        self,
+        stage_name: Optional[str],
+        camera_name: Optional[str] = None,
+        frames_processed: Optional[int] = None,
+        total_frames: Optional[int] = None,
+        fraction: Optional[float] = None,
+    ):
+        if self.progress_callback is None:
+            return
+
+        if fraction is None and total_frames and frames_processed is not None:
+            fraction = min(frames_processed / total_frames, 1.0)
+
+        job_start_time = self.job_start_times.setdefault(
+            (stage_name, camera_name), time.perf_counter()
+        )
+        eta = None
+        if fraction is not None and fraction > 0:
+            eta = (time.perf_counter() - job_start_time) * (1 - fraction) / fraction
+
+        try:
+            self.progress_callback(
+                {
+                    "stage": stage_name,
+                    "camera name": camera_name,
+                    "frames processed": frames_processed,
+                    "total frames": total_frames,
+                    "fraction": fraction,
+                    "eta": eta,
+                }
+            )
+        except Exception as e:
+            logger.warning(f"Error in progress callback: {e}")
+
+    def report_ffmpeg_progress(self, ffmpeg_progress: dict):
+        """Report a progress update parsed from ffmpeg's `-progress` output by the FFmpegRunner"""
+        stage_name = ffmpeg_progress.get("stage")
+        camera_name = ffmpeg_progress.get("camera name")
+        stage_durations = self.expected_durations.get(stage_name, {})
+        expected_duration = stage_durations.get(camera_name, stage_durations.get(None))
+
+        fraction = None
+        if ffmpeg_progress.get("status") == "end":
+            fraction = 1.0
+        elif expected_duration and ffmpeg_progress.get("out time") is not None:
+            fraction = min(ffmpeg_progress["out time"] / expected_duration, 1.0)
+
+        frames_processed = ffmpeg_progress.get("frame")
+        total_frames = None
+        if frames_processed and fraction:
+            total_frames = round(frames_processed / fraction)
+
+        self.report(
+            stage_name=stage_name,
+            camera_name=camera_name,
+            frames_processed=frames_processed,
+            total_frames=total_frames,
+            fraction=fraction,
+        )
+
+
+def report_progress(
+    progress_reporter: Optional[ProgressReporter],
+    stage_name: str,
+    expected_durations: Optional[Dict[Optional[str], float]] = None,
+    fraction: float = 0.0,
+):
+    """Report the start of a pipeline stage and stop if the synchronization was cancelled, if a reporter is given.
+    Expected durations are the seconds of output each camera's ffmpeg job will write in the stage,
+    with a None camera name for a duration shared by every camera, and are used to find the fraction of each job that is done.
+    """
+    if progress_reporter is None:
+        return
+
+    progress_reporter.check_cancelled()
+    if expected_durations is not None:
+        progress_reporter.expected_durations[stage_name] = expected_durations
+    progress_reporter.report(stage_name=stage_name, fraction=fraction)
+
+
+def report_frame_progress(
+    progress_reporter: Optional[ProgressReporter],
+    frames_processed: int,
+    total_frames: Optional[int] = None,
+):
+    """Report the frames processed by a decode loop, for the stage and camera the thread is measuring, and stop if the synchronization was cancelled"""
+    if progress_reporter is None or frames_processed % FRAME_PROGRESS_INTERVAL != 0:
+        return
+
+    progress_reporter.check_cancelled()
+    current_stage = get_current_stage()
+    progress_reporter.report(
+        stage_name=current_stage["stage"],
+        camera_name=current_stage["camera name"],
+        frames_processed=frames_processed,
+        total_frames=total_frames,
+    )
+
+
+def format_progress(progress: dict) -> str:
+    progress_string = f"{progress['stage']}"
+    if progress["camera name"] is not None:
+        progress_string += f" - {progress['camera name']}"
+    if progress["frames processed"] is not None:
+        progress_string += f" - frame {progress['frames processed']}"
+        if progress["total frames"] is not None:
+            progress_string += f" of {progress['total frames']}"
+    if progress["fraction"] is not None:
+        progress_string += f" - {progress['fraction']:.0%}"
+    if progress["eta"] is not None:
+        progress_string += f" - ETA {progress['eta']:.0f} seconds"
+
+    return progress_string
+
+
+def find_modification_times(folder_path: Path, pattern: str) -> Optional[dict]:
+    if not folder_path.is_dir():
+        return None
+
+    return {path: path.stat().st_mtime_ns for path in folder_path.glob(pattern)}
+
+
+@contextlib.contextmanager
+def remove_partial_outputs_on_cancel(output_patterns: Dict[Path, str]):
+    """Remove what a cancelled synchronization wrote, and raise SynchronizationCancelled.
+    For each folder, entries matching its glob pattern that were created or modified after the synchronization started are removed,
+    and folders that did not exist are removed entirely.
+    """
+    starting_modification_times = {
+        folder_path: find_modification_times(Path(folder_path), pattern)
+        for folder_path, pattern in output_patterns.items()
+    }
+    try:
+        yield
+    except (
+        SynchronizationCancelled,
+        concurrent.futures.CancelledError,
+        KeyboardInterrupt,
+    ) as e:
+        for folder_path, pattern in output_patterns.items():
+            remove_new_entries(
+                folder_path=Path(folder_path),
+                pattern=pattern,
+                starting_modification_times=starting_modification_times[folder_path],
+            )
+        if isinstance(e, KeyboardInterrupt):
+            raise
+        raise SynchronizationCancelled("Synchronization was cancelled") from e
+
+
+def remove_new_entries(
+    folder_path: Path, pattern: str, starting_modification_times: Optional[dict]
+):
+    if not folder_path.exists():
+        return
+    if starting_modification_times is None:
+        logger.info(f"Removing partial output folder {folder_path}")
+        shutil.rmtree(folder_path, ignore_errors=True)
+        return
+
+    for path in folder_path.glob(pattern):
+        if starting_modification_times.get(path) == path.stat().st_mtime_ns:
+            continue
+        logger.info(f"Removing partial output {path}")
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
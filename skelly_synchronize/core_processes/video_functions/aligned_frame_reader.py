@@ -0,0 +1,297 @@
+import logging
+import queue
+import subprocess
+import threading
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    record_subprocess_spawned,
+)
+from skelly_synchronize.core_processes.sync_result import (
+    CameraSyncResult,
+    SyncResult,
+    load_sync_manifest,
+)
+from skelly_synchronize.core_processes.video_functions.raw_frame_pipeline import (
+    FrameBufferPool,
+    create_decoder_command,
+    find_frame_size_bytes,
+    read_frame_into,
+    stop_process,
+)
+from skelly_synchronize.system.cpu_budget import allocate_threads_per_job
+
+logger = logging.getLogger(__name__)
+
+# pixel formats frames can be read in, with their number of channels
+READER_PIXEL_FORMAT_CHANNELS = {"bgr24": 3, "rgb24": 3, "gray": 1}
+# frames each camera decodes ahead of the reader
+DEFAULT_PREFETCH_FRAMES = 8
+# how often waiting threads check whether the reader was closed
+STOP_CHECK_INTERVAL = 0.1
+
+
+def find_source_offsets(start_frame: int, stop_frame: int, drift: float) -> List[int]:
+    """Return the raw frame offset from a camera's start frame for each synchronized frame, stepping 1 + drift raw frames per frame"""
+    return [
+        round(frame_number * (1 + drift))
+        for frame_number in range(start_frame, stop_frame)
+    ]
+
+
+class CameraFrameStream:
+    """Decodes one camera's synchronized frames on its own thread, into pooled buffers passed to the reader through a bounded queue.
+    Each queued item is a buffer and the number of synchronized frames it is used for, which is more than one when drift repeats a frame.
+    """
+
+    def __init__(
+        self,
+        camera_result: CameraSyncResult,
+        start_frame: int,
+        stop_frame: int,
+        pixel_format: str,
+        prefetch_frames: int,
+        threads: int,
+        frame_size: Optional[Tuple[int, int]] = None,
+    ):
+        # deffcode is only imported when frames are read
+        from skelly_synchronize.core_processes.video_functions.deffcode_functions import (
+            probe_frame_source,
+        )
+
+        self.camera_name = camera_result.camera_name
+        frame_source = probe_frame_source(str(camera_result.raw_video_path))
+        width, height = frame_size or frame_source["frame resolution"]
+        channels = READER_PIXEL_FORMAT_CHANNELS[pixel_format]
+        self.frame_shape = (height, width) if channels == 1 else (height, width, 3)
+
+        source_offsets = find_source_offsets(
+            start_frame=start_frame, stop_frame=stop_frame, drift=camera_result.drift
+        )
+        first_offset = source_offsets[0] if source_offsets else 0
+        # the number of synchronized frames each decoded frame is used for, zero for frames skipped by drift
+        self.frame_repeats = np.bincount(
+            np.asarray(source_offsets, dtype=np.int64) - first_offset
+        ).tolist()
+        self.decoder_command = create_decoder_command(
+            ffmpeg_location=frame_source["ffmpeg location"],
+            input_video_pathstring=str(camera_result.raw_video_path),
+            pixel_format=pixel_format,
+            threads=threads,
+            transpose_filter=frame_source["transpose filter"],
+            start_frame=camera_result.start_frame + first_offset,
+            frame_count=len(self.frame_repeats),
+            frame_size=frame_size,
+        )
+
+        self.buffer_pool = FrameBufferPool(
+            find_frame_size_bytes(
+                width=width, height=height, pixel_format=pixel_format
+            ),
+            # one buffer held by the reader and one being decoded into, besides the queued frames
+            buffer_count=prefetch_frames + 2,
+        )
+        self.frame_queue = queue.Queue(maxsize=prefetch_frames)
+        self.stop_event = threading.Event()
+        self.decoder = None
+        self.current_buffer = None
+        self.current_repeats = 0
+
+        self.decoder_thread = threading.Thread(
+            target=self.decode_frames,
+            name=f"aligned-reader-{self.camera_name}",
+            daemon=True,
+        )
+        self.decoder_thread.start()
+
+    def put(self, item) -> bool:
+        """Queue an item, returning False if the reader was closed while waiting for space"""
+        while not self.stop_event.is_set():
+            try:
+                self.frame_queue.put(item, timeout=STOP_CHECK_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def acquire_buffer(self) -> Optional[np.ndarray]:
+        while not self.stop_event.is_set():
+            try:
+                return self.buffer_pool.acquire(timeout=STOP_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+        return None
+
+    def decode_frames(self):
+        try:
+            self.decoder = subprocess.Popen(
+                self.decoder_command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0,
+            )
+            record_subprocess_spawned()
+            for repeats in self.frame_repeats:
+                buffer = self.acquire_buffer()
+                if buffer is None:
+                    return
+                if not read_frame_into(self.decoder.stdout, buffer):
+                    self.buffer_pool.release(buffer)
+                    self.put(self.create_decoder_error())
+                    return
+                if repeats == 0:
+                    self.buffer_pool.release(buffer)
+                elif not self.put((buffer, repeats)):
+                    return
+            self.put(None)
+        except Exception as e:
+            self.put(e)
+        finally:
+            if self.decoder is not None:
+                stop_process(self.decoder)
+
+    def create_decoder_error(self) -> Exception:
+        stderr = self.decoder.stderr.read().decode(errors="replace").strip()
+        if self.decoder.wait() != 0 and not self.stop_event.is_set():
+            return RuntimeError(
+                f"Decoding camera {self.camera_name} failed with return code {self.decoder.returncode}: {stderr}"
+            )
+        return EOFError(f"Camera {self.camera_name} ran out of frames")
+
+    def read_frame(self) -> np.ndarray:
+        """Return the next synchronized frame, which is only valid until the next frame is read"""
+        if self.current_repeats == 0:
+            if self.current_buffer is not None:
+                self.buffer_pool.release(self.current_buffer)
+                self.current_buffer = None
+            item = self.frame_queue.get()
+            if item is None:
+                raise EOFError(f"Camera {self.camera_name} ran out of frames")
+            if isinstance(item, Exception):
+                raise item
+            self.current_buffer, self.current_repeats = item
+
+        self.current_repeats -= 1
+        return self.current_buffer.reshape(self.frame_shape)
+
+    def close(self):
+        self.stop_event.set()
+        decoder = self.decoder
+        if decoder is not None and decoder.poll() is None:
+            decoder.kill()
+        self.decoder_thread.join()
+
+
+class AlignedFrameReader:
+    """Reads the synchronized frames of every camera straight from the raw videos, following a sync manifest instead of trimmed videos,
+    see `save_sync_manifest`. Iterating yields a tuple of frames, one per camera in the order of camera_names, for each synchronized frame.
+
+    Each camera decodes on its own thread into a bounded queue of prefetch_frames preallocated buffers, so decoding runs ahead of the reader
+    and memory stays constant. Frames are arrays of shape (height, width, 3), or (height, width) for "gray",
+    and a frame's buffer is reused once the next tuple is read, so copy frames that need to be kept longer.
+    Frames from start_frame up to stop_frame of the synchronized frames are read, which is all of them by default,
+    resized to frame_size, as width and height, if one is given.
+    The CPU budget is divided between the cameras' decoders unless decoder_threads is given.
+    """
+
+    def __init__(
+        self,
+        sync_manifest: Union[str, Path, SyncResult],
+        camera_names: Optional[Sequence[str]] = None,
+        pixel_format: str = "bgr24",
+        start_frame: int = 0,
+        stop_frame: Optional[int] = None,
+        prefetch_frames: int = DEFAULT_PREFETCH_FRAMES,
+        frame_size: Optional[Tuple[int, int]] = None,
+        decoder_threads: Optional[int] = None,
+    ):
+        if pixel_format not in READER_PIXEL_FORMAT_CHANNELS:
+            raise ValueError(
+                f"pixel_format must be one of {list(READER_PIXEL_FORMAT_CHANNELS)}"
+            )
+        if isinstance(sync_manifest, SyncResult):
+            self.sync_result = sync_manifest
+        else:
+            self.sync_result = load_sync_manifest(sync_manifest)
+
+        self.camera_names = list(camera_names or self.sync_result.cameras)
+        for camera_name in self.camera_names:
+            if camera_name not in self.sync_result.cameras:
+                raise ValueError(f"Camera {camera_name} is not in the sync manifest")
+
+        frame_count = min(
+            self.sync_result.cameras[camera_name].frame_count
+            for camera_name in self.camera_names
+        )
+        self.start_frame = max(start_frame, 0)
+        self.stop_frame = (
+            frame_count if stop_frame is None else min(stop_frame, frame_count)
+        )
+        self.pixel_format = pixel_format
+        self.prefetch_frames = max(prefetch_frames, 1)
+        self.frame_size = None if frame_size is None else tuple(frame_size)
+        self.decoder_threads = decoder_threads
+        self.streams: List[CameraFrameStream] = []
+
+    @property
+    def fps(self) -> float:
+        return self.sync_result.fps
+
+    def __len__(self) -> int:
+        return max(self.stop_frame - self.start_frame, 0)
+
+    def __enter__(self) -> "AlignedFrameReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self) -> Iterator[Tuple[np.ndarray, ...]]:
+        if len(self) == 0:
+            return
+        self.close()
+        threads = self.decoder_threads or allocate_threads_per_job(
+            len(self.camera_names)
+        )
+        self.streams = [
+            CameraFrameStream(
+                camera_result=self.sync_result.cameras[camera_name],
+                start_frame=self.start_frame,
+                stop_frame=self.stop_frame,
+                pixel_format=self.pixel_format,
+                prefetch_frames=self.prefetch_frames,
+                threads=threads,
+                frame_size=self.frame_size,
+            )
+            for camera_name in self.camera_names
+        ]
+        try:
+            for frame_number in range(self.start_frame, self.stop_frame):
+                try:
+                    frames = tuple(stream.read_frame() for stream in self.streams)
+                except EOFError as e:
+                    logger.warning(
+                        f"Stopping after {frame_number - self.start_frame} of {len(self)} synchronized frames: {e}"
+                    )
+                    return
+                yield frames
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the decoders, which happens on its own once every frame is read"""
+        for stream in self.streams:
+            stream.close()
+        self.streams = []
+
+
+def read_aligned_frames(
+    sync_manifest: Union[str, Path, SyncResult], **reader_kwargs
+) -> Iterator[Tuple[np.ndarray, ...]]:
+    """Yield tuples of synchronized frames from the raw videos, see `AlignedFrameReader`"""
+    with AlignedFrameReader(sync_manifest, **reader_kwargs) as reader:
+        yield from reader
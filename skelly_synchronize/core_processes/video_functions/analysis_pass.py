@@ -0,0 +1,202 @@
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from skelly_synchronize.core_processes.video_functions.ffmpeg_functions import (
+    check_for_ffmpeg,
+    ffmpeg_string,
+    parse_framecrc_keyframe_timestamps,
+    run_subprocess,
+)
+
+logger = logging.getLogger(__name__)
+
+# frames are shrunk to this size before their brightness is measured, area scaling keeps the mean brightness of the full frame
+BRIGHTNESS_FRAME_SIZE = (32, 18)
+ANALYSIS_OUTPUTS = ["audio pcm", "brightness", "keyframe timestamps"]
+
+
+class AnalysisOutput:
+    """Where ffmpeg writes one output of the analysis pass, and how it is read back.
+    On POSIX systems the output is a pipe read on its own thread while ffmpeg runs, so the outputs are read concurrently without touching disk.
+    Elsewhere, file descriptors can't be passed to ffmpeg, so the output is written to a temporary file and read once ffmpeg finishes.
+    """
+
+    def __init__(self, name: str, temporary_folder_path: Path):
+        self.name = name
+        self.data = b""
+        self.write_fd = None
+        self.reader_thread = None
+        self.file_path = None
+
+        if os.name == "posix":
+            read_fd, self.write_fd = os.pipe()
+            self.reader_thread = threading.Thread(
+                target=self.read_pipe,
+                args=(read_fd,),
+                name=f"analysis-{name.replace(' ', '-')}-reader",
+                daemon=True,
+            )
+            self.reader_thread.start()
+        else:
+            self.file_path = temporary_folder_path / f"{name.replace(' ', '_')}.out"
+
+    @property
+    def target(self) -> str:
+        if self.write_fd is not None:
+            return f"pipe:{self.write_fd}"
+        return str(self.file_path)
+
+    def read_pipe(self, read_fd: int):
+        with os.fdopen(read_fd, "rb") as pipe:
+            self.data = pipe.read()
+
+    def finish(self) -> bytes:
+        """Close ffmpeg's end of the pipe and wait for the rest of the output, or read the output file"""
+        if self.write_fd is not None:
+            os.close(self.write_fd)
+            self.write_fd = None
+            self.reader_thread.join()
+        elif self.file_path.is_file():
+            self.data = self.file_path.read_bytes()
+        return self.data
+
+
+def create_analysis_output_arguments(
+    audio_file_path: Optional[Union[str, Path]],
+    audio_pcm_sample_rate: Optional[int],
+    analysis_outputs: Dict[str, AnalysisOutput],
+) -> List[str]:
+    # only the last output gets the job's encoder threads, which is fine since every output here is PCM audio, rawvideo or a stream copy,
+    # or an audio file, whose encoders are single-threaded
+    output_arguments = []
+    if audio_file_path is not None:
+        output_arguments += ["-map", "0:a:0", str(audio_file_path)]
+    if "audio pcm" in analysis_outputs:
+        output_arguments += ["-map", "0:a:0", "-ac", "1"]
+        if audio_pcm_sample_rate is not None:
+            output_arguments += ["-ar", f"{audio_pcm_sample_rate}"]
+        output_arguments += ["-f", "f32le", analysis_outputs["audio pcm"].target]
+    if "brightness" in analysis_outputs:
+        output_arguments += [
+            "-map",
+            "0:v:0",
+            "-vf",
+            f"scale={BRIGHTNESS_FRAME_SIZE[0]}:{BRIGHTNESS_FRAME_SIZE[1]}:flags=area,format=gray",
+            "-f",
+            "rawvideo",
+            analysis_outputs["brightness"].target,
+        ]
+    if "keyframe timestamps" in analysis_outputs:
+        output_arguments += [
+            "-map",
+            "0:v:0",
+            "-c",
+            "copy",
+            "-f",
+            "framecrc",
+            analysis_outputs["keyframe timestamps"].target,
+        ]
+    return output_arguments
+
+
+def parse_brightness_output(data: bytes) -> np.ndarray:
+    frame_size = BRIGHTNESS_FRAME_SIZE[0] * BRIGHTNESS_FRAME_SIZE[1]
+    frame_count = len(data) // frame_size
+    complete_frame_bytes = frame_count * frame_size
+    frames = np.frombuffer(data[:complete_frame_bytes], dtype=np.uint8).reshape(
+        frame_count, -1
+    )
+    return frames.mean(axis=1)
+
+
+def run_analysis_pass(
+    video_pathstring: str,
+    audio_file_path: Optional[Union[str, Path]] = None,
+    outputs: Tuple[str, ...] = (),
+    audio_pcm_sample_rate: Optional[int] = None,
+    duration: Optional[float] = None,
+) -> dict:
+    """Read a video once with a single ffmpeg call, producing every analysis signal the synchronization needs from the one demux and decode.
+    The audio is written to the audio file if one is given, and the outputs are any of ANALYSIS_OUTPUTS:
+    "audio pcm" is the first audio stream as mono float32, resampled to the PCM sample rate if one is given,
+    "brightness" is the mean brightness of each frame, and "keyframe timestamps" are the keyframe times of the first video stream,
+    read from its packets without decoding them.
+    If a duration is given, ffmpeg stops reading the video after that many seconds, so only the start of the video is decoded.
+
+    Returns a dictionary with the requested outputs.
+    """
+    for output_name in outputs:
+        if output_name not in ANALYSIS_OUTPUTS:
+            raise ValueError(f"outputs must be in {ANALYSIS_OUTPUTS}")
+    if audio_file_path is None and len(outputs) == 0:
+        raise ValueError("The analysis pass needs an audio file path or an output")
+
+    check_for_ffmpeg()
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        analysis_outputs = {
+            output_name: AnalysisOutput(output_name, Path(temporary_folder))
+            for output_name in outputs
+        }
+        command = [
+            ffmpeg_string,
+            "-y",
+            "-v",
+            "error",
+            *(["-t", f"{duration}"] if duration is not None else []),
+            "-i",
+            str(video_pathstring),
+            *create_analysis_output_arguments(
+                audio_file_path=audio_file_path,
+                audio_pcm_sample_rate=audio_pcm_sample_rate,
+                analysis_outputs=analysis_outputs,
+            ),
+        ]
+        pass_fds = tuple(
+            analysis_output.write_fd
+            for analysis_output in analysis_outputs.values()
+            if analysis_output.write_fd is not None
+        )
+
+        try:
+            analysis_subprocess = run_subprocess(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                pass_fds=pass_fds,
+            )
+        finally:
+            output_data = {
+                output_name: analysis_output.finish()
+                for output_name, analysis_output in analysis_outputs.items()
+            }
+
+    if analysis_subprocess.returncode != 0:
+        raise RuntimeError(
+            f"Analysis pass failed for video {video_pathstring} with return code {analysis_subprocess.returncode}, check that the video has the streams being analyzed: {analysis_subprocess.stderr.decode(errors='replace').strip()}"
+        )
+
+    analysis_results = {}
+    if "audio pcm" in output_data:
+        analysis_results["audio pcm"] = np.frombuffer(
+            output_data["audio pcm"], dtype=np.float32
+        )
+    if "brightness" in output_data:
+        analysis_results["brightness"] = parse_brightness_output(
+            output_data["brightness"]
+        )
+    if "keyframe timestamps" in output_data:
+        analysis_results["keyframe timestamps"] = parse_framecrc_keyframe_timestamps(
+            output_data["keyframe timestamps"].decode(errors="replace")
+        )
+
+    logger.debug(
+        f"Analysis pass of {video_pathstring} produced {list(analysis_results)}"
+    )
+    return analysis_results
@@ -0,0 +1,327 @@
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import subprocess
+import threading
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    SubprocessCounter,
+    get_current_stage,
+    get_thread_subprocess_counter,
+    record_subprocess_spawned,
+)
+from skelly_synchronize.system.cpu_budget import get_default_worker_count
+
+logger = logging.getLogger(__name__)
+
+# lines of stderr kept from each process for error messages, so long running ffmpeg jobs don't fill memory with log output
+STDERR_TAIL_LINES = 50
+# ffmpeg outputs that write to stdout, other pipes like "pipe:3" leave stdout free for progress
+STDOUT_PIPE_ARGUMENTS = {"-", "pipe:", "pipe:1"}
+
+active_runner_state = threading.local()
+
+
+def get_active_ffmpeg_runner() -> Optional["FFmpegRunner"]:
+    """Return the runner subprocesses started from this thread should run on, if there is one"""
+    return getattr(active_runner_state, "runner", None)
+
+
+def set_active_ffmpeg_runner(runner: Optional["FFmpegRunner"]):
+    active_runner_state.runner = runner
+
+
+def add_progress_arguments(command: List[str]) -> tuple:
+    """Ask ffmpeg to write its progress to stdout, unless stdout is already used for output.
+    Returns the command and whether it reports progress.
+    """
+    if Path(command[0]).stem != "ffmpeg" or any(
+        str(argument) in STDOUT_PIPE_ARGUMENTS for argument in command[1:]
+    ):
+        return command, False
+
+    return [command[0], "-progress", "pipe:1", "-nostats", *command[1:]], True
+
+
+def parse_progress_line(line: str, progress: dict) -> bool:
+    """Add a line of ffmpeg's `-progress` output to the progress dictionary.
+    Returns True when the line ends a progress report.
+    """
+    key, separator, value = line.strip().partition("=")
+    if separator == "":
+        return False
+
+    try:
+        if key == "frame":
+            progress["frame"] = int(value)
+        elif key == "out_time_us":
+            progress["out time"] = int(value) / 1e6
+        elif key == "speed":
+            progress["speed"] = float(value.rstrip("x"))
+        elif key == "progress":
+            progress["status"] = value
+            return True
+    except ValueError:
+        # values are "N/A" until ffmpeg knows them
+        pass
+
+    return False
+
+
+class FFmpegRunner:
+    """Run ffmpeg and ffprobe subprocesses concurrently on one asyncio event loop, without forking Python workers.
+    A semaphore limits how many processes run at once, ffmpeg progress is parsed from `-progress pipe:1` as it streams,
+    and processes are stopped if they run past the timeout or the runner is cancelled.
+
+    The runner has the same `map`, `starmap` and `apply` methods as a multiprocessing Pool, so it can be passed as the pool
+    of the pipeline functions. Functions are run on threads that send their subprocesses to the event loop through `run_subprocess`.
+    Inside `with runner:`, subprocesses started from the entering thread also run on the event loop.
+    """
+
+    def __init__(
+        self,
+        max_concurrent_processes: Optional[int] = None,
+        timeout: Optional[float] = None,
+        progress_callback: Optional[Callable[[dict], None]] = None,
+    ):
+        if max_concurrent_processes is None:
+            max_concurrent_processes = get_default_worker_count()
+        self.max_concurrent_processes = max_concurrent_processes
+        self.timeout = timeout
+        self.progress_callback = progress_callback
+
+        self.cancelled = False
+        self.pending_futures = set()
+        self.futures_lock = threading.Lock()
+        self.previous_runner = None
+
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(
+            target=self.loop.run_forever, name="ffmpeg-event-loop", daemon=True
+        )
+        self.loop_thread.start()
+        # before python 3.10, asyncio primitives bind to the event loop they are created in
+        self.semaphore = asyncio.run_coroutine_threadsafe(
+            self.create_semaphore(), self.loop
+        ).result()
+        self.thread_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_concurrent_processes,
+            thread_name_prefix="ffmpeg-runner",
+            initializer=set_active_ffmpeg_runner,
+            initargs=(self,),
+        )
+
+    async def create_semaphore(self) -> asyncio.Semaphore:
+        return asyncio.Semaphore(self.max_concurrent_processes)
+
+    def __enter__(self) -> "FFmpegRunner":
+        self.previous_runner = get_active_ffmpeg_runner()
+        set_active_ffmpeg_runner(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        set_active_ffmpeg_runner(self.previous_runner)
+        if exc_type is not None:
+            self.cancel()
+        self.close()
+
+    def close(self):
+        self.thread_pool.shutdown(wait=True)
+        # cancelled processes are still being stopped on the event loop after their callers have returned
+        asyncio.run_coroutine_threadsafe(
+            self.wait_for_running_tasks(), self.loop
+        ).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
+        self.loop.close()
+
+    async def wait_for_running_tasks(self):
+        running_tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        await asyncio.gather(*running_tasks, return_exceptions=True)
+
+    def cancel(self):
+        """Stop every running subprocess, and fail any started afterwards"""
+        self.cancelled = True
+        with self.futures_lock:
+            pending_futures = list(self.pending_futures)
+        for future in pending_futures:
+            future.cancel()
+
+    def run(
+        self,
+        command: List[str],
+        text: bool = False,
+        merge_stderr: bool = False,
+        timeout: Optional[float] = None,
+        pass_fds: tuple = (),
+    ) -> subprocess.CompletedProcess:
+        """Run a subprocess on the event loop and wait for it to finish. Can be called from any thread except the event loop's.
+        File descriptors in pass_fds are inherited by the process, for ffmpeg outputs like "pipe:3".
+        Raises concurrent.futures.CancelledError if the runner is cancelled, and subprocess.TimeoutExpired if the process times out.
+        """
+        if self.cancelled:
+            raise concurrent.futures.CancelledError(
+                f"ffmpeg runner was cancelled before running {command[0]}"
+            )
+
+        future = asyncio.run_coroutine_threadsafe(
+            self.run_async(
+                command=command,
+                text=text,
+                merge_stderr=merge_stderr,
+                timeout=timeout,
+                progress_context=get_current_stage(),
+                pass_fds=pass_fds,
+                subprocess_counter=get_thread_subprocess_counter(),
+            ),
+            self.loop,
+        )
+        with self.futures_lock:
+            self.pending_futures.add(future)
+        try:
+            return future.result()
+        finally:
+            with self.futures_lock:
+                self.pending_futures.discard(future)
+
+    async def run_async(
+        self,
+        command: List[str],
+        text: bool = False,
+        merge_stderr: bool = False,
+        timeout: Optional[float] = None,
+        progress_context: Optional[dict] = None,
+        pass_fds: tuple = (),
+        subprocess_counter: Optional[SubprocessCounter] = None,
+    ) -> subprocess.CompletedProcess:
+        """Run a subprocess on the event loop. Progress reports include the progress context, like the stage and camera the process is for.
+        The process is counted on the subprocess counter of the thread it is run for, or the event loop thread's if none is given.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        process_command, reports_progress = add_progress_arguments(command)
+
+        async with self.semaphore:
+            record_subprocess_spawned(counter=subprocess_counter)
+            process = await asyncio.create_subprocess_exec(
+                *process_command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                # stdout carries the progress reports of ffmpeg commands, so their stderr is never merged into it
+                stderr=(
+                    asyncio.subprocess.STDOUT
+                    if merge_stderr and not reports_progress
+                    else asyncio.subprocess.PIPE
+                ),
+                pass_fds=pass_fds,
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    self.communicate(
+                        process=process,
+                        reports_progress=reports_progress,
+                        progress={
+                            "output": str(command[-1]),
+                            **(progress_context or {}),
+                        },
+                    ),
+                    timeout=timeout,
+                )
+            except asyncio.TimeoutError:
+                await self.stop_process(process)
+                raise subprocess.TimeoutExpired(cmd=command, timeout=timeout)
+            except asyncio.CancelledError:
+                await self.stop_process(process)
+                raise
+
+        if text:
+            stdout, stderr = stdout.decode(), stderr.decode()
+
+        return subprocess.CompletedProcess(
+            args=command, returncode=process.returncode, stdout=stdout, stderr=stderr
+        )
+
+    async def communicate(
+        self,
+        process: asyncio.subprocess.Process,
+        reports_progress: bool,
+        progress: dict,
+    ) -> tuple:
+        """Read a process's output until it exits. Progress output is parsed as it streams, and only its final report is kept,
+        like the final stats line ffmpeg writes without `-progress`. Only the tail of stderr is kept.
+        """
+
+        async def read_stdout() -> bytes:
+            if not reports_progress:
+                return await process.stdout.read()
+
+            report_lines = []
+            final_report = b""
+            async for line in process.stdout:
+                report_lines.append(line)
+                if parse_progress_line(line.decode(errors="replace"), progress):
+                    self.report_progress(dict(progress))
+                    final_report = b"".join(report_lines)
+                    report_lines = []
+            return final_report
+
+        async def read_stderr_tail() -> bytes:
+            if process.stderr is None:
+                return b""
+
+            stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+            async for line in process.stderr:
+                stderr_tail.append(line)
+            return b"".join(stderr_tail)
+
+        stdout, stderr = await asyncio.gather(read_stdout(), read_stderr_tail())
+        await process.wait()
+
+        return stdout, stderr
+
+    def report_progress(self, progress: dict):
+        if self.progress_callback is None:
+            return
+        try:
+            self.progress_callback(progress)
+        except Exception as e:
+            logger.warning(f"Error in ffmpeg progress callback: {e}")
+
+    async def stop_process(self, process: asyncio.subprocess.Process):
+        """Kill a process and wait for it to exit. Its output is partial, so there's no point letting ffmpeg finish writing it."""
+        if process.returncode is not None:
+            return
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+        await process.wait()
+
+    def map(self, function: Callable, iterable: Iterable) -> list:
+        return self.starmap(function, ((item,) for item in iterable))
+
+    def starmap(self, function: Callable, iterable: Iterable) -> list:
+        argument_lists = list(iterable)
+        if get_active_ffmpeg_runner() is self and self.is_runner_thread():
+            # called from one of the runner's own threads, which would deadlock waiting on the same thread pool
+            return [function(*arguments) for arguments in argument_lists]
+
+        futures = [
+            self.thread_pool.submit(function, *arguments)
+            for arguments in argument_lists
+        ]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def apply(self, function: Callable, args: tuple = (), kwds: Optional[dict] = None):
+        return self.starmap(lambda: function(*args, **(kwds or {})), [()])[0]
+
+    @staticmethod
+    def is_runner_thread() -> bool:
+        return threading.current_thread().name.startswith("ffmpeg-runner")
@@ -1,11 +1,29 @@
-import json
 import logging
-import cv2
-from deffcode import FFdecoder, Sourcer
+from typing import Optional, Tuple
 
+from deffcode import Sourcer
+
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    record_subprocess_spawned,
+)
+from skelly_synchronize.core_processes.synchronization_progress import (
+    ProgressReporter,
+)
+from skelly_synchronize.core_processes.video_functions.async_ffmpeg import (
+    get_active_ffmpeg_runner,
+)
 from skelly_synchronize.core_processes.video_functions.ffmpeg_functions import (
     check_for_ffmpeg,
+    ffmpeg_string,
+)
+from skelly_synchronize.core_processes.video_functions.raw_frame_pipeline import (
+    choose_pipe_pixel_format,
+    create_decoder_command,
+    create_encoder_command,
+    find_frame_size_bytes,
+    pipe_frames,
 )
+from skelly_synchronize.system.cpu_budget import allocate_threads_per_job, split_threads
 
 tranposition_dictionary = {
     90.0: "transpose=cclock",
@@ -23,61 +41,100 @@ def trim_single_video_deffcode(
     input_video_pathstring: str,
     frame_list: list,
     output_video_pathstring: str,
-):
+    progress_reporter: Optional[ProgressReporter] = None,
+    pixel_format: str = "bgr24",
+) -> int:
+    """Trim a video to the frames in the frame list, decoding and encoding every frame.
+    deffcode probes the source, then raw frames are piped from a decoding ffmpeg process to an encoding one through pooled buffers.
+    A "native" pixel format pipes frames in the source's pixel format, skipping the conversion to and from BGR.
+
+    Returns the number of frames written.
+    """
+    frame_source = probe_frame_source(input_video_pathstring)
+    pipe_pixel_format = choose_pipe_pixel_format(
+        requested_pixel_format=pixel_format,
+        source_pixel_format=frame_source["source pixel format"],
+    )
+    frame_resolution = frame_source["frame resolution"]
+    ffmpeg_location = frame_source["ffmpeg location"]
+    decoder_threads, encoder_threads = find_pipe_thread_counts()
+    # decoding starts at the first frame of the trim, so earlier frames are dropped inside ffmpeg instead of being converted and piped
+    first_frame_number = min(frame_list, default=0)
+    last_frame_number = max(frame_list, default=-1)
+
+    return pipe_frames(
+        decoder_command=create_decoder_command(
+            ffmpeg_location=ffmpeg_location,
+            input_video_pathstring=str(input_video_pathstring),
+            pixel_format=pipe_pixel_format,
+            threads=decoder_threads,
+            transpose_filter=frame_source["transpose filter"],
+            start_frame=first_frame_number,
+            frame_count=last_frame_number + 1 - first_frame_number,
+        ),
+        encoder_command=create_encoder_command(
+            ffmpeg_location=ffmpeg_location,
+            output_video_pathstring=str(output_video_pathstring),
+            pixel_format=pipe_pixel_format,
+            frame_resolution=frame_resolution,
+            framerate=frame_source["framerate"],
+            threads=encoder_threads,
+        ),
+        frame_size_bytes=find_frame_size_bytes(
+            width=frame_resolution[0],
+            height=frame_resolution[1],
+            pixel_format=pipe_pixel_format,
+        ),
+        frame_numbers=frame_list,
+        progress_reporter=progress_reporter,
+        first_frame_number=first_frame_number,
+    )
+
+
+def probe_frame_source(input_video_pathstring: str) -> dict:
+    """Probe a video with deffcode for what decoding its raw frames needs.
+    Returns a dictionary with the "ffmpeg location", the "frame resolution" as width and height after rotation,
+    the "transpose filter" that applies the video's rotation metadata or None, the "source pixel format" and the "framerate".
+    """
     try:
         ffmpeg_location = check_for_ffmpeg()
     except FileNotFoundError:
         ffmpeg_location = ""
 
     sourcer = Sourcer(
-        source=input_video_pathstring, custom_ffmpeg=ffmpeg_location
+        source=str(input_video_pathstring), custom_ffmpeg=ffmpeg_location
     ).probe_stream()
     metadata_dictionary = sourcer.retrieve_metadata()
+    # deffcode runs ffmpeg once to probe the source
+    record_subprocess_spawned()
 
+    frame_resolution = tuple(metadata_dictionary["source_video_resolution"])
+    transpose_filter = None
     if metadata_dictionary["source_video_orientation"] != 0:
         logging.info("Video has reversed metadata, changing FFmpeg transpose argument")
-        ffparams = {
-            "-ffprefixes": ["-noautorotate"],
-            "-vf": tranposition_dictionary[
-                metadata_dictionary["source_video_orientation"]
-            ],
-        }
+        transpose_filter = tranposition_dictionary[
+            metadata_dictionary["source_video_orientation"]
+        ]
+        if abs(metadata_dictionary["source_video_orientation"]) in {90.0, 270.0}:
+            frame_resolution = (frame_resolution[1], frame_resolution[0])
+
+    return {
+        "ffmpeg location": ffmpeg_location or ffmpeg_string,
+        "frame resolution": frame_resolution,
+        "transpose filter": transpose_filter,
+        "source pixel format": metadata_dictionary["source_video_pixfmt"],
+        "framerate": metadata_dictionary["source_video_framerate"],
+    }
+
+
+def find_pipe_thread_counts() -> Tuple[int, int]:
+    """Split this job's share of the CPU budget between its decoding and encoding ffmpeg process, the encoder getting any odd thread.
+    Returns the decoder and encoder thread counts.
+    """
+    runner = get_active_ffmpeg_runner()
+    if runner is not None:
+        threads = allocate_threads_per_job(runner.max_concurrent_processes)
     else:
-        ffparams = {}
-
-    decoder = FFdecoder(
-        str(input_video_pathstring),
-        frame_format="bgr24",
-        custom_ffmpeg=ffmpeg_location,
-        verbose=False,
-        **ffparams,
-    ).formulate()
-
-    metadata_dictionary = json.loads(decoder.metadata)
-
-    fourcc = cv2.VideoWriter.fourcc(*"mp4v")
-    framerate = metadata_dictionary["output_framerate"]
-    framesize = tuple(metadata_dictionary["output_frames_resolution"])
-
-    video_writer_object = cv2.VideoWriter(
-        output_video_pathstring, fourcc, framerate, framesize
-    )
-
-    current_frame = 0
-    written_frames = 0
-
-    for frame in decoder.generateFrame():
-        if frame is None:
-            break
-
-        if current_frame in frame_list:
-            video_writer_object.write(frame)
-            written_frames += 1
-
-        if written_frames == len(frame_list):
-            break
-
-        current_frame += 1
-
-    decoder.terminate()
-    video_writer_object.release()
+        threads = allocate_threads_per_job()
+    decoder_threads, encoder_threads = split_threads(threads, process_count=2)
+    return decoder_threads, encoder_threads
@@ -1,9 +1,23 @@
+import bisect
+import json
 import logging
+import re
 import subprocess
 import shutil
+import time
 from pathlib import Path
-from typing import Union
-
+from typing import List, Optional, Union
+
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    record_subprocess_spawned,
+)
+from skelly_synchronize.core_processes.video_functions.async_ffmpeg import (
+    get_active_ffmpeg_runner,
+)
+from skelly_synchronize.system.cpu_budget import (
+    add_thread_arguments,
+    allocate_threads_per_job,
+)
 from skelly_synchronize.system.file_extensions import AudioExtension
 
 logger = logging.getLogger(__name__)
@@ -11,6 +25,36 @@ logger = logging.getLogger(__name__)
 ffmpeg_string = "ffmpeg"
 ffprobe_string = "ffprobe"
 
+SEEK_STRATEGIES = ["keyframe", "input", "output"]
+# seconds of packets read on either side of the start time when ffprobe looks for the keyframe to seek to.
+# ffprobe reads intervals in the file's absolute time, so for videos whose timestamps start later than this the window ends
+# before the start time, and the last keyframe read, or the start of the video, is used instead of the preceding keyframe.
+# The cut is still accurate, but more frames are decoded and dropped before the start time
+KEYFRAME_SEARCH_WINDOW = 10.0
+
+
+def run_subprocess(command: List[str], **kwargs) -> subprocess.CompletedProcess:
+    """Run a subprocess, counting it for stage instrumentation.
+    If an FFmpegRunner is active in this thread, the subprocess runs on its event loop instead, where it can be timed out and cancelled.
+    ffmpeg commands get their share of the CPU budget, divided between the processes the runner or pool runs at once.
+    """
+    runner = get_active_ffmpeg_runner()
+    if runner is not None:
+        command = add_thread_arguments(
+            command,
+            threads=allocate_threads_per_job(runner.max_concurrent_processes),
+        )
+        return runner.run(
+            command,
+            text=kwargs.get("text", False),
+            merge_stderr=kwargs.get("stderr") == subprocess.STDOUT,
+            pass_fds=kwargs.get("pass_fds", ()),
+        )
+
+    command = add_thread_arguments(command, threads=allocate_threads_per_job())
+    record_subprocess_spawned()
+    return subprocess.run(command, **kwargs)
+
 
 def check_for_ffmpeg() -> str:
     ffmpeg_pathstring = shutil.which(ffmpeg_string)
@@ -54,6 +98,72 @@ def parse_ffmpeg_output(output: str, file_pathstring: str) -> float:
     return output_as_float
 
 
+def parse_frame_rate(frame_rate: str) -> float:
+    numerator, _, denominator = frame_rate.partition("/")
+    if denominator == "":
+        return float(numerator)
+    return float(numerator) / float(denominator)
+
+
+def parse_media_probe(output: str, file_pathstring: str) -> dict:
+    """Parse ffprobe JSON output into the duration and frame rate of the first video stream,
+    and the sample rate and channel count of the first audio stream, which are None if there is no audio.
+    """
+    try:
+        probe = json.loads(output)
+        streams = probe.get("streams", [])
+        video_stream = next(
+            stream for stream in streams if stream.get("codec_type") == "video"
+        )
+        audio_stream = next(
+            (stream for stream in streams if stream.get("codec_type") == "audio"),
+            None,
+        )
+        media_info = {
+            "video duration": float(probe["format"]["duration"]),
+            "video fps": parse_frame_rate(video_stream["r_frame_rate"]),
+            "audio sample rate": None,
+            "audio channels": None,
+        }
+        if audio_stream is not None:
+            media_info["audio sample rate"] = float(audio_stream["sample_rate"])
+            media_info["audio channels"] = int(audio_stream["channels"])
+    except (StopIteration, KeyError, ValueError, ZeroDivisionError) as e:
+        raise RuntimeError(
+            f"Unable to parse probe output for {file_pathstring}: {e}"
+        ) from e
+
+    return media_info
+
+
+def probe_media_ffprobe(file_pathstring: str) -> dict:
+    """Run one ffprobe call to get the video duration and frame rate, and the audio sample rate and channel count, of a file.
+    See `parse_media_probe` for the returned dictionary.
+    """
+    check_for_ffprobe()
+    probe_subprocess = run_subprocess(
+        [
+            ffprobe_string,
+            "-v",
+            "error",
+            "-show_entries",
+            "format=duration:stream=codec_type,r_frame_rate,sample_rate,channels",
+            "-of",
+            "json",
+            file_pathstring,
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if probe_subprocess.returncode != 0:
+        raise RuntimeError(
+            f"probe subprocess failed for video {file_pathstring} with return code {probe_subprocess.returncode}"
+        )
+
+    return parse_media_probe(probe_subprocess.stdout, file_pathstring)
+
+
 def extract_audio_from_video_ffmpeg(
     file_pathstring: str, output_file_path: Union[Path, str]
 ):
@@ -66,7 +176,7 @@ def extract_audio_from_video_ffmpeg(
             f"output path {Path(output_file_path).suffix} is not a valid audio extension, extracting audio requires a valid audio extension"
         )
 
-    extract_audio_subprocess = subprocess.run(
+    extract_audio_subprocess = run_subprocess(
         [
             ffmpeg_string,
             "-y",
@@ -86,7 +196,7 @@ def extract_audio_from_video_ffmpeg(
 
 def extract_video_duration_ffmpeg(file_pathstring: str):
     """Run a subprocess call to get the duration from a video file using ffmpeg"""
-    extract_duration_subprocess = subprocess.run(
+    extract_duration_subprocess = run_subprocess(
         [
             ffprobe_string,
             "-v",
@@ -119,7 +229,7 @@ def extract_video_fps_ffmpeg(file_pathstring: str):
     """Run a subprocess call to get the fps of a video file using ffmpeg"""
 
     check_for_ffprobe()
-    extract_fps_subprocess = subprocess.run(
+    extract_fps_subprocess = run_subprocess(
         [
             ffprobe_string,
             "-v",
@@ -149,7 +259,7 @@ def extract_audio_sample_rate_ffmpeg(file_pathstring: str):
     """Run a subprocess call to get the audio sample rate of a video file using ffmpeg"""
 
     check_for_ffprobe()
-    extract_sample_rate_subprocess = subprocess.run(
+    extract_sample_rate_subprocess = run_subprocess(
         [
             ffprobe_string,
             "-v",
@@ -182,6 +292,36 @@ def extract_audio_sample_rate_ffmpeg(file_pathstring: str):
     return audio_sample_rate
 
 
+def extract_audio_channel_count_ffmpeg(file_pathstring: str) -> int:
+    """Run a subprocess call to get the number of audio channels of a file using ffmpeg"""
+
+    check_for_ffprobe()
+    extract_channels_subprocess = run_subprocess(
+        [
+            ffprobe_string,
+            "-v",
+            "error",
+            "-select_streams",
+            "a:0",
+            "-show_entries",
+            "stream=channels",
+            "-of",
+            "default=noprint_wrappers=1:nokey=1",
+            file_pathstring,
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    if extract_channels_subprocess.returncode != 0:
+        raise RuntimeError(
+            f"extract channels subprocess failed for file {file_pathstring} with return code {extract_channels_subprocess.returncode}"
+        )
+
+    return int(
+        parse_ffmpeg_output(str(extract_channels_subprocess.stdout), file_pathstring)
+    )
+
+
 def normalize_framerates_in_video_ffmpeg(
     input_video_pathstring: str,
     output_video_pathstring: str,
@@ -191,7 +331,7 @@ def normalize_framerates_in_video_ffmpeg(
     """Run a subprocess call to normalize the framerate and audio sample rate of a video file using ffmpeg"""
 
     check_for_ffmpeg()
-    normalize_framerates_subprocess = subprocess.run(
+    normalize_framerates_subprocess = run_subprocess(
         [
             ffmpeg_string,
             "-i",
@@ -211,21 +351,175 @@ def normalize_framerates_in_video_ffmpeg(
         )
 
 
+def parse_keyframe_timestamps(output: str) -> List[float]:
+    """Parse ffprobe csv packet output into a sorted list of keyframe times, relative to the start of the file"""
+    start_time = 0.0
+    keyframe_timestamps = []
+    for line in output.splitlines():
+        fields = line.strip().split(",")
+        if fields[0] == "format" and len(fields) > 1 and fields[1] not in {"", "N/A"}:
+            start_time = float(fields[1])
+        elif fields[0] == "packet" and len(fields) > 2:
+            pts_time, flags = fields[1], fields[2]
+            if "K" in flags and pts_time not in {"", "N/A"}:
+                keyframe_timestamps.append(float(pts_time))
+
+    return sorted(timestamp - start_time for timestamp in keyframe_timestamps)
+
+
+def parse_framecrc_keyframe_timestamps(output: str) -> List[float]:
+    """Parse the keyframe times out of ffmpeg framecrc output of a single copied stream.
+    framecrc marks packets that aren't plain keyframes with their flags, so unflagged packets are keyframes.
+    Timestamps are in the stream time base from the header, relative to the start of the file.
+    """
+    time_base = None
+    keyframe_timestamps = []
+    for line in output.splitlines():
+        if line.startswith("#tb"):
+            numerator, _, denominator = line.split(":")[-1].strip().partition("/")
+            time_base = int(numerator) / int(denominator)
+        elif not line.startswith("#") and time_base is not None:
+            fields = [field.strip() for field in line.split(",")]
+            if len(fields) >= 6 and not any(
+                field.startswith("F=") for field in fields[6:]
+            ):
+                keyframe_timestamps.append(int(fields[2]) * time_base)
+
+    return sorted(keyframe_timestamps)
+
+
+def parse_encoded_frame_count(output: str) -> Optional[int]:
+    """Parse the number of frames ffmpeg wrote out of its final stats line, or its final `-progress` report.
+    Returns None if the output has no frame count.
+    """
+    frame_counts = re.findall(r"frame=\s*(\d+)", output)
+    if len(frame_counts) == 0:
+        return None
+    return int(frame_counts[-1])
+
+
+def extract_keyframe_timestamps_ffmpeg(
+    file_pathstring: str,
+    start_time: Optional[float] = None,
+    search_window: float = KEYFRAME_SEARCH_WINDOW,
+) -> List[float]:
+    """Run a subprocess call to get the keyframe times of a video file using ffprobe.
+    No frames are decoded, but ffprobe still demuxes every packet it reports,
+    so if a start time is given only the packets within the search window around it are read,
+    starting from the keyframe before the window, which finds the keyframe preceding the start time
+    as long as the video's timestamps start less than the search window after 0.
+    """
+    check_for_ffprobe()
+    read_interval_arguments = []
+    if start_time is not None:
+        read_interval_arguments = [
+            "-read_intervals",
+            f"{max(start_time - search_window, 0)}%{start_time + search_window}",
+        ]
+    extract_keyframes_subprocess = run_subprocess(
+        [
+            ffprobe_string,
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "packet=pts_time,flags:format=start_time",
+            *read_interval_arguments,
+            "-of",
+            "csv",
+            file_pathstring,
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if extract_keyframes_subprocess.returncode != 0:
+        raise RuntimeError(
+            f"extract keyframes subprocess failed for video {file_pathstring} with return code {extract_keyframes_subprocess.returncode}"
+        )
+
+    return parse_keyframe_timestamps(extract_keyframes_subprocess.stdout)
+
+
+def find_preceding_keyframe_time(
+    keyframe_timestamps: List[float], target_time: float, tolerance: float = 1e-6
+) -> float:
+    """Return the time of the last keyframe at or before the target time, or 0 if there is none"""
+    keyframe_index = bisect.bisect_right(keyframe_timestamps, target_time + tolerance)
+    if keyframe_index == 0:
+        return 0.0
+
+    return max(keyframe_timestamps[keyframe_index - 1], 0.0)
+
+
+def create_seek_arguments(
+    input_video_pathstring: str,
+    start_time: float,
+    seek_strategy: str,
+    keyframe_timestamps: Optional[List[float]] = None,
+) -> tuple:
+    """Return the ffmpeg arguments placed before and after the input to seek to the start time, and the time skipped without decoding.
+    "output" seeking decodes every frame up to the start time, "input" seeking lets ffmpeg jump to the preceding keyframe,
+    and "keyframe" seeking jumps to the preceding keyframe found in the keyframe index, then cuts accurately with an output offset.
+    The keyframes around the start time are read with ffprobe unless keyframe timestamps are given, like those found in the analysis pass.
+    """
+    if seek_strategy not in SEEK_STRATEGIES:
+        raise ValueError(f"seek_strategy must be one of {SEEK_STRATEGIES}")
+
+    if seek_strategy == "keyframe" and keyframe_timestamps is None:
+        try:
+            keyframe_timestamps = extract_keyframe_timestamps_ffmpeg(
+                file_pathstring=input_video_pathstring, start_time=start_time
+            )
+        except (RuntimeError, FileNotFoundError) as e:
+            logger.warning(
+                f"Unable to build keyframe index for {input_video_pathstring}, falling back to input seeking: {e}"
+            )
+            seek_strategy = "input"
+
+    if seek_strategy == "keyframe":
+        keyframe_time = find_preceding_keyframe_time(
+            keyframe_timestamps=keyframe_timestamps, target_time=start_time
+        )
+        return (
+            ["-ss", f"{keyframe_time}"],
+            ["-ss", f"{start_time - keyframe_time}"],
+            keyframe_time,
+        )
+    if seek_strategy == "input":
+        return ["-ss", f"{start_time}"], [], start_time
+
+    return [], ["-ss", f"{start_time}"], 0.0
+
+
 def trim_single_video_ffmpeg(
     input_video_pathstring: str,
     start_time: float,
     desired_duration: float,
     output_video_pathstring: str,
-):
-    """Run a subprocess call to trim a video from start time to last as long as the desired duration"""
+    seek_strategy: str = "keyframe",
+    keyframe_timestamps: Optional[List[float]] = None,
+) -> Optional[int]:
+    """Run a subprocess call to trim a video from start time to last as long as the desired duration.
+    Returns the number of frames the encoder reports writing, or None if it didn't report one.
+    """
     check_for_ffmpeg()
-    trim_video_subprocess = subprocess.run(
+    input_seek_arguments, output_seek_arguments, skipped_time = create_seek_arguments(
+        input_video_pathstring=input_video_pathstring,
+        start_time=start_time,
+        seek_strategy=seek_strategy,
+        keyframe_timestamps=keyframe_timestamps,
+    )
+
+    start_timer = time.time()
+    trim_video_subprocess = run_subprocess(
         [
             ffmpeg_string,
+            *input_seek_arguments,
             "-i",
             f"{input_video_pathstring}",
-            "-ss",
-            f"{start_time}",
+            *output_seek_arguments,
             "-t",
             f"{desired_duration}",
             "-y",
@@ -234,12 +528,24 @@ def trim_single_video_ffmpeg(
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
     )
+    elapsed_time = time.time() - start_timer
 
     if trim_video_subprocess.returncode != 0:
         raise RuntimeError(
             f"trim video subprocess failed for video {input_video_pathstring} with return code {trim_video_subprocess.returncode}"
         )
 
+    # decode speed is estimated from the part of the video that was decoded, and used to estimate the time the seek saved
+    decoded_time = start_time - skipped_time + desired_duration
+    estimated_time_saved = elapsed_time * skipped_time / max(decoded_time, 1e-6)
+    logger.info(
+        f"Trimmed {input_video_pathstring} in {elapsed_time:.2f} seconds with {seek_strategy} seeking - skipped decoding {skipped_time:.2f} seconds of video, saving an estimated {estimated_time_saved:.2f} seconds"
+    )
+
+    return parse_encoded_frame_count(
+        trim_video_subprocess.stdout.decode(errors="replace")
+    )
+
 
 def attach_audio_to_video_ffmpeg(
     input_video_pathstring: str,
@@ -249,7 +555,7 @@ def attach_audio_to_video_ffmpeg(
     """Run a subprocess call to attach audio file back to the video"""
 
     check_for_ffmpeg()
-    attach_audio_subprocess = subprocess.run(
+    attach_audio_subprocess = run_subprocess(
         [
             ffmpeg_string,
             "-i",
@@ -0,0 +1,241 @@
+import concurrent.futures
+import logging
+from functools import partial
+from multiprocessing.pool import Pool
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from skelly_synchronize.core_processes.sync_result import (
+    SyncResult,
+    load_sync_manifest,
+)
+from skelly_synchronize.core_processes.video_functions.aligned_frame_reader import (
+    AlignedFrameReader,
+)
+from skelly_synchronize.system.cpu_budget import (
+    allocate_threads_per_job,
+    find_concurrent_job_count,
+)
+from skelly_synchronize.system.file_extensions import NUMPY_EXTENSION
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = [NUMPY_EXTENSION, "png", "jpg"]
+# image files encoded at once for each camera, each encoder releases the GIL while it compresses
+IMAGE_WRITER_COUNT = 4
+
+
+def export_synchronized_frames(
+    sync_manifest: Union[str, Path, SyncResult],
+    output_folder_path: Union[str, Path],
+    export_format: str = NUMPY_EXTENSION,
+    frame_size: Optional[Tuple[int, int]] = None,
+    grayscale: bool = False,
+    pool: Optional[Pool] = None,
+    max_processes: Optional[int] = None,
+) -> Dict[str, dict]:
+    """Decode each camera's synchronized frames from the videos of a sync manifest straight into arrays or images,
+    skipping the lossy encode of trimmed videos and the decode of reading them back.
+    Works from the raw videos, so a session synchronized with write_synchronized_videos=False can be exported.
+
+    The "npy" format writes a memory mapped `{camera name}.npy` array of shape (frames, height, width, channels) per camera,
+    which `np.load(path, mmap_mode="r")` opens without reading it into memory. The "png" and "jpg" formats write numbered images
+    to a folder per camera, encoded by several writer threads. Frames are resized to the frame size, as width and height, if one is given,
+    and are BGR or, if grayscale is True, a single channel. Every camera is exported with the same number of frames.
+    If a pool is given, the cameras are exported on its workers, otherwise up to max_processes cameras are exported at once on threads.
+
+    Returns a dictionary keyed by camera name with the "output path" and "frame count" of each camera's export.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"export_format must be one of {EXPORT_FORMATS}")
+    if not isinstance(sync_manifest, SyncResult):
+        sync_manifest = load_sync_manifest(sync_manifest)
+    output_folder_path = Path(output_folder_path)
+    output_folder_path.mkdir(parents=True, exist_ok=True)
+
+    camera_names = list(sync_manifest.cameras)
+    concurrent_cameras = find_concurrent_job_count(
+        job_count=len(camera_names), max_processes=max_processes
+    )
+    # pool workers divide the CPU budget between their own jobs
+    decoder_threads = (
+        None if pool is not None else allocate_threads_per_job(concurrent_cameras)
+    )
+    export_camera = partial(
+        export_camera_frames,
+        sync_result=sync_manifest,
+        output_folder_path=output_folder_path,
+        export_format=export_format,
+        frame_size=frame_size,
+        grayscale=grayscale,
+        decoder_threads=decoder_threads,
+    )
+    if pool is None:
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=concurrent_cameras, thread_name_prefix="frame-export"
+        ) as executor:
+            export_info_list = list(executor.map(export_camera, camera_names))
+    else:
+        export_info_list = pool.map(export_camera, camera_names)
+    export_info_dict = dict(zip(camera_names, export_info_list))
+
+    shortest_frame_count = min(
+        export_info["frame count"] for export_info in export_info_dict.values()
+    )
+    for camera_name, export_info in export_info_dict.items():
+        if export_info["frame count"] > shortest_frame_count:
+            logger.warning(
+                f"Cutting camera {camera_name} from {export_info['frame count']} to {shortest_frame_count} frames to match the shortest camera"
+            )
+            truncate_export(export_info["output path"], shortest_frame_count)
+            export_info["frame count"] = shortest_frame_count
+
+    logger.info(
+        f"Exported {shortest_frame_count} frames of {len(camera_names)} cameras to {output_folder_path}"
+    )
+    return export_info_dict
+
+
+def export_camera_frames(
+    camera_name: str,
+    sync_result: SyncResult,
+    output_folder_path: Path,
+    export_format: str,
+    frame_size: Optional[Tuple[int, int]] = None,
+    grayscale: bool = False,
+    decoder_threads: Optional[int] = None,
+) -> dict:
+    """Export one camera's synchronized frames, see `export_synchronized_frames`"""
+    reader = AlignedFrameReader(
+        sync_result,
+        camera_names=[camera_name],
+        pixel_format="gray" if grayscale else "bgr24",
+        frame_size=frame_size,
+        decoder_threads=decoder_threads or allocate_threads_per_job(),
+    )
+    with reader:
+        if export_format == NUMPY_EXTENSION:
+            output_path = output_folder_path / f"{camera_name}.{NUMPY_EXTENSION}"
+            frame_count = write_frames_to_memmap(reader, output_path)
+        else:
+            output_path = output_folder_path / camera_name
+            frame_count = write_frames_to_images(reader, output_path, export_format)
+
+    logger.info(
+        f"Exported {frame_count} frames of camera {camera_name} to {output_path}"
+    )
+    return {"output path": output_path, "frame count": frame_count}
+
+
+def write_frames_to_memmap(reader: AlignedFrameReader, output_path: Path) -> int:
+    """Write the reader's frames into a memory mapped npy array, returning the number of frames written.
+    The array is sized for every synchronized frame, and cut to the frames written if the video ends early.
+    """
+    frame_array = None
+    frame_count = 0
+    for (frame,) in reader:
+        if frame_array is None:
+            # the frame shape is only known once the first frame is decoded
+            frame_shape = frame.shape if frame.ndim == 3 else (*frame.shape, 1)
+            frame_array = np.lib.format.open_memmap(
+                output_path,
+                mode="w+",
+                dtype=np.uint8,
+                shape=(len(reader), *frame_shape),
+            )
+        frame_array[frame_count] = frame.reshape(frame_array.shape[1:])
+        frame_count += 1
+
+    if frame_array is None:
+        raise RuntimeError(f"No frames were decoded for {output_path}")
+    frame_array.flush()
+    del frame_array
+
+    if frame_count < len(reader):
+        truncate_export(output_path, frame_count)
+    return frame_count
+
+
+def write_frames_to_images(
+    reader: AlignedFrameReader, output_folder_path: Path, image_extension: str
+) -> int:
+    """Write the reader's frames as numbered images, encoded on writer threads, returning the number of frames written"""
+    output_folder_path.mkdir(parents=True, exist_ok=True)
+    frame_count = 0
+    pending_writes = set()
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=IMAGE_WRITER_COUNT, thread_name_prefix="image-writer"
+    ) as executor:
+        for (frame,) in reader:
+            image_path = output_folder_path / f"{frame_count:06d}.{image_extension}"
+            # the reader reuses its buffers, so each writer gets its own copy of the frame
+            pending_writes.add(executor.submit(write_image, image_path, frame.copy()))
+            frame_count += 1
+            # writes are bounded, so frames wait in the reader's buffers instead of piling up in memory
+            if len(pending_writes) >= 2 * IMAGE_WRITER_COUNT:
+                done_writes, pending_writes = concurrent.futures.wait(
+                    pending_writes, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for done_write in done_writes:
+                    done_write.result()
+        for pending_write in pending_writes:
+            pending_write.result()
+
+    return frame_count
+
+
+def write_image(image_path: Path, frame: np.ndarray):
+    # OpenCV is slow to import, so it is only imported when images are written
+    import cv2
+
+    if not cv2.imwrite(str(image_path), frame):
+        raise RuntimeError(f"Could not write image {image_path}")
+
+
+def truncate_export(output_path: Path, frame_count: int):
+    """Cut an export to its first frame count frames, rewriting an npy array's header in place, or removing the images past the last frame"""
+    output_path = Path(output_path)
+    if output_path.is_dir():
+        for image_path in sorted(output_path.iterdir())[frame_count:]:
+            image_path.unlink()
+        return
+
+    truncate_npy_file(output_path, frame_count)
+
+
+def truncate_npy_file(npy_file_path: Path, frame_count: int):
+    """Cut a C ordered npy array to its first frame count entries along the first axis without copying it.
+    The shape in the fixed length header is rewritten, padded with spaces to the same length, and the file is truncated after the kept frames.
+    """
+    with open(npy_file_path, "r+b") as npy_file:
+        version = np.lib.format.read_magic(npy_file)
+        header_length_start = npy_file.tell()
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(npy_file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(npy_file)
+        data_start = npy_file.tell()
+        if fortran_order:
+            raise ValueError(f"Can't truncate Fortran ordered array {npy_file_path}")
+        if frame_count > shape[0]:
+            raise ValueError(
+                f"Can't cut {npy_file_path} with {shape[0]} frames to {frame_count} frames"
+            )
+
+        header_start = header_length_start + (2 if version == (1, 0) else 4)
+        truncated_shape = (frame_count, *shape[1:])
+        header = repr(
+            {
+                "descr": np.lib.format.dtype_to_descr(dtype),
+                "fortran_order": False,
+                "shape": truncated_shape,
+            }
+        ).encode("latin1")
+        # a shorter first dimension never makes the header longer, so the padding is never negative
+        npy_file.seek(header_start)
+        npy_file.write(header.ljust(data_start - header_start - 1) + b"\n")
+
+        frame_size_bytes = dtype.itemsize * int(np.prod(shape[1:]))
+        npy_file.truncate(data_start + frame_count * frame_size_bytes)
@@ -0,0 +1,337 @@
+import functools
+import logging
+import queue
+import re
+import subprocess
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    record_subprocess_spawned,
+)
+from skelly_synchronize.core_processes.synchronization_progress import (
+    ProgressReporter,
+    report_frame_progress,
+)
+
+logger = logging.getLogger(__name__)
+
+# planes of the raw pixel formats frames can be piped in, as bytes per sample and horizontal and vertical subsampling,
+# formats missing from here are converted to bgr24. Packed 4:2:2 formats are one plane of 4 bytes per pair of pixels
+RAW_PIXEL_FORMAT_PLANES = {
+    "gray": [(1, 1, 1)],
+    "yuv420p": [(1, 1, 1), (1, 2, 2), (1, 2, 2)],
+    "yuvj420p": [(1, 1, 1), (1, 2, 2), (1, 2, 2)],
+    "nv12": [(1, 1, 1), (2, 2, 2)],
+    "nv21": [(1, 1, 1), (2, 2, 2)],
+    "yuv422p": [(1, 1, 1), (1, 2, 1), (1, 2, 1)],
+    "yuvj422p": [(1, 1, 1), (1, 2, 1), (1, 2, 1)],
+    "yuyv422": [(4, 2, 1)],
+    "uyvy422": [(4, 2, 1)],
+    "yuv444p": [(1, 1, 1), (1, 1, 1), (1, 1, 1)],
+    "yuvj444p": [(1, 1, 1), (1, 1, 1), (1, 1, 1)],
+    "rgb24": [(3, 1, 1)],
+    "bgr24": [(3, 1, 1)],
+}
+PIXEL_FORMAT_OPTIONS = ["bgr24", "native"]
+# frames decoded ahead of the encoder, each buffer holds one frame
+DEFAULT_BUFFER_COUNT = 4
+# ffmpeg 5.1 replaced -vsync with -fps_mode, older versions only have -vsync
+FPS_MODE_FFMPEG_VERSION = (5, 1)
+# mpeg4 is the codec behind OpenCV's mp4v fourcc, which the deffcode handler wrote with before
+ENCODER_ARGUMENTS = ["-c:v", "mpeg4", "-q:v", "3"]
+
+
+def find_frame_size_bytes(width: int, height: int, pixel_format: str) -> int:
+    """Return the size of one raw frame as ffmpeg writes it, with subsampled planes rounded up for odd widths and heights"""
+    if pixel_format not in RAW_PIXEL_FORMAT_PLANES:
+        raise ValueError(f"Unsupported raw pixel format {pixel_format}")
+    return sum(
+        bytes_per_sample
+        * -(-width // horizontal_subsampling)
+        * -(-height // vertical_subsampling)
+        for bytes_per_sample, horizontal_subsampling, vertical_subsampling in RAW_PIXEL_FORMAT_PLANES[
+            pixel_format
+        ]
+    )
+
+
+def choose_pipe_pixel_format(requested_pixel_format: str, source_pixel_format: str):
+    """Return the pixel format frames are piped in.
+    "native" passes the source's pixel format through without a colour conversion, when its frame size is known.
+    """
+    if requested_pixel_format not in PIXEL_FORMAT_OPTIONS:
+        raise ValueError(f"pixel_format must be one of {PIXEL_FORMAT_OPTIONS}")
+
+    if requested_pixel_format == "native":
+        if source_pixel_format in RAW_PIXEL_FORMAT_PLANES:
+            return source_pixel_format
+        logger.info(
+            f"Source pixel format {source_pixel_format} can't be piped raw, converting frames to bgr24"
+        )
+    return "bgr24"
+
+
+class FrameBufferPool:
+    """A fixed set of preallocated frame buffers, handed out for frames to be read into and returned once they are written.
+    Frames are never allocated per frame, and the number of buffers limits how far decoding runs ahead of encoding.
+    """
+
+    def __init__(self, frame_size_bytes: int, buffer_count: int = DEFAULT_BUFFER_COUNT):
+        self.frame_size_bytes = frame_size_bytes
+        self.free_buffers = queue.Queue()
+        for _ in range(buffer_count):
+            self.free_buffers.put(np.empty(frame_size_bytes, dtype=np.uint8))
+
+    def acquire(self, timeout: Optional[float] = None) -> np.ndarray:
+        """Wait for a free buffer, raising queue.Empty if none is freed within the timeout"""
+        return self.free_buffers.get(timeout=timeout)
+
+    def release(self, buffer: np.ndarray):
+        self.free_buffers.put(buffer)
+
+
+def read_frame_into(pipe, buffer: np.ndarray) -> bool:
+    """Fill the buffer with the next frame from an unbuffered pipe, returning False at the end of the stream"""
+    buffer_view = memoryview(buffer)
+    bytes_read = 0
+    while bytes_read < len(buffer_view):
+        remaining_view = buffer_view[bytes_read:]
+        chunk_size = pipe.readinto(remaining_view)
+        if not chunk_size:
+            if bytes_read > 0:
+                logger.warning(
+                    f"Discarding a partial frame of {bytes_read} bytes at the end of the stream"
+                )
+            return False
+        bytes_read += chunk_size
+    return True
+
+
+def write_frame_from(pipe, buffer: np.ndarray):
+    """Write the whole buffer to an unbuffered pipe, which may accept it in parts"""
+    buffer_view = memoryview(buffer)
+    while len(buffer_view) > 0:
+        bytes_written = pipe.write(buffer_view)
+        buffer_view = buffer_view[bytes_written:]
+
+
+@functools.lru_cache(maxsize=None)
+def find_passthrough_timing_arguments(ffmpeg_location: str) -> Tuple[str, ...]:
+    """Return the arguments that make ffmpeg output each decoded frame once with its own timestamp, for the ffmpeg version at the location.
+    Versions that can't be read, like builds from git, are assumed to be recent.
+    """
+    version_output = subprocess.run(
+        [ffmpeg_location, "-version"], capture_output=True, text=True
+    ).stdout
+    record_subprocess_spawned()
+    version_match = re.search(r"version n?(\d+)\.(\d+)", version_output)
+    if (
+        version_match is not None
+        and tuple(int(number) for number in version_match.groups())
+        < FPS_MODE_FFMPEG_VERSION
+    ):
+        return ("-vsync", "passthrough")
+    return ("-fps_mode", "passthrough")
+
+
+def create_decoder_command(
+    ffmpeg_location: str,
+    input_video_pathstring: str,
+    pixel_format: str,
+    threads: int,
+    transpose_filter: Optional[str] = None,
+    start_frame: int = 0,
+    frame_count: Optional[int] = None,
+    frame_size: Optional[Tuple[int, int]] = None,
+) -> List[str]:
+    """Create a command decoding raw frames to stdout, starting at the start frame and stopping after frame count frames if given.
+    Frames before the start frame are decoded and dropped before any conversion, so the frames match counting every decoded frame.
+    The frames are passed through with their own timestamps, since rawvideo output is constant frame rate by default,
+    and ffmpeg would otherwise repeat the first frame kept to fill the time back to the start of the video.
+    Frames are resized to the frame size, as width and height, if one is given.
+    """
+    command = [ffmpeg_location, "-v", "error", "-nostdin", "-threads", str(threads)]
+    if transpose_filter is not None:
+        command += ["-noautorotate"]
+    command += ["-i", input_video_pathstring]
+
+    video_filters = []
+    if start_frame > 0:
+        video_filters.append(f"select=gte(n\\,{start_frame})")
+    if transpose_filter is not None:
+        video_filters.append(transpose_filter)
+    if frame_size is not None:
+        video_filters.append(f"scale={frame_size[0]}:{frame_size[1]}:flags=area")
+    if video_filters:
+        command += ["-vf", ",".join(video_filters)]
+    if frame_count is not None:
+        command += ["-frames:v", str(frame_count)]
+    return command + [
+        *find_passthrough_timing_arguments(ffmpeg_location),
+        "-an",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        pixel_format,
+        "pipe:1",
+    ]
+
+
+def create_encoder_command(
+    ffmpeg_location: str,
+    output_video_pathstring: str,
+    pixel_format: str,
+    frame_resolution: Tuple[int, int],
+    framerate: float,
+    threads: int,
+) -> List[str]:
+    return [
+        ffmpeg_location,
+        "-v",
+        "error",
+        "-y",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        pixel_format,
+        "-s",
+        f"{frame_resolution[0]}x{frame_resolution[1]}",
+        "-r",
+        f"{framerate}",
+        "-i",
+        "pipe:0",
+        *ENCODER_ARGUMENTS,
+        "-threads",
+        str(threads),
+        output_video_pathstring,
+    ]
+
+
+def write_frames(
+    frame_queue: queue.Queue,
+    buffer_pool: FrameBufferPool,
+    encoder_pipe,
+    write_errors: list,
+):
+    """Write queued buffers to the encoder pipe and return them to the pool, until a None is queued"""
+    while True:
+        buffer = frame_queue.get()
+        if buffer is None:
+            return
+        try:
+            if not write_errors:
+                write_frame_from(encoder_pipe, buffer)
+        except (BrokenPipeError, OSError) as e:
+            write_errors.append(e)
+        finally:
+            buffer_pool.release(buffer)
+
+
+def stop_process(process: subprocess.Popen):
+    if process.poll() is None:
+        process.kill()
+    process.wait()
+    for stream in [process.stdin, process.stdout, process.stderr]:
+        if stream is not None:
+            stream.close()
+
+
+def pipe_frames(
+    decoder_command: List[str],
+    encoder_command: List[str],
+    frame_size_bytes: int,
+    frame_numbers: Iterable[int],
+    progress_reporter: Optional[ProgressReporter] = None,
+    buffer_count: int = DEFAULT_BUFFER_COUNT,
+    first_frame_number: int = 0,
+) -> int:
+    """Decode raw frames from one ffmpeg process and pipe the requested frame numbers into another, returning the number of frames written.
+    Frames are read straight into pooled buffers with `readinto` and written to the encoder from the same buffers on a writer thread,
+    so frames are never copied in Python and decoding overlaps with encoding.
+    The first frame the decoder writes is numbered first_frame_number, for decoders that start at a later frame.
+    """
+    frames_to_write = set(frame_numbers)
+    total_frames = (
+        max(frames_to_write) + 1 - first_frame_number if frames_to_write else 0
+    )
+    buffer_pool = FrameBufferPool(frame_size_bytes, buffer_count=buffer_count)
+    frame_queue = queue.Queue()
+    write_errors = []
+
+    decoder = subprocess.Popen(
+        decoder_command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=0,
+    )
+    encoder = subprocess.Popen(
+        encoder_command,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        bufsize=0,
+    )
+    record_subprocess_spawned(count=2)
+    writer_thread = threading.Thread(
+        target=write_frames,
+        args=(frame_queue, buffer_pool, encoder.stdin, write_errors),
+        name="frame-writer",
+        daemon=True,
+    )
+    writer_thread.start()
+
+    written_frames = 0
+    current_frame = first_frame_number
+    try:
+        while written_frames < len(frames_to_write) and not write_errors:
+            report_frame_progress(
+                progress_reporter,
+                frames_processed=current_frame - first_frame_number,
+                total_frames=total_frames,
+            )
+            buffer = buffer_pool.acquire()
+            if not read_frame_into(decoder.stdout, buffer):
+                buffer_pool.release(buffer)
+                break
+            if current_frame in frames_to_write:
+                frame_queue.put(buffer)
+                written_frames += 1
+            else:
+                buffer_pool.release(buffer)
+            current_frame += 1
+    except BaseException:
+        # the writer may be blocked on a full encoder pipe, which breaks once the encoder is killed
+        encoder.kill()
+        frame_queue.put(None)
+        writer_thread.join()
+        stop_process(encoder)
+        stop_process(decoder)
+        raise
+
+    frame_queue.put(None)
+    writer_thread.join()
+    if written_frames < len(frames_to_write) and not write_errors:
+        decoder_stderr = decoder.stderr.read()
+        if decoder.wait() != 0:
+            stop_process(encoder)
+            raise RuntimeError(
+                f"Decoding raw frames failed with return code {decoder.returncode}: {decoder_stderr.decode(errors='replace').strip()}"
+            )
+        logger.warning(
+            f"Video ended at frame {current_frame}, wrote {written_frames} of {len(frames_to_write)} requested frames"
+        )
+    stop_process(decoder)
+    encoder.stdin.close()
+    encoder_stderr = encoder.stderr.read()
+    encoder.wait()
+
+    if encoder.returncode != 0 or write_errors:
+        raise RuntimeError(
+            f"Encoding raw frames failed with return code {encoder.returncode}: {encoder_stderr.decode(errors='replace').strip()}"
+        )
+
+    return written_frames
@@ -1,20 +1,32 @@
+import concurrent.futures
 import logging
 import multiprocessing
 import tempfile
 import shutil
+from functools import partial
+from multiprocessing.pool import Pool
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Optional
 
 from skelly_synchronize.core_processes.audio_utilities import trim_audio_files
-from skelly_synchronize.core_processes.video_functions.deffcode_functions import (
-    trim_single_video_deffcode,
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    StageInstrumentation,
+    measure_stage,
+)
+from skelly_synchronize.core_processes.synchronization_progress import (
+    ProgressReporter,
+    SynchronizationCancelled,
 )
 from skelly_synchronize.core_processes.video_functions.ffmpeg_functions import (
     attach_audio_to_video_ffmpeg,
-    extract_video_duration_ffmpeg,
-    extract_video_fps_ffmpeg,
+    probe_media_ffprobe,
     trim_single_video_ffmpeg,
 )
+from skelly_synchronize.system.cpu_budget import (
+    configure_cpu_budget,
+    find_concurrent_job_count,
+    get_max_cpu,
+)
 from skelly_synchronize.system.file_extensions import AudioExtension, VideoExtension
 from skelly_synchronize.utils.get_video_files import get_video_file_list
 from skelly_synchronize.utils.path_handling_utilities import (
@@ -23,30 +35,55 @@ from skelly_synchronize.utils.path_handling_utilities import (
 
 logger = logging.getLogger(__name__)
 
+# container durations are rounded to packet boundaries, so outputs within this many frames of their expected duration pass verification
+VERIFICATION_TOLERANCE_FRAMES = 2
+
 
 def create_video_info_dict(
-    video_filepath_list: list, video_handler: str = "ffmpeg"
+    video_filepath_list: list,
+    video_handler: str = "ffmpeg",
+    pool: Optional[Pool] = None,
+    instrumentation: Optional[StageInstrumentation] = None,
 ) -> Dict[str, dict]:
-    """Get a dictionary with video information from the given video file paths."""
-    video_info_dict = dict()
-    for video_filepath in video_filepath_list:
-        video_dict = dict()
-        video_dict["video filepath"] = Path(video_filepath)
-        video_dict["video pathstring"] = str(video_filepath)
-        video_name = Path(video_filepath).stem
-        video_dict["camera name"] = video_name
-
-        if video_handler == "ffmpeg":
-            video_dict["video duration"] = extract_video_duration_ffmpeg(
-                file_pathstring=str(video_filepath)
-            )
-            video_dict["video fps"] = extract_video_fps_ffmpeg(
-                file_pathstring=str(video_filepath)
-            )
+    """Get a dictionary with video information from the given video file paths.
+    If a pool is given, the videos are probed on its workers.
+    """
+    probe_video = partial(
+        create_single_video_info_dict,
+        video_handler=video_handler,
+        instrumentation=instrumentation,
+    )
+    if pool is None:
+        video_dict_list = [
+            probe_video(video_filepath) for video_filepath in video_filepath_list
+        ]
+    else:
+        video_dict_list = pool.map(probe_video, video_filepath_list)
+
+    return {video_dict["camera name"]: video_dict for video_dict in video_dict_list}
 
-        video_info_dict[video_name] = video_dict
 
-    return video_info_dict
+def create_single_video_info_dict(
+    video_filepath: Path,
+    video_handler: str = "ffmpeg",
+    instrumentation: Optional[StageInstrumentation] = None,
+) -> dict:
+    """Get a dictionary with video information from a single video file path."""
+    video_dict = dict()
+    video_dict["video filepath"] = Path(video_filepath)
+    video_dict["video pathstring"] = str(video_filepath)
+    video_dict["camera name"] = Path(video_filepath).stem
+
+    if video_handler == "ffmpeg":
+        with measure_stage(instrumentation, "probe", video_dict["camera name"]):
+            media_info = probe_media_ffprobe(file_pathstring=str(video_filepath))
+        video_dict["video duration"] = media_info["video duration"]
+        video_dict["video fps"] = media_info["video fps"]
+        # kept so the audio sample rate doesn't need another probe, and left out for videos without audio
+        if media_info["audio sample rate"] is not None:
+            video_dict["audio sample rate"] = media_info["audio sample rate"]
+
+    return video_dict
 
 
 def trim_videos(
@@ -55,8 +92,25 @@ def trim_videos(
     lag_dict: Dict[str, float],
     fps: float,
     video_handler: str = "deffcode",
-) -> None:
-    """Take a list of video files and a list of lags, and make all videos start and end at the same time."""
+    ffmpeg_seek_strategy: str = "keyframe",
+    pool: Optional[Pool] = None,
+    max_processes: Optional[int] = None,
+    instrumentation: Optional[StageInstrumentation] = None,
+    progress_reporter: Optional[ProgressReporter] = None,
+    deffcode_pixel_format: str = "bgr24",
+    keyframe_timestamps_dict: Optional[Dict[str, List[float]]] = None,
+    camera_names: Optional[List[str]] = None,
+) -> Dict[str, dict]:
+    """Take a list of video files and a list of lags, and make all videos start and end at the same time.
+    The ffmpeg seek strategy is only used with the ffmpeg video handler, see `trim_single_video_ffmpeg` for the options,
+    and the deffcode pixel format only with the deffcode video handler, see `trim_single_video_deffcode`.
+    Keyframe timestamps found in the analysis pass are used for keyframe seeking instead of reading the keyframe index again.
+    If a pool is given, the videos are trimmed on its workers, otherwise a pool of up to max_processes workers is started for this call,
+    and the CPU budget is divided between its workers.
+    If camera names are given, only those cameras are trimmed, to the window shared by every video in the video info dict.
+
+    Returns a dictionary with what was written for each trimmed camera, see `trim_single_video`.
+    """
 
     if video_handler not in ["ffmpeg", "deffcode"]:
         raise ValueError("video_handler must be either 'ffmpeg' or 'deffcode'")
@@ -66,24 +120,61 @@ def trim_videos(
     )
     minimum_frames = int(minimum_duration * fps)
 
-    max_processes = min(len(video_info_dict), multiprocessing.cpu_count() - 1)
-
-    with multiprocessing.Pool(processes=max_processes) as pool:
-        pool.starmap(
-            trim_single_video,
-            [
-                (
-                    video_dict,
-                    synchronized_folder_path,
-                    minimum_duration,
-                    minimum_frames,
-                    lag_dict,
-                    fps,
-                    video_handler,
-                )
-                for video_dict in video_info_dict.values()
-            ],
+    trim_arguments = [
+        (
+            video_dict,
+            synchronized_folder_path,
+            minimum_duration,
+            minimum_frames,
+            lag_dict,
+            fps,
+            video_handler,
+            ffmpeg_seek_strategy,
+            instrumentation,
+            progress_reporter,
+            deffcode_pixel_format,
+            (keyframe_timestamps_dict or {}).get(video_dict["camera name"]),
         )
+        for video_dict in video_info_dict.values()
+        if camera_names is None or video_dict["camera name"] in camera_names
+    ]
+
+    if pool is not None:
+        trim_info_list = pool.starmap(trim_single_video, trim_arguments)
+        return {trim_info["camera name"]: trim_info for trim_info in trim_info_list}
+
+    max_processes = find_concurrent_job_count(
+        job_count=len(trim_arguments), max_processes=max_processes
+    )
+
+    with multiprocessing.Pool(
+        processes=max_processes,
+        initializer=configure_cpu_budget,
+        initargs=(get_max_cpu(), max_processes),
+    ) as pool:
+        trim_info_list = pool.starmap(trim_single_video, trim_arguments)
+
+    return {trim_info["camera name"]: trim_info for trim_info in trim_info_list}
+
+
+def find_trimmed_frame_ranges(
+    video_info_dict: Dict[str, dict], lag_dict: Dict[str, float], fps: float
+) -> Dict[str, dict]:
+    """Find the frames each camera's trimmed video would hold without writing it,
+    returned like `trim_videos` does, with None for the output video pathstring.
+    """
+    minimum_duration = find_minimum_video_duration(
+        video_info_dict=video_info_dict, lag_dict=lag_dict
+    )
+    return {
+        camera_name: {
+            "camera name": camera_name,
+            "output video pathstring": None,
+            "start frame": int(lag_dict[camera_name] * fps),
+            "frame count": int(minimum_duration * fps),
+        }
+        for camera_name in video_info_dict
+    }
 
 
 def trim_single_video(
@@ -94,50 +185,70 @@ def trim_single_video(
     lag_dict: Dict[str, float],
     fps: float,
     video_handler: str = "deffcode",
-) -> None:
-    """Take a list of video files and a list of lags, and make all videos start and end at the same time."""
+    ffmpeg_seek_strategy: str = "keyframe",
+    instrumentation: Optional[StageInstrumentation] = None,
+    progress_reporter: Optional[ProgressReporter] = None,
+    deffcode_pixel_format: str = "bgr24",
+    keyframe_timestamps: Optional[List[float]] = None,
+) -> dict:
+    """Take a list of video files and a list of lags, and make all videos start and end at the same time.
+    Returns the camera name, output video pathstring, start frame and frame count of the trimmed video.
+    The frame count is the number of frames the encoder wrote, or the target frame count if ffmpeg doesn't report it.
+    """
 
     try:
-        logger.debug(f"trimming video file {video_dict['camera name']}")
-        synced_video_name = name_synced_video(
-            raw_video_filename=video_dict["camera name"]
-        )
-
-        start_time = lag_dict[video_dict["camera name"]]
-        start_frame = int(start_time * fps)
-        frame_list = get_frame_list(
-            start_frame=start_frame, duration_frames=minimum_frames
-        )
-
-        if video_handler == "ffmpeg":
-            logger.info(
-                f"Saving video - Cam name: {video_dict['camera name']} - target duration: {minimum_duration} seconds"
-            )
-            trim_single_video_ffmpeg(
-                input_video_pathstring=video_dict["video pathstring"],
-                start_time=start_time,
-                desired_duration=minimum_duration,
-                output_video_pathstring=str(
-                    synchronized_folder_path / synced_video_name
-                ),
-            )
-            logger.info(
-                f"Video Saved - Cam name: {video_dict['camera name']}, Video Duration in Seconds: {minimum_duration}"
-            )
-        if video_handler == "deffcode":
-            logger.info(
-                f"Saving video - Cam name: {video_dict['camera name']} - start frame: {start_frame} - target duration: {minimum_frames} frames"
-            )
-            trim_single_video_deffcode(
-                input_video_pathstring=video_dict["video pathstring"],
-                frame_list=frame_list,
-                output_video_pathstring=str(
-                    synchronized_folder_path / synced_video_name
-                ),
+        with measure_stage(instrumentation, "trim", video_dict["camera name"]):
+            logger.debug(f"trimming video file {video_dict['camera name']}")
+            synced_video_name = name_synced_video(
+                raw_video_filename=video_dict["camera name"]
             )
-            logger.info(
-                f"Video Saved - Cam name: {video_dict['camera name']}, Video Duration in Frames: {minimum_frames}"
+
+            start_time = lag_dict[video_dict["camera name"]]
+            start_frame = int(start_time * fps)
+            frame_list = get_frame_list(
+                start_frame=start_frame, duration_frames=minimum_frames
             )
+            output_video_pathstring = str(synchronized_folder_path / synced_video_name)
+            frame_count = minimum_frames
+
+            if video_handler == "ffmpeg":
+                logger.info(
+                    f"Saving video - Cam name: {video_dict['camera name']} - target duration: {minimum_duration} seconds"
+                )
+                # seeking to the lag would start at the first frame after it, so the video starts at the recorded start frame instead
+                encoded_frame_count = trim_single_video_ffmpeg(
+                    input_video_pathstring=video_dict["video pathstring"],
+                    start_time=start_frame / fps,
+                    desired_duration=minimum_duration,
+                    output_video_pathstring=output_video_pathstring,
+                    seek_strategy=ffmpeg_seek_strategy,
+                    keyframe_timestamps=keyframe_timestamps,
+                )
+                if encoded_frame_count is not None:
+                    frame_count = encoded_frame_count
+                logger.info(
+                    f"Video Saved - Cam name: {video_dict['camera name']}, Video Duration in Seconds: {minimum_duration}"
+                )
+            if video_handler == "deffcode":
+                from skelly_synchronize.core_processes.video_functions.deffcode_functions import (
+                    trim_single_video_deffcode,
+                )
+
+                logger.info(
+                    f"Saving video - Cam name: {video_dict['camera name']} - start frame: {start_frame} - target duration: {minimum_frames} frames"
+                )
+                frame_count = trim_single_video_deffcode(
+                    input_video_pathstring=video_dict["video pathstring"],
+                    frame_list=frame_list,
+                    output_video_pathstring=output_video_pathstring,
+                    progress_reporter=progress_reporter,
+                    pixel_format=deffcode_pixel_format,
+                )
+                logger.info(
+                    f"Video Saved - Cam name: {video_dict['camera name']}, Video Duration in Frames: {frame_count}"
+                )
+    except (SynchronizationCancelled, concurrent.futures.CancelledError):
+        raise
     except Exception as e:
         logger.error(
             f"Error trimming video {video_dict['camera name']}: {e}",
@@ -145,6 +256,46 @@ def trim_single_video(
         )
         raise e
 
+    return {
+        "camera name": video_dict["camera name"],
+        "output video pathstring": output_video_pathstring,
+        "start frame": start_frame,
+        "frame count": frame_count,
+    }
+
+
+def verify_synchronized_videos(
+    expected_durations: Dict[str, float],
+    fps: float,
+    pool: Optional[Pool] = None,
+) -> bool:
+    """Probe each synchronized video once and check that it is as long as expected, logging the videos that aren't.
+    Takes a dictionary of expected durations keyed by video pathstring. If a pool is given, the videos are probed on its workers.
+
+    Returns True if every video is within VERIFICATION_TOLERANCE_FRAMES of its expected duration.
+    """
+    video_pathstrings = list(expected_durations)
+    if pool is None:
+        media_info_list = [
+            probe_media_ffprobe(video_pathstring)
+            for video_pathstring in video_pathstrings
+        ]
+    else:
+        media_info_list = pool.map(probe_media_ffprobe, video_pathstrings)
+
+    verified = True
+    for video_pathstring, media_info in zip(video_pathstrings, media_info_list):
+        duration_difference = abs(
+            media_info["video duration"] - expected_durations[video_pathstring]
+        )
+        if duration_difference > VERIFICATION_TOLERANCE_FRAMES / fps:
+            logger.warning(
+                f"Synchronized video {video_pathstring} is {media_info['video duration']} seconds long, expected {expected_durations[video_pathstring]} seconds"
+            )
+            verified = False
+
+    return verified
+
 
 def get_fps_list(video_info_dict: Dict[str, dict]):
     """Get list of the frames per second in each video"""
@@ -176,35 +327,69 @@ def attach_audio_to_videos(
     audio_folder_path: Path,
     lag_dictionary: dict,
     synchronized_video_length: float,
+    pool: Optional[Pool] = None,
+    instrumentation: Optional[StageInstrumentation] = None,
+    camera_names: Optional[List[str]] = None,
 ):
-    trimmed_audio_folder_path = trim_audio_files(
-        audio_folder_path=audio_folder_path,
-        lag_dictionary=lag_dictionary,
-        synced_video_length=synchronized_video_length,
-    )
+    """Trim the audio of every camera to the synchronized part and attach it to the camera's synchronized video,
+    or only for the cameras in camera_names if they are given.
+    """
+    with measure_stage(instrumentation, "audio trim"):
+        trimmed_audio_folder_path = trim_audio_files(
+            audio_folder_path=audio_folder_path,
+            lag_dictionary=lag_dictionary,
+            synced_video_length=synchronized_video_length,
+            camera_names=camera_names,
+        )
 
     with tempfile.TemporaryDirectory(
         dir=str(synchronized_video_folder_path)
     ) as temp_dir:
-        for video in get_video_file_list(synchronized_video_folder_path):
-            video_name = video.stem
-            if video_name.startswith("synced_"):
-                audio_filename = f"{str(video_name).split('_', maxsplit=1)[-1]}.{AudioExtension.WAV.value}"
-            else:
-                audio_filename = f"{video_name}.{AudioExtension.WAV.value}"
-            output_video_pathstring = str(
-                Path(temp_dir)
-                / f"{video_name}_with_audio_temp.{VideoExtension.MP4.value}"
-            )
+        attach_audio = partial(
+            attach_audio_to_single_video,
+            trimmed_audio_folder_path=Path(trimmed_audio_folder_path),
+            temp_folder_path=Path(temp_dir),
+            instrumentation=instrumentation,
+        )
+        video_list = get_video_file_list(synchronized_video_folder_path)
+        if camera_names is not None:
+            synced_video_names = [
+                name_synced_video(camera_name) for camera_name in camera_names
+            ]
+            video_list = [
+                video for video in video_list if video.name in synced_video_names
+            ]
+        if pool is None:
+            for video in video_list:
+                attach_audio(video)
+        else:
+            pool.map(attach_audio, video_list)
 
-            logger.info(f"Attaching audio to video {video_name}")
-            attach_audio_to_video_ffmpeg(
-                input_video_pathstring=str(video),
-                audio_file_pathstring=str(
-                    Path(trimmed_audio_folder_path) / audio_filename
-                ),
-                output_video_pathstring=output_video_pathstring,
-            )
 
-            # overwrite synced video with video containing audio
-            shutil.move(output_video_pathstring, video)
+def attach_audio_to_single_video(
+    video: Path,
+    trimmed_audio_folder_path: Path,
+    temp_folder_path: Path,
+    instrumentation: Optional[StageInstrumentation] = None,
+):
+    video_name = video.stem
+    if video_name.startswith("synced_"):
+        audio_filename = (
+            f"{str(video_name).split('_', maxsplit=1)[-1]}.{AudioExtension.WAV.value}"
+        )
+    else:
+        audio_filename = f"{video_name}.{AudioExtension.WAV.value}"
+    output_video_pathstring = str(
+        temp_folder_path / f"{video_name}_with_audio_temp.{VideoExtension.MP4.value}"
+    )
+
+    logger.info(f"Attaching audio to video {video_name}")
+    with measure_stage(instrumentation, "mux", video_name):
+        attach_audio_to_video_ffmpeg(
+            input_video_pathstring=str(video),
+            audio_file_pathstring=str(trimmed_audio_folder_path / audio_filename),
+            output_video_pathstring=output_video_pathstring,
+        )
+
+    # overwrite synced video with video containing audio
+    shutil.move(output_video_pathstring, video)
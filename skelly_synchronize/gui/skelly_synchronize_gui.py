@@ -1,4 +1,7 @@
+from functools import partial
 from pathlib import Path
+from typing import Callable
+from PySide6.QtCore import QThread
 from PySide6.QtGui import QDoubleValidator
 from PySide6.QtWidgets import (
     QApplication,
@@ -10,8 +13,16 @@ from PySide6.QtWidgets import (
     QLabel,
     QLineEdit,
     QHBoxLayout,
+    QProgressBar,
 )
 
+from skelly_synchronize.core_processes.io_staging import (
+    synchronize_with_local_staging,
+)
+from skelly_synchronize.core_processes.synchronization_progress import (
+    format_progress,
+)
+from skelly_synchronize.gui.synchronization_worker import SynchronizationWorker
 from skelly_synchronize.skelly_synchronize import (
     synchronize_videos_from_audio,
     synchronize_videos_from_brightness,
@@ -22,6 +33,8 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self._folder_path = None
+        self._synchronization_thread = None
+        self._synchronization_worker = None
 
         self.setGeometry(100, 100, 600, 300)
 
@@ -46,8 +59,9 @@ class MainWindow(QMainWindow):
         self.run_audio_synch_button.setEnabled(False)
         self._layout.addWidget(self.run_audio_synch_button)
         self.run_audio_synch_button.clicked.connect(
-            lambda: synchronize_videos_from_audio(
-                raw_video_folder_path=self._folder_path
+            lambda: self._start_synchronization(
+                synchronize_videos_from_audio,
+                raw_video_folder_path=self._folder_path,
             )
         )
 
@@ -69,7 +83,8 @@ class MainWindow(QMainWindow):
         self._layout.addLayout(hbox)
 
         self.run_brightness_synch_button.clicked.connect(
-            lambda: synchronize_videos_from_brightness(
+            lambda: self._start_synchronization(
+                synchronize_videos_from_brightness,
                 raw_video_folder_path=self._folder_path,
                 brightness_ratio_threshold=float(
                     self.brightness_threshold_lineedit.text()
@@ -77,6 +92,93 @@ class MainWindow(QMainWindow):
             )
         )
 
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self._layout.addWidget(self.progress_bar)
+
+        self.progress_label = QLabel("")
+        self._layout.addWidget(self.progress_label)
+
+        self.cancel_button = QPushButton("Cancel synchronization")
+        self.cancel_button.setEnabled(False)
+        self._layout.addWidget(self.cancel_button)
+        self.cancel_button.clicked.connect(self._cancel_synchronization)
+
+    def _start_synchronization(self, synchronize_function: Callable, **kwargs):
+        """Run the synchronization on a worker thread, so the window stays responsive"""
+        self._set_running(True)
+        self.progress_bar.setValue(0)
+        self.progress_label.setText("Starting synchronization")
+
+        self._synchronization_thread = QThread()
+        # videos on network storage are staged to local scratch space, and the outputs moved back when finished
+        # the debug plot is saved in the background, so the window reports the synchronization finished without waiting for it
+        self._synchronization_worker = SynchronizationWorker(
+            partial(synchronize_with_local_staging, synchronize_function),
+            render_debug_plots_in_background=True,
+            **kwargs,
+        )
+        self._synchronization_worker.moveToThread(self._synchronization_thread)
+        self._synchronization_thread.started.connect(self._synchronization_worker.run)
+
+        self._synchronization_worker.progress.connect(self._update_progress)
+        self._synchronization_worker.finished.connect(self._on_synchronization_finished)
+        self._synchronization_worker.failed.connect(self._on_synchronization_failed)
+        self._synchronization_worker.cancelled.connect(
+            self._on_synchronization_cancelled
+        )
+        for signal in [
+            self._synchronization_worker.finished,
+            self._synchronization_worker.failed,
+            self._synchronization_worker.cancelled,
+        ]:
+            signal.connect(self._synchronization_thread.quit)
+
+        self._synchronization_thread.start()
+
+    def _cancel_synchronization(self):
+        if self._synchronization_worker is not None:
+            self.cancel_button.setEnabled(False)
+            self.progress_label.setText("Cancelling synchronization")
+            self._synchronization_worker.cancel()
+
+    def _update_progress(self, progress: dict):
+        if progress["fraction"] is not None:
+            self.progress_bar.setValue(int(progress["fraction"] * 100))
+        self.progress_label.setText(format_progress(progress))
+
+    def _on_synchronization_finished(self, synchronized_video_folder_path):
+        self._set_running(False)
+        self.progress_bar.setValue(100)
+        self.progress_label.setText(
+            f"Synchronized videos saved to {synchronized_video_folder_path}"
+        )
+
+    def _on_synchronization_failed(self, error_message: str):
+        self._set_running(False)
+        self.progress_label.setText(f"Synchronization failed: {error_message}")
+
+    def _on_synchronization_cancelled(self):
+        self._set_running(False)
+        self.progress_bar.setValue(0)
+        self.progress_label.setText("Synchronization cancelled")
+
+    def closeEvent(self, event):
+        # a running synchronization is cancelled, so its partial outputs are cleaned up before the window closes
+        if (
+            self._synchronization_thread is not None
+            and self._synchronization_thread.isRunning()
+        ):
+            self._synchronization_worker.cancel()
+            self._synchronization_thread.wait()
+        super().closeEvent(event)
+
+    def _set_running(self, running: bool):
+        self.folder_open_button.setEnabled(not running)
+        self.run_audio_synch_button.setEnabled(not running)
+        self.run_brightness_synch_button.setEnabled(not running)
+        self.cancel_button.setEnabled(running)
+
     def _open_session_folder_dialog(self):
         folder_input = QFileDialog.getExistingDirectory(None, "Choose a folder")
         self._folder_path = Path(folder_input)
@@ -0,0 +1,49 @@
+import logging
+from typing import Callable
+
+from PySide6.QtCore import QObject, Signal, Slot
+
+from skelly_synchronize.core_processes.synchronization_progress import (
+    ProgressReporter,
+    SynchronizationCancelled,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SynchronizationWorker(QObject):
+    """Runs a synchronization function off the GUI thread, reporting its progress through signals.
+    Move the worker to a QThread and connect the thread's started signal to `run`.
+    """
+
+    progress = Signal(dict)
+    finished = Signal(object)
+    failed = Signal(str)
+    cancelled = Signal()
+
+    def __init__(self, synchronize_function: Callable, **synchronize_kwargs):
+        super().__init__()
+        self.synchronize_function = synchronize_function
+        self.synchronize_kwargs = synchronize_kwargs
+        # progress is reported from the pipeline's worker threads, and signals queue it onto the GUI thread
+        self.progress_reporter = ProgressReporter(progress_callback=self.progress.emit)
+
+    @Slot()
+    def run(self):
+        try:
+            synchronized_video_folder_path = self.synchronize_function(
+                progress_reporter=self.progress_reporter, **self.synchronize_kwargs
+            )
+        except SynchronizationCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            logger.error(f"Error synchronizing videos: {e}", exc_info=True)
+            self.failed.emit(str(e))
+            return
+
+        self.finished.emit(synchronized_video_folder_path)
+
+    def cancel(self):
+        """Cancel the synchronization, safe to call from the GUI thread"""
+        self.progress_reporter.cancel()
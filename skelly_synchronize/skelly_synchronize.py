@@ -1,44 +1,77 @@
 import time
 import logging
+from functools import partial
+from multiprocessing.pool import Pool
 from pathlib import Path
-from typing import Optional
-from skelly_synchronize.core_processes.debugging.debug_plots import (
-    create_audio_debug_plots,
-    create_brightness_debug_plots,
-)
+from typing import Dict, Optional
+
+import numpy as np
 from skelly_synchronize.core_processes.normalize_framerates import normalize_framerates
 
-from skelly_synchronize.utils.get_video_files import get_video_file_list
+from skelly_synchronize.utils.get_video_files import (
+    cache_directory_listings,
+    get_video_file_list,
+)
 from skelly_synchronize.core_processes.audio_utilities import (
     extract_audio_files,
     get_audio_sample_rates,
 )
 from skelly_synchronize.core_processes.correlation_functions import (
-    find_brightest_point_lags,
     find_brightness_across_frames,
+    find_brightness_array_path,
+    find_brightness_lags,
     find_cross_correlation_lags,
 )
+from skelly_synchronize.core_processes.lag_fusion import fuse_brightness_lags
 from skelly_synchronize.core_processes.video_functions.video_utilities import (
     attach_audio_to_videos,
+    find_minimum_video_duration,
     get_fps_list,
     create_video_info_dict,
+    find_trimmed_frame_ranges,
     trim_videos,
+    verify_synchronized_videos,
+)
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    StageInstrumentation,
+    measure_stage,
+)
+from skelly_synchronize.core_processes.video_functions.async_ffmpeg import (
+    FFmpegRunner,
+)
+from skelly_synchronize.core_processes.synchronization_progress import (
+    ProgressReporter,
+    remove_partial_outputs_on_cancel,
+    report_progress,
+)
+from skelly_synchronize.core_processes.sync_result import (
+    SyncResult,
+    create_sync_result,
+    log_sync_result,
+    save_sync_manifest,
+)
+from skelly_synchronize.core_processes.debugging.debug_plots import (
+    create_audio_debug_plots,
+    create_audio_envelopes,
+    create_brightness_debug_plots,
+    create_brightness_envelopes,
+    start_background_debug_plots,
 )
 from skelly_synchronize.core_processes.debugging.debug_output import (
     remove_audio_files_from_audio_signal_dict,
     save_dictionaries_to_toml,
 )
+from skelly_synchronize.system.cpu_budget import find_concurrent_job_count
 from skelly_synchronize.utils.path_handling_utilities import (
     create_directory,
 )
 from skelly_synchronize.tests.utilities.check_list_values_are_equal import (
     check_list_values_are_equal,
 )
-from skelly_synchronize.tests.utilities.get_number_of_frames_of_videos_in_a_folder import (
-    get_number_of_frames_of_videos_in_a_folder,
-)
 from skelly_synchronize.system.paths_and_file_names import (
     AUDIO_NAME,
+    BRIGHTNESS_SUFFIX,
+    CHROME_TRACE_NAME,
     DEBUG_TOML_NAME,
     LAG_DICTIONARY_NAME,
     NORMALIZED_VIDEOS_FOLDER_NAME,
@@ -46,8 +79,10 @@ from skelly_synchronize.system.paths_and_file_names import (
     SYNCHRONIZED_VIDEO_NAME,
     SYNCHRONIZED_VIDEOS_FOLDER_NAME,
     AUDIO_FILES_FOLDER_NAME,
+    STAGE_TIMING_NAME,
+    STAGE_TIMING_RECORDS_NAME,
 )
-from skelly_synchronize.system.file_extensions import AudioExtension
+from skelly_synchronize.system.file_extensions import AudioExtension, NUMPY_EXTENSION
 
 logger = logging.getLogger(__name__)
 
@@ -57,13 +92,77 @@ def synchronize_videos_from_audio(
     synchronized_video_folder_path: Optional[Path] = None,
     video_handler: str = "deffcode",
     create_debug_plots_bool: bool = True,
-):
+    pool: Optional[Pool] = None,
+    max_processes: Optional[int] = None,
+    analysis_sample_rate: Optional[int] = None,
+    cache_folder_path: Optional[Path] = None,
+    save_chrome_trace: bool = False,
+    lag_estimator: str = "full_rate",
+    progress_reporter: Optional[ProgressReporter] = None,
+    verify_outputs: bool = False,
+    render_debug_plots_in_background: bool = False,
+    write_synchronized_videos: bool = True,
+    brightness_fallback_confidence: Optional[float] = None,
+    brightness_fallback_duration: Optional[float] = None,
+) -> SyncResult:
     """Synchronize all videos in the base path folder using audio cross correlation.
     Uses deffcode and to handle the video files as default, set "video_handler" to "ffmpeg" to use ffmpeg methods instead.
     ffmpeg is used to get audio from the video files with either method.
-
-    Returns the folder path of the synchronized video folder.
+    If a pool is given, the per camera work is run on its workers, so it can be shared between sessions.
+    Otherwise the per camera work runs on threads, with every ffmpeg subprocess driven by one FFmpegRunner event loop,
+    and max_processes limits the number of ffmpeg processes running at once.
+    Audio is resampled to the analysis sample rate before correlating if one is given, and extracted audio is reused from the cache folder if one is given.
+    Stage timing is saved next to the debug toml, and also as a Chrome trace if save_chrome_trace is True.
+    The lag estimator is one of the AUDIO_LAG_ESTIMATORS in correlation_functions, "gcc_phat" and "onset_envelope" hold up better in reverberant rooms.
+    If a brightness fallback confidence is given, the audio lags with a lower confidence are checked against the brightness of their videos
+    and fused with the brightness lags, see `fuse_brightness_lags`. Only those videos and the reference video are decoded,
+    for their first brightness_fallback_duration seconds if it is given.
+    Progress is reported to the progress reporter if one is given, and cancelling it raises SynchronizationCancelled
+    after stopping the running ffmpeg processes and removing partial outputs.
+    If verify_outputs is True, the synchronized videos are probed in parallel to check their durations, see `verify_synchronized_videos`.
+    If render_debug_plots_in_background is True, the debug plot is saved by a background process after this returns,
+    see `start_background_debug_plots`.
+    The sync manifest is saved to the synchronized video folder, see `save_sync_manifest`. If write_synchronized_videos is False,
+    the trimmed videos aren't written, and consumers read the synchronized frames straight from the raw videos with `AlignedFrameReader`.
+
+    Returns a SyncResult with the lags, frame ranges and outputs of each camera, which can be used as the synchronized video folder path.
     """
+    if pool is None:
+        progress_reporter = progress_reporter or ProgressReporter()
+        partial_output_patterns = find_partial_output_patterns(
+            raw_video_folder_path=raw_video_folder_path,
+            synchronized_video_folder_path=synchronized_video_folder_path,
+        )
+        # the CPU budget is divided between the cameras' ffmpeg processes, so there's no point running more than one per camera
+        runner = FFmpegRunner(
+            max_concurrent_processes=find_concurrent_job_count(
+                job_count=len(get_video_file_list(folder_path=raw_video_folder_path)),
+                max_processes=max_processes,
+            ),
+            progress_callback=progress_reporter.report_ffmpeg_progress,
+        )
+        # the raw and output folders are listed by several stages, so listings are reused for the run while unchanged
+        with cache_directory_listings():
+            with remove_partial_outputs_on_cancel(partial_output_patterns), runner:
+                with progress_reporter.attach_runner(runner):
+                    return synchronize_videos_from_audio(
+                        raw_video_folder_path=raw_video_folder_path,
+                        synchronized_video_folder_path=synchronized_video_folder_path,
+                        video_handler=video_handler,
+                        create_debug_plots_bool=create_debug_plots_bool,
+                        pool=runner,
+                        analysis_sample_rate=analysis_sample_rate,
+                        cache_folder_path=cache_folder_path,
+                        save_chrome_trace=save_chrome_trace,
+                        lag_estimator=lag_estimator,
+                        progress_reporter=progress_reporter,
+                        verify_outputs=verify_outputs,
+                        render_debug_plots_in_background=render_debug_plots_in_background,
+                        write_synchronized_videos=write_synchronized_videos,
+                        brightness_fallback_confidence=brightness_fallback_confidence,
+                        brightness_fallback_duration=brightness_fallback_duration,
+                    )
+
     start_timer = time.time()
 
     video_file_list = get_video_file_list(folder_path=raw_video_folder_path)
@@ -74,75 +173,156 @@ def synchronize_videos_from_audio(
         )
     synchronized_video_folder_path = Path(synchronized_video_folder_path)
 
+    instrumentation = StageInstrumentation(
+        records_file_path=synchronized_video_folder_path / STAGE_TIMING_RECORDS_NAME
+    )
+
     audio_folder_path = create_directory(
         parent_directory=synchronized_video_folder_path,
         directory_name=AUDIO_FILES_FOLDER_NAME,
     )
 
     # create dictionaries with video and audio information
+    report_progress(progress_reporter, "probe")
     video_info_dict = create_video_info_dict(
-        video_filepath_list=video_file_list, video_handler="ffmpeg"
+        video_filepath_list=video_file_list,
+        video_handler="ffmpeg",
+        pool=pool,
+        instrumentation=instrumentation,
     )
 
     # get video fps and audio sample rate
     fps_list = get_fps_list(video_info_dict=video_info_dict)
-    audio_sample_rates = get_audio_sample_rates(video_info_dict=video_info_dict)
+    with measure_stage(instrumentation, "probe"):
+        audio_sample_rates = get_audio_sample_rates(video_info_dict=video_info_dict)
 
     if len(set(fps_list)) > 1 or len(set(audio_sample_rates)) > 1:
+        report_progress(
+            progress_reporter,
+            "normalization",
+            expected_durations=get_video_durations(video_info_dict),
+        )
         normalized_video_folder_path = normalize_framerates(
             raw_video_folder_path=raw_video_folder_path,
             video_info_dict=video_info_dict,
             fps_list=fps_list,
             audio_samplerate_list=audio_sample_rates,
+            pool=pool,
+            instrumentation=instrumentation,
         )
 
         video_file_list = get_video_file_list(folder_path=normalized_video_folder_path)
 
         video_info_dict = create_video_info_dict(
-            video_filepath_list=video_file_list, video_handler="ffmpeg"
+            video_filepath_list=video_file_list,
+            video_handler="ffmpeg",
+            pool=pool,
+            instrumentation=instrumentation,
         )
 
         fps_list = get_fps_list(video_info_dict=video_info_dict)
-        audio_sample_rates = get_audio_sample_rates(video_info_dict=video_info_dict)
+        with measure_stage(instrumentation, "probe"):
+            audio_sample_rates = get_audio_sample_rates(video_info_dict=video_info_dict)
 
+    report_progress(
+        progress_reporter,
+        "extraction",
+        expected_durations=get_video_durations(video_info_dict),
+    )
     audio_signal_dict = extract_audio_files(
         video_info_dict=video_info_dict,
         audio_extension=AudioExtension.WAV,
         audio_folder_path=audio_folder_path,
+        pool=pool,
+        cache_folder_path=cache_folder_path,
+        instrumentation=instrumentation,
     )
+    # keyframes read in the analysis pass are used to seek when trimming, and are left out of the debug output
+    keyframe_timestamps_dict = {
+        audio_info["camera name"]: audio_info.pop("keyframe timestamps")
+        for audio_info in audio_signal_dict.values()
+        if "keyframe timestamps" in audio_info
+    }
 
     # frame rates and audio sample rates must be the same duration for the trimming process to work correctly
     fps = check_list_values_are_equal(input_list=fps_list)
     audio_sample_rate = check_list_values_are_equal(input_list=audio_sample_rates)
 
     # find the lags between starting times
-    lag_dict = find_cross_correlation_lags(
-        audio_signal_dict=audio_signal_dict, sample_rate=audio_sample_rate
-    )
+    report_progress(progress_reporter, "correlation")
+    with measure_stage(instrumentation, "correlation"):
+        lag_dict, confidence_dict = find_cross_correlation_lags(
+            audio_signal_dict=audio_signal_dict,
+            sample_rate=audio_sample_rate,
+            analysis_sample_rate=analysis_sample_rate,
+            lag_estimator=lag_estimator,
+            return_confidences=True,
+        )
+    if brightness_fallback_confidence is not None:
+        lag_dict, confidence_dict = fuse_brightness_lags(
+            lag_dict=lag_dict,
+            confidence_dict=confidence_dict,
+            video_info_dict=video_info_dict,
+            reference_camera_name=next(iter(audio_signal_dict.values()))["camera name"],
+            frame_rate=fps,
+            audio_resolution=1
+            / min(analysis_sample_rate or audio_sample_rate, audio_sample_rate),
+            minimum_confidence=brightness_fallback_confidence,
+            brightness_duration=brightness_fallback_duration,
+            pool=pool,
+            instrumentation=instrumentation,
+            progress_reporter=progress_reporter,
+        )
 
-    trim_videos(
+    report_progress(
+        progress_reporter,
+        "trim",
+        expected_durations={
+            None: find_minimum_video_duration(
+                video_info_dict=video_info_dict, lag_dict=lag_dict
+            )
+        },
+    )
+    if write_synchronized_videos:
+        trim_info_dict = trim_videos(
+            video_info_dict=video_info_dict,
+            synchronized_folder_path=synchronized_video_folder_path,
+            lag_dict=lag_dict,
+            fps=fps,
+            video_handler=video_handler,
+            pool=pool,
+            max_processes=max_processes,
+            instrumentation=instrumentation,
+            progress_reporter=progress_reporter,
+            keyframe_timestamps_dict=keyframe_timestamps_dict,
+        )
+    else:
+        trim_info_dict = find_trimmed_frame_ranges(
+            video_info_dict=video_info_dict, lag_dict=lag_dict, fps=fps
+        )
+    sync_result = create_sync_result(
+        synchronized_video_folder_path=synchronized_video_folder_path,
+        method="audio",
+        fps=fps,
         video_info_dict=video_info_dict,
-        synchronized_folder_path=synchronized_video_folder_path,
         lag_dict=lag_dict,
-        fps=fps,
-        video_handler=video_handler,
+        trim_info_dict=trim_info_dict,
+        confidence_dict=confidence_dict,
     )
+    log_trimmed_frame_counts(sync_result)
 
-    synchronized_video_framecounts = get_number_of_frames_of_videos_in_a_folder(
-        folder_path=synchronized_video_folder_path
-    )
-    logger.info(
-        f"All videos are {check_list_values_are_equal(synchronized_video_framecounts)} frames long"
-    )
-
-    synchronized_video_info_dict = create_video_info_dict(
-        video_filepath_list=get_video_file_list(synchronized_video_folder_path)
-    )
+    if create_debug_plots_bool:
+        # the envelopes are taken from the audio in memory, before it is removed for the debug output
+        audio_envelopes = create_audio_envelopes(
+            audio_signal_dict=audio_signal_dict,
+            lag_dict=lag_dict,
+            synchronized_duration=sync_result.synchronized_duration,
+        )
 
     save_dictionaries_to_toml(
         input_dictionaries={
             RAW_VIDEO_NAME: video_info_dict,
-            SYNCHRONIZED_VIDEO_NAME: synchronized_video_info_dict,
+            SYNCHRONIZED_VIDEO_NAME: sync_result.create_video_info_dict(),
             AUDIO_NAME: remove_audio_files_from_audio_signal_dict(
                 audio_signal_dictionary=audio_signal_dict
             ),
@@ -151,24 +331,61 @@ def synchronize_videos_from_audio(
         output_file_path=synchronized_video_folder_path / DEBUG_TOML_NAME,
     )
 
-    attach_audio_to_videos(
-        synchronized_video_folder_path=synchronized_video_folder_path,
-        audio_folder_path=audio_folder_path,
-        lag_dictionary=lag_dict,
-        synchronized_video_length=next(iter(synchronized_video_info_dict.values()))[
-            "video duration"
-        ],
-    )
-    if create_debug_plots_bool:
-        create_audio_debug_plots(
-            synchronized_video_folder_path=synchronized_video_folder_path
+    if sync_result.videos_written:
+        synchronized_video_length = sync_result.synchronized_duration
+        report_progress(
+            progress_reporter,
+            "mux",
+            expected_durations={None: synchronized_video_length},
+        )
+        attach_audio_to_videos(
+            synchronized_video_folder_path=synchronized_video_folder_path,
+            audio_folder_path=audio_folder_path,
+            lag_dictionary=lag_dict,
+            synchronized_video_length=synchronized_video_length,
+            pool=pool,
+            instrumentation=instrumentation,
         )
+    if create_debug_plots_bool:
+        report_progress(progress_reporter, "plotting")
+        with measure_stage(instrumentation, "plotting"):
+            run_debug_plots(
+                create_audio_debug_plots,
+                pool=pool,
+                background=render_debug_plots_in_background,
+                synchronized_video_folder_path=synchronized_video_folder_path,
+                audio_envelopes=audio_envelopes,
+            )
+
+    if verify_outputs and sync_result.videos_written:
+        report_progress(progress_reporter, "verification")
+        with measure_stage(instrumentation, "verification"):
+            sync_result.verified = verify_synchronized_videos(
+                expected_durations={
+                    str(camera_result.output_video_path): camera_result.duration
+                    for camera_result in sync_result.cameras.values()
+                },
+                fps=fps,
+                pool=pool,
+            )
+
+    save_sync_manifest(sync_result)
+    instrumentation.save(
+        output_file_path=synchronized_video_folder_path / STAGE_TIMING_NAME,
+        chrome_trace_file_path=(
+            synchronized_video_folder_path / CHROME_TRACE_NAME
+            if save_chrome_trace
+            else None
+        ),
+    )
 
+    report_progress(progress_reporter, "finished", fraction=1.0)
     end_timer = time.time()
 
     logger.info(f"Elapsed processing time in seconds: {end_timer - start_timer}")
 
-    return synchronized_video_folder_path
+    sync_result.elapsed_time = end_timer - start_timer
+    return sync_result
 
 
 def synchronize_videos_from_brightness(
@@ -177,17 +394,68 @@ def synchronize_videos_from_brightness(
     video_handler: str = "deffcode",
     brightness_ratio_threshold: float = 1000,
     create_debug_plots_bool: bool = True,
-):
+    pool: Optional[Pool] = None,
+    max_processes: Optional[int] = None,
+    save_chrome_trace: bool = False,
+    lag_estimator: str = "brightness_threshold",
+    progress_reporter: Optional[ProgressReporter] = None,
+    verify_outputs: bool = False,
+    render_debug_plots_in_background: bool = False,
+    write_synchronized_videos: bool = True,
+) -> SyncResult:
     """Synchronize all videos in the base path folder using the first frame in each video with a high change in brightness between frames.
     Uses deffcode and to handle the video files as default, set "video_handler" to "ffmpeg" to use ffmpeg methods instead.
-
-    Returns the folder path of the synchronized video folder.
+    If a pool is given, the per camera work is run on its workers, so it can be shared between sessions.
+    Otherwise the per camera work runs on threads, with every ffmpeg subprocess driven by one FFmpegRunner event loop,
+    and max_processes limits the number of ffmpeg processes running at once.
+    Stage timing is saved next to the debug toml, and also as a Chrome trace if save_chrome_trace is True.
+    The lag estimator is one of the BRIGHTNESS_LAG_ESTIMATORS in correlation_functions. "brightness_threshold" starts every video
+    at its first brightness change past the brightness ratio threshold, while "brightness_correlation" cross correlates
+    the brightness changes of the whole recordings, needs no threshold, and gives a confidence in each lag.
+    Progress is reported to the progress reporter if one is given, and cancelling it raises SynchronizationCancelled
+    after stopping the running ffmpeg processes and removing partial outputs.
+    If verify_outputs is True, the synchronized videos are probed in parallel to check their durations, see `verify_synchronized_videos`.
+    If render_debug_plots_in_background is True, the debug plot is saved by a background process after this returns,
+    see `start_background_debug_plots`.
+    The sync manifest is saved to the synchronized video folder, see `save_sync_manifest`. If write_synchronized_videos is False,
+    the trimmed videos aren't written, and consumers read the synchronized frames straight from the raw videos with `AlignedFrameReader`.
+
+    Returns a SyncResult with the lags, frame ranges and outputs of each camera, which can be used as the synchronized video folder path.
     """
-    start_timer = time.time()
+    if pool is None:
+        progress_reporter = progress_reporter or ProgressReporter()
+        partial_output_patterns = find_partial_output_patterns(
+            raw_video_folder_path=raw_video_folder_path,
+            synchronized_video_folder_path=synchronized_video_folder_path,
+        )
+        # the CPU budget is divided between the cameras' ffmpeg processes, so there's no point running more than one per camera
+        runner = FFmpegRunner(
+            max_concurrent_processes=find_concurrent_job_count(
+                job_count=len(get_video_file_list(folder_path=raw_video_folder_path)),
+                max_processes=max_processes,
+            ),
+            progress_callback=progress_reporter.report_ffmpeg_progress,
+        )
+        # the raw and output folders are listed by several stages, so listings are reused for the run while unchanged
+        with cache_directory_listings():
+            with remove_partial_outputs_on_cancel(partial_output_patterns), runner:
+                with progress_reporter.attach_runner(runner):
+                    return synchronize_videos_from_brightness(
+                        raw_video_folder_path=raw_video_folder_path,
+                        synchronized_video_folder_path=synchronized_video_folder_path,
+                        video_handler=video_handler,
+                        brightness_ratio_threshold=brightness_ratio_threshold,
+                        create_debug_plots_bool=create_debug_plots_bool,
+                        pool=runner,
+                        save_chrome_trace=save_chrome_trace,
+                        lag_estimator=lag_estimator,
+                        progress_reporter=progress_reporter,
+                        verify_outputs=verify_outputs,
+                        render_debug_plots_in_background=render_debug_plots_in_background,
+                        write_synchronized_videos=write_synchronized_videos,
+                    )
 
-    logger.info(
-        f"Synchronizing videos with a brightness ratio threshold of {brightness_ratio_threshold}"
-    )
+    start_timer = time.time()
 
     video_file_list = get_video_file_list(folder_path=raw_video_folder_path)
     if synchronized_video_folder_path is None:
@@ -197,25 +465,43 @@ def synchronize_videos_from_brightness(
         )
     synchronized_video_folder_path = Path(synchronized_video_folder_path)
 
+    instrumentation = StageInstrumentation(
+        records_file_path=synchronized_video_folder_path / STAGE_TIMING_RECORDS_NAME
+    )
+
     # create dictionaries with video
+    report_progress(progress_reporter, "probe")
     video_info_dict = create_video_info_dict(
-        video_filepath_list=video_file_list, video_handler="ffmpeg"
+        video_filepath_list=video_file_list,
+        video_handler="ffmpeg",
+        pool=pool,
+        instrumentation=instrumentation,
     )
 
     # get video fps
     fps_list = get_fps_list(video_info_dict=video_info_dict)
 
     if len(set(fps_list)) > 1:
+        report_progress(
+            progress_reporter,
+            "normalization",
+            expected_durations=get_video_durations(video_info_dict),
+        )
         normalized_video_folder_path = normalize_framerates(
             raw_video_folder_path=raw_video_folder_path,
             video_info_dict=video_info_dict,
             fps_list=fps_list,
+            pool=pool,
+            instrumentation=instrumentation,
         )
 
         video_file_list = get_video_file_list(folder_path=normalized_video_folder_path)
 
         video_info_dict = create_video_info_dict(
-            video_filepath_list=video_file_list, video_handler="ffmpeg"
+            video_filepath_list=video_file_list,
+            video_handler="ffmpeg",
+            pool=pool,
+            instrumentation=instrumentation,
         )
 
         fps_list = get_fps_list(video_info_dict=video_info_dict)
@@ -224,55 +510,196 @@ def synchronize_videos_from_brightness(
     fps = check_list_values_are_equal(input_list=fps_list)
 
     # find the lags between starting times
-    lag_dict = find_brightest_point_lags(
+    report_progress(progress_reporter, "extraction")
+    lag_dict, confidence_dict = find_brightness_lags(
         video_info_dict=video_info_dict,
         frame_rate=fps,
+        lag_estimator=lag_estimator,
         brightness_ratio_threshold=brightness_ratio_threshold,
+        pool=pool,
+        instrumentation=instrumentation,
+        progress_reporter=progress_reporter,
     )
 
-    trim_videos(
+    report_progress(
+        progress_reporter,
+        "trim",
+        expected_durations={
+            None: find_minimum_video_duration(
+                video_info_dict=video_info_dict, lag_dict=lag_dict
+            )
+        },
+    )
+    if write_synchronized_videos:
+        trim_info_dict = trim_videos(
+            video_info_dict=video_info_dict,
+            synchronized_folder_path=synchronized_video_folder_path,
+            lag_dict=lag_dict,
+            fps=fps,
+            video_handler=video_handler,
+            pool=pool,
+            max_processes=max_processes,
+            instrumentation=instrumentation,
+            progress_reporter=progress_reporter,
+        )
+    else:
+        trim_info_dict = find_trimmed_frame_ranges(
+            video_info_dict=video_info_dict, lag_dict=lag_dict, fps=fps
+        )
+    sync_result = create_sync_result(
+        synchronized_video_folder_path=synchronized_video_folder_path,
+        method="brightness",
+        fps=fps,
         video_info_dict=video_info_dict,
-        synchronized_folder_path=synchronized_video_folder_path,
         lag_dict=lag_dict,
-        fps=fps,
-        video_handler=video_handler,
-    )
-
-    synchronized_video_framecounts = get_number_of_frames_of_videos_in_a_folder(
-        folder_path=synchronized_video_folder_path
-    )
-    logger.info(
-        f"All videos are {check_list_values_are_equal(synchronized_video_framecounts)} frames long"
-    )
-
-    synchronized_video_info_dict = create_video_info_dict(
-        video_filepath_list=get_video_file_list(synchronized_video_folder_path)
+        trim_info_dict=trim_info_dict,
+        confidence_dict=confidence_dict,
     )
+    log_trimmed_frame_counts(sync_result)
 
     save_dictionaries_to_toml(
         input_dictionaries={
             RAW_VIDEO_NAME: video_info_dict,
-            SYNCHRONIZED_VIDEO_NAME: synchronized_video_info_dict,
+            SYNCHRONIZED_VIDEO_NAME: sync_result.create_video_info_dict(),
             LAG_DICTIONARY_NAME: lag_dict,
         },
         output_file_path=synchronized_video_folder_path / DEBUG_TOML_NAME,
     )
 
-    for video_dict in synchronized_video_info_dict.values():
-        find_brightness_across_frames(video_pathstring=video_dict["video pathstring"])
+    synchronized_video_pathstrings = [
+        str(camera_result.output_video_path)
+        for camera_result in sync_result.cameras.values()
+    ]
+    report_progress(progress_reporter, "plotting")
+    find_synchronized_brightness = partial(
+        find_brightness_across_frames, progress_reporter=progress_reporter
+    )
+    with measure_stage(instrumentation, "plotting"):
+        if not sync_result.videos_written:
+            synchronized_brightness_arrays = None
+        elif pool is None:
+            synchronized_brightness_arrays = [
+                find_synchronized_brightness(video_pathstring)
+                for video_pathstring in synchronized_video_pathstrings
+            ]
+        else:
+            synchronized_brightness_arrays = pool.map(
+                find_synchronized_brightness, synchronized_video_pathstrings
+            )
 
     if create_debug_plots_bool:
-        if Path(raw_video_folder_path / NORMALIZED_VIDEOS_FOLDER_NAME).exists:
-            path_to_npys = raw_video_folder_path / NORMALIZED_VIDEOS_FOLDER_NAME
-        else:
-            path_to_npys = raw_video_folder_path
-        create_brightness_debug_plots(
-            raw_video_folder_path=path_to_npys,
-            synchronized_video_folder_path=synchronized_video_folder_path,
-        )
+        with measure_stage(instrumentation, "plotting"):
+            # the raw brightness arrays were saved next to the (possibly normalized) videos when finding the lags
+            raw_brightness_arrays = {
+                video_dict["camera name"]: np.load(
+                    find_brightness_array_path(video_dict["video pathstring"])
+                )
+                for video_dict in video_info_dict.values()
+            }
+            if synchronized_brightness_arrays is None:
+                # without trimmed videos, the synchronized brightness is the raw brightness of each camera's frame range
+                synchronized_brightness_arrays = [
+                    raw_brightness_arrays[camera_name][
+                        slice(camera_result.start_frame, camera_result.end_frame)
+                    ]
+                    for camera_name, camera_result in sync_result.cameras.items()
+                ]
+            brightness_envelopes = create_brightness_envelopes(
+                raw_brightness_arrays=raw_brightness_arrays,
+                synchronized_brightness_arrays=dict(
+                    zip(sync_result.cameras, synchronized_brightness_arrays)
+                ),
+            )
+            run_debug_plots(
+                create_brightness_debug_plots,
+                pool=pool,
+                background=render_debug_plots_in_background,
+                raw_video_folder_path=raw_video_folder_path,
+                synchronized_video_folder_path=synchronized_video_folder_path,
+                brightness_envelopes=brightness_envelopes,
+            )
+
+    if verify_outputs and sync_result.videos_written:
+        report_progress(progress_reporter, "verification")
+        with measure_stage(instrumentation, "verification"):
+            sync_result.verified = verify_synchronized_videos(
+                expected_durations={
+                    str(camera_result.output_video_path): camera_result.duration
+                    for camera_result in sync_result.cameras.values()
+                },
+                fps=fps,
+                pool=pool,
+            )
+
+    save_sync_manifest(sync_result)
+    instrumentation.save(
+        output_file_path=synchronized_video_folder_path / STAGE_TIMING_NAME,
+        chrome_trace_file_path=(
+            synchronized_video_folder_path / CHROME_TRACE_NAME
+            if save_chrome_trace
+            else None
+        ),
+    )
 
+    report_progress(progress_reporter, "finished", fraction=1.0)
     end_timer = time.time()
 
     logger.info(f"Elapsed processing time in seconds: {end_timer - start_timer}")
 
-    return synchronized_video_folder_path
+    sync_result.elapsed_time = end_timer - start_timer
+    return sync_result
+
+
+def log_trimmed_frame_counts(sync_result: SyncResult):
+    """Log each camera's result, and check the trimmed videos are all the same length from the frame counts the trim stage wrote"""
+    log_sync_result(sync_result)
+    frame_counts = [
+        camera_result.frame_count for camera_result in sync_result.cameras.values()
+    ]
+    logger.info(
+        f"All videos are {check_list_values_are_equal(frame_counts)} frames long"
+    )
+
+
+def run_debug_plots(
+    create_debug_plots,
+    pool: Optional[Pool] = None,
+    background: bool = False,
+    **kwargs,
+):
+    """Create debug plots, on a pool worker if a pool is given,
+    or in a background process if background is True, so the synchronization can return before the plot is saved.
+    """
+    if background:
+        start_background_debug_plots(
+            create_debug_plots,
+            output_folder_path=kwargs["synchronized_video_folder_path"],
+            **kwargs,
+        )
+    elif pool is None:
+        create_debug_plots(**kwargs)
+    else:
+        pool.apply(create_debug_plots, kwds=kwargs)
+
+
+def get_video_durations(video_info_dict: Dict[str, dict]) -> Dict[str, float]:
+    return {
+        video_dict["camera name"]: video_dict["video duration"]
+        for video_dict in video_info_dict.values()
+    }
+
+
+def find_partial_output_patterns(
+    raw_video_folder_path: Path, synchronized_video_folder_path: Optional[Path] = None
+) -> Dict[Path, str]:
+    """Find the folders a synchronization writes to, with glob patterns for what it writes in each, so a cancelled synchronization can remove them"""
+    if synchronized_video_folder_path is None:
+        synchronized_video_folder_path = (
+            Path(raw_video_folder_path).parent / SYNCHRONIZED_VIDEOS_FOLDER_NAME
+        )
+
+    return {
+        Path(synchronized_video_folder_path): "*",
+        Path(raw_video_folder_path) / NORMALIZED_VIDEOS_FOLDER_NAME: "*",
+        Path(raw_video_folder_path): f"*{BRIGHTNESS_SUFFIX}.{NUMPY_EXTENSION}",
+    }
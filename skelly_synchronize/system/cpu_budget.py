@@ -0,0 +1,123 @@
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# environment variable read for the max_cpu setting when it hasn't been set in code
+MAX_CPU_ENVIRONMENT_VARIABLE = "SKELLY_SYNCHRONIZE_MAX_CPU"
+
+# the most cores the package uses at once, None to use every available core
+_max_cpu: Optional[int] = None
+# the number of jobs this process runs at once, set by the pools and runners that schedule them
+_concurrent_jobs = 1
+
+
+def get_available_cpu_count() -> int:
+    """Return the number of cores this process may run on, respecting CPU affinity where the platform supports it"""
+    if hasattr(os, "sched_getaffinity"):
+        return max(len(os.sched_getaffinity(0)), 1)
+    return os.cpu_count() or 1
+
+
+def set_max_cpu(max_cpu: Optional[int]):
+    """Set the most cores the package uses at once, shared between every concurrent ffmpeg and decode job.
+    None uses every available core.
+    """
+    global _max_cpu
+    if max_cpu is not None and max_cpu < 1:
+        raise ValueError(f"max_cpu must be at least 1, got {max_cpu}")
+    _max_cpu = max_cpu
+
+
+def get_max_cpu() -> int:
+    """Return the CPU budget, from `set_max_cpu`, then the environment, then the available cores"""
+    available_cpu_count = get_available_cpu_count()
+    max_cpu = _max_cpu
+    if max_cpu is None and os.environ.get(MAX_CPU_ENVIRONMENT_VARIABLE):
+        try:
+            max_cpu = int(os.environ[MAX_CPU_ENVIRONMENT_VARIABLE])
+        except ValueError:
+            logger.warning(
+                f"Ignoring {MAX_CPU_ENVIRONMENT_VARIABLE}={os.environ[MAX_CPU_ENVIRONMENT_VARIABLE]}, it is not an integer"
+            )
+    if max_cpu is None:
+        return available_cpu_count
+
+    return max(min(max_cpu, available_cpu_count), 1)
+
+
+def get_default_worker_count() -> int:
+    """Return the default number of concurrent jobs, one less than the CPU budget to leave a core for the main process"""
+    max_cpu = get_max_cpu()
+    if max_cpu == get_available_cpu_count():
+        return max(max_cpu - 1, 1)
+    return max_cpu
+
+
+def find_concurrent_job_count(
+    job_count: int, max_processes: Optional[int] = None
+) -> int:
+    """Return how many of the jobs run at once, limited by max_processes and the CPU budget"""
+    if max_processes is None:
+        max_processes = get_default_worker_count()
+    return max(min(job_count, max_processes, get_max_cpu()), 1)
+
+
+def set_concurrent_jobs(concurrent_jobs: int):
+    global _concurrent_jobs
+    _concurrent_jobs = max(concurrent_jobs, 1)
+
+
+def get_concurrent_jobs() -> int:
+    return _concurrent_jobs
+
+
+def configure_cpu_budget(max_cpu: Optional[int], concurrent_jobs: int):
+    """Pool initializer that carries the CPU budget into worker processes, which don't share the parent's settings when spawned"""
+    set_max_cpu(max_cpu)
+    set_concurrent_jobs(concurrent_jobs)
+
+
+def allocate_threads_per_job(concurrent_jobs: Optional[int] = None) -> int:
+    """Divide the CPU budget between the jobs running at once, giving each at least one thread"""
+    if concurrent_jobs is None:
+        concurrent_jobs = get_concurrent_jobs()
+    return max(get_max_cpu() // max(concurrent_jobs, 1), 1)
+
+
+def split_threads(threads: int, process_count: int) -> List[int]:
+    """Split one job's threads between the processes it runs at once, so together they stay within the job's share.
+    Threads that don't divide evenly go to the last processes, and every process gets at least one thread,
+    so a job with fewer threads than processes goes over its share by the difference.
+    """
+    base_threads, remaining_threads = divmod(threads, process_count)
+    return [
+        max(base_threads + (index >= process_count - remaining_threads), 1)
+        for index in range(process_count)
+    ]
+
+
+def add_thread_arguments(command: List[str], threads: int) -> List[str]:
+    """Give an ffmpeg command explicit decoder, filter and encoder thread counts, so concurrent jobs don't each start a thread per core.
+    The decoder and filter threads go before the first input, and the encoder threads before the output, which is the last argument.
+    Earlier outputs of commands with several outputs keep ffmpeg's default encoder threads, so only use single-threaded codecs
+    for them, like the PCM, rawvideo and stream copy outputs of the analysis pass.
+    Commands that set their own thread counts, and commands that aren't ffmpeg, are returned unchanged.
+    """
+    if Path(command[0]).stem != "ffmpeg" or "-threads" in command[1:]:
+        return command
+
+    thread_count = str(threads)
+    return [
+        command[0],
+        "-threads",
+        thread_count,
+        "-filter_threads",
+        thread_count,
+        *command[1:-1],
+        "-threads",
+        thread_count,
+        command[-1],
+    ]
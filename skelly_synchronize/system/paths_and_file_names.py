@@ -8,6 +8,10 @@ NORMALIZED_VIDEOS_FOLDER_NAME = "normalized_videos"
 # file names
 DEBUG_TOML_NAME = "synchronization_debug.toml"
 DEBUG_PLOT_NAME = "debug_plot.png"
+STAGE_TIMING_NAME = "synchronization_timing.json"
+STAGE_TIMING_RECORDS_NAME = "synchronization_timing_records.jsonl"
+CHROME_TRACE_NAME = "synchronization_trace.json"
+SYNC_MANIFEST_NAME = "sync_manifest.json"
 
 # debug dictionary keys
 RAW_VIDEO_NAME = "Raw_video_information"
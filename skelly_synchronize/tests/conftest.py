@@ -22,8 +22,9 @@ def pytest_sessionstart():
     pytest.raw_video_folder_path = find_raw_videos_folder_path(
         pytest.sample_session_folder_path
     )
-    pytest.synchronized_video_folder_path = synchronize_videos_from_audio(
-        pytest.raw_video_folder_path
+    pytest.sync_result = synchronize_videos_from_audio(pytest.raw_video_folder_path)
+    pytest.synchronized_video_folder_path = (
+        pytest.sync_result.synchronized_video_folder_path
     )
     pytest.video_file_list = get_video_file_list(
         folder_path=pytest.synchronized_video_folder_path
@@ -40,6 +41,11 @@ def synchronized_video_folder_path():
     return pytest.synchronized_video_folder_path
 
 
+@pytest.fixture
+def sync_result():
+    return pytest.sync_result
+
+
 @pytest.fixture
 def test_video_pathstring():
     return str(pytest.video_file_list[0])
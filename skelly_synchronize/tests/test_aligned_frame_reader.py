@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from skelly_synchronize.core_processes.sync_result import (
+    SyncResult,
+    save_sync_manifest,
+)
+from skelly_synchronize.core_processes.video_functions.aligned_frame_reader import (
+    AlignedFrameReader,
+    find_source_offsets,
+    read_aligned_frames,
+)
+from skelly_synchronize.tests.utilities.create_test_video import (
+    FRAME_SIZE,
+    create_test_sync_result,
+    decode_gray_frames,
+    requires_ffmpeg,
+)
+
+
+@pytest.fixture
+def sync_result(tmp_path) -> SyncResult:
+    return create_test_sync_result(tmp_path)
+
+
+def test_find_source_offsets():
+    assert find_source_offsets(start_frame=2, stop_frame=5, drift=0.0) == [2, 3, 4]
+    assert find_source_offsets(start_frame=0, stop_frame=4, drift=0.5) == [0, 2, 3, 4]
+    assert find_source_offsets(start_frame=0, stop_frame=4, drift=-0.5) == [0, 0, 1, 2]
+
+
+@requires_ffmpeg
+def test_read_aligned_frames(sync_result):
+    manifest_path = save_sync_manifest(sync_result)
+    raw_frames = {
+        camera_name: decode_gray_frames(camera_result.raw_video_path)
+        for camera_name, camera_result in sync_result.cameras.items()
+    }
+
+    frame_number = 0
+    for cam_a_frame, cam_b_frame in read_aligned_frames(
+        manifest_path, pixel_format="gray", prefetch_frames=2
+    ):
+        assert np.array_equal(cam_a_frame, raw_frames["cam_a"][7 + frame_number])
+        assert np.array_equal(cam_b_frame, raw_frames["cam_b"][frame_number])
+        frame_number += 1
+    assert frame_number == 40
+
+
+@requires_ffmpeg
+def test_read_part_of_aligned_frames(sync_result):
+    sync_result.cameras["cam_b"].drift = 0.1
+    raw_cam_b_frames = decode_gray_frames(sync_result.cameras["cam_b"].raw_video_path)
+
+    with AlignedFrameReader(
+        sync_result, camera_names=["cam_b"], start_frame=10, stop_frame=20
+    ) as reader:
+        assert len(reader) == 10
+        frames = [frames[0].copy() for frames in reader]
+
+    assert frames[0].shape == (FRAME_SIZE[1], FRAME_SIZE[0], 3)
+    assert len(frames) == 10
+
+    gray_frames = [
+        frames[0].copy()
+        for frames in AlignedFrameReader(
+            sync_result, camera_names=["cam_b"], pixel_format="gray", start_frame=10
+        )
+    ]
+    for frame_number, gray_frame in enumerate(gray_frames, start=10):
+        assert np.array_equal(gray_frame, raw_cam_b_frames[round(frame_number * 1.1)])
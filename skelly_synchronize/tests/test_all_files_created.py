@@ -6,6 +6,7 @@ from skelly_synchronize.system.paths_and_file_names import (
     AUDIO_FILES_FOLDER_NAME,
     DEBUG_PLOT_NAME,
     DEBUG_TOML_NAME,
+    STAGE_TIMING_NAME,
     TRIMMED_AUDIO_FOLDER_NAME,
 )
 
@@ -43,3 +44,9 @@ def test_trimmed_audio_folder_exists(synchronized_video_folder_path: Union[str,
 def test_debug_toml_exists(synchronized_video_folder_path: Union[str, Path]):
     debug_toml_filepath = Path(synchronized_video_folder_path) / DEBUG_TOML_NAME
     assert debug_toml_filepath.exists()
+
+
+@pytest.mark.usefixtures("synchronized_video_folder_path")
+def test_stage_timing_exists(synchronized_video_folder_path: Union[str, Path]):
+    stage_timing_filepath = Path(synchronized_video_folder_path) / STAGE_TIMING_NAME
+    assert stage_timing_filepath.exists()
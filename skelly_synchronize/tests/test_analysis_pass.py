@@ -0,0 +1,104 @@
+import json
+import subprocess
+
+import pytest
+
+from skelly_synchronize.core_processes.video_functions.analysis_pass import (
+    run_analysis_pass,
+)
+from skelly_synchronize.core_processes.video_functions.ffmpeg_functions import (
+    ffmpeg_string,
+    parse_framecrc_keyframe_timestamps,
+    parse_media_probe,
+)
+from skelly_synchronize.tests.utilities.create_test_video import requires_ffmpeg
+
+
+def test_parse_media_probe():
+    probe_output = json.dumps(
+        {
+            "streams": [
+                {"codec_type": "video", "r_frame_rate": "30000/1001"},
+                {"codec_type": "audio", "sample_rate": "48000", "channels": 2},
+            ],
+            "format": {"duration": "12.5"},
+        }
+    )
+    media_info = parse_media_probe(probe_output, "video.mp4")
+
+    assert media_info["video duration"] == 12.5
+    assert media_info["video fps"] == pytest.approx(29.97, abs=1e-2)
+    assert media_info["audio sample rate"] == 48000
+    assert media_info["audio channels"] == 2
+
+    video_only_output = json.dumps(
+        {
+            "streams": [{"codec_type": "video", "r_frame_rate": "30/1"}],
+            "format": {"duration": "1.0"},
+        }
+    )
+    assert (
+        parse_media_probe(video_only_output, "video.mp4")["audio sample rate"] is None
+    )
+
+    with pytest.raises(RuntimeError):
+        parse_media_probe(json.dumps({"streams": []}), "video.mp4")
+
+
+def test_parse_framecrc_keyframe_timestamps():
+    framecrc_output = (
+        "#software: Lavf61.1.100\n"
+        "#tb 0: 1/15360\n"
+        "#media_type 0: video\n"
+        "0,      -1024,          0,      512,    42224, 0x493fc07d\n"
+        "0,       -512,        512,      512,    30339, 0x7c7e4abc, F=0x0\n"
+        "0,     126976,     128000,      512,    41230, 0x11111111\n"
+        "0,     127488,     128512,      512,    30549, 0x011b70f0, F=0x0\n"
+    )
+
+    assert parse_framecrc_keyframe_timestamps(framecrc_output) == [
+        0.0,
+        pytest.approx(128000 / 15360),
+    ]
+
+
+@requires_ffmpeg
+def test_run_analysis_pass(tmp_path):
+    video_pathstring = str(tmp_path / "video.mp4")
+    subprocess.run(
+        [
+            ffmpeg_string,
+            "-y",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc2=size=320x240:rate=30:duration=2",
+            "-f",
+            "lavfi",
+            "-i",
+            "sine=frequency=440:sample_rate=44100:duration=2",
+            "-g",
+            "30",
+            "-shortest",
+            video_pathstring,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    audio_file_path = tmp_path / "video.wav"
+
+    analysis_results = run_analysis_pass(
+        video_pathstring=video_pathstring,
+        audio_file_path=audio_file_path,
+        outputs=("audio pcm", "brightness", "keyframe timestamps"),
+        audio_pcm_sample_rate=8000,
+    )
+
+    assert audio_file_path.is_file()
+    assert len(analysis_results["brightness"]) == 60
+    assert 0 < analysis_results["brightness"].mean() < 255
+    assert analysis_results["keyframe timestamps"] == [
+        pytest.approx(0.0),
+        pytest.approx(1.0),
+    ]
+    assert len(analysis_results["audio pcm"]) == pytest.approx(16000, rel=0.05)
@@ -0,0 +1,101 @@
+import concurrent.futures
+import subprocess
+import threading
+import time
+
+import pytest
+
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    get_subprocess_count,
+)
+from skelly_synchronize.core_processes.video_functions.async_ffmpeg import (
+    FFmpegRunner,
+    parse_progress_line,
+)
+from skelly_synchronize.core_processes.video_functions.ffmpeg_functions import (
+    ffmpeg_string,
+    run_subprocess,
+)
+from skelly_synchronize.tests.utilities.create_test_video import requires_ffmpeg
+
+
+def create_test_video_command(output_pathstring: str, duration: float) -> list:
+    return [
+        ffmpeg_string,
+        "-y",
+        "-f",
+        "lavfi",
+        "-i",
+        f"testsrc2=size=320x240:rate=30:duration={duration}",
+        output_pathstring,
+    ]
+
+
+def test_parse_progress_line():
+    progress = {}
+    for line in ["frame=42", "out_time_us=1400000", "speed=2.5x", "bitrate=N/A"]:
+        assert not parse_progress_line(line, progress)
+    assert parse_progress_line("progress=continue", progress)
+
+    assert progress == {
+        "frame": 42,
+        "out time": 1.4,
+        "speed": 2.5,
+        "status": "continue",
+    }
+
+
+@requires_ffmpeg
+def test_runner_reports_progress(tmp_path):
+    progress_reports = []
+    with FFmpegRunner(
+        max_concurrent_processes=2, progress_callback=progress_reports.append
+    ) as runner:
+        results = runner.map(
+            lambda video_number: run_subprocess(
+                create_test_video_command(
+                    str(tmp_path / f"video_{video_number}.mp4"), duration=1
+                ),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            ),
+            range(3),
+        )
+
+    assert [result.returncode for result in results] == [0, 0, 0]
+    assert len(list(tmp_path.glob("*.mp4"))) == 3
+    final_reports = [report for report in progress_reports if report["status"] == "end"]
+    assert len(final_reports) == 3
+    assert all(report["frame"] == 30 for report in final_reports)
+
+
+@requires_ffmpeg
+def test_runner_counts_subprocesses_for_the_calling_thread():
+    start_subprocess_count = get_subprocess_count()
+    with FFmpegRunner() as runner:
+        runner.run([ffmpeg_string, "-version"])
+
+    assert get_subprocess_count() == start_subprocess_count + 1
+
+
+@requires_ffmpeg
+def test_runner_times_out(tmp_path):
+    with FFmpegRunner(timeout=0.5) as runner:
+        start_time = time.perf_counter()
+        with pytest.raises(subprocess.TimeoutExpired):
+            runner.run(create_test_video_command(str(tmp_path / "long.mp4"), 3600))
+
+    assert time.perf_counter() - start_time < 10
+
+
+@requires_ffmpeg
+def test_runner_cancels_running_processes(tmp_path):
+    runner = FFmpegRunner()
+    threading.Timer(0.5, runner.cancel).start()
+
+    with pytest.raises(concurrent.futures.CancelledError):
+        runner.run(create_test_video_command(str(tmp_path / "long.mp4"), 3600))
+    with pytest.raises(concurrent.futures.CancelledError):
+        runner.run(create_test_video_command(str(tmp_path / "short.mp4"), 1))
+
+    runner.close()
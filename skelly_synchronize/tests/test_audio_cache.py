@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from skelly_synchronize.core_processes import audio_utilities
+from skelly_synchronize.core_processes.audio_file_io import write_audio_file
+from skelly_synchronize.system.file_extensions import AudioExtension
+
+
+@pytest.fixture
+def video_dict(tmp_path: Path) -> dict:
+    video_path = tmp_path / "cam_a.mp4"
+    video_path.write_bytes(b"not a real video")
+    return {
+        "camera name": "cam_a",
+        "video filepath": video_path,
+        "video pathstring": str(video_path),
+    }
+
+
+def extract_audio(video_dict: dict, tmp_path: Path):
+    audio_folder_path = tmp_path / "audio"
+    audio_folder_path.mkdir(exist_ok=True)
+    return audio_utilities.extract_audio_from_single_video(
+        video_dict=video_dict,
+        audio_extension=AudioExtension.WAV,
+        audio_folder_path=audio_folder_path,
+        cache_folder_path=tmp_path / "cache",
+    )
+
+
+def test_interrupted_extraction_leaves_no_cache_entry(
+    video_dict, tmp_path, monkeypatch
+):
+    def killed_analysis_pass(video_pathstring, audio_file_path, outputs):
+        Path(audio_file_path).write_bytes(b"RIFF truncated")
+        raise RuntimeError("Analysis pass failed with return code -9")
+
+    monkeypatch.setattr(audio_utilities, "run_analysis_pass", killed_analysis_pass)
+    with pytest.raises(RuntimeError):
+        extract_audio(video_dict, tmp_path)
+
+    assert list((tmp_path / "cache").iterdir()) == []
+
+
+def test_completed_extraction_is_reused(video_dict, tmp_path, monkeypatch):
+    def analysis_pass(video_pathstring, audio_file_path, outputs):
+        write_audio_file(
+            audio_file_path=audio_file_path,
+            audio_signal=np.zeros(1000, dtype=np.float32),
+            sample_rate=1000,
+        )
+        return {"keyframe timestamps": [0.0]}
+
+    monkeypatch.setattr(audio_utilities, "run_analysis_pass", analysis_pass)
+    extract_audio(video_dict, tmp_path)
+    assert len(list((tmp_path / "cache").iterdir())) == 2
+
+    monkeypatch.setattr(audio_utilities, "run_analysis_pass", None)
+    _, audio_info = extract_audio(video_dict, tmp_path)
+    assert audio_info["audio duration"] == 1.0
+    assert audio_info["keyframe timestamps"] == [0.0]
+
+
+def test_video_without_audio_raises_audio_error(video_dict, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        audio_utilities,
+        "run_analysis_pass",
+        lambda video_pathstring, audio_file_path, outputs: {},
+    )
+    with pytest.raises(FileNotFoundError, match="ensure input video has audio"):
+        extract_audio(video_dict, tmp_path)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from pathlib import Path
+
+from skelly_synchronize.core_processes.audio_file_io import (
+    get_audio_file_duration,
+    load_audio_file,
+    write_audio_file,
+)
+
+SAMPLE_RATE = 8000
+
+
+@pytest.fixture
+def stereo_audio_signal() -> np.ndarray:
+    rng = np.random.default_rng(seed=0)
+    return rng.uniform(-0.5, 0.5, size=(2, SAMPLE_RATE * 3)).astype(np.float32)
+
+
+@pytest.fixture
+def audio_file_path(tmp_path: Path, stereo_audio_signal: np.ndarray) -> Path:
+    audio_file_path = tmp_path / "test_audio.wav"
+    write_audio_file(
+        audio_file_path=audio_file_path,
+        audio_signal=stereo_audio_signal,
+        sample_rate=SAMPLE_RATE,
+        subtype="FLOAT",
+    )
+    return audio_file_path
+
+
+def test_get_audio_file_duration(audio_file_path: Path):
+    assert get_audio_file_duration(audio_file_path) == pytest.approx(3.0)
+
+
+def test_load_audio_file_mono(audio_file_path: Path, stereo_audio_signal: np.ndarray):
+    audio_signal, sample_rate = load_audio_file(audio_file_path=audio_file_path)
+
+    assert sample_rate == SAMPLE_RATE
+    assert audio_signal.dtype == np.float32
+    np.testing.assert_allclose(audio_signal, stereo_audio_signal.mean(axis=0))
+
+
+def test_load_audio_file_partial_read(
+    audio_file_path: Path, stereo_audio_signal: np.ndarray
+):
+    audio_signal, _ = load_audio_file(
+        audio_file_path=audio_file_path, start_time=0.5, duration=1.0, mono=False
+    )
+
+    start_sample = SAMPLE_RATE // 2
+    end_sample = start_sample + SAMPLE_RATE
+    np.testing.assert_allclose(
+        audio_signal, stereo_audio_signal[:, start_sample:end_sample]
+    )
+
+
+def test_load_audio_file_resampled(audio_file_path: Path):
+    audio_signal, sample_rate = load_audio_file(
+        audio_file_path=audio_file_path, sample_rate=SAMPLE_RATE // 2
+    )
+
+    assert sample_rate == SAMPLE_RATE // 2
+    assert audio_signal.shape == (SAMPLE_RATE * 3 // 2,)
+    assert audio_signal.dtype == np.float32
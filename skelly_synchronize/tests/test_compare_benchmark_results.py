@@ -0,0 +1,43 @@
+from skelly_synchronize.benchmarks.run_benchmarks import compare_benchmark_results
+
+
+def create_benchmark_result(wall_time: float, trim_time: float, peak_rss_bytes: int):
+    return {
+        "scenario": "small",
+        "method": "audio",
+        "video handler": "ffmpeg",
+        "status": "completed",
+        "wall time": wall_time,
+        "peak rss bytes": peak_rss_bytes,
+        "max lag error": 0.0,
+        "stage totals": {
+            "trim": {"wall time": trim_time},
+            "probe": {"wall time": 0.01},
+        },
+    }
+
+
+def test_compare_benchmark_results():
+    baseline_results = [create_benchmark_result(10.0, 5.0, 1000)]
+
+    assert (
+        compare_benchmark_results(
+            baseline_results=baseline_results,
+            current_results=[create_benchmark_result(11.0, 5.5, 1100)],
+        )
+        == []
+    )
+
+    regressions = compare_benchmark_results(
+        baseline_results=baseline_results,
+        current_results=[create_benchmark_result(13.0, 8.0, 1000)],
+    )
+    assert [regression["metric"] for regression in regressions] == [
+        "wall time",
+        "trim wall time",
+    ]
+
+    regressions = compare_benchmark_results(
+        baseline_results=baseline_results, current_results=[]
+    )
+    assert regressions[0]["metric"] == "status"
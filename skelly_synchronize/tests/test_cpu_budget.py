@@ -0,0 +1,69 @@
+import pytest
+
+from skelly_synchronize.system import cpu_budget
+from skelly_synchronize.system.cpu_budget import (
+    add_thread_arguments,
+    split_threads,
+    allocate_threads_per_job,
+    find_concurrent_job_count,
+    set_max_cpu,
+)
+
+
+@pytest.fixture
+def eight_cpus(monkeypatch):
+    monkeypatch.setattr(cpu_budget, "get_available_cpu_count", lambda: 8)
+    monkeypatch.delenv(cpu_budget.MAX_CPU_ENVIRONMENT_VARIABLE, raising=False)
+    yield
+    set_max_cpu(None)
+
+
+def test_allocate_threads_per_job(eight_cpus):
+    assert allocate_threads_per_job(concurrent_jobs=1) == 8
+    assert allocate_threads_per_job(concurrent_jobs=3) == 2
+    assert allocate_threads_per_job(concurrent_jobs=20) == 1
+
+    set_max_cpu(4)
+    assert allocate_threads_per_job(concurrent_jobs=2) == 2
+
+
+def test_max_cpu_from_environment(eight_cpus, monkeypatch):
+    monkeypatch.setenv(cpu_budget.MAX_CPU_ENVIRONMENT_VARIABLE, "2")
+    assert allocate_threads_per_job(concurrent_jobs=1) == 2
+
+
+def test_find_concurrent_job_count(eight_cpus):
+    assert find_concurrent_job_count(job_count=3) == 3
+    assert find_concurrent_job_count(job_count=12) == 7
+
+    set_max_cpu(4)
+    assert find_concurrent_job_count(job_count=12) == 4
+    assert find_concurrent_job_count(job_count=12, max_processes=2) == 2
+
+
+def test_add_thread_arguments():
+    command = ["ffmpeg", "-i", "input.mp4", "-t", "5", "-y", "output.mp4"]
+    assert add_thread_arguments(command, threads=2) == [
+        "ffmpeg",
+        "-threads",
+        "2",
+        "-filter_threads",
+        "2",
+        "-i",
+        "input.mp4",
+        "-t",
+        "5",
+        "-y",
+        "-threads",
+        "2",
+        "output.mp4",
+    ]
+
+    ffprobe_command = ["ffprobe", "-v", "error", "input.mp4"]
+    assert add_thread_arguments(ffprobe_command, threads=2) == ffprobe_command
+
+
+def test_split_threads():
+    assert split_threads(4, process_count=2) == [2, 2]
+    assert split_threads(5, process_count=2) == [2, 3]
+    assert split_threads(1, process_count=2) == [1, 1]
@@ -0,0 +1,87 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import skelly_synchronize
+from skelly_synchronize.core_processes.debugging.debug_plots import (
+    compute_min_max_envelope,
+    create_audio_debug_plots,
+    create_audio_envelopes,
+    start_background_debug_plots,
+    wait_for_background_debug_plots,
+)
+from skelly_synchronize.system.paths_and_file_names import DEBUG_PLOT_NAME
+
+
+@pytest.fixture
+def audio_signal_dict() -> dict:
+    random_generator = np.random.default_rng(0)
+    return {
+        f"{camera_name}.wav": {
+            "camera name": camera_name,
+            "sample rate": 1000,
+            "audio file": random_generator.uniform(-1, 1, 10_000).astype(np.float32),
+        }
+        for camera_name in ["cam_a", "cam_b"]
+    }
+
+
+def test_compute_min_max_envelope():
+    signal = np.array([0, 5, -1, 2, 3, -4, 1])
+
+    envelope = compute_min_max_envelope(signal, sample_rate=2, max_points=3)
+
+    assert envelope["times"].tolist() == [0.0, 1.5, 3.0]
+    assert envelope["minimums"].tolist() == [-1, -4, 1]
+    assert envelope["maximums"].tolist() == [5, 3, 1]
+
+    part_envelope = compute_min_max_envelope(
+        signal, sample_rate=1, start_sample=3, sample_count=2
+    )
+    assert part_envelope["minimums"].tolist() == [2, 3]
+
+
+def test_create_audio_envelopes(audio_signal_dict):
+    audio_envelopes = create_audio_envelopes(
+        audio_signal_dict=audio_signal_dict,
+        lag_dict={"cam_a": 2.0, "cam_b": 0.0},
+        synchronized_duration=5.0,
+    )
+
+    raw_envelope = audio_envelopes["raw"]["cam_a"]
+    synchronized_envelope = audio_envelopes["synchronized"]["cam_a"]
+    assert len(raw_envelope["times"]) <= 2000
+    assert synchronized_envelope["times"][-1] < 5.0
+    signal = audio_signal_dict["cam_a.wav"]["audio file"]
+    assert synchronized_envelope["maximums"].max() == signal[2000:7000].max()
+
+
+def test_audio_debug_plots_are_saved_in_background(audio_signal_dict, tmp_path):
+    pytest.importorskip("matplotlib")
+    audio_envelopes = create_audio_envelopes(
+        audio_signal_dict=audio_signal_dict,
+        lag_dict={"cam_a": 2.0, "cam_b": 0.0},
+        synchronized_duration=5.0,
+    )
+
+    start_background_debug_plots(
+        create_audio_debug_plots,
+        output_folder_path=tmp_path,
+        synchronized_video_folder_path=tmp_path,
+        audio_envelopes=audio_envelopes,
+    )
+
+    assert wait_for_background_debug_plots(tmp_path, timeout=120)
+    assert (tmp_path / DEBUG_PLOT_NAME).stat().st_size > 0
+
+
+def test_package_folder_is_not_on_sys_path():
+    # spawned plot processes get this sys.path, and the skelly_synchronize module in the package folder would shadow the package
+    package_folder_path = Path(skelly_synchronize.__file__).parent
+    assert all(
+        Path(path).resolve() != package_folder_path.resolve()
+        for path in sys.path
+        if path
+    )
@@ -0,0 +1,64 @@
+import subprocess
+
+import pytest
+
+from skelly_synchronize.core_processes.video_functions import ffmpeg_functions
+from skelly_synchronize.core_processes.video_functions.ffmpeg_functions import (
+    create_seek_arguments,
+    find_preceding_keyframe_time,
+    parse_keyframe_timestamps,
+)
+
+
+@pytest.fixture
+def ffprobe_packet_output():
+    return (
+        "packet,1.500000,K__\n"
+        "packet,1.533333,___\n"
+        "packet,3.500000,K__\n"
+        "packet,N/A,K__\n"
+        "packet,5.500000,K_\n"
+        "format,1.500000\n"
+    )
+
+
+@pytest.fixture
+def keyframe_timestamps():
+    return [0.0, 2.0, 4.0]
+
+
+def test_parse_keyframe_timestamps(ffprobe_packet_output):
+    assert parse_keyframe_timestamps(ffprobe_packet_output) == [0.0, 2.0, 4.0]
+
+
+def test_find_preceding_keyframe_time(keyframe_timestamps):
+    assert find_preceding_keyframe_time(keyframe_timestamps, 3.9) == 2.0
+    assert find_preceding_keyframe_time(keyframe_timestamps, 4.0) == 4.0
+    assert find_preceding_keyframe_time(keyframe_timestamps, 10.0) == 4.0
+
+
+def test_find_preceding_keyframe_time_without_keyframes():
+    assert find_preceding_keyframe_time([], 3.0) == 0.0
+    assert find_preceding_keyframe_time([1.0], 0.5) == 0.0
+
+
+def test_keyframe_seeking_reads_only_the_packets_around_the_start(
+    ffprobe_packet_output, monkeypatch
+):
+    ffprobe_commands = []
+
+    def run_ffprobe(command, **kwargs):
+        ffprobe_commands.append(command)
+        return subprocess.CompletedProcess(command, 0, stdout=ffprobe_packet_output)
+
+    monkeypatch.setattr(ffmpeg_functions, "check_for_ffprobe", lambda: None)
+    monkeypatch.setattr(ffmpeg_functions, "run_subprocess", run_ffprobe)
+    input_arguments, output_arguments, skipped_time = create_seek_arguments(
+        input_video_pathstring="video.mp4",
+        start_time=3.0,
+        seek_strategy="keyframe",
+    )
+
+    assert skipped_time == 2.0
+    read_intervals_index = ffprobe_commands[0].index("-read_intervals")
+    assert ffprobe_commands[0][read_intervals_index + 1] == "0%13.0"
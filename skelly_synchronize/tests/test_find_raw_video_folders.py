@@ -0,0 +1,46 @@
+from pathlib import Path
+
+from skelly_synchronize.batch_synchronize import find_raw_video_folders
+from skelly_synchronize.system.paths_and_file_names import RAW_VIDEOS_FOLDER_NAME
+
+
+def test_find_raw_video_folders(tmp_path: Path):
+    (tmp_path / "session_1" / RAW_VIDEOS_FOLDER_NAME).mkdir(parents=True)
+    (tmp_path / "session_2").mkdir()
+    (tmp_path / "session_3.txt").touch()
+
+    raw_video_folders = find_raw_video_folders(
+        [str(tmp_path / "session_*"), tmp_path / "session_2"]
+    )
+
+    assert raw_video_folders == [
+        tmp_path / "session_1" / RAW_VIDEOS_FOLDER_NAME,
+        tmp_path / "session_2",
+    ]
+
+
+def test_find_raw_video_folders_recursively(tmp_path: Path):
+    (tmp_path / "2024" / "session_1" / RAW_VIDEOS_FOLDER_NAME).mkdir(parents=True)
+    (tmp_path / "2024" / "session_2").mkdir(parents=True)
+    (tmp_path / "2024" / "session_2" / "cam_0.MP4").touch()
+    (tmp_path / "2024" / "session_2" / "synchronized_videos").mkdir()
+    (tmp_path / "2024" / "session_2" / "synchronized_videos" / "cam_0.mp4").touch()
+    (tmp_path / "2025" / "calibration").mkdir(parents=True)
+    (tmp_path / "2025" / "calibration" / "cam_0.mov").touch()
+    (tmp_path / "2025" / "notes").mkdir()
+    (tmp_path / "2025" / "notes" / "readme.txt").touch()
+
+    assert find_raw_video_folders(tmp_path, recursive=True) == [
+        tmp_path / "2024" / "session_1" / RAW_VIDEOS_FOLDER_NAME,
+        tmp_path / "2024" / "session_2",
+        tmp_path / "2025" / "calibration",
+    ]
+    assert find_raw_video_folders(
+        tmp_path, recursive=True, exclude_patterns=["calibration"]
+    ) == [
+        tmp_path / "2024" / "session_1" / RAW_VIDEOS_FOLDER_NAME,
+        tmp_path / "2024" / "session_2",
+    ]
+    assert find_raw_video_folders(
+        tmp_path, recursive=True, include_patterns=["2024/session_2"]
+    ) == [tmp_path / "2024" / "session_2"]
@@ -0,0 +1,99 @@
+import cv2
+import numpy as np
+import pytest
+
+from skelly_synchronize.core_processes.sync_result import (
+    SyncResult,
+    save_sync_manifest,
+)
+from skelly_synchronize.core_processes.video_functions.frame_export import (
+    export_synchronized_frames,
+    truncate_export,
+)
+from skelly_synchronize.tests.utilities.create_test_video import (
+    FRAME_SIZE,
+    create_test_sync_result,
+    decode_gray_frames,
+    requires_ffmpeg,
+)
+
+
+@pytest.fixture
+def sync_result(tmp_path) -> SyncResult:
+    return create_test_sync_result(tmp_path)
+
+
+@requires_ffmpeg
+def test_export_frames_to_memmap(sync_result, tmp_path):
+    manifest_path = save_sync_manifest(sync_result)
+    # cam_b runs out of raw frames first, so both cameras are cut to its length
+    sync_result.cameras["cam_b"].start_frame = 30
+    sync_result.cameras["cam_b"].frame_count = 40
+
+    export_info_dict = export_synchronized_frames(
+        sync_result, tmp_path / "export", grayscale=True
+    )
+
+    assert export_info_dict["cam_b"]["frame count"] == 30
+    assert export_info_dict["cam_a"]["frame count"] == 30
+    cam_a_frames = np.load(export_info_dict["cam_a"]["output path"], mmap_mode="r")
+    assert cam_a_frames.shape == (30, FRAME_SIZE[1], FRAME_SIZE[0], 1)
+    # each exported frame is the raw frame at the camera's start frame plus its index
+    raw_cam_a_frames = decode_gray_frames(sync_result.cameras["cam_a"].raw_video_path)
+    assert np.array_equal(cam_a_frames[..., 0], raw_cam_a_frames[7:37])
+    cam_b_frames = np.load(export_info_dict["cam_b"]["output path"], mmap_mode="r")
+    raw_cam_b_frames = decode_gray_frames(sync_result.cameras["cam_b"].raw_video_path)
+    assert np.array_equal(cam_b_frames[..., 0], raw_cam_b_frames[30:60])
+
+    resized_export = export_synchronized_frames(
+        manifest_path, tmp_path / "resized", frame_size=(32, 24)
+    )
+    resized_frames = np.load(resized_export["cam_b"]["output path"], mmap_mode="r")
+    assert resized_frames.shape == (40, 24, 32, 3)
+
+
+@requires_ffmpeg
+def test_export_frames_to_images(sync_result, tmp_path):
+    export_info_dict = export_synchronized_frames(
+        sync_result, tmp_path / "export", export_format="png", max_processes=1
+    )
+
+    for camera_name, export_info in export_info_dict.items():
+        image_paths = sorted(export_info["output path"].iterdir())
+        assert len(image_paths) == export_info["frame count"] == 40
+        assert image_paths[0].name == "000000.png"
+
+        # the images are converted to gray differently than ffmpeg does, so each is matched to the raw frame it is closest to
+        camera_result = sync_result.cameras[camera_name]
+        raw_frames = decode_gray_frames(camera_result.raw_video_path).astype(np.int16)
+        matching_raw_frame_numbers = [
+            int(
+                np.argmin(
+                    np.abs(
+                        raw_frames - cv2.imread(str(image_path), cv2.IMREAD_GRAYSCALE)
+                    ).mean(axis=(1, 2))
+                )
+            )
+            for image_path in image_paths
+        ]
+        assert matching_raw_frame_numbers == list(
+            range(camera_result.start_frame, camera_result.start_frame + 40)
+        )
+
+
+def test_truncate_export(tmp_path):
+    array_path = tmp_path / "frames.npy"
+    np.save(array_path, np.arange(48, dtype=np.uint8).reshape(12, 2, 2, 1))
+    inode = array_path.stat().st_ino
+
+    truncate_export(array_path, frame_count=4)
+
+    truncated_array = np.load(array_path)
+    assert truncated_array.shape == (4, 2, 2, 1)
+    assert truncated_array[-1, -1, -1, 0] == 15
+    # the array is cut in place rather than copied to a new file
+    assert array_path.stat().st_ino == inode
+    assert array_path.stat().st_size == 128 + truncated_array.nbytes
+
+    with pytest.raises(ValueError):
+        export_synchronized_frames(tmp_path, tmp_path / "export", export_format="bmp")
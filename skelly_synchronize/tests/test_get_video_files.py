@@ -0,0 +1,32 @@
+from pathlib import Path
+
+from skelly_synchronize.utils.get_video_files import (
+    cache_directory_listings,
+    get_unique_list,
+    get_video_file_list,
+)
+
+
+def test_get_video_file_list(tmp_path: Path):
+    for file_name in ["b.MP4", "a.mov", "c.Mkv", "notes.txt", "audio.wav"]:
+        (tmp_path / file_name).touch()
+    (tmp_path / "folder.mp4").mkdir()
+
+    assert get_video_file_list(folder_path=tmp_path) == [
+        tmp_path / "a.mov",
+        tmp_path / "b.MP4",
+        tmp_path / "c.Mkv",
+    ]
+
+
+def test_cached_listings_see_new_files(tmp_path: Path):
+    (tmp_path / "cam_0.mp4").touch()
+
+    with cache_directory_listings():
+        assert len(get_video_file_list(folder_path=tmp_path)) == 1
+        (tmp_path / "cam_1.mp4").touch()
+        assert len(get_video_file_list(folder_path=tmp_path)) == 2
+
+
+def test_get_unique_list():
+    assert get_unique_list([3, 1, 3, 2, 1]) == [3, 1, 2]
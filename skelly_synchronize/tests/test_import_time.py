@@ -0,0 +1,59 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+base_package_path = Path(__file__).parent.parent.parent
+
+# generous enough for slow CI runners, but well below the seconds it takes when heavy dependencies are imported eagerly
+IMPORT_TIME_BUDGET_SECONDS = 1.5
+
+HEAVY_MODULES = [
+    "librosa",
+    "numba",
+    "matplotlib",
+    "cv2",
+    "deffcode",
+    "scipy",
+    "toml",
+    "PySide6",
+]
+
+
+def measure_import(module_name: str) -> dict:
+    """Import a module in a fresh interpreter, and return the import time and which heavy modules were loaded"""
+    measure_script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module_name}\n"
+        "import_time = time.perf_counter() - start\n"
+        f"heavy_modules = [module for module in {HEAVY_MODULES!r} if module in sys.modules]\n"
+        "print(json.dumps({'import time': import_time, 'heavy modules': heavy_modules}))\n"
+    )
+    measure_subprocess = subprocess.run(
+        [sys.executable, "-c", measure_script],
+        cwd=str(base_package_path),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    assert measure_subprocess.returncode == 0, measure_subprocess.stderr
+
+    return json.loads(measure_subprocess.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize(
+    "module_name",
+    [
+        "skelly_synchronize",
+        "skelly_synchronize.skelly_synchronize",
+        "skelly_synchronize.batch_synchronize",
+    ],
+)
+def test_import_does_not_load_heavy_modules(module_name: str):
+    import_measurement = measure_import(module_name)
+
+    assert import_measurement["heavy modules"] == []
+    assert import_measurement["import time"] < IMPORT_TIME_BUDGET_SECONDS
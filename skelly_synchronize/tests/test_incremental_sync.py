@@ -0,0 +1,153 @@
+import pytest
+
+from skelly_synchronize.core_processes.debugging.debug_output import (
+    load_dictionaries_from_toml,
+    save_dictionaries_to_toml,
+)
+from skelly_synchronize.core_processes.incremental_sync import (
+    create_session_video_info_dict,
+    find_changed_cameras,
+    find_incremental_lag_dict,
+    update_debug_outputs,
+)
+from skelly_synchronize.core_processes.sync_result import create_sync_result
+from skelly_synchronize.core_processes.video_functions.video_utilities import (
+    find_trimmed_frame_ranges,
+)
+from skelly_synchronize.system.paths_and_file_names import (
+    AUDIO_NAME,
+    DEBUG_PLOT_NAME,
+    DEBUG_TOML_NAME,
+    LAG_DICTIONARY_NAME,
+    RAW_VIDEO_NAME,
+)
+
+FPS = 30.0
+
+
+@pytest.fixture
+def sync_result(tmp_path):
+    # cam_b starts half a second after cam_a, and both raw videos are 10 seconds long
+    video_info_dict = {
+        camera_name: {
+            "camera name": camera_name,
+            "video pathstring": str(tmp_path / "raw_videos" / f"{camera_name}.mp4"),
+            "video duration": 10.0,
+        }
+        for camera_name in ["cam_a", "cam_b"]
+    }
+    lag_dict = {"cam_a": 0.5, "cam_b": 0.0}
+    return create_sync_result(
+        synchronized_video_folder_path=tmp_path / "synchronized_videos",
+        method="audio",
+        fps=FPS,
+        video_info_dict=video_info_dict,
+        lag_dict=lag_dict,
+        trim_info_dict=find_trimmed_frame_ranges(video_info_dict, lag_dict, FPS),
+    )
+
+
+def add_camera(sync_result, camera_name: str, lag: float, duration: float):
+    lag_dict = find_incremental_lag_dict(
+        lag_dict=sync_result.lag_dict,
+        reference_camera_name="cam_a",
+        camera_name=camera_name,
+        lag=lag,
+    )
+    video_info_dict = create_session_video_info_dict(
+        sync_result=sync_result,
+        new_video_dict={
+            "camera name": camera_name,
+            "video pathstring": f"{camera_name}.mp4",
+            "video duration": duration,
+        },
+    )
+    trim_info_dict = find_trimmed_frame_ranges(video_info_dict, lag_dict, FPS)
+    return lag_dict, find_changed_cameras(sync_result, trim_info_dict, camera_name)
+
+
+def test_camera_inside_the_window_reuses_the_others(sync_result):
+    lag_dict, changed_camera_names = add_camera(
+        sync_result, "cam_c", lag=0.25, duration=10.0
+    )
+
+    # the lags of cameras whose window didn't move are kept exactly
+    assert lag_dict == {"cam_a": 0.5, "cam_b": 0.0, "cam_c": 0.25}
+    assert changed_camera_names == ["cam_c"]
+
+
+def test_later_camera_moves_the_start(sync_result):
+    lag_dict, changed_camera_names = add_camera(
+        sync_result, "cam_c", lag=1.0, duration=10.0
+    )
+
+    assert lag_dict == pytest.approx({"cam_a": 1.0, "cam_b": 0.5, "cam_c": 0.0})
+    assert changed_camera_names == ["cam_a", "cam_b", "cam_c"]
+
+
+def test_shorter_camera_moves_the_end(sync_result):
+    _, changed_camera_names = add_camera(sync_result, "cam_c", lag=0.25, duration=5.0)
+
+    assert changed_camera_names == ["cam_a", "cam_b", "cam_c"]
+
+
+def test_replacing_the_latest_camera_moves_the_start(sync_result):
+    lag_dict, changed_camera_names = add_camera(
+        sync_result, "cam_b", lag=0.25, duration=10.0
+    )
+
+    assert lag_dict == pytest.approx({"cam_a": 0.25, "cam_b": 0.0})
+    assert changed_camera_names == ["cam_a", "cam_b"]
+
+
+def test_debug_outputs_follow_the_new_camera(sync_result):
+    synchronized_video_folder_path = sync_result.synchronized_video_folder_path
+    synchronized_video_folder_path.mkdir()
+    save_dictionaries_to_toml(
+        input_dictionaries={
+            RAW_VIDEO_NAME: {
+                "cam_a": {"camera name": "cam_a", "video duration": 10.0},
+                "cam_b": {"camera name": "cam_b", "video duration": 10.0},
+            },
+            AUDIO_NAME: {"cam_a.wav": {"camera name": "cam_a"}},
+            LAG_DICTIONARY_NAME: sync_result.lag_dict,
+        },
+        output_file_path=synchronized_video_folder_path / DEBUG_TOML_NAME,
+    )
+    (synchronized_video_folder_path / DEBUG_PLOT_NAME).write_bytes(b"stale plot")
+
+    lag_dict, _ = add_camera(sync_result, "cam_c", lag=0.25, duration=10.0)
+    new_video_dict = {
+        "camera name": "cam_c",
+        "video pathstring": "cam_c.mp4",
+        "video duration": 10.0,
+    }
+    video_info_dict = create_session_video_info_dict(sync_result, new_video_dict)
+    updated_sync_result = create_sync_result(
+        synchronized_video_folder_path=synchronized_video_folder_path,
+        method="audio",
+        fps=FPS,
+        video_info_dict=video_info_dict,
+        lag_dict=lag_dict,
+        trim_info_dict=find_trimmed_frame_ranges(video_info_dict, lag_dict, FPS),
+    )
+    update_debug_outputs(
+        sync_result=updated_sync_result,
+        new_video_dict=new_video_dict,
+        audio_info={
+            "camera name": "cam_c",
+            "audio file": [0.0],
+            "audio duration": 10.0,
+        },
+    )
+
+    debug_dictionaries = load_dictionaries_from_toml(
+        synchronized_video_folder_path / DEBUG_TOML_NAME
+    )
+    assert debug_dictionaries[LAG_DICTIONARY_NAME] == lag_dict
+    assert list(debug_dictionaries[RAW_VIDEO_NAME]) == ["cam_a", "cam_b", "cam_c"]
+    assert debug_dictionaries[AUDIO_NAME]["cam_c.wav"] == {
+        "camera name": "cam_c",
+        "audio duration": 10.0,
+    }
+    assert not (synchronized_video_folder_path / DEBUG_PLOT_NAME).exists()
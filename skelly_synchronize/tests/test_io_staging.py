@@ -0,0 +1,105 @@
+from pathlib import Path
+
+import pytest
+
+from skelly_synchronize.core_processes import io_staging
+from skelly_synchronize.core_processes.io_staging import (
+    is_network_path,
+    synchronize_with_local_staging,
+)
+
+
+@pytest.fixture
+def raw_video_folder_path(tmp_path) -> Path:
+    raw_video_folder_path = tmp_path / "session" / "raw_videos"
+    raw_video_folder_path.mkdir(parents=True)
+    for camera_name in ["cam_a", "cam_b"]:
+        (raw_video_folder_path / f"{camera_name}.mp4").write_bytes(b"0" * 100)
+    return raw_video_folder_path
+
+
+def fake_synchronize(
+    raw_video_folder_path: Path, synchronized_video_folder_path: Path, fail=False
+):
+    """Stands in for a synchronization function, recording where it ran and writing outputs next to the raw videos and to the synchronized folder"""
+    for video_path in sorted(raw_video_folder_path.glob("*.mp4")):
+        (synchronized_video_folder_path / f"synced_{video_path.name}").write_bytes(
+            video_path.read_bytes()
+        )
+        (raw_video_folder_path / f"{video_path.stem}_brightness.npy").write_text(
+            str(video_path.is_symlink())
+        )
+    (synchronized_video_folder_path / "staged_from.txt").write_text(
+        str(raw_video_folder_path)
+    )
+    if fail:
+        raise RuntimeError("synchronization failed")
+    return synchronized_video_folder_path
+
+
+def test_staged_outputs_are_moved_to_their_destinations(raw_video_folder_path):
+    synchronized_video_folder_path = synchronize_with_local_staging(
+        fake_synchronize,
+        raw_video_folder_path=raw_video_folder_path,
+        staging_mode="always",
+    )
+
+    assert synchronized_video_folder_path == (
+        raw_video_folder_path.parent / "synchronized_videos"
+    )
+    assert sorted(path.name for path in synchronized_video_folder_path.iterdir()) == [
+        "staged_from.txt",
+        "synced_cam_a.mp4",
+        "synced_cam_b.mp4",
+    ]
+    staged_from = Path((synchronized_video_folder_path / "staged_from.txt").read_text())
+    assert staged_from != raw_video_folder_path
+    assert not staged_from.exists()
+    assert (raw_video_folder_path / "cam_a_brightness.npy").read_text() == "False"
+    assert not list(synchronized_video_folder_path.glob("*.partial"))
+
+
+def test_videos_past_the_scratch_limit_are_read_from_their_source(
+    raw_video_folder_path,
+):
+    synchronize_with_local_staging(
+        fake_synchronize,
+        raw_video_folder_path=raw_video_folder_path,
+        staging_mode="always",
+        max_scratch_bytes=150,
+    )
+
+    assert (raw_video_folder_path / "cam_a_brightness.npy").read_text() == "False"
+    assert (raw_video_folder_path / "cam_b_brightness.npy").read_text() == "True"
+
+
+def test_failed_synchronization_leaves_destination_untouched(
+    raw_video_folder_path, tmp_path
+):
+    synchronized_video_folder_path = tmp_path / "output"
+    with pytest.raises(RuntimeError):
+        synchronize_with_local_staging(
+            fake_synchronize,
+            raw_video_folder_path=raw_video_folder_path,
+            synchronized_video_folder_path=synchronized_video_folder_path,
+            staging_mode="always",
+            scratch_folder_path=tmp_path / "scratch",
+            fail=True,
+        )
+
+    assert not synchronized_video_folder_path.exists()
+    assert not list(raw_video_folder_path.glob("*.npy"))
+    assert not list((tmp_path / "scratch").iterdir())
+
+
+def test_is_network_path(monkeypatch):
+    monkeypatch.setattr(io_staging.sys, "platform", "linux")
+    monkeypatch.setattr(
+        io_staging,
+        "read_mount_points",
+        lambda: {Path("/"): "ext4", Path("/mnt/share"): "nfs4"},
+    )
+
+    assert is_network_path("/mnt/share/session/raw_videos")
+    assert not is_network_path("/mnt/shared")
+    assert not is_network_path("/home/user/session")
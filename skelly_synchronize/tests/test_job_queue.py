@@ -0,0 +1,132 @@
+import pickle
+import threading
+from pathlib import Path
+
+import pytest
+
+from skelly_synchronize.core_processes.job_queue import (
+    DirectoryJobQueue,
+    JobFailedError,
+    JobQueuePool,
+    SQLiteJobQueue,
+    run_job_worker,
+)
+
+
+def square(value: int) -> int:
+    return value * value
+
+
+def fail_once(marker_pathstring: str) -> str:
+    marker_path = Path(marker_pathstring)
+    if not marker_path.exists():
+        marker_path.touch()
+        raise RuntimeError("first attempt fails")
+    return "retried"
+
+
+def always_fail():
+    raise ValueError("this job always fails")
+
+
+@pytest.fixture(params=["sqlite", "directory"])
+def job_queue(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteJobQueue(database_path=tmp_path / "jobs.sqlite", max_attempts=2)
+    return DirectoryJobQueue(queue_folder_path=tmp_path / "jobs", max_attempts=2)
+
+
+@pytest.fixture
+def worker(job_queue):
+    stop_event = threading.Event()
+    worker_thread = threading.Thread(
+        target=run_job_worker,
+        kwargs={"queue": job_queue, "poll_interval": 0.01, "stop_event": stop_event},
+    )
+    worker_thread.start()
+    yield
+    stop_event.set()
+    worker_thread.join()
+
+
+def test_claim_is_exclusive(job_queue):
+    job_ids = job_queue.submit([pickle.dumps((square, (2,), {}))])
+
+    assert job_queue.claim("worker a", lease_seconds=60)[0] == job_ids[0]
+    assert job_queue.claim("worker b", lease_seconds=60) is None
+    assert not job_queue.complete(job_ids[0], "worker b", pickle.dumps(4))
+    assert job_queue.complete(job_ids[0], "worker a", pickle.dumps(4))
+    assert job_queue.get_jobs(job_ids)[job_ids[0]]["status"] == "succeeded"
+
+
+def test_expired_lease_is_reclaimed(job_queue):
+    job_ids = job_queue.submit([pickle.dumps((square, (2,), {}))])
+
+    job_queue.claim("crashed worker", lease_seconds=-1)
+    assert job_queue.claim("worker b", lease_seconds=-1)[0] == job_ids[0]
+    # both attempts were used, so the job fails instead of being claimed a third time
+    assert job_queue.claim("worker c", lease_seconds=60) is None
+    assert job_queue.get_jobs(job_ids)[job_ids[0]]["status"] == "failed"
+
+
+def test_pool_runs_jobs_on_worker(job_queue, worker):
+    pool = JobQueuePool(queue=job_queue, poll_interval=0.01, timeout=30)
+
+    assert pool.map(square, range(5)) == [0, 1, 4, 9, 16]
+    assert pool.starmap(pow, [(2, 3), (3, 2)]) == [8, 9]
+    assert pool.apply(square, args=(7,)) == 49
+    # gathered jobs are removed from the queue
+    assert job_queue.count_jobs()["succeeded"] == 0
+
+
+def test_failed_job_is_retried(job_queue, worker, tmp_path):
+    pool = JobQueuePool(queue=job_queue, poll_interval=0.01, timeout=30)
+
+    assert pool.apply(fail_once, args=(str(tmp_path / "marker"),)) == "retried"
+
+    with pytest.raises(JobFailedError, match="this job always fails"):
+        pool.apply(always_fail)
+
+
+def test_pool_times_out_without_workers(job_queue):
+    pool = JobQueuePool(queue=job_queue, poll_interval=0.01, timeout=0.05)
+
+    with pytest.raises(TimeoutError):
+        pool.map(square, [1, 2])
+    assert sum(job_queue.count_jobs().values()) == 0
+
+
+def test_concurrent_claims_are_exclusive(job_queue):
+    job_count = 20
+    job_queue.submit(
+        [pickle.dumps((square, (value,), {})) for value in range(job_count)]
+    )
+    claimed_job_ids = []
+
+    def claim_all(worker_id: str):
+        while (job := job_queue.claim(worker_id, lease_seconds=60)) is not None:
+            claimed_job_ids.append(job[0])
+
+    workers = [
+        threading.Thread(target=claim_all, args=(f"worker {index}",))
+        for index in range(4)
+    ]
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+
+    assert len(claimed_job_ids) == job_count
+    assert len(set(claimed_job_ids)) == job_count
+
+
+def test_lost_lease_stops_heartbeat_and_completion(job_queue):
+    job_ids = job_queue.submit([pickle.dumps((square, (2,), {}))])
+
+    job_queue.claim("slow worker", lease_seconds=-1)
+    assert job_queue.claim("worker b", lease_seconds=60)[0] == job_ids[0]
+    assert not job_queue.heartbeat(job_ids[0], "slow worker", lease_seconds=60)
+    assert not job_queue.complete(job_ids[0], "slow worker", pickle.dumps(4))
+    assert job_queue.heartbeat(job_ids[0], "worker b", lease_seconds=60)
+    assert job_queue.complete(job_ids[0], "worker b", pickle.dumps(4))
+    assert pickle.loads(job_queue.get_jobs(job_ids)[job_ids[0]]["result"]) == 4
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from scipy import signal
+
+from skelly_synchronize.core_processes.correlation_functions import (
+    AUDIO_LAG_ESTIMATORS,
+    BRIGHTNESS_LAG_ESTIMATORS,
+    batched_cross_correlation,
+    estimate_lags_brightness_correlation,
+)
+
+SAMPLE_RATE = 8000
+FRAME_RATE = 30
+
+
+@pytest.fixture
+def audio_signals():
+    rng = np.random.default_rng(0)
+    session_audio = 0.1 * rng.standard_normal(SAMPLE_RATE * 12)
+    # claps give the onset envelope something to align
+    clap_envelope = np.exp(-np.arange(SAMPLE_RATE // 10) / (SAMPLE_RATE / 100))
+    for clap_start in rng.integers(0, SAMPLE_RATE * 11, size=20):
+        clap_end = clap_start + clap_envelope.size
+        session_audio[clap_start:clap_end] += (
+            rng.standard_normal(clap_envelope.size) * clap_envelope
+        )
+    # the second camera starts 1.25 seconds after the first
+    second_camera_start = int(1.25 * SAMPLE_RATE)
+    return session_audio[: SAMPLE_RATE * 10], session_audio[second_camera_start:]
+
+
+def test_batched_cross_correlation(audio_signals):
+    reference_signal, signal_to_align = audio_signals
+    shorter_signal = signal_to_align[: SAMPLE_RATE * 5]
+
+    correlation, lags = batched_cross_correlation(
+        reference_signal, [signal_to_align, shorter_signal]
+    )
+
+    for signal_correlation, signal_2 in zip(
+        correlation, [signal_to_align, shorter_signal]
+    ):
+        expected_lags = signal.correlation_lags(reference_signal.size, signal_2.size)
+        assert np.allclose(
+            signal_correlation[lags >= expected_lags[0]],
+            signal.correlate(reference_signal, signal_2),
+            atol=1e-2,
+        )
+
+
+@pytest.mark.parametrize("estimator_name", list(AUDIO_LAG_ESTIMATORS))
+def test_audio_lag_estimators(audio_signals, estimator_name):
+    lag, confidence = AUDIO_LAG_ESTIMATORS[estimator_name](*audio_signals, SAMPLE_RATE)
+
+    assert lag == pytest.approx(1.25, abs=1 / 1000)
+    assert 0 < confidence <= 1
+
+
+@pytest.mark.parametrize("estimator_name", list(BRIGHTNESS_LAG_ESTIMATORS))
+def test_brightness_lag_estimators(estimator_name):
+    reference_brightness = np.full(300, 100.0)
+    reference_brightness[100:115] = 235
+    brightness = np.full(300, 100.0)
+    brightness[70:85] = 235
+
+    lag, confidence = BRIGHTNESS_LAG_ESTIMATORS[estimator_name](
+        reference_brightness, brightness, FRAME_RATE
+    )
+
+    assert lag == pytest.approx(1.0, abs=1 / FRAME_RATE)
+    assert confidence > 0.5
+
+
+def test_brightness_correlation_without_threshold_crossings():
+    rng = np.random.default_rng(0)
+    light_change_times = np.arange(0, 21, 0.5)
+    light_levels = rng.uniform(90, 110, light_change_times.size)
+
+    def record_brightness(start_time: float, frame_count: int) -> np.ndarray:
+        # dim, slow lighting changes that never pass the brightness ratio threshold
+        frame_times = start_time + np.arange(frame_count) / FRAME_RATE
+        return np.interp(frame_times, light_change_times, light_levels)
+
+    reference_brightness = record_brightness(0, 450)
+    # the other cameras start 1.5 and 2.25 seconds later, half a frame apart, one with a different exposure and sensor noise
+    later_brightness = 0.6 * record_brightness(1.5, 400) + 20
+    later_brightness += rng.normal(0, 0.05, later_brightness.size)
+    latest_brightness = record_brightness(2.25, 500)
+
+    lags_and_confidences = estimate_lags_brightness_correlation(
+        reference_brightness, [later_brightness, latest_brightness], FRAME_RATE
+    )
+
+    assert lags_and_confidences[0][0] == pytest.approx(1.5, abs=0.25 / FRAME_RATE)
+    assert lags_and_confidences[1][0] == pytest.approx(2.25, abs=0.25 / FRAME_RATE)
+    for _, confidence in lags_and_confidences:
+        assert 0 < confidence <= 1
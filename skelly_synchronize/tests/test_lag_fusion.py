@@ -0,0 +1,65 @@
+import pytest
+
+from skelly_synchronize.core_processes.lag_fusion import (
+    fuse_brightness_lags,
+    fuse_lag_estimates,
+)
+from skelly_synchronize.tests.utilities.create_test_video import (
+    create_flash_video,
+    requires_ffmpeg,
+)
+
+
+def test_agreeing_lags_are_averaged():
+    lag, confidence = fuse_lag_estimates(
+        audio_lag=1.0,
+        audio_confidence=0.1,
+        audio_resolution=1 / 8000,
+        brightness_lag=1.01,
+        brightness_confidence=0.5,
+        brightness_resolution=1 / 30,
+    )
+
+    # the audio lag is much finer, so it dominates the average
+    assert 1.0 <= lag < 1.001
+    assert confidence == pytest.approx(0.55)
+
+
+def test_disagreeing_lags_keep_the_more_confident_one():
+    assert fuse_lag_estimates(
+        audio_lag=2.5,
+        audio_confidence=0.05,
+        audio_resolution=1 / 8000,
+        brightness_lag=1.0,
+        brightness_confidence=0.9,
+        brightness_resolution=1 / 30,
+    ) == (1.0, 0.9)
+
+
+@requires_ffmpeg
+def test_only_low_confidence_cameras_are_checked(tmp_path):
+    create_flash_video(tmp_path / "cam_a.mp4", flash_frame=60)
+    # cam_b starts a second after cam_a
+    create_flash_video(tmp_path / "cam_b.mp4", flash_frame=30)
+    video_info_dict = {
+        camera_name: {"video pathstring": str(tmp_path / f"{camera_name}.mp4")}
+        for camera_name in ["cam_a", "cam_b", "cam_c"]
+    }
+
+    # the audio put cam_b 2.5 seconds after cam_a with a low confidence, and cam_c has no video to decode
+    lag_dict, confidence_dict = fuse_brightness_lags(
+        lag_dict={"cam_a": 2.5, "cam_b": 0.0, "cam_c": 2.0},
+        confidence_dict={"cam_a": 1.0, "cam_b": 0.05, "cam_c": 0.9},
+        video_info_dict=video_info_dict,
+        reference_camera_name="cam_a",
+        frame_rate=30,
+        audio_resolution=1 / 8000,
+        minimum_confidence=0.2,
+        brightness_duration=3,
+    )
+
+    assert lag_dict["cam_a"] == pytest.approx(1.0, abs=0.5 / 30)
+    assert lag_dict["cam_b"] == 0.0
+    assert lag_dict["cam_c"] == pytest.approx(0.5, abs=0.5 / 30)
+    assert confidence_dict["cam_b"] > 0.5
+    assert confidence_dict["cam_c"] == 0.9
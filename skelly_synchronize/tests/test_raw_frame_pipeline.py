@@ -0,0 +1,172 @@
+import io
+import subprocess
+
+import cv2
+import numpy as np
+import pytest
+
+from skelly_synchronize.core_processes.video_functions.ffmpeg_functions import (
+    ffmpeg_string,
+)
+from skelly_synchronize.core_processes.video_functions import raw_frame_pipeline
+from skelly_synchronize.core_processes.video_functions.raw_frame_pipeline import (
+    FrameBufferPool,
+    choose_pipe_pixel_format,
+    create_decoder_command,
+    create_encoder_command,
+    find_frame_size_bytes,
+    find_passthrough_timing_arguments,
+    pipe_frames,
+    read_frame_into,
+)
+from skelly_synchronize.tests.utilities.create_test_video import requires_ffmpeg
+
+
+class ShortReadPipe(io.BytesIO):
+    """A pipe that returns at most a few bytes per read, like a pipe the writer hasn't filled yet"""
+
+    def readinto(self, buffer):
+        short_view = memoryview(buffer)[:3]
+        return super().readinto(short_view)
+
+
+def test_read_frame_into_fills_buffer_across_short_reads():
+    pipe = ShortReadPipe(bytes(range(20)))
+    buffer = np.zeros(8, dtype=np.uint8)
+
+    assert read_frame_into(pipe, buffer)
+    assert buffer.tolist() == list(range(8))
+    assert read_frame_into(pipe, buffer)
+    assert buffer.tolist() == list(range(8, 16))
+    # the last four bytes are a partial frame
+    assert not read_frame_into(pipe, buffer)
+
+
+def test_frame_buffer_pool_reuses_buffers():
+    buffer_pool = FrameBufferPool(frame_size_bytes=16, buffer_count=2)
+    first_buffer = buffer_pool.acquire()
+    buffer_pool.acquire()
+    buffer_pool.release(first_buffer)
+
+    assert buffer_pool.acquire() is first_buffer
+    assert buffer_pool.free_buffers.empty()
+
+
+def test_choose_pipe_pixel_format():
+    assert choose_pipe_pixel_format("bgr24", "yuv420p") == "bgr24"
+    assert choose_pipe_pixel_format("native", "yuv420p") == "yuv420p"
+    assert choose_pipe_pixel_format("native", "yuv420p10le") == "bgr24"
+    with pytest.raises(ValueError):
+        choose_pipe_pixel_format("rgba", "yuv420p")
+
+    assert find_frame_size_bytes(320, 240, "yuv420p") == 320 * 240 * 3 // 2
+
+
+@pytest.mark.parametrize(
+    "version_line, timing_arguments",
+    [
+        ("ffmpeg version 7.0.2-static", ("-fps_mode", "passthrough")),
+        ("ffmpeg version n5.1", ("-fps_mode", "passthrough")),
+        ("ffmpeg version 4.4.2-0ubuntu0.22.04.1", ("-vsync", "passthrough")),
+        ("ffmpeg version N-112345-gabcdef", ("-fps_mode", "passthrough")),
+    ],
+)
+def test_find_passthrough_timing_arguments(version_line, timing_arguments, monkeypatch):
+    monkeypatch.setattr(
+        raw_frame_pipeline.subprocess,
+        "run",
+        lambda command, **kwargs: subprocess.CompletedProcess(
+            command, 0, stdout=f"{version_line} Copyright (c) 2000-2024"
+        ),
+    )
+    find_passthrough_timing_arguments.cache_clear()
+    try:
+        assert find_passthrough_timing_arguments("ffmpeg") == timing_arguments
+    finally:
+        find_passthrough_timing_arguments.cache_clear()
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize("pixel_format", ["bgr24", "yuv420p"])
+def test_pipe_frames(tmp_path, pixel_format):
+    input_pathstring = str(tmp_path / "input.mp4")
+    output_pathstring = str(tmp_path / "output.mp4")
+    subprocess.run(
+        [
+            ffmpeg_string,
+            "-y",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc2=size=320x240:rate=30:duration=2",
+            "-f",
+            "lavfi",
+            "-i",
+            "sine=duration=2",
+            "-shortest",
+            "-pix_fmt",
+            "yuv420p",
+            input_pathstring,
+        ],
+        check=True,
+        capture_output=True,
+    )
+
+    written_frames = pipe_frames(
+        decoder_command=create_decoder_command(
+            ffmpeg_location=ffmpeg_string,
+            input_video_pathstring=input_pathstring,
+            pixel_format=pixel_format,
+            threads=1,
+            start_frame=10,
+            frame_count=30,
+        ),
+        encoder_command=create_encoder_command(
+            ffmpeg_location=ffmpeg_string,
+            output_video_pathstring=output_pathstring,
+            pixel_format=pixel_format,
+            frame_resolution=(320, 240),
+            framerate=30,
+            threads=1,
+        ),
+        frame_size_bytes=find_frame_size_bytes(320, 240, pixel_format),
+        frame_numbers=range(10, 40),
+        buffer_count=2,
+        first_frame_number=10,
+    )
+
+    assert written_frames == 30
+    video_capture = cv2.VideoCapture(output_pathstring)
+    assert int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT)) == 30
+    video_capture.release()
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize(
+    "pixel_format", ["yuv420p", "nv12", "yuv422p", "yuyv422", "bgr24"]
+)
+def test_frame_size_bytes_matches_ffmpeg_for_odd_sizes(pixel_format):
+    raw_frame = subprocess.run(
+        [
+            ffmpeg_string,
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc2=size=320x240:rate=30:duration=1",
+            "-vf",
+            "scale=321:241",
+            "-frames:v",
+            "1",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            pixel_format,
+            "pipe:1",
+        ],
+        check=True,
+        capture_output=True,
+    ).stdout
+
+    assert find_frame_size_bytes(321, 241, pixel_format) == len(raw_frame)
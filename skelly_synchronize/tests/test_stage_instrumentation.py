@@ -0,0 +1,64 @@
+import json
+import threading
+from pathlib import Path
+
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    StageInstrumentation,
+    record_subprocess_spawned,
+)
+
+
+def test_stage_instrumentation(tmp_path: Path):
+    instrumentation = StageInstrumentation(records_file_path=tmp_path / "records.jsonl")
+
+    for camera_name in ["cam_0", "cam_1"]:
+        with instrumentation.measure(stage_name="trim", camera_name=camera_name):
+            record_subprocess_spawned()
+    with instrumentation.measure(stage_name="correlation"):
+        pass
+
+    instrumentation.save(
+        output_file_path=tmp_path / "timing.json",
+        chrome_trace_file_path=tmp_path / "trace.json",
+    )
+
+    stage_timing = json.loads((tmp_path / "timing.json").read_text())
+    assert [record["stage"] for record in stage_timing["stages"]] == [
+        "trim",
+        "trim",
+        "correlation",
+    ]
+    assert stage_timing["stage totals"]["trim"]["records"] == 2
+    assert stage_timing["stage totals"]["trim"]["subprocesses spawned"] == 2
+    assert stage_timing["stage totals"]["correlation"]["subprocesses spawned"] == 0
+    assert stage_timing["process totals"]["rss high water mark bytes"] >= 0
+
+    trace_events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert len([event for event in trace_events if event["ph"] == "X"]) == 3
+    assert not (tmp_path / "records.jsonl").exists()
+
+
+def test_concurrent_stages_only_count_their_own_subprocesses(tmp_path: Path):
+    instrumentation = StageInstrumentation(records_file_path=tmp_path / "records.jsonl")
+    both_measuring = threading.Barrier(2)
+
+    def trim_camera(camera_name: str, subprocess_count: int):
+        with instrumentation.measure(stage_name="trim", camera_name=camera_name):
+            both_measuring.wait()
+            record_subprocess_spawned(count=subprocess_count)
+            both_measuring.wait()
+
+    threads = [
+        threading.Thread(target=trim_camera, args=(f"cam_{count}", count))
+        for count in [1, 3]
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    subprocess_counts = {
+        record["camera name"]: record["subprocesses spawned"]
+        for record in instrumentation.load_records()
+    }
+    assert subprocess_counts == {"cam_1": 1, "cam_3": 3}
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from skelly_synchronize.core_processes.streaming_synchronizer import (
+    RingBuffer,
+    StreamingSynchronizer,
+)
+
+SAMPLE_RATE = 8000
+CHUNK_LENGTH = SAMPLE_RATE // 10
+
+
+def test_ring_buffer_keeps_latest_samples():
+    ring_buffer = RingBuffer(capacity=10)
+    for chunk_start in range(0, 25, 3):
+        ring_buffer.write(np.arange(chunk_start, chunk_start + 3))
+
+    assert ring_buffer.samples_written == 27
+    assert ring_buffer.samples_available == 10
+    assert np.array_equal(ring_buffer.read_latest(10), np.arange(17, 27))
+    assert np.array_equal(ring_buffer.read_latest(4), np.arange(23, 27))
+
+    ring_buffer.write(np.arange(100, 115))
+    assert np.array_equal(ring_buffer.read_latest(10), np.arange(105, 115))
+
+
+def test_streaming_synchronizer_finds_lag():
+    rng = np.random.default_rng(0)
+    session_audio = rng.standard_normal(SAMPLE_RATE * 20).astype(np.float32)
+    # the second camera starts recording 1.2 seconds after the first
+    second_camera_start = int(1.2 * SAMPLE_RATE)
+
+    streaming_synchronizer = StreamingSynchronizer(
+        camera_names=["cam_0", "cam_1"],
+        sample_rate=SAMPLE_RATE,
+        window_duration=4.0,
+        max_delivery_skew=1.0,
+    )
+    for chunk_start in range(0, session_audio.size, CHUNK_LENGTH):
+        chunk_end = chunk_start + CHUNK_LENGTH
+        streaming_synchronizer.add_chunk("cam_0", session_audio[chunk_start:chunk_end])
+        if chunk_start >= second_camera_start:
+            # the second camera's chunks arrive just after the first camera's
+            streaming_synchronizer.add_chunk(
+                "cam_1", session_audio[chunk_start:chunk_end]
+            )
+
+    assert streaming_synchronizer.lag_estimates["cam_1"]["updates"] > 1
+    assert streaming_synchronizer.get_lag_dictionary() == pytest.approx(
+        {"cam_0": 1.2, "cam_1": 0.0}, abs=1 / SAMPLE_RATE
+    )
+    # memory stays constant however long the stream runs
+    for ring_buffer in streaming_synchronizer.ring_buffers.values():
+        assert ring_buffer.buffer.size == 6 * SAMPLE_RATE
@@ -0,0 +1,165 @@
+import os
+import pickle
+from pathlib import Path
+
+import pytest
+
+from skelly_synchronize.core_processes.sync_result import (
+    create_sync_result,
+    load_sync_manifest,
+    save_sync_manifest,
+)
+from skelly_synchronize.core_processes.video_functions.ffmpeg_functions import (
+    parse_encoded_frame_count,
+)
+from skelly_synchronize.core_processes.video_functions.video_utilities import (
+    find_trimmed_frame_ranges,
+)
+
+
+@pytest.fixture
+def sync_result(tmp_path):
+    video_info_dict = {
+        camera_name: {
+            "camera name": camera_name,
+            "video pathstring": str(tmp_path / "raw_videos" / f"{camera_name}.mp4"),
+        }
+        for camera_name in ["cam_a", "cam_b"]
+    }
+    trim_info_dict = {
+        "cam_a": {
+            "camera name": "cam_a",
+            "output video pathstring": str(tmp_path / "staged" / "synced_cam_a.mp4"),
+            "start frame": 15,
+            "frame count": 60,
+        },
+        "cam_b": {
+            "camera name": "cam_b",
+            "output video pathstring": str(tmp_path / "staged" / "synced_cam_b.mp4"),
+            "start frame": 0,
+            "frame count": 60,
+        },
+    }
+    return create_sync_result(
+        synchronized_video_folder_path=tmp_path / "staged",
+        method="audio",
+        fps=30.0,
+        video_info_dict=video_info_dict,
+        lag_dict={"cam_a": 0.5, "cam_b": 0.0},
+        trim_info_dict=trim_info_dict,
+        confidence_dict={"cam_a": 0.8, "cam_b": 1.0},
+    )
+
+
+def test_create_sync_result(sync_result, tmp_path):
+    cam_a_result = sync_result.cameras["cam_a"]
+
+    assert cam_a_result.start_frame == 15
+    assert cam_a_result.end_frame == 75
+    assert cam_a_result.duration == pytest.approx(2.0)
+    assert sync_result.lag_dict == {"cam_a": 0.5, "cam_b": 0.0}
+    assert sync_result.confidence_dict == {"cam_a": 0.8, "cam_b": 1.0}
+    assert sync_result.synchronized_duration == pytest.approx(2.0)
+    assert sync_result.verified is None
+    assert set(sync_result.create_video_info_dict()) == {
+        "synced_cam_a",
+        "synced_cam_b",
+    }
+
+
+def test_sync_result_is_usable_as_a_path(sync_result, tmp_path):
+    assert Path(sync_result) == tmp_path / "staged"
+    assert os.fspath(sync_result) == str(tmp_path / "staged")
+    assert str(sync_result) == str(tmp_path / "staged")
+    assert sync_result / "synced_cam_a.mp4" == tmp_path / "staged" / "synced_cam_a.mp4"
+    assert sync_result.parent == tmp_path
+    assert sync_result.name == "staged"
+    assert not sync_result.exists()
+    (tmp_path / "staged").mkdir()
+    (tmp_path / "staged" / "synced_cam_a.mp4").touch()
+    assert sync_result.is_dir()
+    assert list(sync_result.glob("*.mp4")) == [tmp_path / "staged" / "synced_cam_a.mp4"]
+    with pytest.raises(AttributeError):
+        sync_result.not_a_path_attribute
+
+
+def test_sync_result_pickles(sync_result):
+    assert pickle.loads(pickle.dumps(sync_result)) == sync_result
+
+
+def test_sync_result_move_to(sync_result, tmp_path):
+    moved_sync_result = sync_result.move_to(tmp_path / "synchronized_videos")
+
+    assert moved_sync_result.synchronized_video_folder_path == (
+        tmp_path / "synchronized_videos"
+    )
+    assert moved_sync_result.cameras["cam_a"].output_video_path == (
+        tmp_path / "synchronized_videos" / "synced_cam_a.mp4"
+    )
+    # the original result is left as it was
+    assert sync_result.cameras["cam_a"].output_video_path == (
+        tmp_path / "staged" / "synced_cam_a.mp4"
+    )
+
+
+def test_parse_encoded_frame_count():
+    stats_output = (
+        "Output #0, mp4, to 'out.mp4':\n"
+        "frame=   30 fps=0.0 q=28.0 size=       0kB time=00:00:01.00 speed=2x\r"
+        "frame=   60 fps=0.0 q=-1.0 Lsize=      85kB time=00:00:02.00 speed=2.1x\n"
+    )
+    progress_output = "frame=60\nfps=0.00\nout_time_us=2000000\nprogress=end\n"
+
+    assert parse_encoded_frame_count(stats_output) == 60
+    assert parse_encoded_frame_count(progress_output) == 60
+    assert parse_encoded_frame_count("Conversion failed!") is None
+
+
+def test_sync_manifest_round_trip(sync_result, tmp_path):
+    (tmp_path / "staged").mkdir()
+    manifest_path = save_sync_manifest(sync_result)
+    loaded_sync_result = load_sync_manifest(manifest_path)
+
+    assert loaded_sync_result == sync_result
+    assert load_sync_manifest(tmp_path / "staged") == sync_result
+
+
+def test_sync_manifest_paths_are_relative(sync_result, tmp_path):
+    (tmp_path / "staged").mkdir()
+    save_sync_manifest(sync_result)
+    moved_session_path = tmp_path / "moved_session"
+    (tmp_path / "staged").rename(moved_session_path)
+
+    cam_a_result = load_sync_manifest(moved_session_path).cameras["cam_a"]
+
+    # the raw videos are found next to the manifest's folder, wherever it was moved
+    assert cam_a_result.raw_video_path == tmp_path / "raw_videos" / "cam_a.mp4"
+    assert cam_a_result.output_video_path == moved_session_path / "synced_cam_a.mp4"
+
+
+def test_frame_ranges_without_videos(tmp_path):
+    video_info_dict = {
+        camera_name: {
+            "camera name": camera_name,
+            "video pathstring": str(tmp_path / f"{camera_name}.mp4"),
+            "video duration": duration,
+        }
+        for camera_name, duration in [("cam_a", 3.0), ("cam_b", 2.0)]
+    }
+    lag_dict = {"cam_a": 0.5, "cam_b": 0.0}
+    trim_info_dict = find_trimmed_frame_ranges(
+        video_info_dict=video_info_dict, lag_dict=lag_dict, fps=30.0
+    )
+    sync_result = create_sync_result(
+        synchronized_video_folder_path=tmp_path,
+        method="brightness",
+        fps=30.0,
+        video_info_dict=video_info_dict,
+        lag_dict=lag_dict,
+        trim_info_dict=trim_info_dict,
+    )
+
+    assert not sync_result.videos_written
+    assert sync_result.cameras["cam_a"].start_frame == 15
+    assert sync_result.cameras["cam_a"].frame_count == 60
+    assert sync_result.create_video_info_dict() == {}
@@ -0,0 +1,85 @@
+import pytest
+
+from skelly_synchronize.core_processes.debugging.stage_instrumentation import (
+    measure_stage,
+)
+from skelly_synchronize.core_processes.synchronization_progress import (
+    FRAME_PROGRESS_INTERVAL,
+    ProgressReporter,
+    SynchronizationCancelled,
+    remove_partial_outputs_on_cancel,
+    report_frame_progress,
+    report_progress,
+)
+
+
+def test_ffmpeg_progress_is_reported_with_fraction():
+    progress_reports = []
+    progress_reporter = ProgressReporter(progress_callback=progress_reports.append)
+    report_progress(progress_reporter, "trim", expected_durations={None: 10.0})
+
+    progress_reporter.report_ffmpeg_progress(
+        {"stage": "trim", "camera name": "cam_0", "frame": 75, "out time": 2.5}
+    )
+
+    assert progress_reports[-1]["stage"] == "trim"
+    assert progress_reports[-1]["camera name"] == "cam_0"
+    assert progress_reports[-1]["fraction"] == pytest.approx(0.25)
+    assert progress_reports[-1]["total frames"] == 300
+    assert progress_reports[-1]["eta"] is not None
+
+
+def test_frame_progress_uses_current_stage_and_stops_when_cancelled():
+    progress_reports = []
+    progress_reporter = ProgressReporter(progress_callback=progress_reports.append)
+
+    with measure_stage(None, "extraction", "cam_1"):
+        report_frame_progress(
+            progress_reporter,
+            frames_processed=FRAME_PROGRESS_INTERVAL,
+            total_frames=4 * FRAME_PROGRESS_INTERVAL,
+        )
+        progress_reporter.cancel()
+        with pytest.raises(SynchronizationCancelled):
+            report_frame_progress(
+                progress_reporter, frames_processed=2 * FRAME_PROGRESS_INTERVAL
+            )
+
+    assert len(progress_reports) == 1
+    assert progress_reports[0]["stage"] == "extraction"
+    assert progress_reports[0]["camera name"] == "cam_1"
+    assert progress_reports[0]["fraction"] == pytest.approx(0.25)
+
+
+def test_partial_outputs_are_removed_on_cancel(tmp_path):
+    raw_video_folder_path = tmp_path / "raw_videos"
+    raw_video_folder_path.mkdir()
+    raw_video_path = raw_video_folder_path / "cam_0.mp4"
+    raw_video_path.write_bytes(b"raw video")
+    synchronized_video_folder_path = tmp_path / "synchronized_videos"
+
+    with pytest.raises(SynchronizationCancelled):
+        with remove_partial_outputs_on_cancel(
+            {
+                synchronized_video_folder_path: "*",
+                raw_video_folder_path: "*_brightness.npy",
+            }
+        ):
+            synchronized_video_folder_path.mkdir()
+            (synchronized_video_folder_path / "synced_cam_0.mp4").write_bytes(b"")
+            (raw_video_folder_path / "cam_0_brightness.npy").write_bytes(b"")
+            raise SynchronizationCancelled("Synchronization was cancelled")
+
+    assert not synchronized_video_folder_path.exists()
+    assert list(raw_video_folder_path.iterdir()) == [raw_video_path]
+
+
+def test_partial_outputs_are_kept_on_other_errors(tmp_path):
+    output_path = tmp_path / "synced_cam_0.mp4"
+
+    with pytest.raises(RuntimeError):
+        with remove_partial_outputs_on_cancel({tmp_path: "*"}):
+            output_path.write_bytes(b"")
+            raise RuntimeError("ffmpeg failed")
+
+    assert output_path.exists()
@@ -1,6 +1,7 @@
 import pytest
 import logging
 
+import numpy as np
 
 from skelly_synchronize.tests.utilities.find_frame_count_of_video import (
     find_frame_count_of_video,
@@ -8,6 +9,11 @@ from skelly_synchronize.tests.utilities.find_frame_count_of_video import (
 from skelly_synchronize.core_processes.video_functions.deffcode_functions import (
     trim_single_video_deffcode,
 )
+from skelly_synchronize.tests.utilities.create_test_video import (
+    create_test_video,
+    decode_gray_frames,
+    requires_ffmpeg,
+)
 
 
 @pytest.fixture
@@ -31,3 +37,25 @@ def test_trim_single_video_deffcode(
     )
 
     assert find_frame_count_of_video(output_video_pathstring) == len(frame_list)
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize("pixel_format", ["bgr24", "native"])
+def test_trimmed_video_starts_at_the_start_frame(tmp_path, pixel_format):
+    raw_video_path = tmp_path / "cam_a.mp4"
+    output_video_path = tmp_path / "synced_cam_a.mp4"
+    create_test_video(raw_video_path, hue=0)
+    trim_single_video_deffcode(
+        input_video_pathstring=str(raw_video_path),
+        frame_list=list(range(24, 44)),
+        output_video_pathstring=str(output_video_path),
+        pixel_format=pixel_format,
+    )
+
+    raw_frames = decode_gray_frames(raw_video_path).astype(np.int16)
+    # the trimmed video is re-encoded, so each frame is matched to the raw frame it is closest to
+    matching_raw_frame_numbers = [
+        int(np.argmin(np.abs(raw_frames - trimmed_frame).mean(axis=(1, 2))))
+        for trimmed_frame in decode_gray_frames(output_video_path).astype(np.int16)
+    ]
+    assert matching_raw_frame_numbers == list(range(24, 44))
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from skelly_synchronize.core_processes.video_functions.video_utilities import (
+    trim_single_video,
+)
+from skelly_synchronize.tests.utilities.create_test_video import (
+    create_test_video,
+    decode_gray_frames,
+    requires_ffmpeg,
+)
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize(
+    "seek_strategy, keyframe_timestamps",
+    [("keyframe", [0.0, 1 / 3, 2 / 3, 1.0]), ("input", None), ("output", None)],
+)
+def test_trimmed_video_starts_at_the_recorded_start_frame(
+    tmp_path, seek_strategy, keyframe_timestamps
+):
+    raw_video_path = tmp_path / "cam_a.mp4"
+    create_test_video(raw_video_path, hue=0)
+    # the lag falls between raw frames 20 and 21
+    trim_info = trim_single_video(
+        video_dict={"camera name": "cam_a", "video pathstring": str(raw_video_path)},
+        synchronized_folder_path=tmp_path,
+        minimum_duration=1.0,
+        minimum_frames=30,
+        lag_dict={"cam_a": 0.6865},
+        fps=30.0,
+        video_handler="ffmpeg",
+        ffmpeg_seek_strategy=seek_strategy,
+        keyframe_timestamps=keyframe_timestamps,
+    )
+
+    raw_frames = decode_gray_frames(raw_video_path).astype(np.int16)
+    first_trimmed_frame = decode_gray_frames(trim_info["output video pathstring"])[0]
+    # the trimmed video is re-encoded, so its first frame is matched to the raw frame it is closest to
+    assert trim_info["start frame"] == 20
+    assert np.argmin(np.abs(raw_frames - first_trimmed_frame).mean(axis=(1, 2))) == 20
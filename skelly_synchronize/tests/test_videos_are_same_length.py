@@ -18,3 +18,13 @@ def test_videos_are_same_length(synchronized_video_folder_path: Union[str, Path]
     assert isinstance(
         check_list_values_are_equal(synchronized_video_framecounts), (int, float)
     )
+
+
+@pytest.mark.usefixtures("sync_result")
+def test_sync_result_frame_counts_match_videos(sync_result):
+    synchronized_video_framecounts = get_number_of_frames_of_videos_in_a_folder(
+        folder_path=sync_result.synchronized_video_folder_path
+    )
+    assert sorted(synchronized_video_framecounts) == sorted(
+        camera_result.frame_count for camera_result in sync_result.cameras.values()
+    )
@@ -0,0 +1,128 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from skelly_synchronize.core_processes.sync_result import (
+    CameraSyncResult,
+    SyncResult,
+)
+from skelly_synchronize.core_processes.video_functions.ffmpeg_functions import (
+    ffmpeg_string,
+)
+
+FRAME_SIZE = (64, 48)
+
+requires_ffmpeg = pytest.mark.skipif(
+    shutil.which(ffmpeg_string) is None, reason="ffmpeg is not installed"
+)
+
+
+def create_test_video(video_path: Path, hue: int):
+    """Create a 2 second 30 fps video with an audio track, like the videos being synchronized.
+    Each frame has a white column at the x of its frame number, so no two frames are the same.
+    """
+    subprocess.run(
+        [
+            ffmpeg_string,
+            "-y",
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc2=size={FRAME_SIZE[0]}x{FRAME_SIZE[1]}:rate=30:duration=2,hue=h={hue},"
+            "geq=lum='if(eq(X,N),255,lum(X,Y))':cb='cb(X,Y)':cr='cr(X,Y)'",
+            "-f",
+            "lavfi",
+            "-i",
+            "sine=duration=2",
+            "-shortest",
+            "-g",
+            "10",
+            str(video_path),
+        ],
+        check=True,
+    )
+
+
+def create_flash_video(video_path: Path, flash_frame: int, frame_count: int = 120):
+    """Create a gray 30 fps video that flashes bright for 10 frames from the flash frame"""
+    frames = np.full((frame_count, FRAME_SIZE[1], FRAME_SIZE[0]), 100, dtype=np.uint8)
+    frames[slice(flash_frame, flash_frame + 10)] = 235
+    subprocess.run(
+        [
+            ffmpeg_string,
+            "-y",
+            "-v",
+            "error",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "gray",
+            "-s",
+            f"{FRAME_SIZE[0]}x{FRAME_SIZE[1]}",
+            "-r",
+            "30",
+            "-i",
+            "pipe:0",
+            "-pix_fmt",
+            "yuv420p",
+            str(video_path),
+        ],
+        input=frames.tobytes(),
+        check=True,
+    )
+
+
+def decode_gray_frames(video_path: Path) -> np.ndarray:
+    decoded_frames = subprocess.run(
+        [
+            ffmpeg_string,
+            "-v",
+            "error",
+            "-i",
+            str(video_path),
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "gray",
+            "pipe:1",
+        ],
+        check=True,
+        capture_output=True,
+    ).stdout
+    return np.frombuffer(decoded_frames, dtype=np.uint8).reshape(
+        -1, FRAME_SIZE[1], FRAME_SIZE[0]
+    )
+
+
+def create_test_sync_result(tmp_path: Path) -> SyncResult:
+    """Create two raw test videos and a sync result starting camera cam_a 7 frames after cam_b, 40 frames long"""
+    raw_video_folder_path = tmp_path / "raw_videos"
+    raw_video_folder_path.mkdir()
+    synchronized_video_folder_path = tmp_path / "synchronized_videos"
+    synchronized_video_folder_path.mkdir()
+
+    cameras = {}
+    for camera_name, start_frame, hue in [("cam_a", 7, 0), ("cam_b", 0, 90)]:
+        raw_video_path = raw_video_folder_path / f"{camera_name}.mp4"
+        create_test_video(raw_video_path, hue=hue)
+        cameras[camera_name] = CameraSyncResult(
+            camera_name=camera_name,
+            raw_video_path=raw_video_path,
+            output_video_path=None,
+            lag=start_frame / 30,
+            confidence=None,
+            start_frame=start_frame,
+            frame_count=40,
+            duration=40 / 30,
+        )
+    return SyncResult(
+        synchronized_video_folder_path=synchronized_video_folder_path,
+        method="audio",
+        fps=30.0,
+        cameras=cameras,
+    )
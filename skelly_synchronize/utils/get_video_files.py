@@ -1,33 +1,179 @@
+import contextlib
+import fnmatch
 import logging
+import os
+import threading
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 from skelly_synchronize.system.file_extensions import VideoExtension
+from skelly_synchronize.system.paths_and_file_names import (
+    AUDIO_FILES_FOLDER_NAME,
+    NORMALIZED_VIDEOS_FOLDER_NAME,
+    RAW_VIDEOS_FOLDER_NAME,
+    SYNCHRONIZED_VIDEOS_FOLDER_NAME,
+)
 
 logger = logging.getLogger(__name__)
 
+# lowercase suffixes, so file names are matched case insensitively with one lookup
+VIDEO_FILE_SUFFIXES = frozenset(f".{extension.value}" for extension in VideoExtension)
+# folders synchronization writes its outputs to, which session discovery doesn't search
+OUTPUT_FOLDER_NAMES = frozenset(
+    [
+        SYNCHRONIZED_VIDEOS_FOLDER_NAME,
+        NORMALIZED_VIDEOS_FOLDER_NAME,
+        AUDIO_FILES_FOLDER_NAME,
+    ]
+)
+
+# directory listings kept while `cache_directory_listings` is active, keyed by folder path,
+# holding the folder's modification time and the name, is file and is folder of each entry
+_directory_listing_cache: Dict[Path, Tuple[int, List[Tuple[str, bool, bool]]]] = {}
+_directory_listing_cache_users = 0
+_directory_listing_cache_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def cache_directory_listings() -> Iterator[None]:
+    """Reuse directory listings for as long as the context is active, like for the length of a synchronization run.
+    A cached listing is only reused while the folder's modification time is unchanged, so files added or removed during the run are still found.
+    Contexts can be nested and used from several threads, and the cache is cleared once the last one exits.
+    """
+    global _directory_listing_cache_users
+    with _directory_listing_cache_lock:
+        _directory_listing_cache_users += 1
+    try:
+        yield
+    finally:
+        with _directory_listing_cache_lock:
+            _directory_listing_cache_users -= 1
+            if _directory_listing_cache_users == 0:
+                _directory_listing_cache.clear()
+
+
+def list_directory(folder_path: Path) -> List[Tuple[str, bool, bool]]:
+    """List a folder with one scandir pass, returning the name, is file and is folder of each entry.
+    Symlinks are followed, so a link to a video counts as a file.
+    """
+    folder_path = Path(folder_path)
+    with _directory_listing_cache_lock:
+        caching = _directory_listing_cache_users > 0
+        cached_listing = _directory_listing_cache.get(folder_path)
+
+    modification_time = None
+    if caching:
+        modification_time = os.stat(folder_path).st_mtime_ns
+        if cached_listing is not None and cached_listing[0] == modification_time:
+            return cached_listing[1]
+
+    with os.scandir(folder_path) as entries:
+        listing = [(entry.name, entry.is_file(), entry.is_dir()) for entry in entries]
+
+    if caching:
+        with _directory_listing_cache_lock:
+            _directory_listing_cache[folder_path] = (modification_time, listing)
+    return listing
+
+
+def is_video_file_name(file_name: str) -> bool:
+    return os.path.splitext(file_name)[1].lower() in VIDEO_FILE_SUFFIXES
+
 
 def get_video_file_list(folder_path: Path) -> list:
     """Return a list of all video files in the base_path folder that match a video file type"""
-    list_of_video_formats = [extension.value for extension in VideoExtension]
+    folder_path = Path(folder_path)
+    video_filepath_list = [
+        folder_path / name
+        for name, is_file, _ in list_directory(folder_path)
+        if is_file and is_video_file_name(name)
+    ]
 
-    video_filepath_list = []
-    for file_type in list_of_video_formats:
-        file_extension_upper = "*" + file_type.upper()
-        file_extension_lower = "*" + file_type.lower()
+    logger.info(f"{len(video_filepath_list)} videos found in folder")
 
-        video_filepath_list.extend(list(folder_path.glob(file_extension_upper)))
-        video_filepath_list.extend(list(folder_path.glob(file_extension_lower)))
+    return sorted(video_filepath_list, key=lambda p: str(p).lower())
 
-    # because glob behaves differently on windows vs. mac/linux, we collect all files both upper and lowercase, and remove redundant files that appear on windows
-    unique_video_filepath_list = get_unique_list(video_filepath_list)
 
-    logger.info(f"{len(unique_video_filepath_list)} videos found in folder")
+def get_unique_list(list: list) -> list:
+    """Return a list of the unique elements from input list, in the order they first appear"""
+    return [*dict.fromkeys(list)]
 
-    return sorted(unique_video_filepath_list, key=lambda p: str(p).lower())
 
+def matches_any_pattern(relative_pathstring: str, patterns: Sequence[str]) -> bool:
+    """Check a folder's path relative to the search root, or its name, against glob patterns"""
+    folder_name = relative_pathstring.rsplit("/", maxsplit=1)[-1]
+    return any(
+        fnmatch.fnmatch(relative_pathstring, pattern)
+        or fnmatch.fnmatch(folder_name, pattern)
+        for pattern in patterns
+    )
 
-def get_unique_list(list: list) -> list:
-    """Return a list of the unique elements from input list"""
-    unique_list = []
-    [unique_list.append(clip) for clip in list if clip not in unique_list]
-    return unique_list
+
+def find_session_video_folders(
+    root_folder_path: Union[str, Path],
+    include_patterns: Optional[Sequence[str]] = None,
+    exclude_patterns: Optional[Sequence[str]] = None,
+    max_depth: Optional[int] = None,
+) -> List[Path]:
+    """Search a folder tree for the folders holding each session's raw videos, listing every folder once with scandir.
+    A folder with a raw videos folder in it is a session, and its raw videos folder is returned.
+    Otherwise a folder with videos in it is returned directly. Sessions aren't searched further, and neither are synchronization output folders.
+
+    Include and exclude patterns are glob patterns matched against each folder's path relative to the root (with "/" separators) or its name.
+    Excluded folders are skipped along with everything inside them, and when include patterns are given,
+    only video folders matching one of them, or inside a folder matching one of them, are returned.
+    """
+    root_folder_path = Path(root_folder_path)
+    include_patterns = list(include_patterns or [])
+    exclude_patterns = list(exclude_patterns or [])
+
+    video_folder_paths = []
+    # folders to search, with their depth and whether they are inside an included folder
+    folders_to_search = [(root_folder_path, 0, len(include_patterns) == 0)]
+    while folders_to_search:
+        folder_path, depth, included = folders_to_search.pop()
+        if folder_path != root_folder_path:
+            relative_pathstring = folder_path.relative_to(root_folder_path).as_posix()
+            if matches_any_pattern(relative_pathstring, exclude_patterns):
+                continue
+            included = included or matches_any_pattern(
+                relative_pathstring, include_patterns
+            )
+
+        try:
+            listing = list_directory(folder_path)
+        except OSError as e:
+            logger.warning(f"Skipping {folder_path}, it could not be listed: {e}")
+            continue
+
+        video_folder_path = find_session_video_folder(folder_path, listing)
+        if video_folder_path is not None:
+            if included:
+                video_folder_paths.append(video_folder_path)
+            continue
+
+        if max_depth is not None and depth >= max_depth:
+            continue
+        subfolder_names = sorted(
+            name
+            for name, _, is_dir in listing
+            if is_dir and name not in OUTPUT_FOLDER_NAMES
+        )
+        # pushed in reverse so folders are searched in sorted order
+        for subfolder_name in reversed(subfolder_names):
+            folders_to_search.append(
+                (folder_path / subfolder_name, depth + 1, included)
+            )
+
+    return video_folder_paths
+
+
+def find_session_video_folder(
+    folder_path: Path, listing: List[Tuple[str, bool, bool]]
+) -> Optional[Path]:
+    """Return the folder's raw videos folder if it has one, the folder itself if it has videos in it, or None if it isn't a session"""
+    if any(is_dir and name == RAW_VIDEOS_FOLDER_NAME for name, _, is_dir in listing):
+        return folder_path / RAW_VIDEOS_FOLDER_NAME
+    if any(is_file and is_video_file_name(name) for name, is_file, _ in listing):
+        return folder_path
+    return None
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 from pathlib import Path
 
@@ -33,3 +34,22 @@ def name_synced_video(raw_video_filename: str) -> str:
         )
 
     return synced_video_name
+
+
+def get_cached_file_path(
+    cache_folder_path: Path, source_file_path: Path, file_extension: str
+) -> Path:
+    """Return the path a file derived from the source file is cached at.
+    The cache key includes the source file's size and modification time, so a changed source gets a new cache entry.
+    """
+    source_file_path = Path(source_file_path).resolve()
+    source_file_stat = source_file_path.stat()
+    cache_key = hashlib.sha1(
+        f"{source_file_path}|{source_file_stat.st_size}|{source_file_stat.st_mtime_ns}".encode(),
+        usedforsecurity=False,
+    ).hexdigest()
+
+    return (
+        Path(cache_folder_path)
+        / f"{source_file_path.stem}_{cache_key}.{file_extension}"
+    )